@@ -1,8 +1,14 @@
 import serial
 import json
 import os
+import sys
+from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "iot"))
+
+from binary_format import decode_binary
+
 SERIAL_PORT = os.getenv("SERIAL_PORT", "COM3")
 BAUD_RATE = int(os.getenv("BAUD_RATE", "115200"))
 
@@ -13,7 +19,14 @@ def read_serial():
         
         while True:
             line = ser.readline().decode('utf-8').strip()
-            if line:
+            if line.lower().startswith("fa01"):
+                # formato binário v1 em hexadecimal (serial_simulator --format binary)
+                try:
+                    for data in decode_binary(bytes.fromhex(line)):
+                        print(f"[{datetime.now().isoformat()}] {data}")
+                except ValueError:
+                    print(f"Invalid binary payload: {line}")
+            elif line:
                 try:
                     data = json.loads(line)
                     print(f"[{datetime.now().isoformat()}] {data}")
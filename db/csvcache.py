@@ -0,0 +1,326 @@
+"""
+csvcache.py
+Leitura incremental dos CSVs do dashboard (sensors/weather/detections).
+
+Cada arquivo guarda inode, tamanho, mtime e o offset (em bytes) do fim da última linha
+completa já lida. Num rerun:
+  - nada mudou (mesmo inode/tamanho/mtime): devolve o DataFrame em cache, sem I/O
+  - cresceu: lê só os bytes novos, converte para os tipos já em cache e anexa
+  - truncado, rotacionado (outro inode) ou reescrito (bytes antes do offset mudaram):
+    recarrega inteiro
+As colunas usam os tipos compactos de db/frames.py (sensor_id/categoria category,
+leituras float32); anexos com sensores novos só acrescentam categorias.
+Uma linha final sem '\\n' (writer no meio da gravação) fica para o próximo rerun.
+Campos entre aspas com quebra de linha não são suportados no modo incremental.
+
+O DataFrame devolvido é compartilhado entre reruns/sessões: não altere in-place.
+
+Benchmark:
+    python db/csvcache.py bench --rows 1000000 --append 500
+"""
+
+import io
+import os
+import sys
+import time
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.frames import CATEGORY_COLUMNS, compact, codes_dtype
+
+logger = logging.getLogger("data.csvcache")
+
+DATE_COLUMNS = ("ts",)
+_TAIL_CHECK = 64  # bytes antes do offset comparados para detectar arquivo reescrito
+# a carga completa converte em blocos: o pico é um bloco de strings, não o arquivo inteiro
+FULL_LOAD_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "250000"))
+
+
+def _column_array(values: pd.Series) -> np.ndarray:
+    """Colunas numéricas/datas como ndarray nativo (category: os códigos); o resto como object."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    if pd.api.types.is_bool_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype) \
+            or pd.api.types.is_datetime64_dtype(values.dtype):
+        return values.to_numpy()
+    return values.to_numpy(dtype=object)
+
+
+class IncrementalCSV:
+    """
+    Um CSV com cache por offset. As colunas ficam em buffers numpy com folga (crescem 2x):
+    anexar custa O(linhas novas) e ``df`` é montado sobre fatias dos buffers, sem concat
+    (que copiaria o histórico inteiro a cada rerun).
+    """
+
+    def __init__(self, path, date_columns=DATE_COLUMNS):
+        self.path = Path(path)
+        self.date_columns = tuple(date_columns)
+        self.df = None
+        self._lock = threading.Lock()
+        self._ino = None
+        self._size = -1
+        self._mtime = None
+        self._offset = 0
+        self._tail = b""
+        self._header = None
+        self._cols = {}
+        self._cats = {}  # coluna category -> pd.Index das categorias (códigos ficam em _cols)
+        self._n = 0
+        self.full_loads = 0
+        self.appends = 0
+
+    def read(self):
+        """DataFrame atualizado (None se o arquivo não existe ou não pôde ser lido)."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._reset()
+                return None
+            if self._header is not None and (st.st_ino, st.st_size, st.st_mtime_ns) == (self._ino, self._size, self._mtime):
+                return self.df
+            try:
+                with open(self.path, "rb") as f:
+                    if self._header is None or st.st_ino != self._ino or st.st_size < self._offset \
+                            or not self._same_prefix(f):
+                        self._load_full(f)
+                    else:
+                        self._load_tail(f)
+            except Exception:
+                logger.exception("Falha lendo %s", self.path)
+                self._reset()
+                return None
+            self._ino, self._size, self._mtime = st.st_ino, st.st_size, st.st_mtime_ns
+            return self.df
+
+    def _reset(self):
+        self.df = None
+        self._header = None
+        self._cols = {}
+        self._cats = {}
+        self._n = 0
+        self._ino = None
+        self._offset = 0
+        self._tail = b""
+
+    def _same_prefix(self, f) -> bool:
+        start = max(0, self._offset - len(self._tail))
+        f.seek(start)
+        return f.read(self._offset - start) == self._tail
+
+    def _remember(self, data: bytes, end: int):
+        self._offset = end
+        self._tail = data[max(0, len(data) - _TAIL_CHECK):]
+
+    def _publish(self):
+        n = self._n
+        data = {}
+        for c, a in self._cols.items():
+            if c in self._cats:
+                data[c] = pd.Categorical.from_codes(a[:n], categories=self._cats[c], validate=False)
+            elif a.dtype == object:
+                data[c] = pd.Series(a[:n], dtype=object, copy=False)
+            else:
+                data[c] = a[:n]
+        self.df = pd.DataFrame(data, copy=False)
+
+    def _load_full(self, f):
+        f.seek(0)
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:  # vazio ou cabeçalho ainda incompleto
+            self._reset()
+            return
+        self._remember(data[max(0, end - _TAIL_CHECK):end], end)
+        if end < len(data):
+            data = data[:end]
+        rows = max(0, data.count(b"\n") - 1)
+        chunks = pd.read_csv(io.BytesIO(data), chunksize=FULL_LOAD_CHUNK_ROWS,
+                             dtype={c: "category" for c in CATEGORY_COLUMNS})
+        self._cols = {}
+        self._cats = {}
+        self._n = 0
+        first = True
+        for chunk in chunks:
+            if first:
+                self._init_columns(chunk, capacity=max(1024, rows + rows // 2))
+                first = False
+            else:
+                self._append(chunk)
+        if first:  # só o cabeçalho
+            self._init_columns(pd.read_csv(io.BytesIO(data), nrows=0), capacity=1024)
+        self._publish()
+        self.full_loads += 1
+
+    def _init_columns(self, chunk: pd.DataFrame, capacity: int):
+        """Buffers a partir do primeiro bloco: define tipos (compactos) e categorias."""
+        for c in self.date_columns:
+            if c in chunk.columns:
+                chunk[c] = pd.to_datetime(chunk[c], errors="coerce")
+        chunk = compact(chunk)  # category / float32 (db/frames.py)
+        n = len(chunk)
+        for c in chunk.columns:
+            if isinstance(chunk[c].dtype, pd.CategoricalDtype):
+                self._cats[c] = chunk[c].cat.categories
+            arr = _column_array(chunk[c])
+            buf = np.empty(max(capacity, n), dtype=arr.dtype)
+            buf[:n] = arr
+            self._cols[c] = buf
+        self._header = list(chunk.columns)
+        self._n = n
+
+    def _load_tail(self, f):
+        f.seek(self._offset)
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return
+        text_cols = {c: str for c, a in self._cols.items() if a.dtype == object or c in self._cats}
+        chunk = pd.read_csv(io.BytesIO(data[:end]), header=None, names=self._header, dtype=text_cols)
+        self._append(chunk)
+        self._remember(data[:end], self._offset + end)
+        self._publish()
+        self.appends += 1
+
+    def _append(self, chunk: pd.DataFrame):
+        """Converte ``chunk`` para os tipos dos buffers e anexa (buffers crescem 2x)."""
+        n, k = self._n, len(chunk)
+        for c in self._header:
+            buf = self._cols[c]
+            if c in self._cats:
+                values, buf = self._encode(c, chunk[c], buf)
+            elif buf.dtype.kind == "M":
+                values = pd.to_datetime(chunk[c], errors="coerce").to_numpy().astype(buf.dtype)
+            elif buf.dtype.kind in "iufb":
+                values = pd.to_numeric(chunk[c], errors="coerce").to_numpy()
+                if not np.can_cast(values.dtype, buf.dtype, casting="same_kind") or \
+                        (buf.dtype.kind in "ib" and values.dtype.kind == "f"):
+                    # ex.: coluna inteira recebe vazio/NaN -> promove o buffer inteiro
+                    buf = buf.astype(np.result_type(buf.dtype, values.dtype, np.float64))
+            else:
+                values = chunk[c].to_numpy(dtype=object)
+            if n + k > len(buf):
+                grown = np.empty(max(2 * len(buf), n + k), dtype=buf.dtype)
+                grown[:n] = buf[:n]
+                buf = grown
+            buf[n:n + k] = values
+            self._cols[c] = buf
+        self._n = n + k
+
+    def _encode(self, column: str, values: pd.Series, buf: np.ndarray):
+        """Códigos de ``values`` nas categorias da coluna; categorias novas entram no fim."""
+        cats = self._cats[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # bloco já categórico (carga completa): traduz só as categorias do bloco
+            codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, labels = None, values
+        idx = cats.get_indexer(labels)
+        new = pd.unique(labels[(idx == -1) & np.asarray(pd.notna(labels))])
+        if len(new):
+            cats = self._cats[column] = cats.append(pd.Index(new))
+            idx = cats.get_indexer(labels)
+            dtype = codes_dtype(len(cats))
+            if dtype.itemsize > buf.dtype.itemsize:
+                buf = buf.astype(dtype)
+        if codes is not None:
+            mapped = np.full(len(codes), -1, dtype=idx.dtype)
+            mapped[codes >= 0] = idx[codes[codes >= 0]]
+            idx = mapped
+        return idx.astype(buf.dtype), buf
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def read_csv_cached(path, date_columns=DATE_COLUMNS):
+    """Leitor incremental do processo para ``path`` (um por caminho); devolve o DataFrame ou None."""
+    key = str(Path(path).resolve())
+    with _files_lock:
+        reader = _files.get(key)
+        if reader is None:
+            reader = _files[key] = IncrementalCSV(key, date_columns)
+    return reader.read()
+
+
+def read_first_cached(candidates):
+    """Primeiro candidato existente e legível: (DataFrame, caminho) ou (None, None)."""
+    for p in candidates:
+        if Path(p).exists():
+            df = read_csv_cached(p)
+            if df is not None:
+                return df, p
+    return None, None
+
+
+# ---------- benchmark ----------
+def _bench(rows: int, append: int, reruns: int):
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp(prefix="csvcache_bench_"))
+    path = tmp / "sensors.csv"
+    rng = np.random.default_rng(0)
+
+    def frame(n, start):
+        ts = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.arange(start, start + n), unit="s")
+        return pd.DataFrame({"id": np.arange(start, start + n), "sensor_id": rng.integers(0, 200, n).astype(str),
+                             "umidade": rng.uniform(20, 60, n).round(2), "nutriente": rng.uniform(0, 5, n).round(2),
+                             "ts": ts.strftime("%Y-%m-%dT%H:%M:%S")})
+
+    frame(rows, 0).to_csv(path, index=False)
+    size_mb = path.stat().st_size / 1e6
+    reader = IncrementalCSV(path)
+    reader.read()
+    full, inc, idle = [], [], []
+    n = rows
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        df = pd.read_csv(path)
+        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
+        full.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        reader.read()
+        idle.append(time.perf_counter() - t0)
+        new = frame(append, n)
+        new.to_csv(path, mode="a", header=False, index=False)
+        frame_last = new["umidade"].iloc[-1]
+        n += append
+        t0 = time.perf_counter()
+        df_inc = reader.read()
+        inc.append(time.perf_counter() - t0)
+    assert len(df_inc) == n and df_inc["ts"].dtype == df["ts"].dtype and df_inc["umidade"].iloc[-1] == np.float32(frame_last), "leitura incremental divergente"
+    med = lambda xs: sorted(xs)[len(xs) // 2] * 1000
+    print(f"arquivo: {rows:,} linhas ({size_mb:.0f} MB), +{append} linhas por rerun, {reruns} reruns")
+    print(f"read_csv + to_datetime (atual) : {med(full):9.2f} ms/rerun")
+    print(f"incremental, sem dados novos   : {med(idle):9.2f} ms/rerun")
+    print(f"incremental, +{append} linhas     : {med(inc):9.2f} ms/rerun  "
+          f"(cargas completas={reader.full_loads}, anexos={reader.appends})")
+    path.write_text("id,sensor_id,umidade,nutriente,ts\n1,s1,30.0,1.0,2025-01-01T00:00:00\n")
+    assert len(reader.read()) == 1, "truncamento não detectado"
+    print("truncamento -> recarga completa: ok")
+    path.unlink()
+    tmp.rmdir()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Leitura incremental de CSV (dashboard)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Releitura completa x incremental por rerun")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--append", type=int, default=500)
+    p.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+    _bench(args.rows, args.append, args.reruns)
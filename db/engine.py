@@ -0,0 +1,287 @@
+"""
+engine.py
+Fábrica única de engines SQLAlchemy para o app Streamlit e os módulos de db/.
+
+- um engine (e um pool) por URL no processo inteiro: todas as sessões do Streamlit e
+  todos os reruns reaproveitam as mesmas conexões
+- pool_pre_ping descarta conexões mortas na retirada, sem SELECT 1 manual a cada uso
+- falha de conexão não fica em cache: novas tentativas com backoff exponencial
+  (DB_RETRY_BASE .. DB_RETRY_MAX segundos); enquanto espera, get_engine devolve None
+- engine_stats(): retiradas do pool, conexões novas, tempo de espera na retirada
+
+Benchmark (conexões abertas por rerun com sessões concorrentes):
+    python db/engine.py bench --sessions 8 --reruns 20
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy.pool import QueuePool
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+logger = logging.getLogger("data.engine")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "3"))
+DB_RETRY_BASE = float(os.getenv("DB_RETRY_BASE", "1"))
+DB_RETRY_MAX = float(os.getenv("DB_RETRY_MAX", "60"))
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede o tempo de cada retirada (inclui esperar vaga e abrir conexão)."""
+
+    stats = None
+
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - t0)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def normalize_url(url: str) -> str:
+    """``postgres://`` (Heroku/docker-compose) não é aceito pelo SQLAlchemy 2: vira postgresql+psycopg2://."""
+    if url.startswith("postgres://"):
+        return "postgresql+psycopg2://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+psycopg2://" + url[len("postgresql://"):]
+    return url
+
+
+def create_engine(url: str, stats: PoolStats = None, **overrides):
+    """Engine com o pool configurado (DB_POOL_*) e contadores em ``stats``."""
+    url = normalize_url(url)
+    kwargs = {}
+    if url.startswith("postgresql"):
+        kwargs = dict(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+        )
+    kwargs.update(overrides)
+    engine = sqlalchemy.create_engine(url, **kwargs)
+    stats = stats or PoolStats()
+    engine.pool.stats = stats
+    sqlalchemy.event.listen(engine, "connect", lambda *a: stats.incr("connects"))
+    sqlalchemy.event.listen(engine, "checkin", lambda *a: stats.incr("checkins"))
+    sqlalchemy.event.listen(engine, "invalidate", lambda *a: stats.incr("invalidated"))
+    return engine
+
+
+class _Entry:
+    def __init__(self):
+        self.engine = None
+        self.stats = PoolStats()
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self.lock = threading.Lock()
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _entry(url: str) -> _Entry:
+    with _engines_lock:
+        entry = _engines.get(url)
+        if entry is None:
+            entry = _engines[url] = _Entry()
+        return entry
+
+
+def get_engine(database_url: str = None):
+    """
+    Engine compartilhado da URL (padrão: data_pipeline.config.DATABASE_URL), ou None se o
+    banco não responde; a próxima tentativa só acontece depois do backoff.
+    """
+    if database_url is None:
+        from data_pipeline.config import DATABASE_URL as database_url
+    if not database_url:
+        return None
+    entry = _entry(database_url)
+    if entry.engine is not None:
+        return entry.engine
+    with entry.lock:
+        if entry.engine is not None:
+            return entry.engine
+        if time.monotonic() < entry.retry_at:
+            return None
+        engine = None
+        try:
+            engine = create_engine(database_url, stats=entry.stats)
+            with engine.connect() as conn:  # primeira conexão já fica no pool
+                conn.execute(sqlalchemy.text("SELECT 1"))
+        except Exception as e:
+            if engine is not None:
+                engine.dispose()
+            entry.failures += 1
+            delay = min(DB_RETRY_MAX, DB_RETRY_BASE * 2 ** (entry.failures - 1))
+            entry.retry_at = time.monotonic() + delay
+            entry.last_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+            logger.warning("Banco indisponível (%s); nova tentativa em %.0fs", entry.last_error, delay)
+            return None
+        entry.engine = engine
+        entry.failures = 0
+        entry.last_error = None
+        return engine
+
+
+def engine_stats(database_url: str = None) -> dict:
+    """Contadores do pool de cada URL (ou só de ``database_url``), sem a senha."""
+    out = {}
+    with _engines_lock:
+        items = list(_engines.items())
+    for url, entry in items:
+        if database_url is not None and url != database_url:
+            continue
+        info = entry.stats.as_dict()
+        info["failures"] = entry.failures
+        info["last_error"] = entry.last_error
+        if entry.engine is not None:
+            info["pool"] = entry.engine.pool.status()
+        key = sqlalchemy.engine.make_url(normalize_url(url)).render_as_string(hide_password=True)
+        out[key] = info
+    return out
+
+
+def dispose_all():
+    with _engines_lock:
+        items = list(_engines.values())
+        _engines.clear()
+    for entry in items:
+        if entry.engine is not None:
+            entry.engine.dispose()
+
+
+# ---------- benchmark ----------
+def _bench(database_url: str, sessions: int, reruns: int, pause: float):
+    from statistics import median
+    import pandas as pd
+    from db.loader import metrics_from_db
+
+    def result():
+        return {"sensors_active": 0, "umidade_media": None, "alerts_pending": 0, "latest_readings": pd.DataFrame()}
+
+    def legacy_rerun(stats):
+        # padrão anterior do app: engine novo (cache expirado) + SELECT 1 a cada rerun
+        engine = create_engine(database_url, stats=stats, poolclass=InstrumentedQueuePool,
+                               pool_pre_ping=False)
+        with engine.connect() as conn:
+            conn.execute(sqlalchemy.text("SELECT 1"))
+        metrics_from_db(engine, result())
+        engine.dispose()
+
+    def shared_rerun(stats):
+        metrics_from_db(get_engine(database_url), result())
+
+    for label, fn in (("engine por rerun", legacy_rerun), ("engine compartilhado", shared_rerun)):
+        dispose_all()
+        stats = PoolStats() if fn is legacy_rerun else None
+        if fn is shared_rerun:
+            get_engine(database_url)
+            stats = _entry(database_url).stats
+        lat = []
+        lat_lock = threading.Lock()
+
+        def session():
+            for _ in range(reruns):
+                t0 = time.perf_counter()
+                fn(stats)
+                with lat_lock:
+                    lat.append(time.perf_counter() - t0)
+                time.sleep(pause)
+
+        threads = [threading.Thread(target=session) for _ in range(sessions)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        s = stats.as_dict()
+        total = sessions * reruns
+        lat.sort()
+        print(f"{label:22s} reruns={total} conexões abertas={s['connects']:4d} ({s['connects'] / total:.2f}/rerun) "
+              f"retiradas={s['checkouts']} espera méd={s['wait_avg_ms']:.2f} ms máx={s['wait_max_ms']:.1f} ms | "
+              f"rerun p50={median(lat) * 1000:.1f} ms p95={lat[int(len(lat) * 0.95) - 1] * 1000:.1f} ms "
+              f"({elapsed:.1f}s)")
+    dispose_all()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Pool de conexões compartilhado (SQLAlchemy)")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Conexões por rerun: engine por rerun x compartilhado")
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--reruns", type=int, default=20)
+    p.add_argument("--pause", type=float, default=0.05, help="Intervalo entre reruns de uma sessão (s)")
+    p = sub.add_parser("check", help="Conecta e mostra os contadores do pool")
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        from data_pipeline.config import DATABASE_URL
+        args.database_url = DATABASE_URL
+    if args.cmd == "bench":
+        _bench(args.database_url, args.sessions, args.reruns, args.pause)
+    else:
+        print("conectado" if get_engine(args.database_url) is not None else "indisponível")
+        print(engine_stats())
@@ -0,0 +1,161 @@
+"""
+frames.py
+Tipos compactos para os DataFrames de leituras usados pelo dashboard, loader e treino.
+
+  sensor_id, categoria           -> category (códigos int8/int16 + uma cópia de cada texto)
+  umidade, nutriente, clima, ... -> float32 (a precisão dos sensores cabe com folga)
+  ts                             -> datetime64[us]
+
+Uma linha de sensors (sensor_id, ts, umidade, nutriente) cai de ~40 para ~17 bytes.
+Os frames compactos são compartilhados entre painéis: as funções de plot não copiam o
+frame (agrupam direto sobre as colunas), então não altere in-place.
+
+Benchmark (RSS de carregar e desenhar os painéis):
+    python db/frames.py bench --rows 5000000
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+CATEGORY_COLUMNS = ("sensor_id", "categoria")
+FLOAT32_COLUMNS = ("umidade", "nutriente", "temp", "chuva", "vento", "confianca")
+DATE_COLUMNS = ("ts",)
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas conhecidas para os tipos compactos; devolve um frame novo (não altera ``df``)."""
+    if df is None:
+        return None
+    out = {}
+    for c in df.columns:
+        s = df[c]
+        if c in CATEGORY_COLUMNS and not isinstance(s.dtype, pd.CategoricalDtype):
+            out[c] = s.astype("category")
+        elif c in FLOAT32_COLUMNS and s.dtype != np.float32:
+            out[c] = pd.to_numeric(s, errors="coerce").astype(np.float32)
+        elif c in DATE_COLUMNS and s.dtype != "datetime64[us]":
+            out[c] = pd.to_datetime(s, errors="coerce").astype("datetime64[us]")
+    return df.assign(**out) if out else df
+
+
+def compact_table(table) -> pd.DataFrame:
+    """pyarrow.Table -> DataFrame compacto, convertendo no Arrow (sem passar por strings object)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for i, name in enumerate(table.column_names):
+        col = table.column(i)
+        if name in CATEGORY_COLUMNS and not pa.types.is_dictionary(col.type):
+            table = table.set_column(i, name, pc.dictionary_encode(col))
+        elif name in FLOAT32_COLUMNS and pa.types.is_floating(col.type) and col.type != pa.float32():
+            table = table.set_column(i, name, col.cast(pa.float32()))
+    return table.to_pandas()
+
+
+def codes_dtype(n_categories: int):
+    """Menor inteiro para os códigos (o mesmo que o pandas escolhe, para from_codes não copiar)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum()) if df is not None else 0
+
+
+# ---------- benchmark ----------
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _rss_mb() -> float:
+    return _status_mb("VmRSS")
+
+
+def _peak_mb() -> float:
+    # VmHWM e não ru_maxrss: este sobrevive ao exec e traria o pico do processo pai
+    return _status_mb("VmHWM")
+
+
+def _bench_child(mode: str, path: str):
+    """Um processo por modo: RSS não volta ao SO de forma confiável depois de liberar frames."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    if mode == "antes":
+        # caminho anterior: read_csv + to_datetime, cópia do frame por painel
+        df = pd.read_csv(path)
+        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
+        loaded = _rss_mb()
+        d = df.copy().dropna(subset=["ts", "umidade"])
+        d["hour"] = d["ts"].dt.floor("h")
+        hourly = d.groupby("hour")["umidade"].mean()
+        per_sensor = df.dropna(subset=["sensor_id", "umidade"]).groupby("sensor_id")["umidade"].mean()
+        last = df.sort_values("ts").iloc[-1]
+        preview = df.sort_values("ts", ascending=False).head(200)
+    else:
+        from db.csvcache import IncrementalCSV
+        df = IncrementalCSV(path).read()
+        loaded = _rss_mb()
+        hourly = df.groupby(df["ts"].dt.floor("h"))["umidade"].mean()
+        per_sensor = df.groupby("sensor_id", observed=True)["umidade"].mean()
+        last = df.loc[df["ts"].idxmax()]
+        preview = df.nlargest(200, "ts")
+    fig, ax = plt.subplots()
+    ax.plot(hourly.index, hourly.values)
+    plt.close(fig)
+    elapsed = time.perf_counter() - t0
+    print(f"{mode:8s} frame={frame_nbytes(df) / 2**20:8.1f} MB  RSS após carga={loaded - base:8.1f} MB  "
+          f"pico={_peak_mb() - base:8.1f} MB  ({elapsed:.1f}s, {len(per_sensor)} sensores, "
+          f"última={last['umidade']:.1f}, preview={len(preview)})")
+
+
+def _bench(rows: int, sensors: int):
+    import subprocess
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp(prefix="frames_bench_"))
+    path = tmp / "sensors.csv"
+    rng = np.random.default_rng(0)
+    ts = pd.date_range("2025-01-01", periods=rows, freq="s")
+    pd.DataFrame({"sensor_id": pd.Series(rng.integers(0, sensors, rows)).map(lambda i: f"esp32-{i:03d}"),
+                  "ts": ts.strftime("%Y-%m-%dT%H:%M:%S"), "umidade": rng.uniform(20, 60, rows).round(1),
+                  "nutriente": rng.uniform(0, 20, rows).round(1)}).to_csv(path, index=False)
+    print(f"{rows:,} linhas, {sensors} sensores ({path.stat().st_size / 1e6:.0f} MB de CSV)")
+    try:
+        for mode in ("antes", "compacto"):
+            subprocess.run([sys.executable, __file__, "_child", mode, str(path)], check=True)
+    finally:
+        path.unlink()
+        tmp.rmdir()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    if len(sys.argv) == 4 and sys.argv[1] == "_child":
+        _bench_child(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="Tipos compactos dos frames de leituras")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="RSS: frame object/float64 com cópias x compacto compartilhado")
+    p.add_argument("--rows", type=int, default=5_000_000)
+    p.add_argument("--sensors", type=int, default=200)
+    args = parser.parse_args()
+    _bench(args.rows, args.sensors)
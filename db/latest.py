@@ -0,0 +1,322 @@
+"""
+latest.py
+Último valor por sensor, mantido na ingestão, para os KPIs "sensores ativos" e
+"últimas leituras" custarem O(sensores) em vez de O(histórico).
+
+  - LatestReadings: dict em memória sensor_id -> (ts, umidade, nutriente); só troca a
+    entrada quando o ts recebido é >= ao guardado (reentregas/atrasos não regridem)
+  - PostgreSQL: tabela sensor_latest (db/schema.sql) com upsert condicionado ao ts
+  - local (sink csv/parquet): snapshot JSON por worker em LATEST_DIR, lido pelo dashboard;
+    o snapshot registra a origem (source_id do sink) e o loader só o usa quando ela é a
+    mesma que está lendo e o arquivo tem menos de LATEST_MAX_AGE segundos
+  - LatestMaintainer: o bridge alimenta com as linhas gravadas pelo sink e descarrega
+    os sensores alterados a cada ``flush_interval`` segundos
+
+CLI:
+    python db/latest.py rebuild --from-pg             # sensor_latest a partir de sensors
+    python db/latest.py rebuild --from-csv arquivo    # snapshot local a partir de um CSV
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.rollups import _num, _ts
+
+logger = logging.getLogger("data.latest")
+
+DEFAULT_LATEST_DIR = os.getenv("LATEST_DIR", str(ROOT / "db" / "latest"))
+# snapshot mais velho que isso (bridge parado) não é usado nos KPIs
+LATEST_MAX_AGE = float(os.getenv("LATEST_MAX_AGE", "300"))
+COLUMNS = ["sensor_id", "umidade", "nutriente", "ts"]
+
+# leitura da tabela sensor_latest (uma linha por sensor)
+Q_LATEST_ACTIVE = ("SELECT count(*) AS active FROM sensor_latest "
+                   "WHERE ts >= LOCALTIMESTAMP - interval '15 minutes'")
+Q_LATEST_PER_SENSOR = "SELECT sensor_id, umidade, nutriente, ts FROM sensor_latest ORDER BY ts DESC LIMIT 20"
+
+_UPSERT_SQL = """
+INSERT INTO sensor_latest (sensor_id, umidade, nutriente, ts) VALUES %s
+ON CONFLICT (sensor_id) DO UPDATE
+SET umidade = EXCLUDED.umidade, nutriente = EXCLUDED.nutriente, ts = EXCLUDED.ts, updated_at = now()
+WHERE sensor_latest.ts IS NULL OR EXCLUDED.ts >= sensor_latest.ts
+"""
+
+
+def source_id(kind: str, path) -> str:
+    """Identifica o destino do sink (ex.: "csv:/abs/sensors.csv", "parquet:/abs/db/store")."""
+    return f"{kind}:{Path(path).resolve()}"
+
+
+class LatestReadings:
+    """Último (ts, umidade, nutriente) por sensor_id."""
+
+    def __init__(self):
+        self._rows = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def update(self, rows) -> int:
+        """Aplica linhas do bridge (ts ISO/epoch/datetime); retorna quantos sensores mudaram."""
+        changed = 0
+        with self._lock:
+            for row in rows:
+                sid = row.get("sensor_id")
+                ts = _ts(row.get("ts"))
+                if sid in (None, "") or ts is None:
+                    continue
+                sid = str(sid)
+                cur = self._rows.get(sid)
+                if cur is None or ts >= cur[0]:
+                    self._rows[sid] = (ts, _num(row.get("umidade")), _num(row.get("nutriente")))
+                    self._dirty.add(sid)
+                    changed += 1
+        return changed
+
+    def drain_dirty(self) -> list:
+        """Tuplas (sensor_id, umidade, nutriente, ts) alteradas desde o último drain."""
+        with self._lock:
+            out = [(sid, self._rows[sid][1], self._rows[sid][2], self._rows[sid][0]) for sid in self._dirty]
+            self._dirty = set()
+        return out
+
+    def mark_dirty(self, sensor_ids):
+        with self._lock:
+            self._dirty.update(s for s in sensor_ids if s in self._rows)
+
+    def active(self, minutes: float = 15, now: datetime = None) -> int:
+        cutoff = (now or datetime.now()) - timedelta(minutes=minutes)
+        with self._lock:
+            return sum(1 for ts, _, _ in self._rows.values() if ts >= cutoff)
+
+    def latest(self, n: int = 20) -> pd.DataFrame:
+        """Os ``n`` sensores com leitura mais recente (heap: O(sensores log n))."""
+        with self._lock:
+            top = heapq.nlargest(n, self._rows.items(), key=lambda kv: kv[1][0])
+        return pd.DataFrame([(sid, u, nu, ts) for sid, (ts, u, nu) in top], columns=COLUMNS)
+
+    def to_frame(self) -> pd.DataFrame:
+        with self._lock:
+            items = list(self._rows.items())
+        return pd.DataFrame([(sid, u, nu, ts) for sid, (ts, u, nu) in items], columns=COLUMNS)
+
+    def save(self, path, source: str = None):
+        """
+        Snapshot JSON atômico (tmp + os.replace): o dashboard nunca lê arquivo pela metade.
+        ``source`` (source_id do sink) permite ao leitor descartar snapshots de outra origem.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = {sid: [ts.isoformat(), u, nu] for sid, (ts, u, nu) in self._rows.items()}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"source": source, "saved_at": time.time(), "sensors": data}), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory: str = None, source: str = None, max_age: float = None):
+        """
+        Combina os snapshots de todos os workers (maior ts vence); None se não houver nenhum.
+        Com ``source`` só entram snapshots gravados por esse destino; com ``max_age`` só os
+        regravados há menos de ``max_age`` segundos (mtime).
+        """
+        files = sorted(Path(directory or DEFAULT_LATEST_DIR).glob("*.json"))
+        if max_age is not None:
+            now = time.time()
+            files = [f for f in files if now - _mtime(f) <= max_age]
+        return cls.load_files(files, source=source) if files else None
+
+    @classmethod
+    def load_files(cls, files, source: str = None):
+        """Snapshots de ``files``; com ``source``, None se nenhum for dessa origem."""
+        latest = cls()
+        used = 0
+        for f in files:
+            try:
+                doc = json.loads(f.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                logger.warning("Snapshot ignorado (ilegível): %s", f)
+                continue
+            # formato antigo: só o dict de sensores, sem origem
+            data, origin = (doc["sensors"], doc.get("source")) if "sensors" in doc else (doc, None)
+            if source is not None and origin != source:
+                continue
+            latest.update({"sensor_id": sid, "ts": ts, "umidade": u, "nutriente": nu}
+                          for sid, (ts, u, nu) in data.items())
+            used += 1
+        latest._dirty = set()
+        return None if source is not None and not used else latest
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """A partir de um DataFrame de leituras: uma passada (idxmax por sensor), sem ordenar."""
+        latest = cls()
+        if df is None or df.empty or "sensor_id" not in df.columns or "ts" not in df.columns:
+            return latest
+        df = df.assign(ts=pd.to_datetime(df["ts"], errors="coerce")).dropna(subset=["sensor_id", "ts"])
+        last = df.loc[df.groupby("sensor_id")["ts"].idxmax()]
+        latest.update(last.to_dict("records"))  # pd.Timestamp já é datetime
+        latest._dirty = set()
+        return latest
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+class PostgresLatest:
+    """Tabela sensor_latest com upsert (só avança quando o ts recebido é mais novo)."""
+
+    def __init__(self, database_url: str = None):
+        if database_url is None:
+            from data_pipeline.config import DATABASE_URL as database_url
+        self.database_url = database_url
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.database_url)
+        return self._conn
+
+    def upsert(self, rows: list):
+        from psycopg2.extras import execute_values
+
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, _UPSERT_SQL, rows, page_size=1000)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+class LatestMaintainer:
+    """
+    Recebe as linhas gravadas pelo sink (``add``) e, a cada ``flush_interval`` segundos,
+    faz upsert dos sensores alterados em ``backend`` (PostgresLatest) e/ou grava o
+    snapshot JSON em ``snapshot_path``. Em falha no banco os sensores voltam a ficar pendentes.
+    """
+
+    def __init__(self, backend=None, snapshot_path=None, flush_interval: float = 2.0, source: str = None):
+        self.backend = backend
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.flush_interval = float(flush_interval)
+        self.source = source
+        # o snapshot é regravado inteiro: parte do estado da execução anterior (do mesmo destino)
+        latest = None
+        if self.snapshot_path is not None and self.snapshot_path.exists():
+            latest = LatestReadings.load_files([self.snapshot_path], source=source)
+        self.latest = latest if latest is not None else LatestReadings()
+        self._flushes = 0
+        self._upserted = 0
+        self._errors = 0
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="latest-flush", daemon=True)
+        self._thread.start()
+
+    def add(self, rows):
+        self.latest.update(rows)
+
+    def flush(self):
+        dirty = self.latest.drain_dirty()
+        if not dirty:
+            return
+        if self.backend is not None:
+            try:
+                self.backend.upsert(dirty)
+                self._upserted += len(dirty)
+            except Exception:
+                self._errors += 1
+                logger.exception("sensor_latest: falha no upsert (nova tentativa no próximo flush)")
+                self.latest.mark_dirty(sid for sid, *_ in dirty)
+        if self.snapshot_path is not None:
+            try:
+                self.latest.save(self.snapshot_path, source=self.source)
+            except OSError:
+                self._errors += 1
+                logger.exception("sensor_latest: falha ao gravar snapshot %s", self.snapshot_path)
+        self._flushes += 1
+
+    def _loop(self):
+        while not self._halt.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._halt.set()
+        self._thread.join(timeout=max(1.0, self.flush_interval * 2))
+        self.flush()
+        if self.backend is not None:
+            self.backend.close()
+
+    def stats(self) -> dict:
+        return {"sensors": len(self.latest), "flushes": self._flushes, "upserted": self._upserted,
+                "errors": self._errors}
+
+
+def rebuild_from_pg(database_url: str = None) -> int:
+    """Recalcula sensor_latest com DISTINCT ON sobre o índice (sensor_id, ts DESC) de sensors."""
+    import psycopg2
+
+    if database_url is None:
+        from data_pipeline.config import DATABASE_URL as database_url
+    with psycopg2.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE sensor_latest")
+        cur.execute("""
+            INSERT INTO sensor_latest (sensor_id, umidade, nutriente, ts)
+            SELECT DISTINCT ON (sensor_id) sensor_id, umidade, nutriente, ts
+            FROM sensors
+            WHERE sensor_id IS NOT NULL AND ts IS NOT NULL
+            ORDER BY sensor_id, ts DESC
+        """)
+        return cur.rowcount
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Último valor por sensor (sensor_latest / snapshot local)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_reb = sub.add_parser("rebuild", help="Recalcula a partir do histórico")
+    src = p_reb.add_mutually_exclusive_group(required=True)
+    src.add_argument("--from-pg", action="store_true", help="Tabela sensors -> sensor_latest")
+    src.add_argument("--from-csv", default=None, help="CSV de leituras -> snapshot em LATEST_DIR")
+    p_reb.add_argument("--database-url", default=None)
+    p_reb.add_argument("--latest-dir", default=None)
+    args = parser.parse_args()
+
+    if args.from_pg:
+        print(f"sensor_latest: {rebuild_from_pg(args.database_url)} sensores")
+    else:
+        latest = LatestReadings.from_frame(pd.read_csv(args.from_csv))
+        out = Path(args.latest_dir or DEFAULT_LATEST_DIR) / "rebuild.json"
+        latest.save(out, source=source_id("csv", args.from_csv))
+        print(f"{out}: {len(latest)} sensores")
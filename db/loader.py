@@ -1,25 +1,252 @@
+import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import sqlalchemy
-from functools import lru_cache
 
-ROOT = Path(__file__).resolve().parents[2]  # ajustar conforme layout
+from db.engine import get_engine
+from db.latest import LatestReadings, LATEST_MAX_AGE, Q_LATEST_ACTIVE, Q_LATEST_PER_SENSOR, source_id
+from db.query import CSV_CANDIDATES, read_range
+from db.ringbuffer import get_live_rings
 
-@lru_cache(maxsize=4)
-def get_engine(database_url: str):
+try:
+    from db.store import get_store
+except ImportError:  # pyarrow ausente: só CSV
+    get_store = None
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Consultas de fetch_metrics sobre sensors particionada por mês (db/schema.sql).
+# O filtro em ts poda as partições já na inicialização do executor: sobra a partição
+# corrente (btree em ts) e, no máximo, a anterior. Sem o limite superior sensors_default
+# (ts NULL ou fora das partições) não é podada e o planner ordena todas as partições.
+# As consultas "últimas N" tentam janelas crescentes: o custo fica proporcional às
+# linhas da janela, não ao tamanho da tabela.
+RECENT_WINDOWS = ("15 minutes", "1 day")
+_RECENT = "ts >= LOCALTIMESTAMP - interval '{window}' AND ts < LOCALTIMESTAMP + interval '1 day'"
+Q_ACTIVE_SENSORS = f"""
+SELECT count(DISTINCT sensor_id) AS active
+FROM sensors
+WHERE {_RECENT.format(window="15 minutes")}
+"""
+Q_UMIDADE_RECENT = "SELECT umidade FROM sensors WHERE umidade IS NOT NULL AND {recent} ORDER BY ts DESC LIMIT 100"
+Q_LATEST_READINGS = "SELECT sensor_id, umidade, nutriente, ts FROM sensors WHERE {recent} ORDER BY ts DESC LIMIT 20"
+
+def recent_sql(template: str, window: str = None) -> str:
+    """Preenche ``{recent}`` com a janela ``window`` (None = sem janela, todas as partições)."""
+    return template.format(recent=_RECENT.format(window=window) if window else "TRUE")
+
+def read_recent_sql(engine, template: str, limit: int) -> pd.DataFrame:
+    """Executa ``template`` em janelas RECENT_WINDOWS até obter ``limit`` linhas; por fim sem janela."""
+    for window in RECENT_WINDOWS + (None,):
+        df = pd.read_sql_query(sqlalchemy.text(recent_sql(template, window)), con=engine)
+        if len(df) >= limit:
+            break
+    return df
+
+def metrics_from_ring(live, result: dict) -> dict:
+    """KPIs direto do ring buffer do bridge (memória compartilhada, sem I/O)."""
+    result["sensors_active"] = live.active(15)
+    um = live.frame(since=3600)["umidade"].dropna().tail(100)
+    result["umidade_media"] = round(float(um.mean()), 2) if not um.empty else None
+    result["latest_readings"] = live.latest().head(20)
+    return result
+
+def alerts_pending(engine) -> int:
     try:
-        engine = sqlalchemy.create_engine(database_url)
-        # quick smoke test
-        with engine.connect() as conn:
-            conn.execute(sqlalchemy.text("SELECT 1"))
-        return engine
+        q_alerts = "SELECT COUNT(*) as pending FROM alerts WHERE resolved = false"
+        df_alerts = pd.read_sql_query(sqlalchemy.text(q_alerts), con=engine)
+        return int(df_alerts['pending'].iloc[0]) if not df_alerts.empty else 0
+    except Exception:
+        return 0
+
+def metrics_from_latest(latest: LatestReadings, result: dict) -> dict:
+    """Sensores ativos e últimas leituras (uma por sensor) a partir do último valor: O(sensores)."""
+    result["sensors_active"] = latest.active(15)
+    result["latest_readings"] = latest.latest(20)
+    return result
+
+def metrics_from_store(store, result: dict) -> dict:
+    """Métricas lendo só o necessário do store Parquet (últimos 15 min / últimas leituras)."""
+    um = store.latest(100, columns=["umidade"])["umidade"].dropna()
+    result["umidade_media"] = round(float(um.mean()), 2) if not um.empty else None
+    # snapshot do bridge (db/latest.py), só se recente e gravado neste mesmo store
+    latest = LatestReadings.load(source=source_id("parquet", store.root), max_age=LATEST_MAX_AGE)
+    if latest is not None:
+        return metrics_from_latest(latest, result)
+    now = pd.Timestamp.now()
+    active = store.read_range(start=now - pd.Timedelta(minutes=15), columns=["sensor_id"])
+    result["sensors_active"] = int(active["sensor_id"].nunique())
+    result["latest_readings"] = store.latest(20, columns=["sensor_id", "umidade", "nutriente", "ts"])
+    return result
+
+def metrics_from_csv(df: pd.DataFrame, result: dict, path=None) -> dict:
+    """
+    CSV fallback (``path``: o CSV lido); sem snapshot recente do bridge gravando nesse mesmo
+    arquivo, o último valor por sensor sai de um idxmax (sem ordenar).
+    """
+    if 'ts' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['ts']):
+        df = df.assign(ts=pd.to_datetime(df['ts'], errors='coerce'))  # df pode ser o cache compartilhado
+    if 'umidade' in df.columns:
+        try:
+            result['umidade_media'] = round(float(df['umidade'].dropna().astype(float).tail(100).mean()), 2)
+        except Exception:
+            result['umidade_media'] = None
+    latest = LatestReadings.load(source=source_id("csv", path), max_age=LATEST_MAX_AGE) if path else None
+    if latest is not None:
+        return metrics_from_latest(latest, result)
+    try:
+        result['sensors_active'] = LatestReadings.from_frame(df).active(15)
+    except Exception:
+        result['sensors_active'] = int(df['sensor_id'].nunique()) if 'sensor_id' in df.columns else 0
+    try:
+        if 'ts' in df.columns:
+            result['latest_readings'] = df.nlargest(20, 'ts')
+        else:
+            result['latest_readings'] = df.head(20)
+    except Exception:
+        result['latest_readings'] = df.head(20)
+    return result
+
+def _db_latest(engine) -> pd.DataFrame:
+    try:
+        return pd.read_sql_query(sqlalchemy.text(Q_LATEST_PER_SENSOR), con=engine)
+    except Exception:
+        return pd.DataFrame()
+
+def _db_active(engine, from_latest: bool):
+    try:
+        q = Q_LATEST_ACTIVE if from_latest else Q_ACTIVE_SENSORS
+        df_active = pd.read_sql_query(sqlalchemy.text(q), con=engine)
+        return int(df_active['active'].iloc[0])
+    except Exception:
+        return 0
+
+def _db_umidade(engine):
+    try:
+        df_um = read_recent_sql(engine, Q_UMIDADE_RECENT, 100)
+        return round(float(df_um['umidade'].mean()), 2) if not df_um.empty else None
     except Exception:
         return None
 
+def _db_latest_raw(engine) -> pd.DataFrame:
+    try:
+        return read_recent_sql(engine, Q_LATEST_READINGS, 20)
+    except Exception:
+        return pd.DataFrame()
+
+def metrics_from_db_parallel(engine, result: dict, workers: int = 4) -> dict:
+    """
+    As consultas separadas, em paralelo em conexões do pool (db/engine.py); ``workers=1``
+    reproduz a sequência original. Sem sensor_latest preenchida há uma segunda rodada
+    (contagem em sensors e últimas leituras brutas).
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        f_last = pool.submit(_db_latest, engine)
+        f_active = pool.submit(_db_active, engine, True)
+        f_um = pool.submit(_db_umidade, engine)
+        f_alerts = pool.submit(alerts_pending, engine)
+        df_last = f_last.result()
+        if df_last.empty:
+            f_active = pool.submit(_db_active, engine, False)
+            f_raw = pool.submit(_db_latest_raw, engine)
+            result["latest_readings"] = f_raw.result()
+        else:
+            result["latest_readings"] = df_last
+        result["sensors_active"] = f_active.result()
+        result["umidade_media"] = f_um.result()
+        result["alerts_pending"] = f_alerts.result()
+    return result
+
+# Todos os KPIs numa ida ao banco. Subconsultas escalares viram InitPlans, executados só
+# quando referenciados: o count em sensors e as leituras brutas só rodam com sensor_latest
+# vazia. As janelas são fixas (1 dia); se vierem menos linhas que o limite, completa com
+# read_recent_sql, como nas consultas separadas.
+_Q_METRICS = """
+WITH last AS (
+    SELECT sensor_id, umidade, nutriente, ts FROM sensor_latest ORDER BY ts DESC LIMIT 20
+), raw AS (
+    SELECT sensor_id, umidade, nutriente, ts FROM sensors WHERE {day} ORDER BY ts DESC LIMIT 20
+), um AS (
+    SELECT umidade FROM sensors WHERE umidade IS NOT NULL AND {day} ORDER BY ts DESC LIMIT 100
+)
+SELECT
+    CASE WHEN EXISTS (SELECT 1 FROM last)
+         THEN (SELECT count(*) FROM sensor_latest WHERE ts >= LOCALTIMESTAMP - interval '15 minutes')
+         ELSE (SELECT count(DISTINCT sensor_id) FROM sensors WHERE {quarter}) END AS active,
+    (SELECT avg(umidade) FROM um) AS umidade_media,
+    (SELECT count(*) FROM um) AS umidade_n,
+    {alerts} AS alerts_pending,
+    CASE WHEN EXISTS (SELECT 1 FROM last)
+         THEN (SELECT json_agg(l ORDER BY l.ts DESC) FROM last l)
+         ELSE (SELECT json_agg(r ORDER BY r.ts DESC) FROM raw r) END AS latest,
+    EXISTS (SELECT 1 FROM last) AS from_latest
+"""
+_Q_ALERTS = "(SELECT count(*) FROM alerts WHERE resolved = false)"
+ALERTS_RECHECK = 300  # s até tentar de novo a tabela alerts depois de não encontrá-la
+_alerts_missing = {}
+
+def metrics_sql(alerts: bool = True) -> str:
+    return _Q_METRICS.format(day=_RECENT.format(window="1 day"), quarter=_RECENT.format(window="15 minutes"),
+                             alerts=_Q_ALERTS if alerts else "0")
+
+def _query_metrics(engine, alerts: bool) -> dict:
+    """
+    Executa a consulta como prepared statement da sessão: com ~35 partições o planejamento
+    (7 ms) custava 10x a execução; PREPARE uma vez por conexão do pool e o plano é reaproveitado
+    (a poda por LOCALTIMESTAMP continua em tempo de execução).
+    """
+    name = "farmtech_metrics" if alerts else "farmtech_metrics_noalerts"
+    with engine.connect() as conn:
+        prepared = conn.connection.info.setdefault("prepared", set())
+        if name not in prepared:
+            conn.exec_driver_sql(f"PREPARE {name} AS {metrics_sql(alerts)}")
+            prepared.add(name)
+        return dict(conn.exec_driver_sql(f"EXECUTE {name}").mappings().one())
+
+def metrics_from_db_single(engine, result: dict) -> dict:
+    """KPIs numa única consulta (CTEs); alerts ausente vira 0 sem outra ida ao banco por ALERTS_RECHECK s."""
+    key = str(engine.url)
+    with_alerts = time.monotonic() - _alerts_missing.get(key, -ALERTS_RECHECK) >= ALERTS_RECHECK
+    try:
+        row = _query_metrics(engine, with_alerts)
+    except sqlalchemy.exc.ProgrammingError as e:
+        if not with_alerts or 'relation "alerts"' not in str(e):
+            raise
+        _alerts_missing[key] = time.monotonic()
+        row = _query_metrics(engine, False)
+    else:
+        if with_alerts:
+            _alerts_missing.pop(key, None)
+    result["sensors_active"] = int(row["active"])
+    result["alerts_pending"] = int(row["alerts_pending"])
+    latest = pd.DataFrame(row["latest"] or [], columns=["sensor_id", "umidade", "nutriente", "ts"])
+    latest = latest.astype({"umidade": float, "nutriente": float})
+    latest["ts"] = pd.to_datetime(latest["ts"], format="ISO8601")
+    if not row["from_latest"] and len(latest) < 20:
+        latest = _db_latest_raw(engine)
+    result["latest_readings"] = latest
+    if int(row["umidade_n"]) < 100:
+        result["umidade_media"] = _db_umidade(engine)
+    else:
+        result["umidade_media"] = round(float(row["umidade_media"]), 2)
+    return result
+
+def metrics_from_db(engine, result: dict) -> dict:
+    """
+    Consultas no PostgreSQL; sensor_latest (mantida pelo bridge) quando preenchida.
+    Uma única consulta; se falhar (ex.: banco sem sensor_latest), as consultas separadas em paralelo.
+    """
+    try:
+        return metrics_from_db_single(engine, result)
+    except Exception:
+        return metrics_from_db_parallel(engine, result)
+
 def fetch_metrics(database_url: str = None):
     """
     Retorna dict com sensor count, umidade média, alerts pendentes e últimas leituras.
-    Usa DB se disponível, senão CSV fallback.
+    Usa o ring buffer do bridge se ativo, senão DB, senão o store Parquet (db/store.py),
+    senão CSV fallback.
     """
     result = {
         "sensors_active": 0,
@@ -27,78 +254,62 @@ def fetch_metrics(database_url: str = None):
         "alerts_pending": 0,
         "latest_readings": pd.DataFrame()
     }
-    # DB path
     engine = get_engine(database_url) if database_url else None
+    # bridge rodando na mesma máquina: ring buffer, sem consultar banco/arquivos
+    live = get_live_rings()
+    if live is not None:
+        if engine:
+            result["alerts_pending"] = alerts_pending(engine)
+        return metrics_from_ring(live, result)
+    # DB path
     if engine:
-        try:
-            q_active = """
-            SELECT sensor_id, MAX(ts) as last_ts
-            FROM sensors
-            GROUP BY sensor_id
-            HAVING MAX(ts) >= (now() - interval '15 minutes')
-            """
-            df_active = pd.read_sql_query(sqlalchemy.text(q_active), con=engine)
-            result["sensors_active"] = int(df_active.shape[0])
-        except Exception:
-            result["sensors_active"] = 0
+        return metrics_from_db(engine, result)
+    if get_store is not None and get_store() is not None:
+        return metrics_from_store(get_store(), result)
+    # CSV fallback: db/query.py sem banco (CSV incremental, só as linhas novas desde o último rerun)
+    df = read_range("sensors", database_url="")
+    if df.empty:
+        return result
+    path = next((p for p in CSV_CANDIDATES["sensors"] if Path(p).exists()), None)
+    return metrics_from_csv(df, result, path)
 
-        try:
-            q_um = "SELECT umidade FROM sensors WHERE umidade IS NOT NULL ORDER BY ts DESC LIMIT 100"
-            df_um = pd.read_sql_query(sqlalchemy.text(q_um), con=engine)
-            if not df_um.empty:
-                result["umidade_media"] = round(float(df_um['umidade'].mean()), 2)
-        except Exception:
-            result["umidade_media"] = None
+def _bench(database_url: str, repeat: int):
+    """p50/p95 de metrics_from_db: consultas em sequência x em paralelo x consulta única."""
+    from db.engine import get_engine, engine_stats
 
-        try:
-            q_alerts = "SELECT COUNT(*) as pending FROM alerts WHERE resolved = false"
-            df_alerts = pd.read_sql_query(sqlalchemy.text(q_alerts), con=engine)
-            result["alerts_pending"] = int(df_alerts['pending'].iloc[0]) if not df_alerts.empty else 0
-        except Exception:
-            result["alerts_pending"] = 0
+    engine = get_engine(database_url)
+    if engine is None:
+        raise SystemExit("banco indisponível")
+    variants = (
+        ("sequencial (original)", lambda r: metrics_from_db_parallel(engine, r, workers=1)),
+        ("paralelo (pool)", lambda r: metrics_from_db_parallel(engine, r)),
+        ("consulta única (CTE)", lambda r: metrics_from_db_single(engine, r)),
+    )
+    for label, fn in variants:
+        fn({})  # aquece pool e planos
+        before = next(iter(engine_stats(database_url).values()))["checkouts"]
+        lat = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn({})
+            lat.append(time.perf_counter() - t0)
+        checkouts = next(iter(engine_stats(database_url).values()))["checkouts"] - before
+        lat.sort()
+        print(f"{label:22s} p50={lat[len(lat) // 2] * 1000:7.2f} ms  p95={lat[int(len(lat) * 0.95) - 1] * 1000:7.2f} ms"
+              f"  consultas/chamada={checkouts / repeat:.1f}")
 
-        try:
-            q_latest = "SELECT sensor_id, umidade, nutriente, ts FROM sensors ORDER BY ts DESC LIMIT 20"
-            df_latest = pd.read_sql_query(sqlalchemy.text(q_latest), con=engine)
-            result["latest_readings"] = df_latest
-        except Exception:
-            result["latest_readings"] = pd.DataFrame()
-    else:
-        # CSV fallback (same logic que já discutimos)
-        csv_candidates = [
-            ROOT / "db" / "data_samples" / "sensors.csv",
-            ROOT / "db" / "sensors.csv",
-            ROOT / "db" / "sensors_data.csv",
-        ]
-        df = None
-        for c in csv_candidates:
-            if c.exists():
-                try:
-                    df = pd.read_csv(c)
-                    break
-                except Exception:
-                    df = None
-        if df is None:
-            return result
-        if 'ts' in df.columns:
-            df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
-        try:
-            now = pd.Timestamp.now()
-            last_per_sensor = df.sort_values('ts').groupby('sensor_id').last().reset_index()
-            recent = last_per_sensor[last_per_sensor['ts'] >= (now - pd.Timedelta(minutes=15))]
-            result['sensors_active'] = int(recent.shape[0])
-        except Exception:
-            result['sensors_active'] = int(df['sensor_id'].nunique()) if 'sensor_id' in df.columns else 0
-        if 'umidade' in df.columns:
-            try:
-                result['umidade_media'] = round(float(df['umidade'].dropna().astype(float).tail(100).mean()), 2)
-            except Exception:
-                result['umidade_media'] = None
-        try:
-            if 'ts' in df.columns:
-                result['latest_readings'] = df.sort_values('ts', ascending=False).head(20)
-            else:
-                result['latest_readings'] = df.head(20)
-        except Exception:
-            result['latest_readings'] = df.head(20)
-    return result
+
+if __name__ == '__main__':
+    # python -m db.loader bench --database-url postgres://...
+    import argparse
+
+    parser = argparse.ArgumentParser(description="KPIs do dashboard (fetch_metrics)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Consultas separadas x paralelas x consulta única")
+    p.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    p.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    if args.database_url is None:
+        from data_pipeline.config import DATABASE_URL
+        args.database_url = DATABASE_URL
+    _bench(args.database_url, args.repeat)
@@ -0,0 +1,356 @@
+"""
+Particionamento mensal da tabela ``sensors`` (ver db/schema.sql).
+
+- ``ensure_partitions``: garante as partições de um intervalo de meses (padrão: mês
+  corrente + ``months_ahead``); linhas já caídas em sensors_default são movidas.
+- ``brin_cold_partitions``: partições de meses fechados trocam o btree em ts por BRIN.
+- ``migrate``: converte a tabela ``sensors`` antiga (SERIAL + idx_sensors_ts) para o
+  layout particionado, copiando mês a mês numa única transação. A tabela antiga fica
+  como ``sensors_legacy`` (ou é removida com ``drop_legacy``). É o caminho de atualização
+  de uma instalação anterior: aplicar db/schema.sql sobre ela não converte a tabela.
+- ``maintain`` / ``PartitionMaintainer``: partições futuras + BRIN nas fechadas; o
+  mqtt_bridge (sink postgres, worker 0) roda na subida e a cada PARTITION_MAINTAIN_INTERVAL
+  segundos, e o orchestrator tem a fase ``partitions``. Leituras fora das partições
+  existentes caem em sensors_default e são movidas quando a partição do mês é criada.
+
+Uso:
+    python db/partitions.py migrate [--drop-legacy]
+    python db/partitions.py maintain --months-ahead 2 --hot-months 1
+    python db/partitions.py bench --rows 100000000
+"""
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from datetime import date
+from pathlib import Path
+from statistics import median
+
+logger = logging.getLogger("data.partitions")
+
+SCHEMA_SQL = Path(__file__).resolve().parent / "schema.sql"
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+PARTITION_MAINTAIN_INTERVAL = float(os.getenv("PARTITION_MAINTAIN_INTERVAL", str(6 * 3600)))
+
+# layout anterior da tabela (para o benchmark e referência da migração)
+LEGACY_SENSORS_DDL = """
+CREATE TABLE sensors (
+    id SERIAL PRIMARY KEY,
+    sensor_id TEXT,
+    umidade REAL,
+    nutriente REAL,
+    ts TIMESTAMP
+);
+CREATE INDEX idx_sensors_ts ON sensors(ts);
+"""
+
+_PART_RE = re.compile(r"^sensors_y(\d{4})m(\d{2})$")
+
+
+def _connect(database_url: str = None):
+    import psycopg2
+
+    if database_url is None:
+        from data_pipeline.config import DATABASE_URL as database_url
+    conn = psycopg2.connect(database_url)
+    conn.set_client_encoding("UTF8")  # schema.sql tem comentários acentuados
+    return conn
+
+
+def _month_add(d: date, months: int) -> date:
+    m = d.month - 1 + months
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def is_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('sensors')")
+    row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def list_partitions(cur) -> list:
+    """[(nome, primeiro dia do mês)] das partições mensais, em ordem."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('sensors')
+    """)
+    out = []
+    for (name,) in cur.fetchall():
+        m = _PART_RE.match(name)
+        if m:
+            out.append((name, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(out, key=lambda p: p[1])
+
+
+def ensure_partitions(cur, start: date = None, months_ahead: int = 2) -> list:
+    """Cria as partições de ``start`` (padrão: mês corrente) até ``months_ahead`` meses à frente."""
+    first = (start or date.today()).replace(day=1)
+    last = _month_add(date.today().replace(day=1), months_ahead)
+    created = []
+    month = first
+    while month <= last:
+        cur.execute("SELECT sensors_create_partition(%s)", (month,))
+        created.append(cur.fetchone()[0])
+        month = _month_add(month, 1)
+    return created
+
+
+def brin_cold_partitions(cur, hot_months: int = 1) -> list:
+    """Troca btree(ts) por BRIN nas partições anteriores aos ``hot_months`` meses mais recentes."""
+    cutoff = _month_add(date.today().replace(day=1), -(hot_months - 1))
+    done = []
+    for name, month in list_partitions(cur):
+        if month < cutoff:
+            cur.execute("SELECT sensors_brin_partition(%s)", (name,))
+            done.append(name)
+    return done
+
+
+def maintain(conn, months_ahead: int = PARTITION_MONTHS_AHEAD, hot_months: int = 1) -> tuple:
+    """Partições até ``months_ahead`` meses à frente + BRIN nas fechadas; devolve (criadas, brin)."""
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('sensors')")
+        if cur.fetchone()[0] is None:
+            apply_schema(cur)  # banco novo
+        if not is_partitioned(cur):
+            raise RuntimeError("sensors não é particionada (schema anterior): rode python db/partitions.py migrate")
+        created = ensure_partitions(cur, months_ahead=months_ahead)
+        brin = brin_cold_partitions(cur, hot_months)
+    return created, brin
+
+
+class PartitionMaintainer(threading.Thread):
+    """Roda maintain() na subida e a cada ``interval`` segundos (conexão nova a cada rodada)."""
+
+    def __init__(self, database_url: str = None, interval: float = PARTITION_MAINTAIN_INTERVAL,
+                 months_ahead: int = PARTITION_MONTHS_AHEAD):
+        super().__init__(name="partition-maintainer", daemon=True)
+        self.database_url = database_url
+        self.interval = max(60.0, float(interval))
+        self.months_ahead = months_ahead
+        self.runs = 0
+        self.last_error = None
+        self._halt = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                conn = _connect(self.database_url)
+                try:
+                    created, brin = maintain(conn, self.months_ahead)
+                finally:
+                    conn.close()
+                self.runs += 1
+                self.last_error = None
+                logger.info("Partições garantidas até %s; BRIN: %s", created[-1] if created else "-",
+                            ", ".join(brin) or "-")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Falha na manutenção das partições de sensors: %s", e)
+            if self._halt.wait(self.interval):
+                return
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=5)
+
+
+def apply_schema(cur):
+    cur.execute(SCHEMA_SQL.read_text(encoding="utf-8"))
+
+
+def migrate(conn, drop_legacy: bool = False, hot_months: int = 1) -> int:
+    """
+    Converte ``sensors`` (tabela simples) para o layout particionado. Idempotente: não faz
+    nada se já estiver particionada. Escritores (bridge com sink postgres) devem estar
+    parados; com o journal ligado as mensagens são reenviadas depois.
+    """
+    with conn, conn.cursor() as cur:
+        if is_partitioned(cur):
+            logger.info("sensors já é particionada; nada a migrar")
+            return 0
+        cur.execute("LOCK TABLE sensors IN ACCESS EXCLUSIVE MODE")
+        cur.execute("ALTER TABLE sensors RENAME TO sensors_legacy")
+        cur.execute("ALTER SEQUENCE IF EXISTS sensors_id_seq RENAME TO sensors_legacy_id_seq")
+        cur.execute("ALTER INDEX IF EXISTS idx_sensors_ts RENAME TO idx_sensors_legacy_ts")
+        cur.execute("ALTER INDEX IF EXISTS sensors_pkey RENAME TO sensors_legacy_pkey")
+        # criado pelo schema.sql também na tabela simples: o nome tem de ficar livre para a nova
+        cur.execute("ALTER INDEX IF EXISTS idx_sensors_sensor_ts RENAME TO idx_sensors_legacy_sensor_ts")
+        apply_schema(cur)
+
+        cur.execute("SELECT min(ts), max(ts), max(id) FROM sensors_legacy")
+        lo, hi, max_id = cur.fetchone()
+        total = 0
+        if lo is not None:
+            ensure_partitions(cur, start=lo.date())
+            month = lo.date().replace(day=1)
+            while month <= hi.date():
+                nxt = _month_add(month, 1)
+                t0 = time.perf_counter()
+                cur.execute(
+                    "INSERT INTO sensors (id, sensor_id, umidade, nutriente, ts) "
+                    "SELECT id, sensor_id, umidade, nutriente, ts FROM sensors_legacy "
+                    "WHERE ts >= %s AND ts < %s ORDER BY ts", (month, nxt))
+                total += cur.rowcount
+                logger.info("migrado %s: %s linhas em %.1fs", month.strftime("%Y-%m"), cur.rowcount,
+                            time.perf_counter() - t0)
+                month = nxt
+        cur.execute("INSERT INTO sensors (id, sensor_id, umidade, nutriente, ts) "
+                    "SELECT id, sensor_id, umidade, nutriente, ts FROM sensors_legacy WHERE ts IS NULL")
+        total += cur.rowcount
+        if max_id is not None:
+            cur.execute("SELECT setval(pg_get_serial_sequence('sensors', 'id'), %s)", (max_id,))
+        brin_cold_partitions(cur, hot_months)
+        if drop_legacy:
+            cur.execute("DROP TABLE sensors_legacy")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE sensors")
+    conn.autocommit = False
+    logger.info("migração concluída: %s linhas", total)
+    return total
+
+
+# ---------- benchmark: layout antigo x particionado ----------
+# consultas do loader.fetch_metrics antes e depois (db/loader.py)
+OLD_QUERIES = {
+    "active_sensors": """
+        SELECT sensor_id, MAX(ts) as last_ts FROM sensors GROUP BY sensor_id
+        HAVING MAX(ts) >= (now() - interval '15 minutes')""",
+    "umidade_last_100": "SELECT umidade FROM sensors WHERE umidade IS NOT NULL ORDER BY ts DESC LIMIT 100",
+    "latest_20": "SELECT sensor_id, umidade, nutriente, ts FROM sensors ORDER BY ts DESC LIMIT 20",
+    "sensor_last_100": "SELECT umidade, ts FROM sensors WHERE sensor_id = 'esp32-00042' ORDER BY ts DESC LIMIT 100",
+}
+
+
+def _new_queries():
+    from db.loader import Q_ACTIVE_SENSORS, Q_UMIDADE_RECENT, Q_LATEST_READINGS, RECENT_WINDOWS, recent_sql
+
+    # primeira janela de read_recent_sql (a que responde com ingestão ativa)
+    return {
+        "active_sensors": Q_ACTIVE_SENSORS,
+        "umidade_last_100": recent_sql(Q_UMIDADE_RECENT, RECENT_WINDOWS[0]),
+        "latest_20": recent_sql(Q_LATEST_READINGS, RECENT_WINDOWS[0]),
+        "sensor_last_100": OLD_QUERIES["sensor_last_100"],
+    }
+
+
+def _fill(cur, rows: int, sensors: int, days: int):
+    # append-only em ordem de ts terminando agora, sensores em round-robin
+    step = days * 86400.0 / rows
+    cur.execute(f"""
+        INSERT INTO sensors (sensor_id, umidade, nutriente, ts)
+        SELECT 'esp32-' || lpad((i % {sensors})::text, 5, '0'),
+               (random() * 100)::real, (random() * 50)::real,
+               LOCALTIMESTAMP - make_interval(secs => ({rows} - i) * {step})
+        FROM generate_series(1, {rows}) AS i
+    """)
+
+
+def _size(cur, schema: str) -> str:
+    cur.execute("""
+        SELECT pg_size_pretty(sum(pg_table_size(c.oid))), pg_size_pretty(sum(pg_indexes_size(c.oid)))
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind = 'r'
+    """, (schema,))
+    table, idx = cur.fetchone()
+    return f"tabela {table}, índices {idx}"
+
+
+def _time_query(cur, sql: str, repeat: int) -> tuple:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        cur.fetchall()
+        times.append((time.perf_counter() - t0) * 1000)
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) " + sql)
+    plan = [r[0] for r in cur.fetchall()]
+    return median(times), plan
+
+
+def _bench(database_url: str, rows: int, sensors: int, days: int, repeat: int, show_plans: bool):
+    layouts = {"antigo": "farmtech_bench_legacy", "particionado": "farmtech_bench_part"}
+    conn = _connect(database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        for label, schema in layouts.items():
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}, public")
+            t0 = time.perf_counter()
+            if label == "antigo":
+                cur.execute(LEGACY_SENSORS_DDL)
+            else:
+                apply_schema(cur)
+                ensure_partitions(cur, start=_month_add(date.today().replace(day=1), -(days // 28 + 1)))
+            _fill(cur, rows, sensors, days)
+            if label == "particionado":
+                brin_cold_partitions(cur)
+            cur.execute("VACUUM ANALYZE sensors")
+            print(f"[{label}] {rows:,} linhas carregadas em {time.perf_counter() - t0:.1f}s; {_size(cur, schema)}")
+
+        results = {}
+        for label, schema in layouts.items():
+            cur.execute(f"SET search_path TO {schema}, public")
+            queries = OLD_QUERIES if label == "antigo" else _new_queries()
+            for name, sql in queries.items():
+                results[(label, name)] = _time_query(cur, sql, repeat)
+
+        print(f"\n{'consulta':18s} {'antigo (ms)':>12s} {'particionado (ms)':>18s} {'ganho':>8s}")
+        for name in OLD_QUERIES:
+            old, new = results[("antigo", name)][0], results[("particionado", name)][0]
+            print(f"{name:18s} {old:12.2f} {new:18.2f} {old / new:7.1f}x")
+        if show_plans:
+            for (label, name), (_, plan) in results.items():
+                print(f"\n--- {name} [{label}]")
+                print("\n".join(plan))
+    finally:
+        for schema in layouts.values():
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    parser = argparse.ArgumentParser(description="Partições mensais da tabela sensors")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help="Converte sensors (tabela simples) para particionada")
+    p.add_argument("--drop-legacy", action="store_true", help="Remove sensors_legacy ao final")
+    p.add_argument("--hot-months", type=int, default=1)
+    p = sub.add_parser("maintain", help="Cria partições futuras e aplica BRIN nas fechadas")
+    p.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    p.add_argument("--hot-months", type=int, default=1)
+    p = sub.add_parser("bench", help="Layout antigo x particionado (planos e latência)")
+    p.add_argument("--rows", type=int, default=int(os.getenv("PARTITION_BENCH_ROWS", "100000000")))
+    p.add_argument("--sensors", type=int, default=2000)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--plans", action="store_true", help="Imprime EXPLAIN ANALYZE de cada consulta")
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        conn = _connect(args.database_url)
+        migrate(conn, drop_legacy=args.drop_legacy, hot_months=args.hot_months)
+        conn.close()
+    elif args.cmd == "maintain":
+        conn = _connect(args.database_url)
+        try:
+            created, brin = maintain(conn, args.months_ahead, args.hot_months)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        finally:
+            conn.close()
+        logger.info("partições garantidas: %s; BRIN: %s", ", ".join(created), ", ".join(brin) or "-")
+    else:
+        _bench(args.database_url, args.rows, args.sensors, args.days, args.repeat, args.plans)
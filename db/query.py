@@ -0,0 +1,355 @@
+"""
+query.py
+Leitura de séries temporais para todos os consumidores (dashboard, KPIs, treino).
+
+    read_range(table, start, end, sensors, columns, bucket, agg, limit)
+
+- com banco: filtro de tempo/sensor, date_trunc e agregação rodam no PostgreSQL
+  (WHERE em ts poda as partições mensais de sensors); só o resultado vem pela rede
+- sem banco (ou consulta falhou): store Parquet (db/store.py, filtro no scan) para
+  sensors; CSVs do dashboard (db/csvcache.py, incrementais) para o resto
+- resultado em cache por chave da consulta (QUERY_CACHE_TTL s, QUERY_CACHE_SIZE chaves);
+  ``start``/``end`` relativos (pd.Timedelta, "agora - delta") entram na chave como delta,
+  então "últimos 7 dias" acerta o cache entre reruns
+- frames com os tipos compactos de db/frames.py; são compartilhados: não altere in-place
+
+Buckets: 1m | 1h | 1d (date_trunc minute/hour/day). Com ``bucket`` e/ou ``agg`` as colunas
+de texto pedidas (sensor_id, categoria) viram chaves do agrupamento e as numéricas são
+agregadas com ``agg``: mean | min | max | sum | count | last.
+
+Benchmark (janela de 1 dia, série horária):
+    python db/query.py bench --database-url postgres://...
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+import sqlalchemy
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.csvcache import read_first_cached
+from db.engine import get_engine
+from db.frames import compact
+
+try:
+    from db.store import get_store
+except ImportError:  # pyarrow ausente: só CSV
+    get_store = None
+
+logger = logging.getLogger("data.query")
+
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "5"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "32"))
+
+# colunas consultáveis por tabela (ts primeiro); sensor_id só existe em sensors
+TABLES = {
+    "sensors": ("ts", "sensor_id", "umidade", "nutriente"),
+    "weather": ("ts", "temp", "chuva", "vento"),
+    "detections": ("ts", "categoria", "confianca"),
+}
+KEY_COLUMNS = ("sensor_id", "categoria")
+CSV_CANDIDATES = {
+    "sensors": [ROOT / "db" / "data_samples" / "sensors.csv", ROOT / "db" / "sensors.csv",
+                ROOT / "db" / "sensors_data.csv"],
+    "weather": [ROOT / "db" / "data_samples" / "weather.csv", ROOT / "db" / "weather.csv"],
+    "detections": [ROOT / "db" / "data_samples" / "detections.csv", ROOT / "db" / "detections.csv"],
+}
+BUCKETS = {"1m": ("minute", "min"), "1h": ("hour", "h"), "1d": ("day", "D")}  # date_trunc, pandas floor
+AGGS = {"mean": "avg({c})", "min": "min({c})", "max": "max({c})", "sum": "sum({c})", "count": "count({c})",
+        "last": "(array_agg({c} ORDER BY ts DESC) FILTER (WHERE {c} IS NOT NULL))[1]"}
+
+
+class QueryCache:
+    """LRU com TTL: chave da consulta -> (instante, DataFrame)."""
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, size: int = QUERY_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, df):
+        with self._lock:
+            self._items[key] = (time.monotonic(), df)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+_cache = QueryCache()
+
+
+def _bound(value):
+    """Limite do intervalo: None, pd.Timedelta (relativo a agora) ou data absoluta."""
+    if value is None:
+        return None
+    if isinstance(value, pd.Timedelta):
+        return pd.Timestamp.now() - value
+    return pd.Timestamp(value)
+
+
+def _key_part(value):
+    if value is None or isinstance(value, pd.Timedelta):
+        return value
+    return pd.Timestamp(value)
+
+
+def _validate(table, columns, sensors, bucket, agg):
+    if table not in TABLES:
+        raise ValueError(f"tabela desconhecida: {table} (use {', '.join(TABLES)})")
+    columns = list(columns) if columns else list(TABLES[table])
+    unknown = [c for c in columns if c not in TABLES[table]]
+    if unknown:
+        raise ValueError(f"colunas desconhecidas em {table}: {unknown}")
+    if sensors is not None and "sensor_id" not in TABLES[table]:
+        raise ValueError(f"{table} não tem sensor_id")
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"bucket inválido: {bucket} (use {', '.join(BUCKETS)})")
+    if bucket is not None and agg is None:
+        agg = "mean"
+    if agg is not None and agg not in AGGS:
+        raise ValueError(f"agg inválido: {agg} (use {', '.join(AGGS)})")
+    return columns, agg
+
+
+# ---------- PostgreSQL ----------
+def range_sql(table: str, columns, sensors=None, bucket=None, agg=None, limit=None,
+              start=False, end=False) -> str:
+    """SQL parametrizado (:start, :end, :sensors) da consulta; colunas já validadas."""
+    where = []
+    if start:
+        where.append("ts >= :start")
+    if end:
+        where.append("ts < :end")
+    if sensors is not None:
+        where.append("sensor_id = ANY(:sensors)")
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    if agg is None:
+        sql = f"SELECT {', '.join(columns)} FROM {table} {where_sql}"
+        return sql + (f" ORDER BY ts DESC LIMIT {int(limit)}" if limit else " ORDER BY ts")
+    keys = [c for c in columns if c in KEY_COLUMNS]
+    values = [c for c in columns if c != "ts" and c not in KEY_COLUMNS]
+    select, group = [], []
+    if bucket is not None:
+        select.append(f"date_trunc('{BUCKETS[bucket][0]}', ts) AS ts")
+        group.append("1")
+    for k in keys:
+        select.append(k)
+        group.append(str(len(group) + 1))
+    select += [f"{AGGS[agg].format(c=c)} AS {c}" for c in values]
+    sql = f"SELECT {', '.join(select)} FROM {table} {where_sql}"
+    if group:
+        sql += f" GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+    return sql
+
+
+def _read_db(engine, table, start, end, sensors, columns, bucket, agg, limit) -> pd.DataFrame:
+    sql = range_sql(table, columns, sensors, bucket, agg, limit, start is not None, end is not None)
+    params = {}
+    if start is not None:
+        params["start"] = start.to_pydatetime()
+    if end is not None:
+        params["end"] = end.to_pydatetime()
+    if sensors is not None:
+        params["sensors"] = [str(s) for s in sensors]
+    return pd.read_sql_query(sqlalchemy.text(sql), con=engine, params=params)
+
+
+# ---------- local: store Parquet / CSV ----------
+def _read_local(table, start, end, sensors, columns, bucket, agg, limit) -> pd.DataFrame:
+    store = get_store() if table == "sensors" and get_store is not None else None
+    if store is not None:
+        read_cols = columns if agg is None or "ts" in columns else columns + ["ts"]
+        df = store.read_range(start=start, end=end, sensors=sensors, columns=read_cols, compact_types=True)
+    else:
+        df, _ = read_first_cached(CSV_CANDIDATES[table])
+        if df is None:
+            return pd.DataFrame(columns=columns)
+        mask = None
+        if start is not None:
+            mask = df["ts"] >= start
+        if end is not None:
+            mask = (df["ts"] < end) if mask is None else mask & (df["ts"] < end)
+        if sensors is not None:
+            m = df["sensor_id"].isin([str(s) for s in sensors])
+            mask = m if mask is None else mask & m
+        cols = [c for c in columns if c in df.columns]
+        if agg is not None and "ts" not in cols:
+            cols.append("ts")
+        df = df.loc[mask, cols] if mask is not None else df[cols]
+    if agg is None:
+        if limit:
+            return df.nlargest(int(limit), "ts")
+        if not df["ts"].is_monotonic_increasing:  # mesma ordem do ORDER BY ts do banco
+            df = df.sort_values("ts", kind="stable")
+        return df
+    return _aggregate(df, columns, bucket, agg)
+
+
+def _lexical(col: pd.Series) -> pd.Series:
+    # category agrupa na ordem das categorias (ordem de chegada no store): o banco ordena por valor
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.reorder_categories(sorted(col.cat.categories, key=str))
+    return col
+
+
+def _aggregate(df: pd.DataFrame, columns, bucket, agg) -> pd.DataFrame:
+    keys = [c for c in columns if c in KEY_COLUMNS and c in df.columns]
+    values = [c for c in columns if c != "ts" and c not in KEY_COLUMNS and c in df.columns]
+    if agg == "last":
+        df = df.sort_values("ts", kind="stable")
+    by = [df["ts"].dt.floor(BUCKETS[bucket][1])] if bucket is not None else []
+    by += [_lexical(df[k]) for k in keys]
+    if not by:  # intervalo inteiro numa linha
+        return df[values].groupby(pd.Series(0, index=df.index)).agg(agg).reset_index(drop=True)
+    return df.groupby(by, observed=True, sort=True)[values].agg(agg).reset_index()
+
+
+# ---------- API ----------
+def read_range(table: str = "sensors", start=None, end=None, sensors=None, columns=None,
+               bucket: str = None, agg: str = None, limit: int = None,
+               database_url: str = None, cache: bool = True) -> pd.DataFrame:
+    """
+    Linhas (ou agregados) de ``table`` com ``start <= ts < end``.
+
+    ``start``/``end``: datetime/str, pd.Timedelta (relativo a agora) ou None.
+    ``bucket`` 1m|1h|1d agrupa por date_trunc(ts) (agg padrão: mean); ``agg`` sem bucket
+    agrega o intervalo inteiro por sensor_id/categoria (se pedidas em ``columns``).
+    ``limit``: só as ``limit`` linhas mais recentes (ordem decrescente de ts), sem agregação.
+    ``database_url`` padrão: data_pipeline.config.DATABASE_URL; banco indisponível -> local.
+    """
+    columns, agg = _validate(table, columns, sensors, bucket, agg)
+    engine = get_engine(database_url)
+    sensors_key = tuple(sorted(str(s) for s in sensors)) if sensors is not None else None
+    key = (str(engine.url) if engine is not None else "local", table, _key_part(start), _key_part(end),
+           sensors_key, tuple(columns), bucket, agg, limit)
+    if cache:
+        df = _cache.get(key)
+        if df is not None:
+            return df
+    start_ts, end_ts = _bound(start), _bound(end)
+    df = None
+    if engine is not None:
+        try:
+            df = _read_db(engine, table, start_ts, end_ts, sensors, columns, bucket, agg, limit)
+        except Exception as e:
+            logger.warning("Consulta em %s falhou (%s); usando store/CSV local", table, str(e).splitlines()[0])
+    if df is None:
+        df = _read_local(table, start_ts, end_ts, sensors, columns, bucket, agg, limit)
+    if agg != "count":  # contagens ficam inteiras
+        df = compact(df)
+    if cache:
+        _cache.put(key, df)
+    return df
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def query_stats() -> dict:
+    return _cache.stats()
+
+
+# ---------- benchmark ----------
+def _bench(database_url: str, days: float, repeat: int):
+    from statistics import median
+
+    engine = get_engine(database_url)
+    if engine is None:
+        raise SystemExit("banco indisponível")
+    window = pd.Timedelta(days=days)
+
+    def legacy():
+        # padrão anterior: tabela inteira no pandas, filtro e agregação no cliente
+        df = pd.read_sql_query(sqlalchemy.text("SELECT sensor_id, umidade, nutriente, ts FROM sensors"), con=engine)
+        df = df[df["ts"] >= pd.Timestamp.now() - window]
+        hourly = df.groupby(df["ts"].dt.floor("h"))["umidade"].mean()
+        per_sensor = df.groupby("sensor_id")["umidade"].mean()
+        return len(hourly), len(per_sensor)
+
+    def pushdown(use_cache):
+        def run():
+            hourly = read_range("sensors", start=window, columns=["ts", "umidade"], bucket="1h",
+                                database_url=database_url, cache=use_cache)
+            per_sensor = read_range("sensors", start=window, columns=["sensor_id", "umidade"], agg="mean",
+                                    database_url=database_url, cache=use_cache)
+            return len(hourly), len(per_sensor)
+        return run
+
+    total = pd.read_sql_query(sqlalchemy.text("SELECT count(*) AS n FROM sensors"), con=engine)["n"].iloc[0]
+    print(f"sensors: {total:,} linhas; janela {days:g} dia(s), série horária + média por sensor")
+    variants = (("tabela inteira + pandas", legacy, max(1, repeat // 10)),
+                ("read_range (SQL)", pushdown(False), repeat),
+                ("read_range (cache)", pushdown(True), repeat))
+    for label, fn, n in variants:
+        shape = fn()
+        lat = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            lat.append(time.perf_counter() - t0)
+        print(f"{label:24s} p50={median(lat) * 1000:9.2f} ms  (buckets={shape[0]}, sensores={shape[1]}, n={n})")
+    print(f"cache: {query_stats()}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Consultas de séries temporais (read_range)")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Tabela inteira + pandas x read_range com pushdown x cache")
+    p.add_argument("--days", type=float, default=1)
+    p.add_argument("--repeat", type=int, default=20)
+    p = sub.add_parser("read", help="Executa read_range e mostra o resultado")
+    p.add_argument("table", choices=list(TABLES))
+    p.add_argument("--days", type=float, default=None, help="Só os últimos N dias")
+    p.add_argument("--sensors", nargs="*", default=None)
+    p.add_argument("--columns", nargs="*", default=None)
+    p.add_argument("--bucket", choices=list(BUCKETS), default=None)
+    p.add_argument("--agg", choices=list(AGGS), default=None)
+    p.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        from data_pipeline.config import DATABASE_URL
+        args.database_url = DATABASE_URL
+    if args.cmd == "bench":
+        _bench(args.database_url, args.days, args.repeat)
+    else:
+        df = read_range(args.table, start=pd.Timedelta(days=args.days) if args.days else None,
+                        sensors=args.sensors, columns=args.columns, bucket=args.bucket, agg=args.agg,
+                        limit=args.limit, database_url=args.database_url)
+        print(df.to_string(max_rows=40))
+        print(f"{len(df)} linhas")
@@ -0,0 +1,433 @@
+"""
+ringbuffer.py
+Ring buffer em memória compartilhada (arquivo mapeado com mmap) com as últimas
+``depth`` leituras de cada sensor, escrito pelo mqtt_bridge e lido pelo dashboard
+sem I/O de arquivo/banco: os arrays NumPy apontam direto para as páginas mapeadas.
+
+Layout do arquivo (um por worker do bridge, <RING_DIR>/w<N>.ring):
+    header  (64 bytes)   magic, versão, capacity, depth, n_sensors, updated
+    slots   capacity x SLOT     sensor_id, seq (seqlock), head (total de escritas)
+    data    capacity x depth x READING   (ts epoch, umidade, nutriente)
+
+Consistência (seqlock por sensor): o escritor incrementa ``seq`` (ímpar = escrita em
+andamento), grava a leitura, avança ``head`` e incrementa ``seq`` de novo. O leitor
+copia o que precisa entre duas leituras de ``seq``; se estava ímpar ou mudou, repete.
+Um único escritor por arquivo; leitores não bloqueiam o escritor. As escritas de 8
+bytes alinhados são atômicas em x86-64/ARM64, e a ordem das stores é a do programa
+em x86 (TSO).
+
+Benchmark (latência de leitura com escritor concorrente em outro processo):
+    python db/ringbuffer.py bench --sensors 2000 --depth 256 --seconds 5
+"""
+
+import os
+import sys
+import mmap
+import time
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.rollups import _num, _ts
+
+logger = logging.getLogger("data.ringbuffer")
+
+DEFAULT_RING_DIR = os.getenv("RING_DIR", str(ROOT / "db" / "ring"))
+RING_CAPACITY = int(os.getenv("RING_CAPACITY", "4096"))
+RING_DEPTH = int(os.getenv("RING_DEPTH", "256"))
+# leitor ignora arquivos sem escrita há mais que isso (bridge parado)
+RING_STALE_SECONDS = float(os.getenv("RING_STALE_SECONDS", "60"))
+
+MAGIC = b"FTRING01"
+HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("capacity", "<u4"), ("depth", "<u4"),
+                   ("n_sensors", "<u4"), ("updated", "<f8"), ("pad", "V32")])
+SLOT = np.dtype([("sensor_id", "S32"), ("seq", "<u8"), ("head", "<u8")])
+READING = np.dtype([("ts", "<f8"), ("umidade", "<f4"), ("nutriente", "<f4")])
+_MAX_RETRIES = 1000
+
+
+def _layout(capacity: int, depth: int):
+    slots_off = HEADER.itemsize
+    data_off = slots_off + capacity * SLOT.itemsize
+    return slots_off, data_off, data_off + capacity * depth * READING.itemsize
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _epoch(v):
+    """Segundos desde 1970 do horário local "ingênuo" (como ts é gravado no CSV/banco)."""
+    ts = _ts(v)
+    if ts is None:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return (ts - _EPOCH).total_seconds()
+
+
+def _backoff(attempt: int):
+    # escritor pode ter sido preemptado com seq ímpar: cede a CPU em vez de girar
+    if attempt >= 8:
+        time.sleep(0 if attempt < 64 else 0.0001)
+
+
+def _to_datetime(seconds: np.ndarray) -> np.ndarray:
+    return (seconds * 1e6).astype("datetime64[us]")
+
+
+def _map(mm, capacity: int, depth: int):
+    slots_off, data_off, _ = _layout(capacity, depth)
+    header = np.frombuffer(mm, HEADER, 1, 0)[0:1]
+    slots = np.frombuffer(mm, SLOT, capacity, slots_off)
+    data = np.frombuffer(mm, READING, capacity * depth, data_off).reshape(capacity, depth)
+    return header, slots, data
+
+
+class RingWriter:
+    """Escritor (um por arquivo). Sensores novos ganham o próximo slot livre."""
+
+    def __init__(self, path, capacity: int = RING_CAPACITY, depth: int = RING_DEPTH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.capacity, self.depth = int(capacity), int(depth)
+        size = _layout(self.capacity, self.depth)[2]
+        reuse = False
+        if self.path.exists() and self.path.stat().st_size == size:
+            with open(self.path, "rb") as f:
+                h = np.frombuffer(f.read(HEADER.itemsize), HEADER)[0]
+            reuse = h["magic"] == MAGIC and h["capacity"] == self.capacity and h["depth"] == self.depth
+        if not reuse:
+            # layout novo: arquivo zerado com o tamanho final (sem crescer depois)
+            with open(self.path, "wb") as f:
+                f.truncate(size)
+        self._file = open(self.path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self.header, self.slots, self.data = _map(self._mm, self.capacity, self.depth)
+        if not reuse:
+            self.header["magic"] = MAGIC
+            self.header["version"] = 1
+            self.header["capacity"] = self.capacity
+            self.header["depth"] = self.depth
+        self._index = {bytes(s).rstrip(b"\0").decode(): i
+                       for i, s in enumerate(self.slots["sensor_id"][:int(self.header["n_sensors"][0])])}
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped_sensors = 0
+
+    def _slot(self, sensor_id: str):
+        i = self._index.get(sensor_id)
+        if i is not None:
+            return i
+        n = int(self.header["n_sensors"][0])
+        if n >= self.capacity:
+            self.dropped_sensors += 1
+            if self.dropped_sensors == 1:
+                logger.warning("Ring buffer cheio (%s sensores): sensores novos ignorados", self.capacity)
+            return None
+        self.slots["sensor_id"][n] = sensor_id.encode()[:32]
+        self.header["n_sensors"] = n + 1  # publica o slot só depois do nome gravado
+        self._index[sensor_id] = n
+        return n
+
+    def write(self, sensor_id: str, ts: float, umidade, nutriente):
+        i = self._slot(sensor_id)
+        if i is None:
+            return
+        slot = self.slots[i:i + 1]
+        head = int(slot["head"][0])
+        slot["seq"] += 1  # ímpar: escrita em andamento
+        self.data[i, head % self.depth] = (ts, np.nan if umidade is None else umidade,
+                                           np.nan if nutriente is None else nutriente)
+        slot["head"] = head + 1
+        slot["seq"] += 1
+
+    def write_rows(self, rows) -> int:
+        """Linhas do bridge (sensor_id, ts ISO/epoch, umidade, nutriente); sem ts são ignoradas."""
+        n = 0
+        with self._lock:
+            for row in rows:
+                sid = row.get("sensor_id")
+                ts = _epoch(row.get("ts"))
+                if sid in (None, "") or ts is None:
+                    continue
+                self.write(str(sid), ts, _num(row.get("umidade")), _num(row.get("nutriente")))
+                n += 1
+            self.header["updated"] = time.time()
+            self.written += n
+        return n
+
+    def stats(self) -> dict:
+        return {"sensors": len(self._index), "written": self.written,
+                "dropped_sensors": self.dropped_sensors}
+
+    def close(self):
+        self.header = self.slots = self.data = None
+        self._mm.close()
+        self._file.close()
+
+
+class RingReader:
+    """Leitor somente-leitura; ``view`` é zero-cópia, os demais validam com o seqlock."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        h = np.frombuffer(self._mm, HEADER, 1, 0)[0]
+        if h["magic"] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path}: não é um ring buffer")
+        self.capacity, self.depth = int(h["capacity"]), int(h["depth"])
+        self.header, self.slots, self.data = _map(self._mm, self.capacity, self.depth)
+        self._index = {}
+        self.retries = 0
+
+    @property
+    def updated(self) -> float:
+        return float(self.header["updated"][0])
+
+    def is_fresh(self, max_age: float = RING_STALE_SECONDS) -> bool:
+        return time.time() - self.updated <= max_age
+
+    def sensors(self) -> dict:
+        n = int(self.header["n_sensors"][0])
+        if n != len(self._index):
+            self._index = {bytes(s).rstrip(b"\0").decode(): i for i, s in enumerate(self.slots["sensor_id"][:n])}
+        return self._index
+
+    def view(self, sensor_id: str):
+        """(ring bruto, head) sem cópia e sem garantia de consistência durante escritas."""
+        i = self.sensors()[sensor_id]
+        return self.data[i], int(self.slots["head"][i])
+
+    def window(self, sensor_id: str, n: int = None) -> np.ndarray:
+        """Últimas ``n`` leituras do sensor (mais antiga primeiro), cópia consistente."""
+        i = self.sensors().get(sensor_id)
+        if i is None:
+            return np.empty(0, READING)
+        n = min(n or self.depth, self.depth)
+        seq = self.slots["seq"]
+        for attempt in range(_MAX_RETRIES):
+            s1 = int(seq[i])
+            if not s1 & 1:
+                head = int(self.slots["head"][i])
+                k = min(n, head)
+                idx = np.arange(head - k, head) % self.depth
+                out = self.data[i, idx]  # indexação por array: já é cópia
+                if int(seq[i]) == s1:
+                    return out
+            self.retries += 1
+            _backoff(attempt)
+        raise RuntimeError(f"ring buffer: leitura de {sensor_id} não estabilizou")
+
+    def snapshot(self):
+        """
+        Cópia consistente de todos os sensores: (nomes, heads, data). Copia tudo de uma
+        vez e relê só os sensores cujo ``seq`` mudou (ou estava ímpar) durante a cópia.
+        """
+        names = list(self.sensors())
+        n = len(names)
+        seq_before = self.slots["seq"][:n].copy()
+        heads = self.slots["head"][:n].copy()
+        data = self.data[:n].copy()
+        seq_after = self.slots["seq"][:n]
+        for i in np.flatnonzero((seq_before != seq_after) | (seq_before & 1).astype(bool)):
+            self.retries += 1
+            for attempt in range(_MAX_RETRIES):
+                s1 = int(self.slots["seq"][i])
+                if not s1 & 1:
+                    heads[i] = self.slots["head"][i]
+                    data[i] = self.data[i]
+                    if int(self.slots["seq"][i]) == s1:
+                        break
+                _backoff(attempt)
+            else:
+                raise RuntimeError(f"ring buffer: leitura de {names[i]} não estabilizou")
+        return names, heads, data
+
+    def latest(self) -> pd.DataFrame:
+        """Última leitura de cada sensor: só um elemento por ring é copiado (O(sensores))."""
+        names = list(self.sensors())
+        n = len(names)
+        rows = np.arange(n)
+        seq = self.slots["seq"]
+        seq_before = seq[:n].copy()
+        heads = self.slots["head"][:n].astype(np.int64)
+        last = self.data[rows, (heads - 1) % self.depth]
+        # só os sensores que escreveram durante a coleta são relidos, um a um
+        for i in np.flatnonzero((seq_before != seq[:n]) | (seq_before & 1).astype(bool)):
+            self.retries += 1
+            for attempt in range(_MAX_RETRIES):
+                s1 = int(seq[i])
+                if not s1 & 1:
+                    heads[i] = self.slots["head"][i]
+                    last[i] = self.data[i, (heads[i] - 1) % self.depth]
+                    if int(seq[i]) == s1:
+                        break
+                _backoff(attempt)
+            else:
+                raise RuntimeError(f"ring buffer: leitura de {names[i]} não estabilizou")
+        has = heads > 0
+        return pd.DataFrame({"sensor_id": np.asarray(names, dtype=object)[has],
+                             "umidade": last["umidade"][has], "nutriente": last["nutriente"][has],
+                             "ts": _to_datetime(last["ts"][has])})
+
+    def frame(self, since: float = None) -> pd.DataFrame:
+        """Leituras retidas (até depth por sensor) em ordem de ts; ``since`` em segundos atrás."""
+        names, heads, data = self.snapshot()
+        filled = np.minimum(heads, self.depth).astype(np.int64)
+        mask = np.arange(self.depth)[None, :] < filled[:, None]  # slots já escritos de cada ring
+        codes = np.broadcast_to(np.arange(len(names))[:, None], mask.shape)[mask]
+        rows = data[mask]
+        if since is not None:
+            keep = rows["ts"] >= (datetime.now() - _EPOCH).total_seconds() - since
+            rows, codes = rows[keep], codes[keep]
+        order = np.argsort(rows["ts"], kind="stable")
+        rows, codes = rows[order], codes[order]
+        return pd.DataFrame({"sensor_id": pd.Categorical.from_codes(codes, categories=names),
+                             "umidade": rows["umidade"], "nutriente": rows["nutriente"],
+                             "ts": _to_datetime(rows["ts"])})
+
+    def close(self):
+        self.header = self.slots = self.data = None
+        self._mm.close()
+
+
+def open_readers(directory: str = None, max_age: float = RING_STALE_SECONDS) -> list:
+    """Leitores dos rings com escrita recente em ``directory`` (um por worker do bridge)."""
+    readers = []
+    for p in sorted(Path(directory or DEFAULT_RING_DIR).glob("*.ring")):
+        try:
+            r = RingReader(p)
+        except (OSError, ValueError):
+            continue
+        if max_age and not r.is_fresh(max_age):
+            r.close()
+            continue
+        readers.append(r)
+    return readers
+
+
+class LiveRings:
+    """Leitura combinada dos rings de todos os workers (sensor em vários rings: maior ts vence)."""
+
+    def __init__(self, readers: list):
+        self.readers = readers
+
+    def latest(self) -> pd.DataFrame:
+        df = pd.concat([r.latest() for r in self.readers], ignore_index=True)
+        if len(self.readers) > 1 and not df.empty:
+            df = df.loc[df.groupby("sensor_id", observed=True)["ts"].idxmax()]
+        return df.sort_values("ts", ascending=False).reset_index(drop=True)
+
+    def frame(self, since: float = None) -> pd.DataFrame:
+        if len(self.readers) == 1:
+            return self.readers[0].frame(since)
+        df = pd.concat([r.frame(since) for r in self.readers], ignore_index=True)
+        return df.sort_values("ts", kind="stable").reset_index(drop=True)
+
+    def active(self, minutes: float = 15) -> int:
+        latest = self.latest()
+        return int((latest["ts"] >= pd.Timestamp.now() - pd.Timedelta(minutes=minutes)).sum())
+
+
+_live = {}
+
+def get_live_rings(directory: str = None):
+    """LiveRings com os rings ativos (leitores reaproveitados entre chamadas); None sem bridge escrevendo."""
+    directory = str(directory or DEFAULT_RING_DIR)
+    readers = _live.get(directory)
+    if readers is None or any(not r.is_fresh() for r in readers):
+        for r in readers or []:
+            r.close()
+        readers = _live[directory] = open_readers(directory)
+    return LiveRings(readers) if readers else None
+
+
+# ---------- benchmark ----------
+def _bench_writer(path, sensors: int, depth: int, seconds: float, counter):
+    w = RingWriter(path, capacity=sensors, depth=depth)
+    names = [f"esp32-{i:05d}" for i in range(sensors)]
+    end = time.time() + seconds
+    n = 0
+    while time.time() < end:
+        for _ in range(1000):
+            ts = (datetime.now() - _EPOCH).total_seconds()
+            v = float(n % 100000)
+            # umidade == nutriente em toda leitura: o leitor detecta leitura rasgada
+            w.write(names[n % sensors], ts, v, v)
+            n += 1
+        w.header["updated"] = time.time()
+    counter.value = n
+    w.close()
+
+
+def _bench(sensors: int, depth: int, seconds: float, directory: Path):
+    import multiprocessing as mp
+
+    path = directory / "bench.ring"
+    RingWriter(path, capacity=sensors, depth=depth).close()
+    counter = mp.Value("q", 0)
+    proc = mp.Process(target=_bench_writer, args=(str(path), sensors, depth, seconds, counter))
+    proc.start()
+    time.sleep(0.5)
+    r = RingReader(path)
+    names = [f"esp32-{i:05d}" for i in range(sensors)]
+    lat = {"window(64)": [], "latest()": [], "frame()": []}
+    torn = 0
+    rng = np.random.default_rng(3)
+    end = time.time() + seconds - 1.0
+    while time.time() < end:
+        t0 = time.perf_counter()
+        w = r.window(names[rng.integers(sensors)], 64)
+        lat["window(64)"].append(time.perf_counter() - t0)
+        torn += int((w["umidade"] != w["nutriente"]).sum())
+        if len(lat["window(64)"]) % 50 == 0:
+            t0 = time.perf_counter()
+            df = r.latest()
+            lat["latest()"].append(time.perf_counter() - t0)
+            torn += int((df["umidade"] != df["nutriente"]).sum())
+        if len(lat["window(64)"]) % 500 == 0:
+            t0 = time.perf_counter()
+            r.frame()
+            lat["frame()"].append(time.perf_counter() - t0)
+    proc.join()
+    print(f"escritor: {counter.value:,} leituras em {seconds:.0f}s -> {counter.value / seconds:,.0f} leituras/s "
+          f"({sensors} sensores, depth {depth}, arquivo {path.stat().st_size / 1e6:.1f} MB)")
+    for name, xs in lat.items():
+        if xs:
+            xs = np.array(xs) * 1e6
+            print(f"{name:11s} n={len(xs):6d}  p50={np.percentile(xs, 50):9.1f} µs  "
+                  f"p99={np.percentile(xs, 99):9.1f} µs  máx={xs.max():9.1f} µs")
+    print(f"releituras por seqlock: {r.retries}; leituras inconsistentes: {torn}")
+    r.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Ring buffer mmap das leituras recentes")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Latência de leitura com escritor concorrente")
+    p.add_argument("--sensors", type=int, default=2000)
+    p.add_argument("--depth", type=int, default=256)
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--dir", default=None)
+    p = sub.add_parser("show", help="Última leitura de cada sensor nos rings ativos")
+    p.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "bench":
+        _bench(args.sensors, args.depth, args.seconds, Path(args.dir or tempfile.mkdtemp(prefix="farmtech_ring_")))
+    else:
+        live = get_live_rings(args.dir)
+        print(live.latest().to_string() if live else "nenhum ring ativo")
@@ -0,0 +1,648 @@
+"""
+rollups.py
+Rollups por sensor em buckets de 1 minuto, 1 hora e 1 dia, mantidos incrementalmente na ingestão.
+
+Para umidade e nutriente cada bucket guarda count (n_), sum, min, max e last (+ last_ts).
+Esses agregados parciais se combinam (soma, min, max, last pelo maior ts), então:
+  - o bridge acumula deltas em memória (RollupAccumulator) a partir das linhas gravadas
+    pelo sink e os descarrega periodicamente (RollupMaintainer)
+  - PostgreSQL: upsert nas tabelas sensor_rollup_1m/1h/1d (ver db/schema.sql)
+  - local: arquivos Parquet de deltas por bucket/dia, recombinados na leitura e compactados
+
+Consultas (custo proporcional ao intervalo, não ao total de linhas brutas):
+  - choose_bucket(): bucket mais grosso que ainda dá a resolução pedida ao gráfico
+  - Rollups.series(): série por bucket (média ponderada entre sensores)
+  - Rollups.summary(): KPIs de um intervalo combinando dias inteiros (1d), horas (1h)
+    e as bordas (1m)
+
+CLI:
+    python db/rollups.py rebuild --from-store db/store      # recalcula a partir do store Parquet
+    python db/rollups.py rebuild --from-pg                  # recalcula a partir da tabela sensors
+    python db/rollups.py bench --rows 2000000 --days 30
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+logger = logging.getLogger("data.rollups")
+
+DEFAULT_ROLLUP_DIR = os.getenv("ROLLUP_DIR", str(ROOT / "db" / "rollups"))
+BUCKETS = {"1m": 60, "1h": 3600, "1d": 86400}
+# granularidade da partição de cada bucket no backend Parquet (poucos arquivos por leitura)
+PARTITION_FORMATS = {"1m": "%Y-%m-%d", "1h": "%Y-%m", "1d": "%Y"}
+METRICS = ("umidade", "nutriente")
+AGG_COLUMNS = [f"{a}_{m}" for m in METRICS for a in ("n", "sum", "min", "max", "last")] + ["last_ts"]
+COLUMNS = ["sensor_id", "bucket"] + AGG_COLUMNS
+_seq = count()
+
+
+def _num(v):
+    if v is None or v == "":
+        return None
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return None
+    return None if v != v else v  # NaN -> None
+
+def _ts(v):
+    """
+    datetime ingênuo (hora local, como o resto da ingestão) a partir de datetime/Timestamp,
+    epoch ou ISO-8601 (com offset ou ``Z`` inclusive); inválido -> None.
+    """
+    if isinstance(v, datetime):
+        if pd.isna(v):
+            return None
+        if isinstance(v, pd.Timestamp):
+            v = v.to_pydatetime()
+    elif v is None or v == "":
+        return None
+    elif isinstance(v, (int, float)):
+        return None if v != v else datetime.fromtimestamp(v)
+    else:
+        text = str(v).strip()
+        if text[-1:] in ("Z", "z"):
+            text = text[:-1] + "+00:00"
+        try:
+            v = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    # com fuso -> hora local sem fuso: misturar os dois quebraria as comparações de last_ts
+    return v if v.tzinfo is None else v.astimezone().replace(tzinfo=None)
+
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    if bucket == "1m":
+        return ts.replace(second=0, microsecond=0)
+    if bucket == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_bucket(start, end, max_points: int = 500) -> str:
+    """Menor bucket que cobre o intervalo com no máximo ``max_points`` pontos (1m -> 1h -> 1d)."""
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+    for name, seconds in BUCKETS.items():
+        if span / seconds <= max_points:
+            return name
+    return "1d"
+
+
+# ---------- acumulação em memória ----------
+class RollupAccumulator:
+    """Deltas (sensor_id, bucket) -> agregados parciais, para os três tamanhos de bucket."""
+
+    def __init__(self):
+        self._acc = {b: {} for b in BUCKETS}
+        self._lock = threading.Lock()
+        self.rows = 0
+
+    def add_rows(self, rows):
+        parsed = []
+        for row in rows:
+            sensor_id, ts = row.get("sensor_id"), _ts(row.get("ts"))
+            if sensor_id in (None, "") or ts is None:
+                continue
+            parsed.append((str(sensor_id), ts, (_num(row.get("umidade")), _num(row.get("nutriente")))))
+        with self._lock:
+            acc_m, acc_h, acc_d = self._acc["1m"], self._acc["1h"], self._acc["1d"]
+            for sensor_id, ts, values in parsed:
+                minute = ts.replace(second=0, microsecond=0)
+                hour = minute.replace(minute=0)
+                day = hour.replace(hour=0)
+                for acc, start in ((acc_m, minute), (acc_h, hour), (acc_d, day)):
+                    key = (sensor_id, start)
+                    agg = acc.get(key)
+                    if agg is None:
+                        # por métrica: [n, sum, min, max, last]; por fim last_ts
+                        agg = acc[key] = [0, 0.0, None, None, None, 0, 0.0, None, None, None, None]
+                    newest = agg[10] is None or ts >= agg[10]
+                    o = 0
+                    for v in values:
+                        if v is not None:
+                            agg[o] += 1
+                            agg[o + 1] += v
+                            if agg[o + 2] is None or v < agg[o + 2]:
+                                agg[o + 2] = v
+                            if agg[o + 3] is None or v > agg[o + 3]:
+                                agg[o + 3] = v
+                            if newest:
+                                agg[o + 4] = v
+                        o = 5
+                    if newest:
+                        agg[10] = ts
+            self.rows += len(parsed)
+
+    def drain(self) -> dict:
+        """Devolve {bucket: DataFrame(COLUMNS)} com os deltas acumulados e zera o acumulador."""
+        with self._lock:
+            acc, self._acc = self._acc, {b: {} for b in BUCKETS}
+        out = {}
+        for bucket, items in acc.items():
+            if items:
+                out[bucket] = pd.DataFrame(
+                    [(sid, start, *agg) for (sid, start), agg in items.items()], columns=COLUMNS)
+        return out
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(v) for v in self._acc.values())
+
+
+def merge_partials(df: pd.DataFrame, keys=("sensor_id", "bucket")) -> pd.DataFrame:
+    """Combina agregados parciais com as mesmas ``keys`` (count/sum somam, min/max, last pelo maior ts)."""
+    keys = list(keys)
+    if df.empty:
+        return df.reindex(columns=keys + AGG_COLUMNS)
+    df = df.sort_values("last_ts")
+    g = df.groupby(keys, sort=False)
+    parts = [
+        g[[f"{a}_{m}" for m in METRICS for a in ("n", "sum")]].sum(),
+        g[[f"min_{m}" for m in METRICS]].min(),
+        g[[f"max_{m}" for m in METRICS]].max(),
+        g[[f"last_{m}" for m in METRICS]].last(),  # último não nulo na ordem de last_ts
+        g[["last_ts"]].max(),
+    ]
+    return pd.concat(parts, axis=1).reset_index()[keys + AGG_COLUMNS]
+
+
+# ---------- backends ----------
+class ParquetRollups:
+    """
+    Deltas em <root>/<bucket>/date=<período>/delta-*.parquet, recombinados na leitura.
+    O período é dia (1m), mês (1h) ou ano (1d): PARTITION_FORMATS.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = Path(root or DEFAULT_ROLLUP_DIR)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def upsert(self, bucket: str, df: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        days = df["bucket"].dt.strftime(PARTITION_FORMATS[bucket])
+        for day, part in df.groupby(days, sort=False):
+            d = self.root / bucket / f"date={day}"
+            d.mkdir(parents=True, exist_ok=True)
+            name = f"delta-{time.time_ns()}-{os.getpid()}-{next(_seq)}.parquet"
+            tmp = d / f".{name}.tmp"
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp)
+            os.replace(tmp, d / name)
+
+    def read(self, bucket: str, start=None, end=None, sensors=None, columns=None, merge: bool = True) -> pd.DataFrame:
+        """Agregados de ``bucket`` no intervalo; ``merge=False`` devolve os deltas sem recombinar."""
+        import pyarrow.dataset as ds
+
+        columns = list(columns or COLUMNS)
+        base = self.root / bucket
+        if not base.exists():
+            return pd.DataFrame(columns=columns)
+        # poda as partições de dia pelo nome antes de abrir qualquer arquivo
+        fmt = PARTITION_FORMATS[bucket]
+        lo = pd.Timestamp(start).strftime(fmt) if start is not None else ""
+        hi = pd.Timestamp(end).strftime(fmt) if end is not None else "9999"
+        files = [str(f) for d in base.glob("date=*") if lo <= d.name[5:] <= hi for f in d.glob("*.parquet")]
+        if not files:
+            return pd.DataFrame(columns=columns)
+        dataset = ds.dataset(files, format="parquet")
+        flt = None
+        if start is not None:
+            flt = ds.field("bucket") >= pd.Timestamp(start).to_datetime64()
+        if end is not None:
+            e = ds.field("bucket") < pd.Timestamp(end).to_datetime64()
+            flt = e if flt is None else flt & e
+        if sensors is not None:
+            e = ds.field("sensor_id").isin([str(s) for s in sensors])
+            flt = e if flt is None else flt & e
+        df = dataset.to_table(columns=columns, filter=flt).to_pandas()
+        return merge_partials(df) if merge else df
+
+    def compact(self, min_files: int = 4) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        merged = 0
+        with self._lock:
+            for d in sorted(self.root.glob("*/date=*")):
+                files = sorted(d.glob("*.parquet"))
+                if len(files) < min_files:
+                    continue
+                df = merge_partials(pa.concat_tables(pq.read_table(p) for p in files).to_pandas())
+                name = f"delta-{time.time_ns()}-{os.getpid()}-{next(_seq)}.parquet"
+                tmp = d / f".{name}.tmp"
+                pq.write_table(pa.Table.from_pandas(df[COLUMNS], preserve_index=False), tmp)
+                os.replace(tmp, d / name)
+                for p in files:
+                    p.unlink(missing_ok=True)
+                merged += len(files)
+        return merged
+
+    def clear(self):
+        import shutil
+        for bucket in BUCKETS:
+            shutil.rmtree(self.root / bucket, ignore_errors=True)
+
+
+class PostgresRollups:
+    """Tabelas sensor_rollup_<bucket> com upsert (INSERT ... ON CONFLICT DO UPDATE)."""
+
+    def __init__(self, database_url: str = None):
+        if database_url is None:
+            from data_pipeline.config import DATABASE_URL as database_url
+        self.database_url = database_url
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.database_url)
+        return self._conn
+
+    @staticmethod
+    def _upsert_sql(bucket: str) -> str:
+        t = f"sensor_rollup_{bucket}"
+        sets = []
+        for m in METRICS:
+            sets += [
+                f"n_{m} = {t}.n_{m} + EXCLUDED.n_{m}",
+                f"sum_{m} = {t}.sum_{m} + EXCLUDED.sum_{m}",
+                f"min_{m} = LEAST({t}.min_{m}, EXCLUDED.min_{m})",
+                f"max_{m} = GREATEST({t}.max_{m}, EXCLUDED.max_{m})",
+                f"last_{m} = CASE WHEN EXCLUDED.last_ts >= {t}.last_ts "
+                f"THEN COALESCE(EXCLUDED.last_{m}, {t}.last_{m}) ELSE COALESCE({t}.last_{m}, EXCLUDED.last_{m}) END",
+            ]
+        sets.append(f"last_ts = GREATEST({t}.last_ts, EXCLUDED.last_ts)")
+        return (f"INSERT INTO {t} ({', '.join(COLUMNS)}) VALUES %s "
+                f"ON CONFLICT (sensor_id, bucket) DO UPDATE SET {', '.join(sets)}")
+
+    def upsert(self, bucket: str, df: pd.DataFrame):
+        from psycopg2.extras import execute_values
+
+        df = df.astype(object).where(df.notna(), None)
+        rows = [tuple(r) for r in df[COLUMNS].itertuples(index=False)]
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, self._upsert_sql(bucket), rows, page_size=1000)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def read(self, bucket: str, start=None, end=None, sensors=None, columns=None, merge: bool = True) -> pd.DataFrame:
+        # no banco cada (sensor_id, bucket) já é uma linha só: merge não se aplica
+        columns = list(columns or COLUMNS)
+        where, params = [], []
+        if start is not None:
+            where.append("bucket >= %s")
+            params.append(pd.Timestamp(start).to_pydatetime())
+        if end is not None:
+            where.append("bucket < %s")
+            params.append(pd.Timestamp(end).to_pydatetime())
+        if sensors is not None:
+            where.append("sensor_id = ANY(%s)")
+            params.append([str(s) for s in sensors])
+        sql = f"SELECT {', '.join(columns)} FROM sensor_rollup_{bucket}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    data = cur.fetchall()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        df = pd.DataFrame(data, columns=columns)
+        for c in columns:
+            if c in ("bucket", "last_ts"):
+                df[c] = pd.to_datetime(df[c])
+            elif c != "sensor_id":
+                df[c] = pd.to_numeric(df[c])
+        return df
+
+    def compact(self, min_files: int = 4) -> int:
+        return 0
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                for bucket in BUCKETS:
+                    cur.execute(f"TRUNCATE sensor_rollup_{bucket}")
+            conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------- consultas ----------
+def _floor(ts: pd.Timestamp, bucket: str) -> pd.Timestamp:
+    return ts.floor({"1m": "min", "1h": "h", "1d": "D"}[bucket])
+
+def _ceil(ts: pd.Timestamp, bucket: str) -> pd.Timestamp:
+    return ts.ceil({"1m": "min", "1h": "h", "1d": "D"}[bucket])
+
+def plan_segments(start, end, levels=("1d", "1h", "1m")):
+    """
+    Cobre [start, end) com o mínimo de buckets: dias inteiros em 1d, horas inteiras em 1h
+    e as bordas em 1m (arredondadas para fora até o minuto).
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if start >= end or not levels:
+        return []
+    bucket, rest = levels[0], levels[1:]
+    if not rest:
+        return [(bucket, _floor(start, bucket), _ceil(end, bucket))]
+    cs, fe = _ceil(start, bucket), _floor(end, bucket)
+    if cs < fe:
+        return plan_segments(start, cs, rest) + [(bucket, cs, fe)] + plan_segments(fe, end, rest)
+    return plan_segments(start, end, rest)
+
+
+class Rollups:
+    """API de leitura sobre um backend (ParquetRollups ou PostgresRollups)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def series(self, start, end, metric: str = "umidade", bucket: str = None, max_points: int = 500,
+               sensors=None) -> pd.Series:
+        """Média de ``metric`` por bucket entre os sensores (ponderada pelo count)."""
+        bucket = bucket or choose_bucket(start, end, max_points)
+        # sum e count são aditivos: não precisa recombinar os deltas por sensor
+        df = self.backend.read(bucket, start, end, sensors, columns=["bucket", f"sum_{metric}", f"n_{metric}"],
+                               merge=False)
+        if df.empty:
+            return pd.Series(dtype=float, name=metric)
+        g = df.groupby("bucket")[[f"sum_{metric}", f"n_{metric}"]].sum().sort_index()
+        g = g[g[f"n_{metric}"] > 0]
+        return (g[f"sum_{metric}"] / g[f"n_{metric}"]).rename(metric)
+
+    def summary(self, start, end, by_sensor: bool = False, sensors=None) -> pd.DataFrame:
+        """count/mean/min/max/last por métrica no intervalo (total ou por sensor)."""
+        parts = [self.backend.read(b, s, e, sensors, merge=False) for b, s, e in plan_segments(start, end)]
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            return pd.DataFrame()
+        df = pd.concat(parts, ignore_index=True)
+        if not by_sensor:
+            df = df.assign(sensor_id="*")
+        agg = merge_partials(df, keys=("sensor_id",))
+        out = pd.DataFrame({"sensor_id": agg["sensor_id"]})
+        for m in METRICS:
+            n = agg[f"n_{m}"]
+            out[f"count_{m}"] = n.astype("int64")
+            out[f"mean_{m}"] = (agg[f"sum_{m}"] / n.where(n > 0)).round(4)
+            out[f"min_{m}"] = agg[f"min_{m}"]
+            out[f"max_{m}"] = agg[f"max_{m}"]
+            out[f"last_{m}"] = agg[f"last_{m}"]
+        out["last_ts"] = agg["last_ts"]
+        return out.set_index("sensor_id")
+
+
+def get_rollups(kind: str = None, database_url: str = None, root: str = None):
+    """Rollups para os consumidores: ``kind`` parquet | postgres (padrão: ROLLUP_BACKEND ou parquet)."""
+    kind = (kind or os.getenv("ROLLUP_BACKEND", "parquet")).lower()
+    if kind in ("postgres", "pg"):
+        return Rollups(PostgresRollups(database_url))
+    path = Path(root or DEFAULT_ROLLUP_DIR)
+    if not path.exists():
+        return None
+    return Rollups(ParquetRollups(str(path)))
+
+
+# ---------- manutenção na ingestão ----------
+class RollupMaintainer:
+    """
+    Recebe as linhas gravadas pelo sink (``add``) e descarrega os deltas no backend a cada
+    ``flush_interval`` segundos. Em falha os deltas voltam para o próximo flush, até
+    ``max_retries`` vezes; depois são descartados (``dropped_deltas``/``last_error`` em
+    stats(); recuperar com ``rebuild``).
+
+    ``add(rows, done)``: ``done()`` é chamado quando os deltas dessas linhas estão no
+    backend (ou foram descartados), não quando entram na memória; o bridge dá o ack do
+    journal ali, então um crash antes do flush reenvia as mensagens na subida.
+    """
+
+    def __init__(self, backend, flush_interval: float = 5.0, compact_every: int = 60, max_retries: int = 12):
+        self.backend = backend
+        self.flush_interval = float(flush_interval)
+        self.compact_every = compact_every
+        self.max_retries = max(0, int(max_retries))
+        self.acc = RollupAccumulator()
+        self._retry = []  # [delta, tentativas]
+        self._done = []
+        self._done_retry = []
+        self._done_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushes = 0
+        self._errors = 0
+        self._dropped = 0
+        self.last_error = None
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="rollup-flush", daemon=True)
+        self._thread.start()
+
+    def add(self, rows, done=None):
+        self.acc.add_rows(rows)
+        if done is not None:
+            # depois do add_rows: um flush no meio só atrasa o done(), nunca o adianta
+            with self._done_lock:
+                self._done.append(done)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._done_lock:
+                done, self._done = self._done, []
+            deltas = self._retry + [[self.acc.drain(), 0]]
+            self._retry = []
+            for delta, attempts in deltas:
+                try:
+                    for bucket, df in list(delta.items()):
+                        self.backend.upsert(bucket, df)
+                        del delta[bucket]
+                except Exception as e:
+                    self._errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    if attempts >= self.max_retries:
+                        self._dropped += 1
+                        logger.error("Rollups: deltas descartados após %s tentativas (%s); rode "
+                                     "python db/rollups.py rebuild para recalcular", attempts + 1, self.last_error)
+                    else:
+                        logger.warning("Rollups: falha ao gravar deltas (%s); tentativa %s/%s no próximo flush",
+                                       self.last_error, attempts + 1, self.max_retries)
+                        self._retry.append([delta, attempts + 1])
+            # acks só quando nada ficou pendente (os deltas de um lote podem estar em qualquer retry)
+            self._done_retry += done
+            if not self._retry:
+                done, self._done_retry = self._done_retry, []
+                for callback in done:
+                    try:
+                        callback()
+                    except Exception:
+                        logger.exception("Rollups: falha no callback done")
+            self._flushes += 1
+            if self.compact_every and self._flushes % self.compact_every == 0:
+                self.backend.compact()
+
+    def _loop(self):
+        while not self._halt.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._halt.set()
+        self._thread.join(timeout=max(1.0, self.flush_interval * 2))
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"rows": self.acc.rows, "pending_keys": self.acc.pending(), "flushes": self._flushes,
+                "errors": self._errors, "retry_batches": len(self._retry), "dropped_deltas": self._dropped,
+                "waiting_ack": len(self._done) + len(self._done_retry), "last_error": self.last_error}
+
+
+# ---------- CLI ----------
+def rebuild_from_store(backend, store_root: str = None) -> int:
+    from db.store import ParquetStore
+
+    store = ParquetStore(store_root)
+    days = sorted(p.name.split("=", 1)[1] for p in store.root.glob("date=*") if p.is_dir())
+    total = 0
+    for day in days:
+        start = pd.Timestamp(day)
+        df = store.read_range(start=start, end=start + pd.Timedelta(days=1))
+        acc = RollupAccumulator()
+        acc.add_rows(df.to_dict("records"))
+        for bucket, delta in acc.drain().items():
+            backend.upsert(bucket, delta)
+        total += len(df)
+    return total
+
+
+def rebuild_from_pg(backend, database_url: str = None, chunk: int = 200000) -> int:
+    import psycopg2
+
+    if database_url is None:
+        from data_pipeline.config import DATABASE_URL as database_url
+    total = 0
+    with psycopg2.connect(database_url) as conn:
+        with conn.cursor(name="rollup_rebuild") as cur:  # cursor do lado do servidor
+            cur.itersize = chunk
+            cur.execute("SELECT sensor_id, umidade, nutriente, ts FROM sensors ORDER BY ts")
+            while True:
+                data = cur.fetchmany(chunk)
+                if not data:
+                    break
+                acc = RollupAccumulator()
+                acc.add_rows({"sensor_id": s, "umidade": u, "nutriente": n, "ts": t} for s, u, n, t in data)
+                for bucket, delta in acc.drain().items():
+                    backend.upsert(bucket, delta)
+                total += len(data)
+    return total
+
+
+def _bench(rows: int, days: int, sensors: int, directory: Path):
+    import numpy as np
+    from db.store import ParquetStore
+
+    rng = np.random.default_rng(7)
+    end = pd.Timestamp.now().floor("s")
+    ts = end - pd.to_timedelta(rng.uniform(0, days * 86400, rows), unit="s")
+    raw = pd.DataFrame({
+        "sensor_id": [f"esp32-{i:04d}" for i in rng.integers(0, sensors, rows)],
+        "umidade": rng.uniform(20, 80, rows).round(2),
+        "nutriente": rng.uniform(5, 20, rows).round(2),
+        "ts": ts.floor("us"),
+    })
+    store = ParquetStore(str(directory / "store"))
+    store.write(raw)
+    backend = ParquetRollups(str(directory / "rollups"))
+    records = raw.assign(ts=raw["ts"].dt.to_pydatetime()).to_dict("records")
+    t0 = time.perf_counter()
+    acc = RollupAccumulator()
+    for i in range(0, rows, 2000):  # lotes do tamanho de um flush do sink
+        acc.add_rows(records[i:i + 2000])
+    t_acc = time.perf_counter() - t0
+    for bucket, delta in acc.drain().items():
+        backend.upsert(bucket, delta)
+    backend.compact(min_files=1)
+    print(f"acumulação: {rows} linhas em {t_acc:.2f}s -> {rows / t_acc:,.0f} linhas/s (3 buckets)")
+
+    r = Rollups(backend)
+    start = end - pd.Timedelta(days=days)
+    t0 = time.perf_counter()
+    df = store.read_range(start=start, columns=["ts", "umidade"])
+    hourly_raw = df.set_index("ts")["umidade"].resample("h").mean().dropna()
+    t_raw = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    hourly = r.series(start, end, "umidade", bucket="1h")
+    t_roll = time.perf_counter() - t0
+    diff = (hourly_raw - hourly.reindex(hourly_raw.index)).abs().max()
+    print(f"média horária {days}d: store bruto {t_raw * 1000:.1f} ms | rollup 1h {t_roll * 1000:.1f} ms "
+          f"({len(hourly)} pontos, diferença máx {diff:.2e})")
+
+    q_start = end - pd.Timedelta(days=days - 1, hours=5, minutes=17)
+    t0 = time.perf_counter()
+    sel = store.read_range(start=q_start.floor("min"), end=end.ceil("min"), columns=["umidade"])["umidade"]
+    kpi_raw = (len(sel), round(sel.mean(), 4), sel.min(), sel.max())
+    t_raw = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    kpi = r.summary(q_start, end).iloc[0]
+    t_roll = time.perf_counter() - t0
+    print(f"KPIs do intervalo: store bruto {t_raw * 1000:.1f} ms {kpi_raw} | rollup {t_roll * 1000:.1f} ms "
+          f"({kpi['count_umidade']}, {kpi['mean_umidade']}, {kpi['min_umidade']}, {kpi['max_umidade']}); "
+          f"segmentos={len(plan_segments(q_start, end))}")
+
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Rollups 1m/1h/1d das leituras")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_reb = sub.add_parser("rebuild", help="Recalcula os rollups a partir dos dados brutos")
+    src = p_reb.add_mutually_exclusive_group(required=True)
+    src.add_argument("--from-store", nargs="?", const="", default=None, help="Store Parquet (padrão: PARQUET_STORE_DIR)")
+    src.add_argument("--from-pg", action="store_true", help="Tabela sensors do PostgreSQL")
+    p_reb.add_argument("--to", choices=["parquet", "postgres"], default="parquet")
+    p_reb.add_argument("--database-url", default=None)
+    p_reb.add_argument("--rollup-dir", default=None)
+    p_bench = sub.add_parser("bench", help="Série horária e KPIs: dados brutos vs rollups")
+    p_bench.add_argument("--rows", type=int, default=1000000)
+    p_bench.add_argument("--days", type=int, default=30)
+    p_bench.add_argument("--sensors", type=int, default=200)
+    p_bench.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "rebuild":
+        backend = PostgresRollups(args.database_url) if args.to == "postgres" else ParquetRollups(args.rollup_dir)
+        backend.clear()
+        t0 = time.perf_counter()
+        if args.from_pg:
+            n = rebuild_from_pg(backend, args.database_url)
+        else:
+            n = rebuild_from_store(backend, args.from_store or None)
+        backend.compact(min_files=1)
+        print(f"{n} linhas agregadas em {time.perf_counter() - t0:.1f}s")
+    else:
+        _bench(args.rows, args.days, args.sensors, Path(args.dir or tempfile.mkdtemp(prefix="farmtech_rollups_")))
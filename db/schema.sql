@@ -1,12 +1,63 @@
 -- Schema unificado FarmTech (PostgreSQL)
 
+-- Leituras particionadas por mês em ts (db/partitions.py cria/mantém as partições; o
+-- mqtt_bridge com sink postgres roda o maintain na subida e a cada PARTITION_MAINTAIN_INTERVAL).
+-- Sem PRIMARY KEY: em tabela particionada ela teria de incluir ts, que pode ser NULL
+-- (linhas sem ts e fora das partições criadas caem em sensors_default).
+-- Instalação antiga (sensors como tabela simples): o IF NOT EXISTS mantém a tabela e as
+-- partições abaixo são puladas com um WARNING; a atualização é python db/partitions.py migrate.
 CREATE TABLE IF NOT EXISTS sensors (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     sensor_id TEXT,
     umidade REAL,
     nutriente REAL,
     ts TIMESTAMP
-);
+) PARTITION BY RANGE (ts);
+
+-- Cria a partição mensal de ``month`` (sensors_yYYYYmMM) com índice btree em ts.
+-- Linhas do mês que já estejam em sensors_default são movidas antes do ATTACH.
+CREATE OR REPLACE FUNCTION sensors_create_partition(month DATE) RETURNS TEXT AS $$
+DECLARE
+    lo TIMESTAMP := date_trunc('month', month);
+    hi TIMESTAMP := date_trunc('month', month) + INTERVAL '1 month';
+    part TEXT := 'sensors_' || to_char(lo, '"y"YYYY"m"MM');
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE sensors INCLUDING DEFAULTS)', part);
+    EXECUTE format('WITH moved AS (DELETE FROM sensors_default WHERE ts >= %L AND ts < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (ts IS NOT NULL AND ts >= %L AND ts < %L)',
+                   part, part || '_ts_range', lo, hi);
+    EXECUTE format('ALTER TABLE sensors ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, part || '_ts_range');
+    EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I (ts)', part || '_ts_idx', part);
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partição fechada (só append, já em ordem de ts): troca o btree em ts por BRIN,
+-- ordens de grandeza menor. (sensor_id, ts DESC) continua para as consultas por sensor.
+CREATE OR REPLACE FUNCTION sensors_brin_partition(part TEXT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I USING brin (ts) WITH (pages_per_range = 32)',
+                   part || '_ts_brin', part);
+    EXECUTE format('DROP INDEX IF EXISTS %I', part || '_ts_idx');
+END;
+$$ LANGUAGE plpgsql;
+
+-- partição default + mês corrente e os dois seguintes; db/partitions.py maintain estende a janela
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('sensors')) <> 'p' THEN
+        RAISE WARNING 'sensors não é particionada (schema anterior): rode python db/partitions.py migrate';
+        RETURN;
+    END IF;
+    CREATE TABLE IF NOT EXISTS sensors_default PARTITION OF sensors DEFAULT;
+    PERFORM sensors_create_partition((date_trunc('month', LOCALTIMESTAMP) + make_interval(months => m))::date)
+    FROM generate_series(0, 2) AS m;
+END $$;
 
 CREATE TABLE IF NOT EXISTS weather (
     id SERIAL PRIMARY KEY,
@@ -24,6 +75,89 @@ CREATE TABLE IF NOT EXISTS detections (
     meta JSONB
 );
 
-CREATE INDEX IF NOT EXISTS idx_sensors_ts ON sensors(ts);
+-- Último valor por sensor (db/latest.py): upsert do mqtt_bridge a cada flush do sink;
+-- "sensores ativos" e "últimas leituras" leem aqui em vez de varrer sensors
+CREATE TABLE IF NOT EXISTS sensor_latest (
+    sensor_id TEXT PRIMARY KEY,
+    umidade REAL,
+    nutriente REAL,
+    ts TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Rollups por sensor (db/rollups.py): mantidos na ingestão pelo mqtt_bridge
+CREATE TABLE IF NOT EXISTS sensor_rollup_1m (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    n_umidade BIGINT NOT NULL DEFAULT 0,
+    sum_umidade DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_umidade REAL,
+    max_umidade REAL,
+    last_umidade REAL,
+    n_nutriente BIGINT NOT NULL DEFAULT 0,
+    sum_nutriente DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_nutriente REAL,
+    max_nutriente REAL,
+    last_nutriente REAL,
+    last_ts TIMESTAMP,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS sensor_rollup_1h (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    n_umidade BIGINT NOT NULL DEFAULT 0,
+    sum_umidade DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_umidade REAL,
+    max_umidade REAL,
+    last_umidade REAL,
+    n_nutriente BIGINT NOT NULL DEFAULT 0,
+    sum_nutriente DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_nutriente REAL,
+    max_nutriente REAL,
+    last_nutriente REAL,
+    last_ts TIMESTAMP,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS sensor_rollup_1d (
+    sensor_id TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    n_umidade BIGINT NOT NULL DEFAULT 0,
+    sum_umidade DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_umidade REAL,
+    max_umidade REAL,
+    last_umidade REAL,
+    n_nutriente BIGINT NOT NULL DEFAULT 0,
+    sum_nutriente DOUBLE PRECISION NOT NULL DEFAULT 0,
+    min_nutriente REAL,
+    max_nutriente REAL,
+    last_nutriente REAL,
+    last_ts TIMESTAMP,
+    PRIMARY KEY (sensor_id, bucket)
+);
+
+-- Carga em lote de CSVs (db/seed.py): offset já carregado por arquivo, gravado na mesma
+-- transação do COPY de cada bloco (retomar não duplica linhas)
+CREATE TABLE IF NOT EXISTS seed_progress (
+    source TEXT PRIMARY KEY,
+    tabela TEXT NOT NULL,
+    offset_bytes BIGINT NOT NULL DEFAULT 0,
+    rows_loaded BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- índices secundários removidos durante uma carga grande, recriados no fim (ou na retomada)
+CREATE TABLE IF NOT EXISTS seed_indexes (
+    name TEXT PRIMARY KEY,
+    tabela TEXT NOT NULL,
+    definition TEXT NOT NULL
+);
+
+-- último valor / janela por sensor; em sensors é criado em todas as partições
+CREATE INDEX IF NOT EXISTS idx_sensors_sensor_ts ON sensors(sensor_id, ts DESC);
 CREATE INDEX IF NOT EXISTS idx_weather_ts ON weather(ts);
 CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections(ts);
+CREATE INDEX IF NOT EXISTS idx_sensor_rollup_1m_bucket ON sensor_rollup_1m(bucket);
+CREATE INDEX IF NOT EXISTS idx_sensor_rollup_1h_bucket ON sensor_rollup_1h(bucket);
+CREATE INDEX IF NOT EXISTS idx_sensor_rollup_1d_bucket ON sensor_rollup_1d(bucket);
@@ -0,0 +1,469 @@
+"""
+seed.py
+Carga em lote de CSVs no PostgreSQL (tabelas de db/schema.sql).
+
+  seed      db/data_samples/*.csv (sensors/weather/detections)
+  backfill  históricos do bridge (db/sensors_ingest*.csv, OUT_CSV) ou os arquivos indicados
+
+- cada arquivo é lido em blocos de ``--chunk-mb`` (cortados no último '\\n'), convertido de
+  forma vetorizada (to_datetime/to_numeric, valores inválidos viram NULL) e enviado com COPY
+- arquivos diferentes carregam em paralelo (``--jobs`` conexões)
+- retomável: o offset em bytes de cada arquivo vai para seed_progress na mesma transação
+  do COPY; rodar de novo continua de onde parou (ou carrega só o que foi anexado)
+- cargas grandes (``--drop-indexes auto``: acima de SEED_DROP_INDEX_MB por tabela) removem os
+  índices secundários antes e recriam no fim; as definições ficam em seed_indexes, então
+  uma carga interrompida recria os índices na próxima execução
+- sensors: cria as partições mensais dos blocos, recria sensor_latest e aplica BRIN nos
+  meses fechados ao final
+- arquivos sem tabela correspondente (ex.: reports/farmtech_summary_*.csv) são ignorados
+
+Uso:
+    python db/seed.py seed
+    python db/seed.py backfill db/sensors_ingest.w0.csv db/sensors_ingest.w1.csv --jobs 2
+    python db/seed.py status
+    python db/seed.py bench --rows 2000000
+"""
+
+import io
+import os
+import csv
+import sys
+import time
+import glob
+import logging
+import threading
+from datetime import date
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # sem pyarrow: DataFrame.to_csv
+    pa = None
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.partitions import SCHEMA_SQL, _month_add, brin_cold_partitions, is_partitioned
+
+logger = logging.getLogger("data.seed")
+
+SEED_DIR = ROOT / "db" / "data_samples"
+SEED_CHUNK_MB = float(os.getenv("SEED_CHUNK_MB", "32"))
+SEED_JOBS = int(os.getenv("SEED_JOBS", "3"))
+SEED_DROP_INDEX_MB = float(os.getenv("SEED_DROP_INDEX_MB", "256"))
+SEED_MAINTENANCE_WORK_MEM = os.getenv("SEED_MAINTENANCE_WORK_MEM", "256MB")
+
+# colunas carregáveis de cada tabela e como converter
+TABLES = {
+    "sensors": {"text": ["sensor_id"], "numeric": ["umidade", "nutriente"], "dates": ["ts"]},
+    "weather": {"text": [], "numeric": ["temp", "chuva", "vento"], "dates": ["ts"]},
+    "detections": {"text": ["categoria", "meta"], "numeric": ["confianca"], "dates": ["ts"]},
+}
+
+
+def table_for(path) -> str:
+    """Tabela de destino pelo nome do arquivo (sensors*.csv, weather*.csv, detections*.csv)."""
+    stem = Path(path).name.lower()
+    for table in TABLES:
+        if stem.startswith(table):
+            return table
+    return None
+
+
+def _connect(database_url: str = None, schema: str = None):
+    import psycopg2
+
+    if database_url is None:
+        from data_pipeline.config import DATABASE_URL as database_url
+    kwargs = {"options": f"-c search_path={schema}"} if schema else {}
+    conn = psycopg2.connect(database_url, **kwargs)
+    conn.set_client_encoding("UTF8")
+    return conn
+
+
+@contextmanager
+def _session(database_url: str = None, schema: str = None):
+    """Conexão com commit/rollback no fim do bloco e fechada em seguida."""
+    conn = _connect(database_url, schema)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def convert_chunk(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Tipos da tabela, coluna a coluna (sem apply por linha); inválidos viram NaN/NaT -> NULL."""
+    spec = TABLES[table]
+    for c in spec["dates"]:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    for c in spec["numeric"]:
+        if c in df.columns and not pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def _copy_payload(df: pd.DataFrame):
+    """
+    CSV do bloco para o COPY. NaN/NaT viram campo vazio sem aspas, que o COPY (FORMAT csv)
+    lê como NULL. Com pyarrow o CSV sai ~10x mais rápido que DataFrame.to_csv (o gargalo
+    da carga: ~4.5 s por milhão de linhas).
+    """
+    if pa is not None:
+        for c in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[c]):
+                df[c] = df[c].astype("datetime64[us]")  # 6 casas: o que o timestamp do PG guarda
+        sink = pa.BufferOutputStream()
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink,
+                         pa_csv.WriteOptions(include_header=False))
+        return pa.BufferReader(sink.getvalue())
+    buf = io.StringIO()
+    df.to_csv(buf, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S.%f")
+    buf.seek(0)
+    return buf
+
+
+class Seeder:
+    def __init__(self, database_url: str = None, schema: str = None, jobs: int = SEED_JOBS,
+                 chunk_mb: float = SEED_CHUNK_MB, drop_indexes: str = "auto"):
+        self.database_url = database_url
+        self.schema = schema
+        self.jobs = max(1, int(jobs))
+        self.chunk_bytes = int(chunk_mb * 1024 * 1024)
+        self.drop_indexes = drop_indexes
+        self._months = set()
+        self._partitioned = True
+        self._dropping = set()
+        self._ddl_lock = threading.Lock()
+
+    def connect(self):
+        return _connect(self.database_url, self.schema)
+
+    def session(self):
+        return _session(self.database_url, self.schema)
+
+    # ---------- esquema / índices ----------
+    def ensure_schema(self):
+        names = list(TABLES) + ["seed_progress", "seed_indexes"]
+        with self.session() as conn, conn.cursor() as cur:
+            cur.execute("SELECT count(to_regclass(n)) FROM unnest(%s::text[]) AS n", (names,))
+            if cur.fetchone()[0] < len(names):
+                cur.execute(SCHEMA_SQL.read_text(encoding="utf-8"))
+            self._partitioned = is_partitioned(cur)
+        if not self._partitioned:
+            logger.warning("sensors não é particionada (schema anterior); carregando sem partições. "
+                           "Atualize com: python db/partitions.py migrate")
+
+    def _drop_secondary(self, cur, table: str) -> list:
+        """Registra em seed_indexes e remove os índices não únicos de ``table`` (e partições)."""
+        cur.execute("""
+            SELECT ci.relname, pg_get_indexdef(i.indexrelid)
+            FROM pg_partition_tree(%s::regclass) t
+            JOIN pg_index i ON i.indrelid = t.relid
+            JOIN pg_class ci ON ci.oid = i.indexrelid
+            WHERE NOT i.indisunique
+              AND NOT EXISTS (SELECT 1 FROM pg_inherits h WHERE h.inhrelid = i.indexrelid)
+        """, (table,))
+        dropped = []
+        for name, definition in cur.fetchall():
+            cur.execute("INSERT INTO seed_indexes (name, tabela, definition) VALUES (%s, %s, %s) "
+                        "ON CONFLICT (name) DO NOTHING", (name, table, definition))
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+            dropped.append(name)
+        return dropped
+
+    def drop_indexes_for(self, tables):
+        with self.session() as conn, conn.cursor() as cur:
+            for table in tables:
+                dropped = self._drop_secondary(cur, table)
+                self._dropping.add(table)
+                logger.info("%s: %d índices removidos até o fim da carga", table, len(dropped))
+
+    def rebuild_indexes(self) -> float:
+        """Recria (em paralelo) tudo o que estiver em seed_indexes; retorna os segundos gastos."""
+        with self.session() as conn, conn.cursor() as cur:
+            cur.execute("SELECT name, definition FROM seed_indexes ORDER BY tabela, name")
+            pending = cur.fetchall()
+        if not pending:
+            return 0.0
+
+        def build(item):
+            name, definition = item
+            # índice de tabela particionada sai como "ON ONLY": sem ONLY recria nas partições
+            sql = definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1).replace(" ON ONLY ", " ON ", 1)
+            with self.session() as conn, conn.cursor() as cur:
+                cur.execute("SET maintenance_work_mem = %s", (SEED_MAINTENANCE_WORK_MEM,))
+                cur.execute(sql)
+                cur.execute("DELETE FROM seed_indexes WHERE name = %s", (name,))
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            list(pool.map(build, pending))
+        elapsed = time.perf_counter() - t0
+        self._dropping.clear()
+        logger.info("%d índices recriados em %.1fs", len(pending), elapsed)
+        return elapsed
+
+    def _ensure_months(self, months):
+        """Partições mensais de sensors para os meses do bloco (conexão própria, fora do COPY)."""
+        missing = sorted(set(months) - self._months)
+        if not missing or not self._partitioned:
+            return
+        with self._ddl_lock:
+            missing = sorted(set(months) - self._months)
+            if not missing:
+                return
+            with self.session() as conn, conn.cursor() as cur:
+                for month in missing:
+                    cur.execute("SELECT sensors_create_partition(%s)", (month,))
+                if "sensors" in self._dropping:  # partição nova já nasce com índice em ts
+                    self._drop_secondary(cur, "sensors")
+            self._months.update(missing)
+
+    # ---------- progresso ----------
+    def progress(self) -> dict:
+        with self.session() as conn, conn.cursor() as cur:
+            cur.execute("SELECT source, tabela, offset_bytes, rows_loaded, updated_at FROM seed_progress")
+            return {r[0]: r[1:] for r in cur.fetchall()}
+
+    # ---------- carga ----------
+    def load_file(self, path, table: str, complete_tail: bool = True) -> dict:
+        """
+        Carrega ``path`` a partir do offset salvo. ``complete_tail``: a última linha sem '\\n'
+        conta como completa (arquivo estático); no backfill de arquivo vivo ela fica para depois.
+        """
+        path = Path(path).resolve()
+        source = str(path)
+        size = path.stat().st_size
+        stats = {"file": path.name, "table": table, "rows": 0, "seconds": 0.0, "skipped": False}
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT offset_bytes FROM seed_progress WHERE source = %s", (source,))
+                row = cur.fetchone()
+            conn.commit()
+            offset = row[0] if row else 0
+            if offset > size:
+                logger.warning("%s encolheu (%d < offset %d): ignorado; remova a linha em seed_progress "
+                               "para recarregar", path.name, size, offset)
+                stats["skipped"] = True
+                return stats
+            if offset == size:
+                return stats
+            t0 = time.perf_counter()
+            with open(path, "rb") as f:
+                header_line = f.readline()
+                header = next(csv.reader([header_line.decode("utf-8-sig")]))
+                spec = TABLES[table]
+                wanted = spec["text"] + spec["numeric"] + spec["dates"]
+                columns = [c for c in header if c in wanted]
+                if not columns:
+                    logger.warning("%s: nenhuma coluna de %s no cabeçalho %s", path.name, table, header)
+                    stats["skipped"] = True
+                    return stats
+                copy_sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, ", ".join(columns))
+                pos = max(offset, len(header_line))
+                while pos < size:
+                    f.seek(pos)
+                    data = f.read(min(self.chunk_bytes, size - pos))
+                    end = data.rfind(b"\n") + 1
+                    if pos + len(data) >= size and end < len(data) and complete_tail:
+                        end = len(data)
+                    if end == 0:
+                        if len(data) < self.chunk_bytes:
+                            break  # última linha ainda sendo escrita
+                        raise ValueError(f"{path.name}: linha maior que --chunk-mb em {pos}")
+                    df = pd.read_csv(io.BytesIO(data[:end]), header=None, names=header,
+                                     usecols=columns, dtype={c: str for c in spec["text"] if c in columns})
+                    df = convert_chunk(df, table)[columns]
+                    if table == "sensors":
+                        ts = df["ts"].dropna()
+                        if not ts.empty:
+                            first, last = ts.min().date().replace(day=1), ts.max().date().replace(day=1)
+                            months, m = [], first
+                            while m <= last:
+                                months.append(m)
+                                m = _month_add(m, 1)
+                            self._ensure_months(months)
+                    with conn.cursor() as cur:
+                        cur.copy_expert(copy_sql, _copy_payload(df))
+                        cur.execute("""
+                            INSERT INTO seed_progress (source, tabela, offset_bytes, rows_loaded) VALUES (%s, %s, %s, %s)
+                            ON CONFLICT (source) DO UPDATE SET offset_bytes = EXCLUDED.offset_bytes,
+                                rows_loaded = seed_progress.rows_loaded + EXCLUDED.rows_loaded, updated_at = now()
+                        """, (source, table, pos + end, len(df)))
+                    conn.commit()
+                    pos += end
+                    stats["rows"] += len(df)
+            stats["seconds"] = time.perf_counter() - t0
+            logger.info("%s -> %s: %s linhas em %.1fs (%s linhas/s)", path.name, table, f"{stats['rows']:,}",
+                        stats["seconds"], f"{stats['rows'] / max(stats['seconds'], 1e-9):,.0f}")
+            return stats
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def run(self, files, complete_tail: bool = True, rebuild_latest: bool = True) -> dict:
+        """Carrega ``files`` (tabela pelo nome) em paralelo; índices/partições/latest conforme o caso."""
+        plan = []
+        for f in files:
+            table = table_for(f)
+            if table is None:
+                logger.warning("%s: sem tabela correspondente em db/schema.sql; ignorado", f)
+                continue
+            plan.append((Path(f), table))
+        self.ensure_schema()
+        done = self.progress()
+        pending_bytes = {}
+        for path, table in plan:
+            offset = done.get(str(path.resolve()), (None, 0))[1]
+            pending_bytes[table] = pending_bytes.get(table, 0) + max(0, path.stat().st_size - offset)
+        if self.drop_indexes == "always":
+            big = [t for t, b in pending_bytes.items() if b > 0]
+        elif self.drop_indexes == "auto":
+            big = [t for t, b in pending_bytes.items() if b >= SEED_DROP_INDEX_MB * 1024 * 1024]
+        else:
+            big = []
+        if big:
+            self.drop_indexes_for(big)
+
+        t0 = time.perf_counter()
+        # maiores primeiro: o arquivo mais longo não fica por último numa conexão só
+        plan.sort(key=lambda p: p[0].stat().st_size, reverse=True)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            results = list(pool.map(lambda p: self.load_file(p[0], p[1], complete_tail), plan))
+        load_s = time.perf_counter() - t0
+        index_s = self.rebuild_indexes()  # inclui índices pendentes de uma execução interrompida
+
+        loaded = {r["table"] for r in results if r["rows"]}
+        with self.session() as conn, conn.cursor() as cur:
+            if "sensors" in loaded:
+                brin_cold_partitions(cur)
+            for table in loaded:
+                cur.execute(f"ANALYZE {table}")
+        if "sensors" in loaded and rebuild_latest and self.schema is None:
+            from db.latest import rebuild_from_pg
+            rebuild_from_pg(self.database_url)
+        rows = sum(r["rows"] for r in results)
+        total_s = time.perf_counter() - t0
+        summary = {"files": len(results), "rows": rows, "load_s": load_s, "index_s": index_s, "total_s": total_s,
+                   "rows_per_s": rows / total_s if total_s > 0 else 0.0, "results": results}
+        logger.info("total: %s linhas, carga %.1fs + índices %.1fs -> %s linhas/s", f"{rows:,}", load_s, index_s,
+                    f"{summary['rows_per_s']:,.0f}")
+        return summary
+
+
+def default_backfill_files() -> list:
+    out_csv = os.getenv("OUT_CSV", str(ROOT / "db" / "sensors_ingest.csv"))
+    stem = Path(out_csv)
+    pattern = str(stem.with_name(stem.stem + "*" + stem.suffix))
+    return sorted(set(glob.glob(pattern)))
+
+
+# ---------- benchmark ----------
+def _bench(database_url: str, rows: int, jobs: int):
+    """Carga de CSVs sintéticos num schema descartável: linha a linha x COPY x COPY sem índices."""
+    import tempfile
+    import numpy as np
+    from psycopg2.extras import execute_batch
+
+    tmp = Path(tempfile.mkdtemp(prefix="seed_bench_"))
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp(date.today().replace(day=1)) - pd.DateOffset(months=2)
+    ts = pd.date_range(start, pd.Timestamp.now(), periods=rows)
+    pd.DataFrame({"sensor_id": "esp32-" + pd.Series(rng.integers(0, 200, rows)).astype(str).str.zfill(2),
+                  "ts": ts.strftime("%Y-%m-%dT%H:%M:%S"), "umidade": rng.uniform(20, 60, rows).round(1),
+                  "nutriente": rng.uniform(0, 20, rows).round(1)}).to_csv(tmp / "sensors.csv", index=False)
+    k = max(1, rows // 10)
+    tsk = ts[::10][:k]
+    pd.DataFrame({"ts": tsk.strftime("%Y-%m-%dT%H:%M:%S"), "temp": rng.uniform(10, 35, k).round(1),
+                  "chuva": rng.uniform(0, 5, k).round(1), "vento": rng.uniform(0, 10, k).round(1)}
+                 ).to_csv(tmp / "weather.csv", index=False)
+    pd.DataFrame({"ts": tsk.strftime("%Y-%m-%dT%H:%M:%S"), "categoria": rng.choice(["praga_mosca", "planta_saudavel"], k),
+                  "confianca": rng.uniform(0.5, 1, k).round(2)}).to_csv(tmp / "detections.csv", index=False)
+    files = [tmp / "sensors.csv", tmp / "weather.csv", tmp / "detections.csv"]
+    total = rows + 2 * k
+    print(f"{rows:,} sensors + {k:,} weather + {k:,} detections ({sum(f.stat().st_size for f in files) / 1e6:.0f} MB)")
+
+    schema = "farmtech_seed_bench"
+
+    def fresh():
+        with _session(database_url) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema}")
+        with _session(database_url, schema) as conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_SQL.read_text(encoding="utf-8"))
+
+    try:
+        # linha a linha (INSERT por linha em lotes de 1000), numa amostra
+        fresh()
+        sample = min(rows, 100_000)
+        df = convert_chunk(pd.read_csv(files[0], nrows=sample), "sensors")
+        t0 = time.perf_counter()
+        with _session(database_url, schema) as conn, conn.cursor() as cur:
+            Seeder(database_url, schema)._ensure_months(sorted({d.replace(day=1) for d in df["ts"].dt.date}))
+            execute_batch(cur, "INSERT INTO sensors (sensor_id, ts, umidade, nutriente) VALUES (%s, %s, %s, %s)",
+                          df[["sensor_id", "ts", "umidade", "nutriente"]].astype(object).values.tolist(), page_size=1000)
+        dt = time.perf_counter() - t0
+        print(f"{'INSERT por linha (amostra)':34s} {sample:>10,} linhas {dt:7.1f}s {sample / dt:>10,.0f} linhas/s")
+
+        for label, kwargs in (("COPY, 1 conexão, índices mantidos", {"jobs": 1, "drop_indexes": "never"}),
+                              (f"COPY, {jobs} conexões, índices mantidos", {"jobs": jobs, "drop_indexes": "never"}),
+                              (f"COPY, {jobs} conexões, sem índices+rebuild", {"jobs": jobs, "drop_indexes": "always"})):
+            fresh()
+            s = Seeder(database_url, schema, **kwargs).run(files, rebuild_latest=False)
+            print(f"{label:34s} {s['rows']:>10,} linhas {s['total_s']:7.1f}s {s['rows_per_s']:>10,.0f} linhas/s "
+                  f"(índices {s['index_s']:.1f}s)")
+            assert s["rows"] == total, "linhas carregadas divergem"
+        # retomada: nada a fazer
+        s = Seeder(database_url, schema).run(files, rebuild_latest=False)
+        print(f"{'nova execução (retomada)':34s} {s['rows']:>10,} linhas {s['total_s']:7.1f}s")
+    finally:
+        with _session(database_url) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        for f in files:
+            f.unlink()
+        tmp.rmdir()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Carga em lote de CSVs no PostgreSQL (COPY, retomável)")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, help_ in (("seed", "db/data_samples/*.csv"), ("backfill", "históricos do bridge (sensors_ingest*.csv)")):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("files", nargs="*", help="CSVs (tabela pelo nome: sensors*/weather*/detections*)")
+        p.add_argument("--jobs", type=int, default=SEED_JOBS)
+        p.add_argument("--chunk-mb", type=float, default=SEED_CHUNK_MB)
+        p.add_argument("--drop-indexes", choices=["auto", "always", "never"], default="auto")
+        p.add_argument("--no-latest", action="store_true", help="Não recalcula sensor_latest")
+    sub.add_parser("status", help="Progresso salvo em seed_progress")
+    p = sub.add_parser("bench", help="INSERT x COPY x COPY sem índices num schema descartável")
+    p.add_argument("--rows", type=int, default=2_000_000)
+    p.add_argument("--jobs", type=int, default=SEED_JOBS)
+    args = parser.parse_args()
+
+    if args.cmd == "bench":
+        _bench(args.database_url, args.rows, args.jobs)
+    elif args.cmd == "status":
+        for source, (tabela, offset, n, updated) in sorted(Seeder(args.database_url).progress().items()):
+            print(f"{tabela:11s} {n:>12,} linhas  {offset:>14,} bytes  {updated:%Y-%m-%d %H:%M}  {source}")
+    else:
+        files = args.files or (sorted(str(p) for p in SEED_DIR.glob("*.csv")) if args.cmd == "seed"
+                               else default_backfill_files())
+        if not files:
+            raise SystemExit("nenhum CSV para carregar")
+        seeder = Seeder(args.database_url, jobs=args.jobs, chunk_mb=args.chunk_mb, drop_indexes=args.drop_indexes)
+        # seed: arquivos estáticos; backfill: o bridge pode estar anexando ao arquivo
+        seeder.run(files, complete_tail=args.cmd == "seed", rebuild_latest=not args.no_latest)
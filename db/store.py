@@ -0,0 +1,387 @@
+"""
+store.py
+Armazenamento colunar (Parquet) das leituras dos sensores, particionado por dia.
+
+Layout (partições no estilo Hive, lidas com pyarrow.dataset):
+    <root>/date=2025-11-16/part-<ns>-<pid>-<n>.parquet
+    <root>/date=2025-11-16/sensor_id=esp32-01/part-...parquet   (partition_by_sensor=True)
+
+- write(): um arquivo novo por partição a cada lote (escrita atômica: .tmp + rename)
+- compact(): junta os arquivos pequenos de cada partição num só, ordenado por ts
+  (Compactor roda em background no bridge)
+- read_range(): filtro de tempo, sensores e colunas empurrado para o scan — partições
+  fora do intervalo nem são abertas, e só as colunas pedidas são lidas
+
+Migração e benchmark:
+    python db/store.py import db/data_samples/sensors.csv
+    python db/store.py compact
+    python db/store.py bench --rows 2000000 --days 90
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.frames import compact_table
+
+logger = logging.getLogger("data.store")
+
+DEFAULT_STORE_DIR = os.getenv("PARQUET_STORE_DIR", str(ROOT / "db" / "store"))
+
+SCHEMA = pa.schema([
+    ("sensor_id", pa.string()),
+    ("umidade", pa.float64()),
+    ("nutriente", pa.float64()),
+    ("ts", pa.timestamp("us")),
+])
+_META_FILE = "_store.json"
+_IGNORE = [".", "_"]  # .tmp em escrita e _store.json ficam fora do dataset
+_seq = count()
+
+
+def _local_naive(v):
+    """datetime ingênuo em hora local (como db/rollups._ts); com fuso é convertido, inválido -> None."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        v = v.to_pydatetime()
+    elif not isinstance(v, datetime):
+        text = str(v).strip()
+        if text[-1:] in ("Z", "z"):
+            text = text[:-1] + "+00:00"  # fromisoformat só aceita "Z" a partir do Python 3.11
+        try:
+            v = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    return v if v.tzinfo is None else v.astimezone().replace(tzinfo=None)
+
+
+def _to_ts(values: pd.Series) -> pd.Series:
+    """ts -> datetime64[us] ingênuo em hora local; inválido vira NaT em vez de levantar (o lote inteiro voltaria ao buffer)."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        try:
+            values = pd.to_datetime(values, format="ISO8601", errors="coerce")
+        except (TypeError, ValueError):  # com e sem fuso (ou fusos diferentes) no mesmo lote
+            values = pd.to_datetime(values.map(_local_naive), errors="coerce")
+    if getattr(values.dtype, "tz", None) is not None or values.dtype == object:
+        values = pd.to_datetime(values.map(_local_naive), errors="coerce")
+    return values.dt.floor("us").astype("datetime64[us]")
+
+
+def _to_frame(rows) -> pd.DataFrame:
+    """Lista de dicts do bridge (ou DataFrame) -> DataFrame com os tipos do SCHEMA."""
+    if isinstance(rows, pd.DataFrame):
+        df = rows.reindex(columns=SCHEMA.names)
+    else:
+        df = pd.DataFrame.from_records(rows, columns=SCHEMA.names)
+    df["sensor_id"] = df["sensor_id"].astype("string")
+    df["umidade"] = pd.to_numeric(df["umidade"], errors="coerce")
+    df["nutriente"] = pd.to_numeric(df["nutriente"], errors="coerce")
+    df["ts"] = _to_ts(df["ts"])
+    return df
+
+
+class ParquetStore:
+
+    def __init__(self, root: str = None, partition_by_sensor: bool = None):
+        self.root = Path(root or DEFAULT_STORE_DIR)
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta_path = self.root / _META_FILE
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        if "partition_by_sensor" in meta:
+            if partition_by_sensor is not None and bool(partition_by_sensor) != meta["partition_by_sensor"]:
+                raise ValueError(f"{self.root} já foi criado com partition_by_sensor={meta['partition_by_sensor']}")
+            partition_by_sensor = meta["partition_by_sensor"]
+        else:
+            partition_by_sensor = bool(partition_by_sensor)
+            meta_path.write_text(json.dumps({"partition_by_sensor": partition_by_sensor}))
+        self.partition_by_sensor = partition_by_sensor
+
+        fields = [("date", pa.string())]
+        if partition_by_sensor:
+            fields.append(("sensor_id", pa.string()))
+        self._partitioning = ds.partitioning(pa.schema(fields), flavor="hive")
+        self._file_schema = SCHEMA.remove(0) if partition_by_sensor else SCHEMA
+        self._compact_lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.files_written = 0
+
+    # ---------- escrita ----------
+    def _partition_dir(self, day: str, sensor_id=None) -> Path:
+        d = self.root / f"date={day}"
+        if self.partition_by_sensor:
+            d = d / f"sensor_id={quote(str(sensor_id), safe='')}"
+        return d
+
+    def _write_file(self, directory: Path, table: pa.Table, prefix: str = "part") -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{prefix}-{time.time_ns()}-{os.getpid()}-{next(_seq)}.parquet"
+        tmp = directory / f".{name}.tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        final = directory / name
+        os.replace(tmp, final)
+        return final
+
+    def write(self, rows) -> int:
+        """Grava um lote (lista de dicts ou DataFrame); devolve as linhas gravadas."""
+        df = _to_frame(rows)
+        bad = df["ts"].isna()
+        if bad.any():
+            self.rows_dropped += int(bad.sum())
+            logger.warning("Store: %s linhas sem ts válido descartadas", int(bad.sum()))
+            df = df[~bad]
+        if df.empty:
+            return 0
+        keys = [df["ts"].dt.strftime("%Y-%m-%d")]
+        if self.partition_by_sensor:
+            keys.append(df["sensor_id"])
+        for key, part in df.groupby(keys, sort=False):
+            day, sensor_id = (key[0], key[1]) if self.partition_by_sensor else (key[0], None)
+            if self.partition_by_sensor:
+                part = part.drop(columns=["sensor_id"])
+            table = pa.Table.from_pandas(part, schema=self._file_schema, preserve_index=False)
+            self._write_file(self._partition_dir(day, sensor_id), table)
+            self.files_written += 1
+        self.rows_written += len(df)
+        return len(df)
+
+    # ---------- compactação ----------
+    def _leaf_dirs(self):
+        pattern = "date=*/sensor_id=*" if self.partition_by_sensor else "date=*"
+        return sorted(p for p in self.root.glob(pattern) if p.is_dir())
+
+    def compact(self, min_files: int = 4, small_bytes: int = 8 * 1024 * 1024) -> dict:
+        """
+        Junta, em cada partição, os arquivos menores que ``small_bytes`` quando houver
+        pelo menos ``min_files`` deles. Os arquivos novos que chegarem durante a
+        compactação não são tocados; os antigos só são apagados depois do rename do novo.
+        """
+        merged = partitions = 0
+        with self._compact_lock:
+            for leaf in self._leaf_dirs():
+                small = sorted(p for p in leaf.glob("*.parquet") if p.stat().st_size < small_bytes)
+                if len(small) < min_files:
+                    continue
+                table = pa.concat_tables(pq.read_table(p, schema=self._file_schema) for p in small)
+                table = table.sort_by("ts")
+                self._write_file(leaf, table, prefix="compact")
+                for p in small:
+                    p.unlink(missing_ok=True)
+                merged += len(small)
+                partitions += 1
+        if partitions:
+            logger.info("Store: %s arquivos compactados em %s partições", merged, partitions)
+        return {"partitions": partitions, "files_merged": merged}
+
+    # ---------- leitura ----------
+    def dataset(self):
+        return ds.dataset(str(self.root), format="parquet", partitioning=self._partitioning,
+                          schema=SCHEMA.append(pa.field("date", pa.string())), ignore_prefixes=_IGNORE)
+
+    def read_range(self, start=None, end=None, sensors=None, columns=None, compact_types: bool = False) -> pd.DataFrame:
+        """
+        Leituras com ``start <= ts < end`` (datetime/str, ambos opcionais), dos ``sensors``
+        pedidos (todos se None) e só com as ``columns`` pedidas (padrão: todas do SCHEMA).
+        O filtro por dia poda partições; o filtro de ts e sensor vai para o scan do Parquet.
+        ``compact_types``: sensor_id category e leituras float32, convertidos ainda no Arrow
+        (db/frames.py); os rollups continuam lendo float64.
+        """
+        columns = list(columns) if columns else list(SCHEMA.names)
+        flt = None
+
+        def _and(expr):
+            return expr if flt is None else flt & expr
+
+        if start is not None:
+            start = pd.Timestamp(start)
+            flt = _and((ds.field("date") >= start.strftime("%Y-%m-%d")) & (ds.field("ts") >= start.to_datetime64()))
+        if end is not None:
+            end = pd.Timestamp(end)
+            flt = _and((ds.field("date") <= end.strftime("%Y-%m-%d")) & (ds.field("ts") < end.to_datetime64()))
+        if sensors is not None:
+            flt = _and(ds.field("sensor_id").isin([str(s) for s in sensors]))
+
+        for attempt in range(3):
+            try:
+                table = self.dataset().to_table(columns=columns, filter=flt)
+                break
+            except (FileNotFoundError, OSError):
+                # arquivo removido por uma compactação entre a listagem e a leitura
+                if attempt == 2:
+                    raise
+                time.sleep(0.05)
+        return compact_table(table) if compact_types else table.to_pandas()
+
+    def latest(self, n: int = 20, columns=None) -> pd.DataFrame:
+        """As ``n`` leituras mais recentes, lendo as partições de dia da mais nova para a mais velha."""
+        columns = list(columns) if columns else list(SCHEMA.names)
+        cols = columns if "ts" in columns else columns + ["ts"]
+        days = sorted({p.name.split("=", 1)[1] for p in self.root.glob("date=*") if p.is_dir()}, reverse=True)
+        parts, total = [], 0
+        for day in days:
+            table = self.dataset().to_table(columns=cols, filter=ds.field("date") == day)
+            if table.num_rows:
+                parts.append(table.to_pandas())
+                total += table.num_rows
+            if total >= n:
+                break
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(parts, ignore_index=True).sort_values("ts", ascending=False).head(n)
+        return df[columns].reset_index(drop=True)
+
+    def read_recent(self, days: float = 7, columns=None, sensors=None, compact_types: bool = False) -> pd.DataFrame:
+        return self.read_range(start=pd.Timestamp.now() - pd.Timedelta(days=days), columns=columns, sensors=sensors,
+                               compact_types=compact_types)
+
+    def is_empty(self) -> bool:
+        return not any(self.root.glob("date=*"))
+
+    def stats(self) -> dict:
+        files = list(self.root.rglob("*.parquet"))
+        return {
+            "root": str(self.root),
+            "partitions": len(self._leaf_dirs()),
+            "files": len(files),
+            "bytes": sum(p.stat().st_size for p in files),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+        }
+
+    def import_csv(self, path: str, chunksize: int = 500000) -> int:
+        """Migra um CSV no formato do bridge (sensor_id, umidade, nutriente, ts) para o store."""
+        total = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            total += self.write(chunk)
+        return total
+
+
+class Compactor(threading.Thread):
+    """Thread de compactação periódica do store (um por diretório: só o worker 0 do bridge)."""
+
+    def __init__(self, store: ParquetStore, interval: float = 300.0, min_files: int = 4):
+        super().__init__(name="store-compactor", daemon=True)
+        self.store = store
+        self.interval = float(interval)
+        self.min_files = min_files
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            try:
+                self.store.compact(min_files=self.min_files)
+            except Exception:
+                logger.exception("Store: falha na compactação")
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=5)
+
+
+_default_store = None
+
+def get_store(root: str = None):
+    """Store padrão (PARQUET_STORE_DIR) compartilhado pelos consumidores; None se ainda não há dados."""
+    global _default_store
+    if root is not None:
+        store = ParquetStore(root)
+        return None if store.is_empty() else store
+    if _default_store is None:
+        if not Path(DEFAULT_STORE_DIR).exists():
+            return None
+        _default_store = ParquetStore(DEFAULT_STORE_DIR)
+    return None if _default_store.is_empty() else _default_store
+
+
+def _bench(rows: int, days: int, sensors: int, directory: Path):
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    end = pd.Timestamp.now().floor("s")
+    ts = end - pd.to_timedelta(np.sort(rng.uniform(0, days * 86400, rows))[::-1], unit="s")
+    df = pd.DataFrame({
+        "sensor_id": [f"esp32-{i:04d}" for i in rng.integers(0, sensors, rows)],
+        "umidade": rng.uniform(20, 80, rows).round(2),
+        "nutriente": rng.uniform(5, 20, rows).round(2),
+        "ts": ts,
+    })
+    csv_path = directory / "sensors.csv"
+    df.assign(ts=df["ts"].dt.strftime("%Y-%m-%dT%H:%M:%S")).to_csv(csv_path, index=False)
+
+    store = ParquetStore(str(directory / "store"))
+    t0 = time.perf_counter()
+    for start in range(0, rows, 2000):  # lotes do tamanho de um flush do bridge
+        store.write(df.iloc[start:start + 2000])
+    t_write = time.perf_counter() - t0
+    files_before = store.stats()["files"]
+    t0 = time.perf_counter()
+    store.compact(min_files=2)
+    t_compact = time.perf_counter() - t0
+    print(f"{rows} linhas, {days} dias: escrita {t_write:.2f}s, compactação {t_compact:.2f}s "
+          f"({files_before} -> {store.stats()['files']} arquivos, "
+          f"{store.stats()['bytes'] / 1e6:.1f} MB vs CSV {csv_path.stat().st_size / 1e6:.1f} MB)")
+
+    week = end - pd.Timedelta(days=7)
+    t0 = time.perf_counter()
+    full = pd.read_csv(csv_path)
+    full["ts"] = pd.to_datetime(full["ts"])
+    legacy = full[full["ts"] >= week]
+    t_csv = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    got = store.read_range(start=week)
+    t_store = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    got_cols = store.read_range(start=week, columns=["ts", "umidade"])
+    t_cols = time.perf_counter() - t0
+    print(f"última semana via read_csv + filtro : {t_csv * 1000:8.1f} ms ({len(legacy)} linhas)")
+    print(f"última semana via read_range        : {t_store * 1000:8.1f} ms ({len(got)} linhas)")
+    print(f"última semana, 2 colunas            : {t_cols * 1000:8.1f} ms ({len(got_cols)} linhas)")
+
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Store Parquet particionado das leituras")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_imp = sub.add_parser("import", help="Importa um CSV de leituras para o store")
+    p_imp.add_argument("csv")
+    p_imp.add_argument("--root", default=None)
+    p_imp.add_argument("--by-sensor", action="store_true", help="Particiona também por sensor_id")
+    p_cmp = sub.add_parser("compact", help="Compacta os arquivos pequenos")
+    p_cmp.add_argument("--root", default=None)
+    p_cmp.add_argument("--min-files", type=int, default=2)
+    p_bench = sub.add_parser("bench", help="read_csv inteiro vs read_range da última semana")
+    p_bench.add_argument("--rows", type=int, default=1000000)
+    p_bench.add_argument("--days", type=int, default=90)
+    p_bench.add_argument("--sensors", type=int, default=500)
+    p_bench.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "import":
+        store = ParquetStore(args.root, partition_by_sensor=args.by_sensor or None)
+        n = store.import_csv(args.csv)
+        print(f"{n} linhas importadas para {store.root}: {store.stats()}")
+    elif args.cmd == "compact":
+        store = ParquetStore(args.root)
+        print(store.compact(min_files=args.min_files), store.stats())
+    else:
+        _bench(args.rows, args.days, args.sensors, Path(args.dir or tempfile.mkdtemp(prefix="farmtech_store_")))
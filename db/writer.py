@@ -1,5 +1,10 @@
 from pathlib import Path
+from datetime import datetime
+import io
 import csv
+import json
+import os
+import time
 import logging
 import threading
 
@@ -7,6 +12,8 @@ logger = logging.getLogger("data.writer")
 _lock = threading.Lock()
 
 HEADER = ["sensor_id", "umidade", "nutriente", "ts"]
+SENSOR_COLUMNS = ("sensor_id", "umidade", "nutriente", "ts")
+FSYNC_POLICIES = ("never", "batch", "interval")
 
 def ensure_parent(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -30,3 +37,634 @@ def safe_write_row_csv(path: str, row: dict, header=HEADER):
         except Exception:
             logger.exception("Falha ao gravar CSV %s", p)
             raise
+
+
+class _BatchedWriter:
+    """
+    Base dos writers em lote: buffer limitado em memória + thread de flush por tempo.
+
+    O buffer é descarregado quando atinge ``max_rows`` linhas (no próprio thread que
+    chamou ``write``) ou quando a linha mais antiga espera mais que ``max_latency``
+    segundos (thread de flush). Flushes são serializados, então a ordem das linhas
+    é preservada. Subclasses implementam apenas ``_write_batch`` e ``_close``.
+    ``on_flush(rows)`` é chamado após cada lote gravado com sucesso (commit do journal).
+
+    Falha em ``_write_batch``: o lote volta para o início do buffer e é tentado de novo
+    no próximo flush (backoff exponencial até ``MAX_RETRY_DELAY``). Se o buffer passar de
+    ``max_buffer`` linhas, ele vai para ``spill_path`` (JSON lines) e é regravado, em
+    lotes de ``max_rows``, quando o destino voltar; sem ``spill_path`` as linhas mais
+    antigas são descartadas (contadas em ``dropped_rows``). Um spill que sobrou de uma
+    execução anterior é regravado no primeiro flush (at-least-once: o journal do bridge
+    também reenvia essas mensagens; o dedup por (sensor_id, ts) filtra a maior parte).
+
+    Erro permanente (``_is_permanent``: dado inválido, não destino fora): o lote é dividido
+    ao meio até isolar as linhas ruins, que vão para ``<spill>.rejected.jsonl`` (com o erro),
+    são contadas em ``rejected_rows`` e passadas a ``on_reject(rows)`` (ack no journal sem
+    alimentar ring/rollups); as boas seguem gravadas normalmente.
+    """
+
+    name = "writer"
+    MAX_RETRY_DELAY = 30.0
+    PERMANENT_ERRORS = (ValueError, TypeError)
+
+    def __init__(self, max_rows: int = 500, max_latency: float = 1.0, on_flush=None,
+                 spill_path: str = None, max_buffer: int = None, on_reject=None):
+        self.max_rows = max(1, int(max_rows))
+        self.on_flush = on_flush
+        self.on_reject = on_reject
+        self.max_latency = max(0.01, float(max_latency))
+        self.max_buffer = max(self.max_rows, int(max_buffer or self.max_rows * 20))
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.reject_path = self.spill_path.with_name(f"{self.spill_path.stem}.rejected.jsonl") \
+            if self.spill_path is not None else None
+        self._buf = []
+        self._buf_since = None
+        self._lock = threading.Lock()      # protege o buffer
+        self._io_lock = threading.Lock()   # serializa os flushes (e o spill)
+        self._closed = False
+        self._stop = threading.Event()
+
+        self._started = time.monotonic()
+        self._rows_in = 0
+        self._rows_out = 0
+        self._flushes = 0
+        self._errors = 0
+        self._flush_time = 0.0
+        self._failed_flushes = 0
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self._spilled_rows = 0
+        self._dropped_rows = 0
+        self._rejected_rows = 0
+        self._spill_pending = 0
+        self._spill_stale = 0  # primeiras linhas do spill: de uma execução anterior
+        if self.spill_path is not None:
+            ensure_parent(self.spill_path)
+            if self.spill_path.exists():
+                with self.spill_path.open("rb") as f:
+                    self._spill_pending = self._spill_stale = sum(1 for _ in f)
+                if self._spill_pending:
+                    logger.warning("%s: %s linhas de um spill anterior em %s serão regravadas",
+                                   self.name, self._spill_pending, self.spill_path)
+
+        self._timer = threading.Thread(target=self._timer_loop, name=f"{self.name}-flush", daemon=True)
+        self._timer.start()
+
+    # ---------- API pública ----------
+    def write(self, row: dict):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} já foi fechado")
+            if not self._buf:
+                self._buf_since = time.monotonic()
+            self._buf.append(row)
+            self._rows_in += 1
+            full = len(self._buf) >= self.max_rows
+        if full:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self, force: bool = False):
+        """
+        Grava o spill pendente e o buffer; devolve quantas linhas foram gravadas.
+        Depois de uma falha só tenta de novo quando o backoff vence (ou com ``force``).
+        """
+        with self._io_lock:
+            if not force and self._consecutive_failures and time.monotonic() < self._retry_at:
+                return 0
+            written = 0
+            if self._spill_pending:
+                written, ok = self._drain_spill()
+                if not ok:
+                    return written
+            with self._lock:
+                batch, self._buf = self._buf, []
+                self._buf_since = None
+            if not batch:
+                return written
+            left = self._write(batch)
+            if left:
+                self._requeue(left)
+            return written + len(batch) - len(left)
+
+    def sync(self):
+        """
+        flush forçado; levanta RuntimeError se alguma linha ficou só em memória (destino
+        fora e sem spill em disco). Usado por quem precisa confirmar a gravação antes de
+        apagar a própria cópia (ex.: replay do spill da fila de ingestão).
+        """
+        self.flush(force=True)
+        with self._lock:
+            buffered = len(self._buf)
+        if buffered and self._consecutive_failures:
+            raise RuntimeError(f"{self.name}: {buffered} linhas não gravadas (destino indisponível)")
+
+    def close(self):
+        if self._closed:
+            return
+        self._stop.set()
+        self._timer.join(timeout=max(1.0, self.max_latency * 2))
+        self.flush(force=True)
+        with self._lock:
+            self._closed = True
+            leftover, self._buf = self._buf, []
+        if leftover:
+            # destino ainda fora: o que der vai para o spill, o resto é perdido (e contado)
+            with self._io_lock:
+                self._overflow(leftover)
+        self._close()
+
+    def stats(self) -> dict:
+        """Contadores de throughput (linhas/s desde a criação, latência média de flush)."""
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        with self._lock:
+            buffered = len(self._buf)
+        return {
+            "rows_in": self._rows_in,
+            "rows_written": self._rows_out,
+            "buffered": buffered,
+            "flushes": self._flushes,
+            "errors": self._errors,
+            "failed_flushes": self._failed_flushes,
+            "consecutive_failures": self._consecutive_failures,
+            "spilled_rows": self._spilled_rows,
+            "spill_pending": self._spill_pending,
+            "dropped_rows": self._dropped_rows,
+            "rejected_rows": self._rejected_rows,
+            "avg_batch": round(self._rows_out / self._flushes, 1) if self._flushes else 0.0,
+            "avg_flush_ms": round(self._flush_time / self._flushes * 1000, 3) if self._flushes else 0.0,
+            "rows_per_s": round(self._rows_out / elapsed, 1),
+        }
+
+    # ---------- internos ----------
+    def _is_permanent(self, exc: Exception) -> bool:
+        """Erro do próprio dado (repetir não adianta); o resto é tratado como destino fora."""
+        return isinstance(exc, self.PERMANENT_ERRORS)
+
+    def _write(self, batch) -> list:
+        """
+        Grava um lote e chama on_flush; devolve as linhas que ficaram por gravar (falha
+        temporária; vazio se tudo foi gravado ou rejeitado). Chamar com _io_lock.
+        """
+        t0 = time.perf_counter()
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            if self._is_permanent(e):
+                if len(batch) == 1:
+                    self._reject(batch, e)
+                    return []
+                mid = len(batch) // 2  # isola a(s) linha(s) ruim(ns) por bisseção
+                left = self._write(batch[:mid])
+                return left + batch[mid:] if left else self._write(batch[mid:])
+            self._errors += 1
+            self._failed_flushes += 1
+            self._consecutive_failures += 1
+            delay = min(self.MAX_RETRY_DELAY, self.max_latency * 2 ** (self._consecutive_failures - 1))
+            self._retry_at = time.monotonic() + delay
+            logger.error("%s: falha ao gravar lote de %s linhas (%s seguidas): %s; nova tentativa em %.1fs",
+                         self.name, len(batch), self._consecutive_failures, e, delay)
+            return batch
+        if self._consecutive_failures:
+            logger.info("%s: destino de volta após %s falhas", self.name, self._consecutive_failures)
+            self._consecutive_failures = 0
+        self._flush_time += time.perf_counter() - t0
+        self._flushes += 1
+        self._rows_out += len(batch)
+        if self.on_flush is not None:
+            try:
+                self.on_flush(batch)
+            except Exception:
+                logger.exception("%s: falha no callback on_flush", self.name)
+        return []
+
+    def _reject(self, rows, exc: Exception):
+        error = str(exc).strip().splitlines()[0] if str(exc).strip() else type(exc).__name__
+        self._errors += 1
+        self._rejected_rows += len(rows)
+        logger.error("%s: %s linha(s) rejeitada(s) pelo destino (%s): %s", self.name, len(rows), error, rows)
+        if self.reject_path is not None:
+            try:
+                with self.reject_path.open("a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(dict(row, _error=error), default=str, ensure_ascii=False) + "\n")
+            except OSError:
+                logger.exception("%s: falha ao gravar %s", self.name, self.reject_path)
+        if self.on_reject is not None:
+            try:
+                self.on_reject(rows)
+            except Exception:
+                logger.exception("%s: falha no callback on_reject", self.name)
+
+    def _requeue(self, batch):
+        """Lote que falhou volta para o início do buffer; acima de max_buffer vai para o spill."""
+        with self._lock:
+            self._buf[:0] = batch
+            self._buf_since = time.monotonic()
+            if len(self._buf) <= self.max_buffer:
+                return
+            overflow, self._buf = self._buf, []
+            self._buf_since = None
+        self._overflow(overflow)
+
+    def _overflow(self, rows):
+        if self.spill_path is None:
+            keep = rows[-self.max_buffer:] if len(rows) > self.max_buffer else rows
+            lost = len(rows) - len(keep)
+            if lost:
+                self._dropped_rows += lost
+                logger.error("%s: buffer cheio e sem spill; %s linhas mais antigas descartadas", self.name, lost)
+            if keep and not self._closed:
+                with self._lock:
+                    self._buf[:0] = keep
+                    self._buf_since = time.monotonic()
+            elif keep:
+                self._dropped_rows += len(keep)
+                logger.error("%s: fechado com o destino fora; %s linhas perdidas", self.name, len(keep))
+            return
+        try:
+            with self.spill_path.open("a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            self._dropped_rows += len(rows)
+            logger.exception("%s: falha ao gravar spill %s; %s linhas perdidas", self.name, self.spill_path, len(rows))
+            return
+        self._spilled_rows += len(rows)
+        self._spill_pending += len(rows)
+        logger.warning("%s: %s linhas enviadas ao spill %s", self.name, len(rows), self.spill_path)
+
+    def _drain_spill(self):
+        """Regrava o spill em lotes de max_rows; devolve (linhas gravadas, tudo gravado?)."""
+        written = 0
+        with self.spill_path.open("r", encoding="utf-8") as f:
+            while True:
+                batch = []
+                for line in iter(f.readline, ""):
+                    if line.strip():
+                        batch.append(json.loads(line))
+                    if len(batch) >= self.max_rows:
+                        break
+                if not batch:
+                    break
+                stale = batch[:self._spill_stale]
+                for row in stale:
+                    row.pop("_wal", None)  # segmento de outra execução do journal
+                left = self._write(batch)
+                done = len(batch) - len(left)
+                self._spill_pending = max(0, self._spill_pending - done)
+                if left:
+                    stale_ids = {id(row) for row in stale}
+                    self._spill_stale = sum(1 for row in left if id(row) in stale_ids) \
+                        + max(0, self._spill_stale - len(batch))
+                    self._rewrite_spill(f, left)
+                    return written + done, False
+                written += done
+                self._spill_stale = max(0, self._spill_stale - len(batch))
+        self.spill_path.unlink(missing_ok=True)
+        self._spill_pending = self._spill_stale = 0
+        return written, True
+
+    def _rewrite_spill(self, f, left):
+        # mantém só o que ainda não foi gravado: o que sobrou do lote e o resto do arquivo
+        tmp = self.spill_path.with_name(self.spill_path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as out:
+            for row in left:
+                out.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+            for line in f:
+                out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.spill_path)
+
+    def _timer_loop(self):
+        tick = min(self.max_latency / 2, 0.5)
+        while not self._stop.wait(tick):
+            since = self._buf_since
+            if since is not None and time.monotonic() - since >= self.max_latency:
+                self.flush()
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class BatchedCsvWriter(_BatchedWriter):
+    """
+    Writer CSV em lote: mantém um único handle aberto e grava as linhas com ``writerows``.
+
+    fsync:
+      - "never"    -> só flush do buffer do Python (o SO decide quando ir ao disco)
+      - "batch"    -> os.fsync a cada lote gravado
+      - "interval" -> os.fsync no máximo a cada ``fsync_interval`` segundos
+    """
+
+    name = "csv-writer"
+
+    def __init__(self, path: str, header=HEADER, max_rows: int = 500, max_latency: float = 1.0,
+                 fsync: str = "never", fsync_interval: float = 1.0, on_flush=None,
+                 spill_path: str = None, max_buffer: int = None, on_reject=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync} (use {', '.join(FSYNC_POLICIES)})")
+        self.path = Path(path)
+        self.header = list(header)
+        self.fsync = fsync
+        self.fsync_interval = float(fsync_interval)
+        self._last_fsync = time.monotonic()
+
+        ensure_parent(self.path)
+        write_header = not self.path.exists() or self.path.stat().st_size == 0
+        self._fh = self.path.open("a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._fh, fieldnames=self.header, restval="", extrasaction="ignore")
+        if write_header:
+            self._writer.writeheader()
+            self._fh.flush()
+        super().__init__(max_rows=max_rows, max_latency=max_latency, on_flush=on_flush,
+                         spill_path=spill_path, max_buffer=max_buffer, on_reject=on_reject)
+
+    def _write_batch(self, rows):
+        self._writer.writerows(rows)
+        self._fh.flush()
+        if self.fsync == "batch":
+            os.fsync(self._fh.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._fh.fileno())
+                self._last_fsync = now
+
+    def _close(self):
+        try:
+            self._fh.flush()
+            if self.fsync != "never":
+                os.fsync(self._fh.fileno())
+        finally:
+            self._fh.close()
+
+
+def _to_float(v):
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _to_ts(v):
+    """
+    Normaliza ts para ISO-8601 sem fuso, na hora local (sensors.ts é TIMESTAMP: um offset
+    seria descartado em silêncio). Aceita ISO, com ``Z``/offset inclusive, ou epoch em
+    segundos. Inválido -> NULL.
+    """
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        try:
+            return datetime.fromtimestamp(v).isoformat()
+        except (OverflowError, OSError, ValueError):
+            return None
+    if not isinstance(v, datetime):
+        text = str(v).strip()
+        if text[-1:] in ("Z", "z"):
+            text = text[:-1] + "+00:00"  # fromisoformat só aceita "Z" a partir do Python 3.11
+        try:
+            v = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    return (v if v.tzinfo is None else v.astimezone().replace(tzinfo=None)).isoformat()
+
+def normalize_sensor_row(row: dict) -> tuple:
+    """Converte uma linha do bridge na tupla (sensor_id, umidade, nutriente, ts) da tabela sensors."""
+    sensor_id = row.get("sensor_id")
+    return (
+        str(sensor_id) if sensor_id not in (None, "") else None,
+        _to_float(row.get("umidade")),
+        _to_float(row.get("nutriente")),
+        _to_ts(row.get("ts")),
+    )
+
+
+class PostgresCopyWriter(_BatchedWriter):
+    """
+    Writer em lote para PostgreSQL usando ``COPY <tabela> (...) FROM STDIN``.
+
+    Cada lote é normalizado, serializado em CSV em memória e enviado num único COPY
+    por uma conexão do pool (psycopg2 ThreadedConnectionPool, criado a partir de
+    ``data_pipeline.config.DATABASE_URL``). Em falha o lote é reenviado até
+    ``retries`` vezes com backoff exponencial; conexões quebradas são descartadas do pool.
+    Esgotadas as tentativas, o lote fica no buffer (ou no spill) para o próximo flush.
+    DataError/IntegrityError (ex.: REAL fora da faixa, byte NUL) não são repetidos: as
+    linhas ruins são isoladas e rejeitadas (ver _BatchedWriter).
+
+    Teste local:
+        docker compose -f docker/docker-compose.yml up -d db
+        python db/writer.py --pg --rows 50000
+    """
+
+    name = "pg-writer"
+
+    def __init__(self, database_url: str = None, table: str = "sensors", columns=SENSOR_COLUMNS,
+                 max_rows: int = 2000, max_latency: float = 1.0, pool_size: int = 2,
+                 retries: int = 3, retry_backoff: float = 0.5, on_flush=None,
+                 spill_path: str = None, max_buffer: int = None, on_reject=None):
+        if database_url is None:
+            from data_pipeline.config import DATABASE_URL as database_url
+        self.database_url = database_url
+        self.table = table
+        self.columns = tuple(columns)
+        self.pool_size = max(1, int(pool_size))
+        self.retries = max(0, int(retries))
+        self.retry_backoff = float(retry_backoff)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._retried = 0
+        self._copy_sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, ", ".join(self.columns))
+        super().__init__(max_rows=max_rows, max_latency=max_latency, on_flush=on_flush,
+                         spill_path=spill_path, max_buffer=max_buffer, on_reject=on_reject)
+
+    def _get_pool(self):
+        # criado sob demanda: o bridge sobe mesmo com o banco fora do ar
+        with self._pool_lock:
+            if self._pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                self._pool = ThreadedConnectionPool(1, self.pool_size, dsn=self.database_url)
+            return self._pool
+
+    def _encode(self, rows) -> io.StringIO:
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        # None vira campo vazio sem aspas, que o COPY (FORMAT csv) interpreta como NULL
+        w.writerows(normalize_sensor_row(r) for r in rows)
+        buf.seek(0)
+        return buf
+
+    def _copy(self, payload: io.StringIO):
+        pool = self._get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(self._copy_sql, payload)
+            conn.commit()
+        except Exception:
+            broken = bool(getattr(conn, "closed", 0))
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken)
+
+    def _is_permanent(self, exc: Exception) -> bool:
+        # DataError: REAL fora da faixa, byte NUL, ts inválido...; IntegrityError: NOT NULL/CHECK
+        try:
+            from psycopg2 import DataError, IntegrityError
+        except ImportError:
+            return super()._is_permanent(exc)
+        return isinstance(exc, (DataError, IntegrityError)) or super()._is_permanent(exc)
+
+    def _write_batch(self, rows):
+        payload = self._encode(rows)
+        attempt = 0
+        while True:
+            try:
+                payload.seek(0)
+                self._copy(payload)
+                return
+            except Exception as e:
+                if attempt >= self.retries or self._is_permanent(e):
+                    raise
+                attempt += 1
+                self._retried += 1
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                logger.warning("%s: COPY falhou (%s); nova tentativa %s/%s em %.1fs",
+                               self.name, e, attempt, self.retries, delay)
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        out = super().stats()
+        out["retries"] = self._retried
+        return out
+
+    def _close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                try:
+                    self._pool.closeall()
+                except Exception:
+                    pass
+                self._pool = None
+
+
+class ParquetStoreWriter(_BatchedWriter):
+    """
+    Writer em lote para o store Parquet particionado por dia (db/store.py).
+    Cada flush vira um arquivo por partição; a compactação junta os arquivos pequenos depois.
+    """
+
+    name = "parquet-writer"
+
+    def __init__(self, root: str = None, partition_by_sensor: bool = None, max_rows: int = 5000,
+                 max_latency: float = 5.0, on_flush=None, spill_path: str = None, max_buffer: int = None,
+                 on_reject=None):
+        from db.store import ParquetStore
+        self.store = ParquetStore(root, partition_by_sensor=partition_by_sensor)
+        super().__init__(max_rows=max_rows, max_latency=max_latency, on_flush=on_flush,
+                         spill_path=spill_path, max_buffer=max_buffer, on_reject=on_reject)
+
+    def _write_batch(self, rows):
+        self.store.write(rows)
+
+
+def _bench_rows(n: int):
+    return [
+        {"sensor_id": f"sim-{i % 300:03d}", "umidade": 40 + i % 30, "nutriente": 10 + i % 5,
+         "ts": "2025-11-16T00:00:00"}
+        for i in range(n)
+    ]
+
+def _bench(n: int, out_dir: Path):
+    """Compara safe_write_row_csv (abre/fecha por linha) com BatchedCsvWriter."""
+    rows = _bench_rows(n)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    legacy = out_dir / "bench_legacy.csv"
+    legacy.unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    for r in rows:
+        safe_write_row_csv(str(legacy), r)
+    dt = time.perf_counter() - t0
+    print(f"safe_write_row_csv : {n} linhas em {dt:.3f}s -> {n / dt:,.0f} linhas/s")
+
+    for policy in FSYNC_POLICIES:
+        batched = out_dir / f"bench_batched_{policy}.csv"
+        batched.unlink(missing_ok=True)
+        t0 = time.perf_counter()
+        w = BatchedCsvWriter(str(batched), fsync=policy)
+        for r in rows:
+            w.write(r)
+        w.close()
+        dt = time.perf_counter() - t0
+        print(f"BatchedCsvWriter[{policy:8s}]: {n} linhas em {dt:.3f}s -> {n / dt:,.0f} linhas/s  {w.stats()}")
+
+def _bench_pg(n: int, database_url: str):
+    """Compara INSERT linha a linha (executemany) com PostgresCopyWriter numa tabela temporária."""
+    import psycopg2
+
+    table = "sensors_bench"
+    conn = psycopg2.connect(database_url)
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"CREATE TABLE {table} (LIKE sensors INCLUDING DEFAULTS)")
+    rows = _bench_rows(n)
+
+    t0 = time.perf_counter()
+    with conn, conn.cursor() as cur:
+        cur.executemany(
+            f"INSERT INTO {table} (sensor_id, umidade, nutriente, ts) VALUES (%s, %s, %s, %s)",
+            [normalize_sensor_row(r) for r in rows],
+        )
+    dt = time.perf_counter() - t0
+    print(f"INSERT executemany : {n} linhas em {dt:.3f}s -> {n / dt:,.0f} linhas/s")
+
+    t0 = time.perf_counter()
+    w = PostgresCopyWriter(database_url, table=table)
+    for r in rows:
+        w.write(r)
+    w.close()
+    dt = time.perf_counter() - t0
+    print(f"PostgresCopyWriter : {n} linhas em {dt:.3f}s -> {n / dt:,.0f} linhas/s  {w.stats()}")
+
+    with conn, conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        print(f"linhas na tabela {table}: {cur.fetchone()[0]} (esperado {2 * n})")
+        cur.execute(f"DROP TABLE {table}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import tempfile
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    parser = argparse.ArgumentParser(description="Benchmark dos writers (CSV e PostgreSQL COPY)")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--out-dir", default=None, help="Diretório dos CSVs gerados (padrão: temporário)")
+    parser.add_argument("--pg", action="store_true", help="Benchmark INSERT vs COPY no PostgreSQL")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    args = parser.parse_args()
+    if args.pg:
+        from data_pipeline.config import DATABASE_URL
+        _bench_pg(args.rows, args.database_url or DATABASE_URL)
+    else:
+        _bench(args.rows, Path(args.out_dir) if args.out_dir else Path(tempfile.mkdtemp(prefix="farmtech_bench_")))
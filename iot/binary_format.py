@@ -0,0 +1,226 @@
+"""
+binary_format.py
+Formato binário compacto (versionado) das leituras de sensores: firmware -> MQTT -> bridge.
+
+Layout v1 (little-endian):
+  cabeçalho (4 bytes): magic 0xFA (u8) | versão 1 (u8) | quantidade de registros (u16)
+  registro (24 bytes): sensor_id (16 bytes ASCII, preenchido com \\0) | ts epoch s (u32)
+                       | umidade x100 (i16) | nutriente x100 (i16)
+  Valor ausente: -32768 (i16) para leituras, 0 para ts (sem timestamp: o bridge usa a
+  hora de chegada ou, na deduplicação, ts=None — nunca 1970-01-01).
+
+Convenção de timestamp (binário e JSON do firmware): epoch em segundos (UTC, como todo
+epoch) na mensagem; o bridge formata com format_epoch() na hora local do host, a mesma
+de decoders.now_ts() (leituras sem ts) e do pd.Timestamp.now() dos painéis.
+Epoch fora de [MIN_EPOCH, MAX_EPOCH] (relógio não sincronizado, lixo) conta como sem ts;
+no JSON, um valor acima de MAX_EPOCH é lido como milissegundos (÷1000) antes da checagem.
+
+Uma leitura ocupa 28 bytes (contra ~80 do JSON); um lote de N leituras ocupa 4 + 24*N.
+Lotes grandes são decodificados com numpy.frombuffer sobre o payload inteiro (vetorizado);
+lotes pequenos com struct.iter_unpack, que tem custo fixo menor.
+
+Publicação no tópico farmtech/sensors/<...>/bin ou detecção pelo magic byte.
+
+Benchmark (JSON vs binário, encode + decode, sem hardware):
+    python iot/binary_format.py --readings 100000 --batch 10
+"""
+
+import struct
+import time
+from functools import lru_cache
+
+import numpy as np
+
+MAGIC = 0xFA
+VERSION = 1
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
+SCALE = 100
+MISSING = -32768
+MAX_RECORDS = 0xFFFF
+SENSOR_ID_LEN = 16
+VECTORIZE_MIN = 64  # a partir deste tamanho de lote o caminho numpy compensa
+
+HEADER = struct.Struct("<BBH")
+RECORD = struct.Struct(f"<{SENSOR_ID_LEN}sIhh")
+RECORD_DTYPE = np.dtype([
+    ("sensor_id", f"S{SENSOR_ID_LEN}"),
+    ("ts", "<u4"),
+    ("umidade", "<i2"),
+    ("nutriente", "<i2"),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def is_binary(topic: str, payload: bytes) -> bool:
+    return (len(payload) >= HEADER.size and payload[0] == MAGIC) or topic.endswith("/bin")
+
+
+# ---------- encoder ----------
+def _scaled(value) -> int:
+    if value is None or value == "":
+        return MISSING
+    v = int(round(float(value) * SCALE))
+    return max(MISSING + 1, min(32767, v))
+
+def encode_readings(readings) -> bytes:
+    """
+    Codifica uma lista de leituras {"sensor_id", "umidade", "nutriente", "ts"} em um payload v1.
+    ts pode ser epoch (int/float) ou ausente; sensor_id é truncado em 16 bytes.
+    """
+    readings = list(readings)
+    if len(readings) > MAX_RECORDS:
+        raise ValueError(f"Lote com {len(readings)} leituras excede o máximo de {MAX_RECORDS}")
+    parts = [HEADER.pack(MAGIC, VERSION, len(readings))]
+    for r in readings:
+        ts = r.get("ts")
+        parts.append(RECORD.pack(
+            str(r.get("sensor_id") or "").encode("ascii", errors="replace")[:SENSOR_ID_LEN],
+            int(ts) if isinstance(ts, (int, float)) else 0,
+            _scaled(r.get("umidade")),
+            _scaled(r.get("nutriente")),
+        ))
+    return b"".join(parts)
+
+def encode_reading(sensor_id: str, umidade=None, nutriente=None, ts=None) -> bytes:
+    return encode_readings([{"sensor_id": sensor_id, "umidade": umidade, "nutriente": nutriente,
+                             "ts": int(time.time()) if ts is None else ts}])
+
+
+# ---------- decoder ----------
+NO_TS = 0
+MIN_EPOCH = 946684800   # 2000-01-01T00:00:00Z: abaixo disso o RTC não foi acertado (NTP)
+MAX_EPOCH = 4102444800  # 2100-01-01T00:00:00Z
+
+
+@lru_cache(maxsize=4096)
+def _format_epoch(sec: int) -> str:
+    return time.strftime(TS_FORMAT, time.localtime(sec))
+
+def epoch_seconds(value):
+    """Epoch numérico em segundos (ms detectado e dividido por 1000); fora da faixa ou inválido -> None."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if value > MAX_EPOCH:
+        value /= 1000
+    return value if MIN_EPOCH <= value <= MAX_EPOCH else None  # NaN também cai fora
+
+def format_epoch(sec):
+    """Epoch (s, ou ms) -> TS_FORMAT na hora local; NO_TS, fora da faixa ou inválido -> None."""
+    sec = epoch_seconds(sec)
+    if sec is None:
+        return None
+    try:
+        return _format_epoch(int(sec))
+    except (OverflowError, OSError, ValueError):
+        return None
+
+def _check_header(payload: bytes) -> int:
+    """Valida o cabeçalho e devolve a quantidade de registros."""
+    if len(payload) < HEADER.size:
+        raise ValueError("Payload binário menor que o cabeçalho")
+    magic, version, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError(f"Magic inválido: {magic:#x}")
+    if version != VERSION:
+        raise ValueError(f"Versão de formato não suportada: {version}")
+    expected = HEADER.size + count * RECORD.size
+    if len(payload) < expected:
+        raise ValueError(f"Payload truncado: {len(payload)} bytes, esperado {expected}")
+    return count
+
+def decode_records(payload: bytes) -> np.ndarray:
+    """Devolve os registros como array estruturado (view sobre o payload, sem cópia)."""
+    count = _check_header(payload)
+    return np.frombuffer(payload, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+
+def _unscale(v: int):
+    return None if v == MISSING else v / SCALE
+
+def _scaled_to_list(col: np.ndarray) -> list:
+    values = col.astype(np.float64) / SCALE
+    values[col == MISSING] = np.nan
+    # NaN -> None para o sink (campo vazio no CSV / NULL no COPY)
+    return [None if v != v else v for v in values.tolist()]
+
+def decode_binary(payload: bytes, now_ts=None) -> list:
+    """
+    Decodifica um payload v1 em linhas normalizadas (sensor_id, umidade, nutriente, ts).
+    ``now_ts()`` dá o ts das leituras com ts=NO_TS ou fora da faixa (padrão: hora atual); pode devolver None.
+    """
+    count = _check_header(payload)
+    if count == 0:
+        return []
+    fallback = now_ts() if now_ts else _format_epoch(int(time.time()))
+    if count < VECTORIZE_MIN:
+        # lotes pequenos: struct.iter_unpack evita o custo fixo das operações numpy
+        end = HEADER.size + count * RECORD.size
+        return [
+            {"sensor_id": sid.rstrip(b"\0").decode("ascii", "replace"), "umidade": _unscale(u),
+             "nutriente": _unscale(n), "ts": _format_epoch(t) if MIN_EPOCH <= t <= MAX_EPOCH else fallback}
+            for sid, t, u, n in RECORD.iter_unpack(payload[HEADER.size:end])
+        ]
+    recs = np.frombuffer(payload, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+    # tipo "S" do numpy já remove os \0 finais
+    ids = [s.decode("ascii", "replace") for s in recs["sensor_id"].tolist()]
+    umidade = _scaled_to_list(recs["umidade"])
+    nutriente = _scaled_to_list(recs["nutriente"])
+    ts = [_format_epoch(t) if MIN_EPOCH <= t <= MAX_EPOCH else fallback for t in recs["ts"].tolist()]
+    return [
+        {"sensor_id": s, "umidade": u, "nutriente": n, "ts": t}
+        for s, u, n, t in zip(ids, umidade, nutriente, ts)
+    ]
+
+
+# ---------- benchmark ----------
+def _bench(n: int, batch: int):
+    import json
+    import random
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from decoders import decode_payload, JSON_BACKEND
+
+    rnd = random.Random(7)
+    now = int(time.time())
+    readings = [
+        {"sensor_id": f"esp32-{i % 1000:04d}", "umidade": round(rnd.uniform(30, 70), 2),
+         "nutriente": round(rnd.uniform(8, 15), 2), "ts": now + i // 1000}
+        for i in range(n)
+    ]
+    chunks = [readings[i:i + batch] for i in range(0, n, batch)]
+
+    t0 = time.perf_counter()
+    json_msgs = [
+        json.dumps(c[0] | {"ts": _format_epoch(c[0]["ts"])}).encode() if batch == 1 else
+        json.dumps({"readings": [r | {"ts": _format_epoch(r["ts"])} for r in c]}).encode()
+        for c in chunks
+    ]
+    t_json_enc = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bin_msgs = [encode_readings(c) for c in chunks]
+    t_bin_enc = time.perf_counter() - t0
+
+    results = {}
+    for label, msgs, t_enc in (("json", json_msgs, t_json_enc), ("binário", bin_msgs, t_bin_enc)):
+        t0 = time.perf_counter()
+        decoded = sum(len(decode_payload(m, "farmtech/sensors/soil")) for m in msgs)
+        t_dec = time.perf_counter() - t0
+        size = sum(len(m) for m in msgs)
+        results[label] = t_dec
+        print(f"{label:8s} ({JSON_BACKEND if label == 'json' else 'v1'}): {decoded} leituras | "
+              f"{size / n:5.1f} bytes/leitura | encode {t_enc / n * 1e6:5.2f} µs/leitura | "
+              f"decode {t_dec / n * 1e6:5.2f} µs/leitura")
+    print(f"decode binário {results['json'] / results['binário']:.1f}x mais rápido (lotes de {batch})")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do formato binário vs JSON")
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=10, help="Leituras por mensagem")
+    args = parser.parse_args()
+    _bench(args.readings, args.batch)
@@ -0,0 +1,234 @@
+"""
+decoders.py
+Camada de decodificação de payloads do mqtt_bridge, trabalhando direto em ``bytes``.
+
+- Tabela de aliases pré-compilada (sensor_id/id/device, umidade/humidity, ...)
+- JSON rápido (orjson) quando instalado, senão json da stdlib
+- Timestamp "agora" formatado no máximo uma vez por segundo
+- ts numérico (epoch em segundos, como manda o firmware) formatado como no binário
+  (binary_format.format_epoch, hora local); ts 0 ou fora da faixa = sem timestamp,
+  epoch em milissegundos é detectado
+- Payload em lote: {"sensor_id": "x", "readings": [{...}, ...]} ou lista JSON [{...}, ...]
+- Formato binário compacto v1 (binary_format.py), detectado pelo magic byte ou tópico .../bin
+- Fallback CSV: "sensor_id,umidade,nutriente[,ts]" (uma leitura por linha)
+- Decoders extras podem ser registrados com register_decoder()
+
+Benchmark (comparado com a lógica antiga do on_message):
+    python iot/decoders.py --messages 100000
+"""
+
+import json
+import time
+
+from binary_format import is_binary, decode_binary, epoch_seconds, format_epoch
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    orjson = None
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# campo normalizado -> chaves aceitas no payload, em ordem de prioridade
+FIELD_ALIASES = {
+    "sensor_id": ("sensor_id", "id", "device"),
+    "umidade": ("umidade", "humidity"),
+    "nutriente": ("nutriente", "nutrient"),
+    "ts": ("ts", "timestamp"),
+}
+BATCH_KEYS = ("readings", "leituras")
+
+_ALIAS_TABLE = tuple(FIELD_ALIASES.items())
+_JSON_START = frozenset(b"{[")
+_WHITESPACE = b" \t\r\n"
+
+# ---------- timestamp ----------
+_ts_cache = (None, None)
+
+def now_ts() -> str:
+    """time.strftime(TS_FORMAT) com cache por segundo (a string só muda uma vez por segundo)."""
+    global _ts_cache
+    sec = int(time.time())
+    cached_sec, cached = _ts_cache
+    if sec != cached_sec:
+        cached = time.strftime(TS_FORMAT, time.localtime(sec))
+        _ts_cache = (sec, cached)
+    return cached
+
+# ---------- normalização ----------
+def _no_ts():
+    return None
+
+def normalize(data: dict, defaults: dict = None, default_ts=now_ts) -> dict:
+    """
+    Resolve os aliases de ``data`` para as chaves canônicas do CSV/tabela sensors.
+    Valores ausentes, None ou "" caem para o próximo alias (0 é uma leitura válida).
+    ``defaults`` vem do envelope de um lote (ex.: sensor_id comum a todas as leituras).
+    ``default_ts`` preenche ts ausente ou 0 (padrão: agora); ts numérico é epoch em segundos.
+    """
+    get = data.get
+    out = {}
+    for field, aliases in _ALIAS_TABLE:
+        value = None
+        for key in aliases:
+            value = get(key)
+            if value is not None and value != "":
+                break
+        else:
+            value = defaults.get(field) if defaults else None
+        out[field] = value
+    ts = out["ts"]
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        out["ts"] = ts = _epoch_ts(ts)
+    if ts is None:
+        out["ts"] = default_ts()
+    return out
+
+def _epoch_ts(value):
+    # mesma convenção do payload binário; fração de segundo preservada (chave da deduplicação)
+    value = epoch_seconds(value)
+    if value is None:
+        return None
+    text = format_epoch(value)
+    frac = value % 1
+    if text is None or not frac:
+        return text
+    return f"{text}.{min(999999, round(frac * 1e6)):06d}"
+
+def _rows_from_json(obj, default_ts=now_ts) -> list:
+    if isinstance(obj, dict):
+        for key in BATCH_KEYS:
+            readings = obj.get(key)
+            if isinstance(readings, list):
+                envelope = normalize(obj, default_ts=default_ts)
+                return [normalize(r, envelope, default_ts) for r in readings if isinstance(r, dict)]
+        return [normalize(obj, default_ts=default_ts)]
+    if isinstance(obj, list):
+        return [normalize(r, default_ts=default_ts) for r in obj if isinstance(r, dict)]
+    return []
+
+def decode_json(payload: bytes, default_ts=now_ts) -> list:
+    return _rows_from_json(_loads(payload), default_ts)
+
+def decode_csv(payload: bytes, default_ts=now_ts) -> list:
+    rows = []
+    for line in payload.splitlines():
+        parts = [p.strip().decode("utf-8", errors="ignore") for p in line.split(b",")]
+        if len(parts) < 3:
+            continue
+        rows.append({
+            "sensor_id": parts[0],
+            "umidade": parts[1],
+            "nutriente": parts[2],
+            "ts": parts[3] if len(parts) > 3 and parts[3] else default_ts(),
+        })
+    return rows
+
+# ---------- registro de decoders ----------
+_custom_decoders = []
+
+def register_decoder(name: str, decode, match):
+    """
+    Registra um decoder extra, consultado antes de JSON/CSV.
+    ``match(topic, payload) -> bool`` decide se ``decode(payload) -> list[dict]`` trata a mensagem.
+    """
+    _custom_decoders.append((name, match, decode))
+
+def decode_payload(payload: bytes, topic: str = "", fill_ts: bool = True) -> list:
+    """
+    Decodifica um payload MQTT em uma lista de linhas normalizadas
+    (sensor_id, umidade, nutriente, ts). Lista vazia = payload não reconhecido.
+    Com ``fill_ts=False`` leituras sem timestamp ficam com ts=None (usado pela deduplicação).
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    for name, match, decode in _custom_decoders:
+        if match(topic, payload):
+            return decode(payload)
+    default_ts = now_ts if fill_ts else _no_ts
+    if is_binary(topic, payload):
+        try:
+            return decode_binary(payload, default_ts)
+        except ValueError:
+            return []
+
+    body = payload.lstrip(_WHITESPACE)
+    if body and body[0] in _JSON_START:
+        try:
+            return decode_json(body, default_ts)
+        except ValueError:
+            pass  # JSONDecodeError (json e orjson) -> tenta CSV como antes
+    return decode_csv(body, default_ts)
+
+
+# ---------- benchmark ----------
+def _legacy_decode(payload: bytes) -> list:
+    """Lógica original de on_message (str + json.loads + cadeia de .get + strftime), para comparação."""
+    payload = payload.decode("utf-8", errors="ignore")
+    try:
+        data = json.loads(payload)
+        return [{
+            "sensor_id": data.get("sensor_id") or data.get("id") or data.get("device"),
+            "umidade": data.get("umidade") or data.get("humidity"),
+            "nutriente": data.get("nutriente") or data.get("nutrient"),
+            "ts": data.get("ts") or data.get("timestamp") or time.strftime(TS_FORMAT)
+        }]
+    except json.JSONDecodeError:
+        parts = [p.strip() for p in payload.split(",")]
+        if len(parts) >= 3:
+            return [{
+                "sensor_id": parts[0],
+                "umidade": parts[1],
+                "nutriente": parts[2],
+                "ts": parts[3] if len(parts) > 3 else time.strftime(TS_FORMAT)
+            }]
+        return []
+
+def _synthetic_payloads(n: int) -> dict:
+    import random
+    rnd = random.Random(42)
+    single, alias, csv_, batch = [], [], [], []
+    for i in range(n):
+        sid = f"sim-{i % 500:03d}"
+        um, nu = round(rnd.uniform(30, 70), 2), round(rnd.uniform(8, 15), 2)
+        single.append(json.dumps({"sensor_id": sid, "umidade": um, "nutriente": nu}).encode())
+        alias.append(json.dumps({"device": sid, "humidity": um, "nutrient": nu,
+                                 "timestamp": "2025-11-16T00:00:00"}).encode())
+        csv_.append(f"{sid},{um},{nu},2025-11-16T00:00:00".encode())
+        if i % 10 == 0:
+            batch.append(json.dumps({"sensor_id": sid, "readings": [
+                {"umidade": um, "nutriente": nu, "ts": f"2025-11-16T00:00:{k:02d}"} for k in range(10)
+            ]}).encode())
+    return {"json": single, "json-alias": alias, "csv": csv_, "json-batch(10)": batch}
+
+def _bench(n: int):
+    print(f"backend JSON: {JSON_BACKEND} | {n} mensagens por formato")
+    for name, payloads in _synthetic_payloads(n).items():
+        per_msg = len(decode_payload(payloads[0]))
+        results = {}
+        for label, fn in (("legado", _legacy_decode), ("decoders", decode_payload)):
+            if label == "legado" and name.startswith("json-batch"):
+                continue  # o formato em lote não existia
+            t0 = time.perf_counter()
+            for p in payloads:
+                fn(p)
+            results[label] = (time.perf_counter() - t0) / len(payloads) * 1e6
+        line = f"{name:15s} " + "  ".join(f"{k}: {v:6.2f} µs/msg" for k, v in results.items())
+        if "legado" in results:
+            line += f"  ({results['legado'] / results['decoders']:.1f}x)"
+        else:
+            line += f"  ({results['decoders'] / per_msg:.2f} µs/leitura)"
+        print(line)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Micro-benchmark dos decoders de payload")
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+    _bench(args.messages)
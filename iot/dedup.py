@@ -0,0 +1,157 @@
+"""
+dedup.py
+Índice de deduplicação limitado em memória para reentregas QoS 1 do broker.
+
+Duas chaves, em índices separados:
+  - (sensor_id, ts) do dispositivo (filter_duplicates): leituras sem ts nunca são
+    descartadas aqui; antes do NTP o firmware manda payloads sem ts, e um valor estável
+    de umidade se repete byte a byte legitimamente
+  - hash (blake2b) do payload bruto (is_redelivery): só descarta mensagens com a flag
+    DUP do MQTT (reentrega QoS >= 1) vistas dentro de uma janela curta; as entregas
+    normais só registram o hash
+O índice é um LRU (OrderedDict) com capacidade fixa e janela de tempo opcional, então o
+custo por mensagem é O(1) e a memória não cresce com o número de sensores/mensagens.
+
+Benchmark (custo por lookup e memória com a capacidade cheia):
+    python iot/dedup.py --keys 500000 --capacity 100000
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class DedupIndex:
+    """
+    LRU de chaves já vistas. ``window`` (segundos, opcional) expira entradas antigas
+    mesmo com a capacidade sobrando; uma entrada expirada conta como miss.
+    """
+
+    def __init__(self, capacity: int = 100000, window: float = None):
+        self.capacity = max(1, int(capacity))
+        self.window = float(window) if window else None
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expired = 0
+
+    def seen(self, key) -> bool:
+        """True se ``key`` já passou pelo índice (duplicata); senão registra e devolve False."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._seen.get(key)
+            if last is not None and (self.window is None or now - last <= self.window):
+                self._seen[key] = now
+                self._seen.move_to_end(key)
+                self._hits += 1
+                return True
+            self._misses += 1
+            self._store(key, now)
+            return False
+
+    def remember(self, key):
+        """Registra ``key`` sem consultar (entrega original: nunca é duplicata)."""
+        with self._lock:
+            self._store(key, time.monotonic())
+
+    def _store(self, key, now: float):
+        seen = self._seen
+        seen[key] = now
+        seen.move_to_end(key)
+        if self.window is not None:
+            # as entradas estão em ordem de último acesso: expira pelo início
+            limit = now - self.window
+            while seen:
+                if next(iter(seen.values())) >= limit:
+                    break
+                seen.popitem(last=False)
+                self._expired += 1
+        while len(seen) > self.capacity:
+            seen.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "size": len(self._seen),
+                "capacity": self.capacity,
+                "window_s": self.window,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / total, 4) if total else 0.0,
+                "evictions": self._evictions,
+                "expired": self._expired,
+            }
+
+
+def filter_duplicates(index: DedupIndex, rows: list) -> list:
+    """
+    Remove de ``rows`` as leituras cujo (sensor_id, ts) do dispositivo já foi visto.
+    As linhas devem vir do decoder com ts=None quando o payload não trouxe timestamp
+    (decode_payload(..., fill_ts=False)); essas passam sempre.
+    """
+    out = []
+    for row in rows:
+        ts = row.get("ts")
+        if ts is None or not index.seen((row.get("sensor_id"), ts)):
+            out.append(row)
+    return out
+
+
+def payload_key(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=12).digest()
+
+
+def is_redelivery(index: DedupIndex, payload: bytes, dup: bool) -> bool:
+    """
+    True se ``payload`` chegou com a flag DUP (reentrega QoS >= 1) e o mesmo payload já foi
+    recebido dentro da janela de ``index``. Entregas sem DUP só registram o hash.
+    """
+    key = payload_key(payload)
+    if dup:
+        return index.seen(key)
+    index.remember(key)
+    return False
+
+
+def _bench(keys: int, capacity: int):
+    import random
+    import tracemalloc
+
+    rnd = random.Random(1)
+    sensors = [f"esp32-{i:05d}" for i in range(5000)]
+    stream = [(rnd.choice(sensors), f"2025-11-16T00:{i // 6000 % 60:02d}:{i // 100 % 60:02d}.{i % 100:02d}")
+              for i in range(keys)]
+    # ~5% de reentregas, como após uma reconexão QoS 1
+    stream += rnd.sample(stream, keys // 20)
+
+    index = DedupIndex(capacity=capacity)
+    t0 = time.perf_counter()
+    for key in stream:
+        index.seen(key)
+    dt = time.perf_counter() - t0
+    print(f"{len(stream)} lookups em {dt:.3f}s -> {dt / len(stream) * 1e6:.2f} µs/lookup")
+    print(index.stats())
+
+    # memória medida à parte (tracemalloc distorce o tempo)
+    tracemalloc.start()
+    index = DedupIndex(capacity=capacity)
+    for key in stream[:capacity * 2]:
+        index.seen(key)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memória do índice cheio: {current / 1e6:.1f} MB ({current / max(1, len(index._seen)):.0f} B/entrada)")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do índice de deduplicação")
+    parser.add_argument("--keys", type=int, default=300000)
+    parser.add_argument("--capacity", type=int, default=100000)
+    args = parser.parse_args()
+    _bench(args.keys, args.capacity)
@@ -0,0 +1,320 @@
+"""
+ingest_queue.py
+Fila limitada entre os callbacks do paho e o sink do mqtt_bridge.
+
+on_message só enfileira (topic, payload[, tag]); threads consumidoras chamam o handler
+(decodificação + escrita no sink), então disco/banco lentos não travam o loop de
+rede nem os keepalives.
+
+Política de overflow quando a fila está cheia:
+  - block       -> o thread do paho espera espaço (backpressure até o broker)
+  - drop_oldest -> descarta a mensagem mais antiga da fila
+  - spill       -> grava a mensagem num arquivo de spill em disco; os consumidores
+                   reprocessam o spill quando a fila esvazia (a ordem não é garantida)
+
+Reprocessamento do spill: o arquivo vira <spill>.replay e é lido registro a registro
+(memória constante, qualquer que seja o tamanho do backlog); o .replay só é apagado
+depois de ``before_spill_commit`` (o bridge passa o flush do sink) terminar sem erro.
+Um .replay que sobrou de um crash é reprocessado no início (at-least-once: mensagens já
+entregues antes do crash podem se repetir).
+
+``tag`` é opaco para a fila (o bridge usa o id do segmento do journal) e volta no handler
+e em ``on_drop``, chamado para cada mensagem descartada.
+
+stats(): depth, enqueued, processed, dropped, spilled, replayed, lag (ms) dos consumidores.
+"""
+
+import os
+import time
+import struct
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger("mqtt_bridge.queue")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+# registro de spill: enqueued_at (double), len(topic) (u16), len(payload) (u32), tag (i64, -1 = None), topic, payload
+_SPILL_HEADER = struct.Struct("<dHIq")
+
+
+# falha no commit do replay (sink fora): espera antes de reprocessar o .replay de novo
+SPILL_RETRY_SECONDS = 5.0
+
+
+class SpillFile:
+    """
+    Arquivo append-only de mensagens que não couberam na fila.
+
+    Reprocessamento em três passos: begin_replay() reserva o .replay (um consumidor por
+    vez), iter_replay() lê registro a registro e commit_replay() apaga o arquivo;
+    abort_replay() mantém o .replay para uma nova tentativa.
+
+    Registros que sobraram de uma execução anterior voltam com tag=None: a tag é o
+    segmento do journal *daquela* execução (o próprio journal reenvia essas mensagens)
+    e, usada agora, baixaria as pendências do segmento recuperado de mesmo id.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.replay_path = self.path.with_name(self.path.name + ".replay")
+        self._lock = threading.Lock()
+        self._fh = None
+        self._replaying = False
+        self._retry_at = 0.0
+        # sobras de uma execução anterior (crash no meio de um replay inclusive): serão reprocessadas
+        self._replay_count = self._count(self.replay_path)
+        self._path_count = self._count(self.path)
+        self._stale = self.pending  # primeiros registros (.replay, depois o spill): tags sem valor
+
+    @property
+    def pending(self) -> int:
+        return self._replay_count + self._path_count
+
+    def ready(self) -> bool:
+        """Há o que reprocessar e nenhum consumidor está com o replay."""
+        return self.pending > 0 and not self._replaying and time.monotonic() >= self._retry_at
+
+    def append(self, enqueued_at: float, topic: str, payload: bytes, tag: int = None):
+        t = topic.encode("utf-8")
+        head = _SPILL_HEADER.pack(enqueued_at, len(t), len(payload), -1 if tag is None else tag)
+        with self._lock:
+            if self._fh is None:
+                self._fh = self.path.open("ab")
+            self._fh.write(head + t + payload)
+            self._fh.flush()
+            self._path_count += 1
+
+    def begin_replay(self):
+        """Reserva o replay; devolve o caminho do .replay ou None (nada a fazer / outro consumidor)."""
+        with self._lock:
+            if self._replaying:
+                return None
+            if not self.replay_path.exists():
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                if not self.path.exists():
+                    self._path_count = 0
+                    return None
+                os.replace(self.path, self.replay_path)
+                self._replay_count, self._path_count = self._path_count, 0
+            self._replaying = True
+            return self.replay_path
+
+    def iter_replay(self):
+        """Mensagens do .replay, uma por vez (não carrega o arquivo inteiro)."""
+        stale = self._stale
+        for i, (enqueued_at, topic, payload, tag) in enumerate(self._iter_file(self.replay_path)):
+            yield enqueued_at, topic, payload, None if i < stale else tag
+
+    def commit_replay(self):
+        """Mensagens do .replay já gravadas no sink: apaga o arquivo."""
+        with self._lock:
+            self.replay_path.unlink(missing_ok=True)
+            self._stale = max(0, self._stale - self._replay_count)
+            self._replay_count = 0
+            self._replaying = False
+
+    def abort_replay(self, retry_after: float = SPILL_RETRY_SECONDS):
+        with self._lock:
+            self._replaying = False
+            self._retry_at = time.monotonic() + retry_after
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    @classmethod
+    def _count(cls, path: Path) -> int:
+        if not path.exists() or path.stat().st_size == 0:
+            return 0
+        return sum(1 for _ in cls._iter_file(path))
+
+    @staticmethod
+    def _iter_file(path: Path):
+        with path.open("rb") as f:
+            while True:
+                head = f.read(_SPILL_HEADER.size)
+                if len(head) < _SPILL_HEADER.size:
+                    return
+                enqueued_at, tlen, plen, tag = _SPILL_HEADER.unpack(head)
+                body = f.read(tlen + plen)
+                if len(body) < tlen + plen:
+                    return  # registro truncado (crash no meio da escrita)
+                yield (enqueued_at, body[:tlen].decode("utf-8", errors="replace"), body[tlen:],
+                       None if tag < 0 else tag)
+
+
+class IngestQueue:
+    """
+    Fila limitada (deque + Condition) com N consumidores chamando ``handler(topic, payload, tag)``.
+    """
+
+    def __init__(self, handler, maxsize: int = 10000, policy: str = "block", consumers: int = 1,
+                 spill_path: str = None, block_timeout: float = None, on_drop=None,
+                 before_spill_commit=None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de overflow inválida: {policy} (use {', '.join(OVERFLOW_POLICIES)})")
+        if policy == "spill" and not spill_path:
+            raise ValueError("policy='spill' exige spill_path")
+        self.handler = handler
+        self.on_drop = on_drop
+        self.before_spill_commit = before_spill_commit
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.spill = SpillFile(spill_path) if policy == "spill" else None
+
+        self._dq = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._consume, name=f"ingest-consumer-{i}", daemon=True)
+            for i in range(max(1, int(consumers)))
+        ]
+
+        self._enqueued = 0
+        self._processed = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._errors = 0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._lag_sum = 0.0
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    # ---------- produtor (thread do paho) ----------
+    def put(self, topic: str, payload: bytes, tag: int = None) -> bool:
+        """Enfileira uma mensagem. Retorna False se ela foi descartada."""
+        item = (time.monotonic(), topic, payload, tag)
+        dropped = None
+        spill = False
+        with self._cond:
+            if len(self._dq) >= self.maxsize:
+                if self.policy == "block":
+                    ok = self._cond.wait_for(lambda: len(self._dq) < self.maxsize or self._stopping,
+                                             timeout=self.block_timeout)
+                    if not ok or self._stopping:
+                        self._dropped += 1
+                        dropped, item = item, None
+                elif self.policy == "drop_oldest":
+                    dropped = self._dq.popleft()
+                    self._dropped += 1
+                else:
+                    spill, item = True, None
+                    self._spilled += 1
+            if item is not None:
+                self._dq.append(item)
+                self._enqueued += 1
+                self._cond.notify_all()
+        if spill:
+            # I/O de disco fora do lock: consumidores seguem drenando a fila
+            self.spill.append(time.time(), topic, payload, tag)
+            return True
+        if dropped is not None:
+            self._notify_drop(*dropped[1:])
+        return item is not None
+
+    def _notify_drop(self, topic, payload, tag):
+        if self.on_drop is None:
+            return
+        try:
+            self.on_drop(topic, payload, tag)
+        except Exception:
+            logger.exception("Falha no callback on_drop (%s)", topic)
+
+    # ---------- consumidores ----------
+    def _consume(self):
+        while True:
+            with self._cond:
+                while not self._dq and not self._stopping:
+                    if self.spill is not None and self.spill.ready():
+                        break
+                    self._cond.wait(timeout=0.5)
+                if self._dq:
+                    enqueued_at, topic, payload, tag = self._dq.popleft()
+                    self._cond.notify_all()  # acorda produtor bloqueado
+                elif self._stopping:
+                    return
+                else:
+                    enqueued_at = None
+            if enqueued_at is None:
+                self._replay_spill()
+                continue
+            self._handle(topic, payload, tag, time.monotonic() - enqueued_at)
+
+    def _replay_spill(self):
+        replay = self.spill.begin_replay()
+        if replay is None:
+            return
+        logger.info("Reprocessando %s mensagens do spill %s", self.spill.pending, replay)
+        try:
+            for enqueued_at, topic, payload, tag in self.spill.iter_replay():
+                self._handle(topic, payload, tag, max(0.0, time.time() - enqueued_at))
+                with self._cond:
+                    self._replayed += 1
+            if self.before_spill_commit is not None:
+                self.before_spill_commit()
+        except Exception:
+            # o .replay fica no disco e é reprocessado depois (pode repetir mensagens)
+            logger.exception("Falha ao concluir o replay de %s; nova tentativa em %ss", replay, SPILL_RETRY_SECONDS)
+            self.spill.abort_replay(SPILL_RETRY_SECONDS)
+            return
+        self.spill.commit_replay()
+
+    def _handle(self, topic, payload, tag, lag):
+        try:
+            self.handler(topic, payload, tag)
+        except Exception:
+            self._errors += 1
+            logger.exception("Falha processando mensagem de %s", topic)
+        with self._cond:
+            self._processed += 1
+            self._lag_last = lag
+            self._lag_sum += lag
+            if lag > self._lag_max:
+                self._lag_max = lag
+
+    def stop(self, drain: bool = True, timeout: float = 10.0):
+        """Encerra os consumidores; com ``drain`` processa antes o que ainda está na fila."""
+        deadline = time.monotonic() + timeout
+        if drain:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._dq, timeout=timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=max(0.1, deadline - time.monotonic()))
+        if self.spill is not None:
+            self.spill.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            processed = self._processed
+            return {
+                "depth": len(self._dq),
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "enqueued": self._enqueued,
+                "processed": processed,
+                "dropped": self._dropped,
+                "spilled": self._spilled,
+                "spill_pending": self.spill.pending if self.spill is not None else 0,
+                "replayed": self._replayed,
+                "handler_errors": self._errors,
+                "lag_ms_last": round(self._lag_last * 1000, 2),
+                "lag_ms_avg": round(self._lag_sum / processed * 1000, 2) if processed else 0.0,
+                "lag_ms_max": round(self._lag_max * 1000, 2),
+            }
@@ -0,0 +1,339 @@
+"""
+journal.py
+Write-ahead journal segmentado (append-only) do mqtt_bridge.
+
+Cada mensagem é gravada em disco (payload bruto) antes de seguir para a fila/sink.
+Cada segmento conta suas mensagens/linhas pendentes:
+  append()  -> +1 (mensagem)
+  retain(n) -> +n (linhas que a mensagem gerou e que ainda vão para o sink)
+  ack(n)    -> -n (mensagem processada / linhas gravadas pelo sink)
+Um segmento fechado (rotacionado) com pendências zeradas está commitado e é apagado.
+Na inicialização, os segmentos que sobraram de uma execução anterior são reprocessados
+com replay() (entrega at-least-once; a deduplicação do bridge absorve parte das repetições).
+
+Registro: crc32 (u32) | len(payload) (u32) | recebido_em (f64) | len(topic) (u16) | topic | payload
+O CRC cobre tudo após o próprio campo; um registro truncado/corrompido encerra a leitura do segmento.
+
+Benchmark e teste de crash (kill -9 no meio de um lote):
+    python iot/journal.py --bench --messages 200000
+    python iot/journal.py --crash-test
+"""
+
+import os
+import time
+import zlib
+import struct
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger("mqtt_bridge.journal")
+
+FSYNC_POLICIES = ("never", "interval", "always")
+_CRC = struct.Struct("<I")
+_HEAD = struct.Struct("<IdH")  # len(payload), recebido_em, len(topic)
+_SEGMENT_GLOB = "seg-*.wal"
+
+
+def _segment_name(seg_id: int) -> str:
+    return f"seg-{seg_id:010d}.wal"
+
+
+class Journal:
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024,
+                 fsync: str = "interval", fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync} (use {', '.join(FSYNC_POLICIES)})")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = int(segment_bytes)
+        self.fsync = fsync
+        self.fsync_interval = float(fsync_interval)
+
+        self._lock = threading.Lock()
+        self._segments = {}  # seg_id -> {"path", "pending", "sealed", "replaying"}
+        self._recovered = []
+        for p in sorted(self.directory.glob(_SEGMENT_GLOB)):
+            seg_id = int(p.stem.split("-")[1])
+            self._segments[seg_id] = {"path": p, "pending": 0, "sealed": True, "replaying": True}
+            self._recovered.append(seg_id)
+        self._next_id = (max(self._segments) + 1) if self._segments else 1
+
+        self._fh = None
+        self._cur_id = None
+        self._cur_size = 0
+        self._last_fsync = time.monotonic()
+
+        self._appended = 0
+        self._bytes = 0
+        self._replayed = 0
+        self._deleted = 0
+        self._started = time.monotonic()
+        self._open_segment()
+
+    # ---------- escrita ----------
+    def _open_segment(self):
+        seg_id = self._next_id
+        self._next_id += 1
+        path = self.directory / _segment_name(seg_id)
+        # sem buffer no Python: cada append é um write() e sobrevive a um kill do processo
+        self._fh = open(path, "ab", buffering=0)
+        self._cur_id = seg_id
+        self._cur_size = 0
+        self._segments[seg_id] = {"path": path, "pending": 0, "sealed": False, "replaying": False}
+
+    def _seal_current(self):
+        if self._fh is None:
+            return
+        if self.fsync != "never":
+            os.fsync(self._fh.fileno())
+        self._fh.close()
+        self._fh = None
+        seg = self._segments[self._cur_id]
+        seg["sealed"] = True
+        self._maybe_delete(self._cur_id)
+
+    def append(self, topic: str, payload: bytes, received_at: float = None) -> int:
+        """Grava a mensagem no segmento corrente e devolve o id do segmento (para ack)."""
+        t = topic.encode("utf-8")
+        head = _HEAD.pack(len(payload), received_at or time.time(), len(t))
+        crc = zlib.crc32(payload, zlib.crc32(t, zlib.crc32(head)))
+        record = _CRC.pack(crc) + head + t + payload
+        with self._lock:
+            if self._cur_size and self._cur_size + len(record) > self.segment_bytes:
+                self._seal_current()
+                self._open_segment()
+            self._fh.write(record)
+            self._cur_size += len(record)
+            if self.fsync == "always":
+                os.fsync(self._fh.fileno())
+            elif self.fsync == "interval":
+                now = time.monotonic()
+                if now - self._last_fsync >= self.fsync_interval:
+                    os.fsync(self._fh.fileno())
+                    self._last_fsync = now
+            seg_id = self._cur_id
+            self._segments[seg_id]["pending"] += 1
+            self._appended += 1
+            self._bytes += len(record)
+            return seg_id
+
+    # ---------- commit ----------
+    def retain(self, seg_id: int, n: int = 1):
+        if seg_id is None or n <= 0:
+            return
+        with self._lock:
+            seg = self._segments.get(seg_id)
+            if seg is not None:
+                seg["pending"] += n
+
+    def ack(self, seg_id: int, n: int = 1):
+        if seg_id is None or n <= 0:
+            return
+        with self._lock:
+            seg = self._segments.get(seg_id)
+            if seg is None:
+                return
+            seg["pending"] -= n
+            self._maybe_delete(seg_id)
+
+    def _maybe_delete(self, seg_id: int):
+        seg = self._segments[seg_id]
+        if seg["sealed"] and not seg["replaying"] and seg["pending"] <= 0:
+            try:
+                seg["path"].unlink(missing_ok=True)
+            except OSError:
+                logger.exception("Falha ao apagar segmento %s", seg["path"])
+                return
+            del self._segments[seg_id]
+            self._deleted += 1
+
+    # ---------- recuperação ----------
+    def replay(self):
+        """
+        Itera (seg_id, topic, payload) dos segmentos que sobraram de uma execução anterior.
+        Cada item conta como pendente até receber ack(seg_id).
+        """
+        for seg_id in list(self._recovered):
+            path = self._segments[seg_id]["path"]
+            count = 0
+            for topic, payload in read_segment(path):
+                with self._lock:
+                    self._segments[seg_id]["pending"] += 1
+                    self._replayed += 1
+                count += 1
+                yield seg_id, topic, payload
+            logger.info("Journal: %s mensagens reenviadas do segmento %s", count, path.name)
+            with self._lock:
+                self._segments[seg_id]["replaying"] = False
+                self._maybe_delete(seg_id)
+        self._recovered = []
+
+    def close(self):
+        with self._lock:
+            self._seal_current()
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        with self._lock:
+            return {
+                "appended": self._appended,
+                "bytes": self._bytes,
+                "appends_per_s": round(self._appended / elapsed, 1),
+                "segments": len(self._segments),
+                "segments_deleted": self._deleted,
+                "pending": sum(max(0, s["pending"]) for s in self._segments.values()),
+                "replayed": self._replayed,
+            }
+
+
+def read_segment(path: Path):
+    """Lê (topic, payload) de um segmento, parando no primeiro registro truncado ou com CRC inválido."""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + _CRC.size + _HEAD.size <= len(data):
+        (crc,) = _CRC.unpack_from(data, pos)
+        plen, _received_at, tlen = _HEAD.unpack_from(data, pos + _CRC.size)
+        start = pos + _CRC.size + _HEAD.size
+        end = start + tlen + plen
+        if end > len(data):
+            logger.warning("Journal: registro truncado em %s (offset %s)", path.name, pos)
+            return
+        head = data[pos + _CRC.size:start]
+        t = data[start:start + tlen]
+        payload = data[start + tlen:end]
+        if zlib.crc32(payload, zlib.crc32(t, zlib.crc32(head))) != crc:
+            logger.warning("Journal: CRC inválido em %s (offset %s)", path.name, pos)
+            return
+        yield t.decode("utf-8", errors="replace"), payload
+        pos = end
+
+
+# ---------- benchmark e teste de crash ----------
+def _bench(n: int, directory: Path):
+    import shutil
+
+    payload = b'{"sensor_id":"esp32-0001","umidade":45.12,"nutriente":11.8,"ts":"2025-11-16T00:00:00"}'
+    for policy in FSYNC_POLICIES:
+        d = directory / policy
+        shutil.rmtree(d, ignore_errors=True)
+        count = n if policy != "always" else min(n, 5000)
+        j = Journal(str(d), fsync=policy)
+        t0 = time.perf_counter()
+        for _ in range(count):
+            seg = j.append("farmtech/sensors/soil", payload)
+            j.ack(seg)
+        j.close()
+        dt = time.perf_counter() - t0
+        st = j.stats()
+        print(f"fsync={policy:8s}: {count} appends em {dt:.3f}s -> {count / dt:,.0f} msg/s, "
+              f"{st['bytes'] / dt / 1e6:.1f} MB/s, segmentos restantes={st['segments']}")
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def _crash_child(directory: Path, out_csv: Path):
+    """
+    Processo filho: journal + sink CSV em lote, com a contagem do bridge (retain por linha,
+    ack da mensagem ao entregar ao sink, ack por linha no flush). Imprime o último id aceito.
+    Morre por SIGKILL.
+    """
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from db.writer import BatchedCsvWriter
+
+    j = Journal(str(directory), segment_bytes=64 * 1024, fsync="never")
+
+    def on_flush(rows):
+        for r in rows:
+            j.ack(r["_wal"])
+
+    w = BatchedCsvWriter(str(out_csv), max_rows=997, max_latency=0.2, fsync="batch", on_flush=on_flush)
+    i = 0
+    while True:
+        payload = f'{{"sensor_id":"crash","umidade":{i},"ts":"id-{i}"}}'.encode()
+        seg = j.append("farmtech/sensors/crash", payload)
+        j.retain(seg, 1)
+        w.write({"sensor_id": "crash", "umidade": i, "nutriente": "", "ts": f"id-{i}", "_wal": seg})
+        j.ack(seg)  # mensagem processada; a linha segue pendente até o flush
+        if i % 1000 == 0:
+            print(i, flush=True)
+        i += 1
+
+
+def _crash_test(directory: Path, seconds: float):
+    import csv
+    import signal
+    import subprocess
+    import sys
+    import shutil
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from db.writer import BatchedCsvWriter
+
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    wal_dir, out_csv = directory / "wal", directory / "out.csv"
+    proc = subprocess.Popen([sys.executable, __file__, "--crash-child", str(directory)],
+                            stdout=subprocess.PIPE, text=True)
+    time.sleep(seconds)
+    proc.send_signal(signal.SIGKILL)
+    lines = proc.stdout.read().split()
+    proc.wait()
+    accepted = int(lines[-1]) if lines else 0
+    with out_csv.open() as f:
+        before = sum(1 for _ in csv.DictReader(f))
+    print(f"filho morto com SIGKILL: >= {accepted} mensagens aceitas, {before} linhas no CSV, "
+          f"{len(list(wal_dir.glob(_SEGMENT_GLOB)))} segmentos no journal")
+
+    # recuperação: reprocessa os segmentos pendentes no mesmo sink (mesma contagem do filho)
+    j = Journal(str(wal_dir), segment_bytes=64 * 1024, fsync="never")
+    w = BatchedCsvWriter(str(out_csv), max_rows=997, max_latency=3600,
+                         on_flush=lambda rows: [j.ack(r["_wal"]) for r in rows])
+    for seg, topic, payload in j.replay():
+        i = int(payload.split(b'"id-')[1].split(b'"')[0])
+        j.retain(seg, 1)
+        w.write({"sensor_id": "crash", "umidade": i, "nutriente": "", "ts": f"id-{i}", "_wal": seg})
+        j.ack(seg)
+    # linhas ainda no buffer do writer: os segmentos delas não podem ter sido apagados
+    with j._lock:
+        held = [s["path"] for s in j._segments.values() if s["sealed"] and s["pending"] > 0]
+    survived = all(p.exists() for p in held)
+    print(f"antes do flush: {w.stats()['buffered']} linhas no buffer, {len(held)} segmento(s) retidos "
+          f"({'no disco' if survived else 'APAGADOS'})")
+    w.close()
+    j.close()
+
+    with out_csv.open() as f:
+        ids = [int(r["ts"][3:]) for r in csv.DictReader(f) if r["ts"].startswith("id-")]
+    unique = set(ids)
+    expected = set(range(max(unique) + 1)) if unique else set()
+    missing = expected - unique
+    print(f"após replay: {len(ids)} linhas, {len(unique)} ids únicos, {len(ids) - len(unique)} duplicados "
+          f"(at-least-once), faltando={len(missing)}, segmentos restantes={j.stats()['segments']}")
+    ok = not missing and len(unique) > accepted and survived
+    print("OK: nenhuma leitura aceita foi perdida" if ok else "FALHA: leituras perdidas")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Benchmark e teste de crash do journal")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--crash-test", action="store_true")
+    parser.add_argument("--crash-child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--seconds", type=float, default=2.0, help="Tempo até o kill -9 (crash test)")
+    parser.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    if args.crash_child:
+        _crash_child(Path(args.crash_child) / "wal", Path(args.crash_child) / "out.csv")
+    work = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="farmtech_journal_"))
+    if args.crash_test:
+        sys.exit(_crash_test(work, args.seconds))
+    _bench(args.messages, work)
@@ -2,20 +2,47 @@
 """
 mqtt_bridge.py (versão atualizada)
 - Callback API v2 (paho >= 2.x)
-- Reconnect/backoff, will, logs e escrita CSV segura
+- Reconnect/backoff, will, logs e escrita em lote: CSV (BatchedCsvWriter),
+  PostgreSQL via COPY (PostgresCopyWriter, BRIDGE_SINK=postgres) ou Parquet
+  particionado por dia (ParquetStoreWriter, BRIDGE_SINK=parquet, compactação em background)
+- Rollups 1m/1h/1d por sensor (db/rollups.py) atualizados a partir das linhas gravadas
+- Último valor por sensor (db/latest.py): upsert em sensor_latest ou snapshot JSON local
+- Ring buffer mmap das últimas leituras por sensor (db/ringbuffer.py) para o dashboard ao vivo
+- Decodificação em bytes via decoders.decode_payload (aliases, lote, orjson opcional)
+- on_message só enfileira; consumidores (IngestQueue) decodificam e gravam no sink
+- Deduplicação (DedupIndex, memória limitada): (sensor_id, ts) do dispositivo e hash do
+  payload só para reentregas QoS >= 1 (flag DUP) numa janela curta
+- Write-ahead journal (JOURNAL_ENABLED): payload bruto em disco antes da fila; segmentos
+  são apagados quando todas as linhas chegam ao sink e reprocessados após um crash
+- Multi-worker (BRIDGE_WORKERS/BRIDGE_WORKER_INDEX): shared subscription MQTT v5
+  ou shard por hash do sensor_id; cada worker tem client id, partição e contadores próprios.
+  shared (padrão) é o modo que escala: o broker divide as mensagens. Em hash cada worker
+  recebe todo o tráfego; a posse é decidida logo após o decode em on_message, antes de
+  dedup, journal e fila, então o custo por mensagem alheia é só o decode
 - Testado com broker público (broker.hivemq.com)
 """
 
 import os
-import csv
 import json
 import time
+import zlib
 import logging
+import threading
 from pathlib import Path
 import signal
 import sys
 import paho.mqtt.client as mqtt
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.writer import BatchedCsvWriter, PostgresCopyWriter, ParquetStoreWriter, HEADER
+from data_pipeline.config import DATABASE_URL
+from decoders import decode_payload, now_ts, JSON_BACKEND
+from dedup import DedupIndex, filter_duplicates, is_redelivery
+from ingest_queue import IngestQueue
+from journal import Journal
 
 OUT_CSV = os.getenv("OUT_CSV", str(Path.cwd() / "db" / "sensors_ingest.csv"))
 BROKER = os.getenv("MQTT_BROKER", "broker.hivemq.com")
@@ -25,9 +52,67 @@ CLIENT_ID = os.getenv("MQTT_CLIENT_ID", "farmtech-bridge-01")
 QOS = int(os.getenv("MQTT_QOS", "0"))
 KEEPALIVE = int(os.getenv("MQTT_KEEPALIVE", "60"))
 
+# scale-out: N processos (iniciados pelo orchestrator --workers N)
+WORKERS = max(1, int(os.getenv("BRIDGE_WORKERS", "1")))
+WORKER_INDEX = int(os.getenv("BRIDGE_WORKER_INDEX", "0"))
+SHARD_MODE = os.getenv("BRIDGE_SHARD_MODE", "shared").lower()  # shared | hash
+SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP", "farmtech-bridge")
+
+if WORKERS > 1:
+    if not 0 <= WORKER_INDEX < WORKERS:
+        raise SystemExit(f"BRIDGE_WORKER_INDEX={WORKER_INDEX} fora do intervalo 0..{WORKERS - 1}")
+    if SHARD_MODE not in ("shared", "hash"):
+        raise SystemExit(f"BRIDGE_SHARD_MODE inválido: {SHARD_MODE} (use shared ou hash)")
+    CLIENT_ID = f"{CLIENT_ID}-w{WORKER_INDEX}"
+    # shared subscription: o broker entrega cada mensagem a um único worker do grupo
+    SUBSCRIBE_TOPIC = f"$share/{SHARE_GROUP}/{TOPIC}" if SHARD_MODE == "shared" else TOPIC
+else:
+    SUBSCRIBE_TOPIC = TOPIC
+HASH_SHARDING = WORKERS > 1 and SHARD_MODE == "hash"
+
 RECONNECT_MIN = int(os.getenv("MQTT_RECONNECT_MIN", "1"))
 RECONNECT_MAX = int(os.getenv("MQTT_RECONNECT_MAX", "120"))
 
+# sink em lote: flush por tamanho (linhas) ou por tempo (segundos)
+SINK = os.getenv("BRIDGE_SINK", "csv").lower()  # csv | postgres | parquet
+SINK_BATCH_ROWS = int(os.getenv("SINK_BATCH_ROWS", "500"))
+SINK_MAX_LATENCY = float(os.getenv("SINK_MAX_LATENCY", "1.0"))
+SINK_FSYNC = os.getenv("SINK_FSYNC", "never")  # never | batch | interval
+SINK_FSYNC_INTERVAL = float(os.getenv("SINK_FSYNC_INTERVAL", "1.0"))
+STATS_INTERVAL = int(os.getenv("BRIDGE_STATS_INTERVAL", "60"))
+# fila entre on_message e o sink (block | drop_oldest | spill)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_OVERFLOW = os.getenv("INGEST_OVERFLOW", "block").lower()
+INGEST_CONSUMERS = int(os.getenv("INGEST_CONSUMERS", "1"))
+INGEST_BLOCK_TIMEOUT = float(os.getenv("INGEST_BLOCK_TIMEOUT", "0")) or None
+# deduplicação: LRU de (sensor_id, ts) do dispositivo; payloads sem ts nunca são descartados
+# por conteúdo, só reentregas (flag DUP, QoS >= 1) do mesmo payload em DEDUP_REDELIVERY_WINDOW s
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1").lower() not in ("0", "false", "no")
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", "100000"))
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "0")) or None
+DEDUP_REDELIVERY_WINDOW = float(os.getenv("DEDUP_REDELIVERY_WINDOW", "30"))
+MAX_QUEUED_OUT = int(os.getenv("MQTT_MAX_QUEUED", "1000"))
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "2"))
+PG_COPY_RETRIES = int(os.getenv("PG_COPY_RETRIES", "3"))
+# manutenção das partições mensais de sensors (db/partitions.py maintain); 0 desliga
+PARTITION_MAINTAIN_INTERVAL = float(os.getenv("PARTITION_MAINTAIN_INTERVAL", str(6 * 3600)))
+PARQUET_STORE_DIR = os.getenv("PARQUET_STORE_DIR") or None  # padrão: db/store
+PARQUET_BY_SENSOR = os.getenv("PARQUET_BY_SENSOR", "0").lower() in ("1", "true", "yes")
+PARQUET_COMPACT_INTERVAL = float(os.getenv("PARQUET_COMPACT_INTERVAL", "300"))
+# rollups: auto (postgres com sink postgres, parquet com sink parquet) | postgres | parquet | off
+ROLLUPS = os.getenv("BRIDGE_ROLLUPS", "auto").lower()
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "5"))
+# último valor por sensor: auto (postgres com sink postgres, senão snapshot) | postgres | snapshot | off
+LATEST = os.getenv("BRIDGE_LATEST", "auto").lower()
+LATEST_FLUSH_INTERVAL = float(os.getenv("LATEST_FLUSH_INTERVAL", "2"))
+# ring buffer em memória compartilhada (um arquivo por worker em RING_DIR)
+RING_ENABLED = os.getenv("RING_ENABLED", "1").lower() not in ("0", "false", "no")
+# write-ahead journal (entrega at-least-once para o sink)
+JOURNAL_ENABLED = os.getenv("JOURNAL_ENABLED", "0").lower() not in ("0", "false", "no")
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "interval").lower()  # never | interval | always
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "1.0"))
+
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
     format="%(asctime)s [%(levelname)s] %(message)s"
@@ -36,20 +121,252 @@ logger = logging.getLogger("mqtt_bridge")
 
 
 out_path = Path(OUT_CSV)
+if WORKERS > 1:
+    # partição por worker: sensors_ingest.w0.csv, sensors_ingest.w1.csv, ...
+    out_path = out_path.with_name(f"{out_path.stem}.w{WORKER_INDEX}{out_path.suffix}")
 out_path.parent.mkdir(parents=True, exist_ok=True)
-HEADER = ["sensor_id", "umidade", "nutriente", "ts"]
+
+WORKER_TAG = f"w{WORKER_INDEX}/{WORKERS}"
+SPILL_PATH = os.getenv("INGEST_SPILL_PATH", str(out_path.parent / "spill" / f"ingest.w{WORKER_INDEX}.spill"))
+# sink fora do ar: lotes que falharam ficam no buffer; acima de SINK_MAX_BUFFER linhas vão para este arquivo
+SINK_SPILL_PATH = os.getenv("SINK_SPILL_PATH", str(out_path.parent / "spill" / f"sink.w{WORKER_INDEX}.jsonl"))
+SINK_MAX_BUFFER = int(os.getenv("SINK_MAX_BUFFER", str(SINK_BATCH_ROWS * 20)))
+JOURNAL_DIR = Path(os.getenv("JOURNAL_DIR", str(out_path.parent / "journal"))) / f"w{WORKER_INDEX}"
+counters = {"received": 0, "written": 0, "skipped_shard": 0, "unparsed": 0, "decode_errors": 0, "duplicates": 0}
+_counters_lock = threading.Lock()
+
+def _count(key, n=1):
+    with _counters_lock:
+        counters[key] += n
+
+_ingest = None
+dedup_index = DedupIndex(DEDUP_CAPACITY, DEDUP_WINDOW) if DEDUP_ENABLED else None
+# QoS 0 não tem reentrega; janela <= 0 desliga
+redelivery_index = DedupIndex(DEDUP_CAPACITY, DEDUP_REDELIVERY_WINDOW) \
+    if DEDUP_ENABLED and QOS >= 1 and DEDUP_REDELIVERY_WINDOW > 0 else None
+journal = None
+
+def get_journal():
+    global journal
+    if journal is None and JOURNAL_ENABLED:
+        journal = Journal(
+            str(JOURNAL_DIR),
+            segment_bytes=JOURNAL_SEGMENT_BYTES,
+            fsync=JOURNAL_FSYNC,
+            fsync_interval=JOURNAL_FSYNC_INTERVAL,
+        )
+        logger.info("Journal em %s (segmento=%s bytes, fsync=%s)", JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_FSYNC)
+    return journal
+
+rollups = None
+
+def get_rollups():
+    global rollups
+    kind = ROLLUPS
+    if kind == "auto":
+        kind = {"postgres": "postgres", "pg": "postgres", "parquet": "parquet"}.get(SINK, "off")
+    if rollups is None and kind in ("postgres", "parquet"):
+        from db.rollups import RollupMaintainer, PostgresRollups, ParquetRollups
+        backend = PostgresRollups(DATABASE_URL) if kind == "postgres" else ParquetRollups()
+        # deltas Parquet de vários workers: só o worker 0 compacta
+        rollups = RollupMaintainer(backend, flush_interval=ROLLUP_FLUSH_INTERVAL,
+                                   compact_every=60 if WORKER_INDEX == 0 else 0)
+        logger.info("Rollups 1m/1h/1d: %s (flush a cada %ss)", kind, ROLLUP_FLUSH_INTERVAL)
+    return rollups
+
+latest = None
+
+def get_latest():
+    global latest
+    kind = LATEST
+    if kind == "auto":
+        kind = "postgres" if SINK in ("postgres", "pg") else "snapshot"
+    if latest is None and kind in ("postgres", "snapshot"):
+        from db.latest import LatestMaintainer, PostgresLatest, DEFAULT_LATEST_DIR, source_id
+        if kind == "postgres":
+            latest = LatestMaintainer(PostgresLatest(DATABASE_URL), flush_interval=LATEST_FLUSH_INTERVAL)
+        else:
+            # o dashboard só usa o snapshot se estiver lendo este mesmo destino
+            if SINK == "parquet":
+                from db.store import DEFAULT_STORE_DIR
+                source = source_id("parquet", PARQUET_STORE_DIR or DEFAULT_STORE_DIR)
+            else:
+                source = source_id("csv", out_path)
+            latest = LatestMaintainer(snapshot_path=Path(DEFAULT_LATEST_DIR) / f"w{WORKER_INDEX}.json",
+                                      flush_interval=LATEST_FLUSH_INTERVAL, source=source)
+        logger.info("Último valor por sensor: %s (flush a cada %ss)", kind, LATEST_FLUSH_INTERVAL)
+    return latest
+
+ring = None
+
+def get_ring():
+    global ring
+    if ring is None and RING_ENABLED:
+        from db.ringbuffer import RingWriter, DEFAULT_RING_DIR
+        ring = RingWriter(Path(DEFAULT_RING_DIR) / f"w{WORKER_INDEX}.ring")
+        logger.info("Ring buffer em %s (%s sensores x %s leituras)", ring.path, ring.capacity, ring.depth)
+    return ring
+
+def _on_sink_flush(rows):
+    """
+    Linhas gravadas pelo sink: alimenta ring, rollups e último valor e libera as pendências
+    no journal. Com rollups o ack espera o flush dos deltas (um crash antes dele reenvia as
+    mensagens na subida, em vez de perder os rollups dessas linhas).
+    """
+    if ring is not None:
+        try:
+            ring.write_rows(rows)
+        except Exception:
+            logger.exception("Falha ao escrever no ring buffer")
+    if latest is not None:
+        try:
+            latest.add(rows)
+        except Exception:
+            logger.exception("Falha ao atualizar último valor por sensor")
+    if rollups is not None:
+        try:
+            rollups.add(rows, done=(lambda: _ack_rows(rows)) if journal is not None else None)
+            return
+        except Exception:
+            logger.exception("Falha ao acumular rollups")
+    _ack_rows(rows)
+
+def _ack_rows(rows):
+    if journal is None:
+        return
+    for row in rows:
+        journal.ack(row.get("_wal"))
+
+def _on_queue_drop(topic, payload, seg):
+    # descartada por política (drop_oldest/timeout): não segura o segmento para sempre
+    if journal is not None:
+        journal.ack(seg)
+
+_sink = None
+_compactor = None
+_partitions = None
+
+def get_sink():
+    global _sink, _compactor, _partitions
+    if _sink is None and SINK == "parquet":
+        _sink = ParquetStoreWriter(
+            PARQUET_STORE_DIR,
+            partition_by_sensor=PARQUET_BY_SENSOR,
+            max_rows=SINK_BATCH_ROWS,
+            max_latency=SINK_MAX_LATENCY,
+            on_flush=_on_sink_flush,
+            on_reject=_ack_rows,  # dado rejeitado pelo destino: libera o journal
+            spill_path=SINK_SPILL_PATH,
+            max_buffer=SINK_MAX_BUFFER,
+        )
+        if WORKER_INDEX == 0 and PARQUET_COMPACT_INTERVAL > 0:
+            # um compactador por diretório: os demais workers só escrevem arquivos novos
+            from db.store import Compactor
+            _compactor = Compactor(_sink.store, interval=PARQUET_COMPACT_INTERVAL)
+            _compactor.start()
+        logger.info("Sink Parquet em %s (batch=%s, latency=%ss, por sensor=%s)",
+                    _sink.store.root, SINK_BATCH_ROWS, SINK_MAX_LATENCY, PARQUET_BY_SENSOR)
+    elif _sink is None and SINK in ("postgres", "pg"):
+        _sink = PostgresCopyWriter(
+            DATABASE_URL,
+            max_rows=SINK_BATCH_ROWS,
+            max_latency=SINK_MAX_LATENCY,
+            pool_size=PG_POOL_SIZE,
+            retries=PG_COPY_RETRIES,
+            on_flush=_on_sink_flush,
+            on_reject=_ack_rows,
+            spill_path=SINK_SPILL_PATH,
+            max_buffer=SINK_MAX_BUFFER,
+        )
+        if WORKER_INDEX == 0 and PARTITION_MAINTAIN_INTERVAL > 0:
+            # partições do mês seguinte antes da virada (senão tudo cai em sensors_default)
+            from db.partitions import PartitionMaintainer
+            _partitions = PartitionMaintainer(DATABASE_URL, interval=PARTITION_MAINTAIN_INTERVAL)
+            _partitions.start()
+        logger.info("Sink PostgreSQL (COPY) na tabela sensors (batch=%s, latency=%ss, pool=%s)",
+                    SINK_BATCH_ROWS, SINK_MAX_LATENCY, PG_POOL_SIZE)
+    elif _sink is None:
+        _sink = BatchedCsvWriter(
+            str(out_path),
+            header=HEADER,
+            max_rows=SINK_BATCH_ROWS,
+            max_latency=SINK_MAX_LATENCY,
+            fsync=SINK_FSYNC,
+            fsync_interval=SINK_FSYNC_INTERVAL,
+            on_flush=_on_sink_flush,
+            on_reject=_ack_rows,
+            spill_path=SINK_SPILL_PATH,
+            max_buffer=SINK_MAX_BUFFER,
+        )
+        logger.info("Sink CSV em lote: %s (batch=%s, latency=%ss, fsync=%s)",
+                    out_path, SINK_BATCH_ROWS, SINK_MAX_LATENCY, SINK_FSYNC)
+    return _sink
+
+def get_ingest_queue():
+    global _ingest
+    if _ingest is None:
+        _ingest = IngestQueue(
+            process_message,
+            maxsize=INGEST_QUEUE_SIZE,
+            policy=INGEST_OVERFLOW,
+            consumers=INGEST_CONSUMERS,
+            spill_path=SPILL_PATH,
+            block_timeout=INGEST_BLOCK_TIMEOUT,
+            on_drop=_on_queue_drop,
+            # o spill reprocessado só é apagado depois que as linhas chegaram ao sink
+            before_spill_commit=lambda: get_sink().sync(),
+        ).start()
+        logger.info("Fila de ingestão: max=%s, overflow=%s, consumidores=%s",
+                    INGEST_QUEUE_SIZE, INGEST_OVERFLOW, INGEST_CONSUMERS)
+    return _ingest
+
+def log_sink_stats():
+    logger.info("[%s] Mensagens: %s", WORKER_TAG, counters)
+    if _ingest is not None:
+        logger.info("[%s] Fila: %s", WORKER_TAG, _ingest.stats())
+    if dedup_index is not None:
+        logger.info("[%s] Dedup: %s", WORKER_TAG, dedup_index.stats())
+    if redelivery_index is not None:
+        logger.info("[%s] Dedup (reentregas): %s", WORKER_TAG, redelivery_index.stats())
+    if journal is not None:
+        logger.info("[%s] Journal: %s", WORKER_TAG, journal.stats())
+    if rollups is not None:
+        logger.info("[%s] Rollups: %s", WORKER_TAG, rollups.stats())
+    if latest is not None:
+        logger.info("[%s] Último valor: %s", WORKER_TAG, latest.stats())
+    if ring is not None:
+        logger.info("[%s] Ring buffer: %s", WORKER_TAG, ring.stats())
+    if _sink is not None:
+        logger.info("[%s] Throughput sink: %s", WORKER_TAG, _sink.stats())
+
+def owns_sensor(sensor_id) -> bool:
+    """Shard determinístico (modo hash): crc32(sensor_id) % WORKERS == WORKER_INDEX."""
+    if not HASH_SHARDING:
+        return True
+    return zlib.crc32(str(sensor_id).encode("utf-8")) % WORKERS == WORKER_INDEX
+
+def owns_message(topic: str, payload: bytes) -> bool:
+    """Modo hash: a mensagem tem ao menos uma leitura deste worker (não reconhecida: worker 0)."""
+    if not HASH_SHARDING:
+        return True
+    try:
+        rows = decode_payload(payload, topic, fill_ts=False)
+    except Exception as e:
+        # roda na thread de rede do paho: uma exceção aqui derrubaria o loop_forever
+        _count("decode_errors")
+        logger.warning("Falha ao decodificar payload (%s): %r", e, payload[:200])
+        return WORKER_INDEX == 0
+    if not rows:
+        return WORKER_INDEX == 0  # o aviso de payload não reconhecido sai uma vez só
+    return any(owns_sensor(row.get("sensor_id")) for row in rows)
 
 def safe_write_row(row: dict):
-    write_header = not out_path.exists()
     try:
-        with out_path.open("a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=HEADER)
-            if write_header:
-                writer.writeheader()
-            to_write = {k: row.get(k, "") for k in HEADER}
-            writer.writerow(to_write)
+        get_sink().write(row)
+        _count("written")
     except Exception as e:
-        logger.exception("Falha ao gravar CSV: %s", e)
+        # com journal, a linha fica pendente e o segmento é reprocessado no próximo start
+        logger.exception("Falha ao gravar linha no sink: %s", e)
 
 
 
@@ -66,35 +383,67 @@ def on_connect(client, userdata, flags, reasonCode, properties=None):
         conn_str = str(rc)
     if rc == 0:
         logger.info("Conectado ao broker %s:%s (resultado=%s)", BROKER, PORT, conn_str)
-        client.subscribe(TOPIC, qos=QOS)
-        logger.info("Inscrito em: %s (qos=%s)", TOPIC, QOS)
+        client.subscribe(SUBSCRIBE_TOPIC, qos=QOS)
+        logger.info("Inscrito em: %s (qos=%s, worker=%s)", SUBSCRIBE_TOPIC, QOS, WORKER_TAG)
     else:
         logger.warning("Falha na conexão, result code: %s", conn_str)
 
-def on_message(client, userdata, msg, properties=None):
-    payload = msg.payload.decode("utf-8", errors="ignore")
-    logger.debug("Mensagem recebida em %s: %s", msg.topic, payload)
+def process_message(topic: str, payload: bytes, seg: int = None):
+    """
+    Decodifica e grava uma mensagem (roda nos consumidores da fila de ingestão).
+    ``seg`` é o segmento do journal: cada linha enviada ao sink fica pendente nele
+    até o flush (``_on_sink_flush``); a mensagem em si é liberada ao final.
+    """
     try:
-        data = json.loads(payload)
-        normalized = {
-            "sensor_id": data.get("sensor_id") or data.get("id") or data.get("device"),
-            "umidade": data.get("umidade") or data.get("humidity"),
-            "nutriente": data.get("nutriente") or data.get("nutrient"),
-            "ts": data.get("ts") or data.get("timestamp") or time.strftime("%Y-%m-%dT%H:%M:%S")
-        }
-        safe_write_row(normalized)
-    except json.JSONDecodeError:
-        parts = [p.strip() for p in payload.split(",")]
-        if len(parts) >= 3:
-            row = {
-                "sensor_id": parts[0],
-                "umidade": parts[1],
-                "nutriente": parts[2],
-                "ts": parts[3] if len(parts) > 3 else time.strftime("%Y-%m-%dT%H:%M:%S")
-            }
-            safe_write_row(row)
-        else:
-            logger.warning("Payload não reconhecido e não gravado: %s", payload)
+        _process_rows(topic, payload, seg)
+    finally:
+        if journal is not None:
+            journal.ack(seg)
+
+def _process_rows(topic: str, payload: bytes, seg):
+    try:
+        rows = decode_payload(payload, topic, fill_ts=dedup_index is None)
+    except Exception as e:
+        _count("decode_errors")
+        logger.warning("Falha ao decodificar payload, não gravado (%s): %r", e, payload[:200])
+        return
+    if not rows:
+        _count("unparsed")
+        logger.warning("Payload não reconhecido e não gravado: %r", payload[:200])
+        return
+    if HASH_SHARDING:
+        # lote com sensores de vários workers: só as leituras deste seguem para dedup/journal
+        owned = [row for row in rows if owns_sensor(row.get("sensor_id"))]
+        if len(owned) != len(rows):
+            _count("skipped_shard", len(rows) - len(owned))
+        rows = owned
+    if dedup_index is not None:
+        unique = filter_duplicates(dedup_index, rows)
+        if len(unique) != len(rows):
+            _count("duplicates", len(rows) - len(unique))
+        for row in unique:
+            if row["ts"] is None:
+                row["ts"] = now_ts()
+        rows = unique
+    if journal is not None and seg is not None:
+        journal.retain(seg, len(rows))
+        for row in rows:
+            row["_wal"] = seg
+    for row in rows:
+        safe_write_row(row)
+
+def on_message(client, userdata, msg, properties=None):
+    _count("received")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Mensagem recebida em %s: %r", msg.topic, msg.payload)
+    if not owns_message(msg.topic, msg.payload):
+        _count("skipped_shard")
+        return
+    if redelivery_index is not None and is_redelivery(redelivery_index, msg.payload, bool(getattr(msg, "dup", False))):
+        _count("duplicates")
+        return
+    seg = journal.append(msg.topic, msg.payload) if journal is not None else None
+    get_ingest_queue().put(msg.topic, msg.payload, seg)
 
 def on_disconnect(client, userdata, reasonCode, properties=None):
     try:
@@ -118,13 +467,14 @@ def create_client():
     """
     Use Callback API v2 (if paho supports) and MQTT v3.1.1 protocol for widest broker compatibility.
     If your paho version is <2.x, you may need to adjust or install a newer paho.
+    Shared subscriptions ($share/...) exigem MQTT v5, usado quando BRIDGE_SHARD_MODE=shared com N workers.
     """
-    
+    protocol = mqtt.MQTTv5 if SUBSCRIBE_TOPIC.startswith("$share/") else mqtt.MQTTv311
     try:
-        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID, protocol=mqtt.MQTTv311)
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=CLIENT_ID, protocol=protocol)
     except Exception:
         
-        client = mqtt.Client(client_id=CLIENT_ID, protocol=mqtt.MQTTv311)
+        client = mqtt.Client(client_id=CLIENT_ID, protocol=protocol)
 
     
     client.on_connect = on_connect
@@ -154,7 +504,7 @@ def create_client():
     
     try:
         client.max_inflight_messages_set(20)
-        client.max_queued_messages_set(0)
+        client.max_queued_messages_set(MAX_QUEUED_OUT)
     except Exception:
         pass
 
@@ -162,6 +512,21 @@ def create_client():
 
 
 def main():
+    logger.info("Decoder JSON: %s", JSON_BACKEND)
+    get_rollups()
+    get_latest()
+    get_ring()
+    get_sink()
+    get_journal()
+    queue = get_ingest_queue()
+    if journal is not None:
+        # segmentos não commitados da execução anterior voltam para a fila antes do broker
+        replayed = 0
+        for seg, topic, payload in journal.replay():
+            queue.put(topic, payload, seg)
+            replayed += 1
+        if replayed:
+            logger.info("Journal: %s mensagens reenfileiradas para o sink", replayed)
     client = create_client()
 
     
@@ -193,15 +558,39 @@ def main():
             client.disconnect()
         except Exception:
             pass
+        if _ingest is not None:
+            _ingest.stop(drain=True)
+        if _compactor is not None:
+            _compactor.stop()
+        if _partitions is not None:
+            _partitions.stop()
+        if _sink is not None:
+            try:
+                _sink.close()
+            except Exception:
+                logger.exception("Falha ao descarregar sink no encerramento")
+            if rollups is not None:
+                rollups.close()
+            if latest is not None:
+                latest.close()
+            if ring is not None:
+                ring.close()
+            if journal is not None:
+                journal.close()
+            log_sink_stats()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, _shutdown)
     signal.signal(signal.SIGTERM, _shutdown)
 
     
+    last_stats = time.monotonic()
     try:
         while True:
             time.sleep(1)
+            if STATS_INTERVAL and time.monotonic() - last_stats >= STATS_INTERVAL:
+                log_sink_stats()
+                last_stats = time.monotonic()
     except KeyboardInterrupt:
         _shutdown("KeyboardInterrupt", None)
 
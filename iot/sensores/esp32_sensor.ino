@@ -1,10 +1,36 @@
 #include <WiFi.h>
 #include <PubSubClient.h>
+#include <time.h>
 
 const char* ssid = "YOUR_SSID";
 const char* password = "YOUR_WIFI_PASSWORD";
 const char* mqtt_server = "broker.hivemq.com";
 
+// 1 = payload binário v1 (iot/binary_format.py), 0 = JSON
+#define USE_BINARY_PAYLOAD 0
+
+const char* SENSOR_ID = "esp32-01";
+const char* TOPIC_JSON = "farmtech/sensors/soil";
+const char* TOPIC_BIN = "farmtech/sensors/soil/bin";
+
+// formato binário v1 (little-endian, mesmo layout de iot/binary_format.py)
+const uint8_t FT_MAGIC = 0xFA;
+const uint8_t FT_VERSION = 1;
+const int16_t FT_MISSING = -32768;
+
+struct __attribute__((packed)) FtHeader {
+  uint8_t magic;
+  uint8_t version;
+  uint16_t count;
+};
+
+struct __attribute__((packed)) FtRecord {
+  char sensor_id[16];
+  uint32_t ts;
+  int16_t umidade;    // x100
+  int16_t nutriente;  // x100
+};
+
 WiFiClient espClient;
 PubSubClient client(espClient);
 
@@ -19,16 +45,45 @@ void setup() {
     Serial.print(".");
   }
   Serial.println("\nWiFi connected");
+  // epoch real via NTP (ts = 0 no payload faz o bridge usar a hora de chegada)
+  configTime(0, 0, "pool.ntp.org", "time.nist.gov");
   client.setServer(mqtt_server, 1883);
 }
 
+uint32_t epoch_now() {
+  time_t now = time(nullptr);
+  return now > 1600000000 ? (uint32_t)now : 0;
+}
+
 void publish_reading() {
   int raw = analogRead(SENSOR_PIN);
   float humidity = map(raw, 0, 4095, 0, 100);
+  uint32_t ts = epoch_now();
+
+#if USE_BINARY_PAYLOAD
+  uint8_t payload[sizeof(FtHeader) + sizeof(FtRecord)];
+  FtHeader header = {FT_MAGIC, FT_VERSION, 1};
+  FtRecord rec;
+  memset(&rec, 0, sizeof(rec));
+  strncpy(rec.sensor_id, SENSOR_ID, sizeof(rec.sensor_id));
+  rec.ts = ts;
+  rec.umidade = (int16_t)lroundf(humidity * 100.0f);
+  rec.nutriente = FT_MISSING;
+  memcpy(payload, &header, sizeof(header));
+  memcpy(payload + sizeof(header), &rec, sizeof(rec));
+  client.publish(TOPIC_BIN, payload, sizeof(payload));
+  Serial.printf("bin %u bytes umidade=%.2f ts=%u\n", (unsigned)sizeof(payload), humidity, ts);
+#else
   char payload[128];
-  snprintf(payload, sizeof(payload), "{\"sensor_id\":\"esp32-01\",\"umidade\":%.2f,\"ts\":\"%s\"}", humidity, "2025-11-16T00:00:00");
-  client.publish("farmtech/sensors/soil", payload);
+  if (ts) {
+    // epoch, como no binário: o bridge formata (iot/binary_format.py format_epoch)
+    snprintf(payload, sizeof(payload), "{\"sensor_id\":\"%s\",\"umidade\":%.2f,\"ts\":%u}", SENSOR_ID, humidity, (unsigned)ts);
+  } else {
+    snprintf(payload, sizeof(payload), "{\"sensor_id\":\"%s\",\"umidade\":%.2f}", SENSOR_ID, humidity);
+  }
+  client.publish(TOPIC_JSON, payload);
   Serial.println(payload);
+#endif
 }
 
 void loop() {
@@ -0,0 +1,391 @@
+"""
+load_generator.py
+Gerador de carga para o mqtt_bridge: milhares de sensores a uma taxa agregada configurável.
+
+- Valores com deriva realista (passeio aleatório com reversão à média por sensor)
+- Injeção opcional de duplicatas (mesmo payload reenviado, como reentrega QoS 1)
+  e de leituras fora de ordem (ts atrasado alguns segundos)
+- Payload JSON (ts com microssegundos) ou binário v1 (iot/binary_format.py)
+
+Modos:
+  direct -> importa o mqtt_bridge no próprio processo e chama on_message (fila + sink reais,
+            sem broker); a latência vai do on_message até o flush do lote no sink
+  mqtt   -> publica num broker local (ex.: docker run -p 1883:1883 eclipse-mosquitto);
+            com --spawn-bridge sobe o bridge como subprocesso apontando para o mesmo broker
+            e mede a latência acompanhando o CSV de saída dele
+
+No formato binário o ts tem resolução de segundos: acima de 1 msg/s por sensor a
+deduplicação do bridge descarta leituras legítimas (use --sensors >= --rate).
+
+Relatório: msgs/s enviadas, linhas/s gravadas (sustentado até a fila esvaziar),
+latência fim a fim p50/p99 e RSS (pico) do processo do bridge.
+
+Exemplos:
+    python iot/sensores/load_generator.py --mode direct --sensors 5000 --rate 20000 --duration 10
+    python iot/sensores/load_generator.py --mode mqtt --broker localhost --spawn-bridge --rate 5000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+IOT = Path(__file__).resolve().parents[1]
+if str(IOT) not in sys.path:
+    sys.path.insert(0, str(IOT))
+
+from binary_format import encode_readings
+from decoders import TS_FORMAT
+
+TOPIC_JSON = "farmtech/sensors/soil"
+TOPIC_BIN = "farmtech/sensors/soil/bin"
+
+
+# ---------- geração das leituras ----------
+class SensorFleet:
+    """Estado por sensor (umidade/nutriente com deriva) e montagem dos payloads."""
+
+    def __init__(self, sensors: int, fmt: str = "json", dup_rate: float = 0.0,
+                 ooo_rate: float = 0.0, ooo_max: float = 30.0, seed: int = 42):
+        self.rnd = random.Random(seed)
+        self.ids = [f"load-{i:05d}" for i in range(sensors)]
+        self.fmt = fmt
+        self.dup_rate = dup_rate
+        self.ooo_rate = ooo_rate
+        self.ooo_max = ooo_max
+        self.humidity = [self.rnd.uniform(30, 70) for _ in self.ids]
+        self.nutrient = [self.rnd.uniform(8, 15) for _ in self.ids]
+        self._last = None
+        self._next = 0
+        self.sent = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+
+    def _drift(self, i: int):
+        # passeio aleatório puxado de volta para o centro da faixa
+        rnd = self.rnd
+        h = self.humidity[i] + rnd.gauss(0, 0.4) + (50 - self.humidity[i]) * 0.01
+        n = self.nutrient[i] + rnd.gauss(0, 0.05) + (11.5 - self.nutrient[i]) * 0.01
+        self.humidity[i] = min(100.0, max(0.0, h))
+        self.nutrient[i] = min(30.0, max(0.0, n))
+        return round(self.humidity[i], 2), round(self.nutrient[i], 2)
+
+    def next_message(self):
+        """Devolve (topic, payload, key, is_duplicate); key identifica a linha gravada pelo sink."""
+        rnd = self.rnd
+        if self._last is not None and self.dup_rate and rnd.random() < self.dup_rate:
+            self.duplicates += 1
+            self.sent += 1
+            topic, payload, key, _ = self._last
+            return topic, payload, key, True
+
+        # rodízio: cada sensor reporta uma vez por volta, como um parque com período fixo
+        i = self._next
+        self._next = (i + 1) % len(self.ids)
+        sid = self.ids[i]
+        umidade, nutriente = self._drift(i)
+        ts = time.time()
+        if self.ooo_rate and rnd.random() < self.ooo_rate:
+            ts -= rnd.uniform(1, self.ooo_max)
+            self.out_of_order += 1
+
+        if self.fmt == "binary":
+            sec = int(ts)
+            payload = encode_readings([{"sensor_id": sid, "umidade": umidade, "nutriente": nutriente, "ts": sec}])
+            msg = (TOPIC_BIN, payload, (sid, time.strftime(TS_FORMAT, time.localtime(sec))), False)
+        else:
+            ts_str = time.strftime(TS_FORMAT, time.localtime(ts)) + f".{int(ts % 1 * 1e6):06d}"
+            payload = json.dumps({"sensor_id": sid, "umidade": umidade, "nutriente": nutriente,
+                                  "ts": ts_str}).encode()
+            msg = (TOPIC_JSON, payload, (sid, ts_str), False)
+        self._last = msg
+        self.sent += 1
+        return msg
+
+
+def paced(rate: float, duration: float, tick: float = 0.01):
+    """Gera quantos envios cabem em cada tick para manter ``rate`` msg/s em média."""
+    start = time.perf_counter()
+    done = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return
+        due = int(elapsed * rate) - done
+        if due > 0:
+            yield due
+            done += due
+        else:
+            time.sleep(tick)
+
+
+# ---------- métricas ----------
+class LatencyTracker:
+    """Casa o instante de envio (por key) com o instante em que a linha chega ao sink."""
+
+    def __init__(self):
+        self._sent = {}
+        self._lat = []
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.last_row_at = None
+
+    def sent(self, key):
+        with self._lock:
+            self._sent.setdefault(key, time.perf_counter())
+
+    def landed(self, keys):
+        now = time.perf_counter()
+        with self._lock:
+            for key in keys:
+                t0 = self._sent.pop(key, None)
+                if t0 is not None:
+                    self._lat.append(now - t0)
+            self.rows += len(keys)
+            self.last_row_at = now
+
+    def percentiles(self):
+        with self._lock:
+            lat = sorted(self._lat)
+        if not lat:
+            return None, None, 0
+        pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000
+        return pick(0.50), pick(0.99), len(lat)
+
+    def pending(self):
+        with self._lock:
+            return len(self._sent)
+
+
+def read_rss_kb(pid: int = None):
+    """(RSS atual, pico de RSS) em kB via /proc; psutil como alternativa fora do Linux."""
+    status = Path(f"/proc/{pid or 'self'}/status")
+    try:
+        fields = dict(line.split(":", 1) for line in status.read_text().splitlines() if ":" in line)
+        return int(fields["VmRSS"].split()[0]), int(fields.get("VmHWM", fields["VmRSS"]).split()[0])
+    except (OSError, KeyError, ValueError):
+        try:
+            import psutil
+            rss = psutil.Process(pid).memory_info().rss // 1024
+            return rss, rss
+        except Exception:
+            return None, None
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int = None, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            rss, hwm = read_rss_kb(self.pid)
+            if rss:
+                self.peak_kb = max(self.peak_kb, rss, hwm or 0)
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=2)
+        rss, hwm = read_rss_kb(self.pid)
+        if rss:
+            self.peak_kb = max(self.peak_kb, rss, hwm or 0)
+
+
+# ---------- modos ----------
+def run_direct(fleet: SensorFleet, rate: float, duration: float, drain_timeout: float):
+    """Bridge no mesmo processo: on_message -> IngestQueue -> sink (CSV em diretório temporário)."""
+    workdir = Path(tempfile.mkdtemp(prefix="farmtech_load_"))
+    os.environ["OUT_CSV"] = str(workdir / "sensors_ingest.csv")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import mqtt_bridge as bridge
+
+    tracker = LatencyTracker()
+    sink = bridge.get_sink()
+    bridge.get_journal()
+    queue = bridge.get_ingest_queue()
+    bridge_flush = sink.on_flush
+
+    def on_flush(rows):
+        if bridge_flush is not None:
+            bridge_flush(rows)
+        tracker.landed([(r.get("sensor_id"), r.get("ts")) for r in rows])
+
+    sink.on_flush = on_flush
+
+    class _Msg:
+        __slots__ = ("topic", "payload")
+
+    sampler = RssSampler()
+    sampler.start()
+    t0 = time.perf_counter()
+    for n in paced(rate, duration):
+        for _ in range(n):
+            topic, payload, key, dup = fleet.next_message()
+            if not dup:
+                tracker.sent(key)
+            msg = _Msg()
+            msg.topic, msg.payload = topic, payload
+            bridge.on_message(None, None, msg)
+    send_time = time.perf_counter() - t0
+
+    queue.stop(drain=True, timeout=drain_timeout)
+    sink.close()
+    if bridge.journal is not None:
+        bridge.journal.close()
+    sampler.stop()
+    extra = {
+        "bridge": dict(bridge.counters),
+        "queue": queue.stats(),
+        "dedup": bridge.dedup_index.stats() if bridge.dedup_index is not None else None,
+        "sink": sink.stats(),
+        "out": str(bridge.out_path),
+    }
+    return report(fleet, tracker, t0, send_time, sampler.peak_kb, extra)
+
+
+def _follow_csv(path: Path, tracker: LatencyTracker, stop: threading.Event):
+    """Acompanha o CSV do bridge e registra a chegada de cada linha (sensor_id, ts)."""
+    while not path.exists() and not stop.is_set():
+        time.sleep(0.05)
+    with path.open("r", encoding="utf-8") as f:
+        f.readline()  # cabeçalho
+        partial = ""
+        while True:
+            chunk = f.read()
+            if chunk:
+                lines = (partial + chunk).split("\n")
+                partial = lines.pop()
+                keys = []
+                for line in lines:
+                    parts = line.rstrip("\r").split(",")
+                    if len(parts) >= 4:
+                        keys.append((parts[0], parts[3]))
+                if keys:
+                    tracker.landed(keys)
+            elif stop.is_set():
+                return
+            else:
+                time.sleep(0.02)
+
+
+def run_mqtt(fleet: SensorFleet, rate: float, duration: float, drain_timeout: float,
+             broker: str, port: int, qos: int, spawn_bridge: bool, bridge_out: str, bridge_pid: int):
+    import subprocess
+    import paho.mqtt.client as mqtt
+
+    tracker = LatencyTracker()
+    proc = None
+    out_csv = Path(bridge_out) if bridge_out else None
+    if spawn_bridge:
+        workdir = Path(tempfile.mkdtemp(prefix="farmtech_load_"))
+        out_csv = workdir / "sensors_ingest.csv"
+        env = os.environ.copy()
+        env.update({"MQTT_BROKER": broker, "MQTT_PORT": str(port), "MQTT_QOS": str(qos),
+                    "MQTT_CLIENT_ID": f"farmtech-bridge-load-{os.getpid()}",
+                    "OUT_CSV": str(out_csv), "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING")})
+        proc = subprocess.Popen([sys.executable, str(IOT / "mqtt_bridge.py")], env=env)
+        bridge_pid = proc.pid
+        time.sleep(2.0)  # conexão + subscribe do bridge
+
+    stop = threading.Event()
+    follower = None
+    if out_csv is not None:
+        follower = threading.Thread(target=_follow_csv, args=(out_csv, tracker, stop), daemon=True)
+        follower.start()
+    sampler = RssSampler(bridge_pid) if bridge_pid else None
+    if sampler:
+        sampler.start()
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"farmtech-loadgen-{os.getpid()}")
+    client.max_queued_messages_set(0)
+    client.connect(broker, port, keepalive=60)
+    client.loop_start()
+
+    t0 = time.perf_counter()
+    for n in paced(rate, duration):
+        for _ in range(n):
+            topic, payload, key, dup = fleet.next_message()
+            if not dup:
+                tracker.sent(key)
+            client.publish(topic, payload, qos=qos)
+    send_time = time.perf_counter() - t0
+
+    # espera as linhas pararem de chegar (ou o timeout)
+    deadline = time.perf_counter() + drain_timeout
+    while out_csv is not None and tracker.pending() and time.perf_counter() < deadline:
+        before = tracker.rows
+        time.sleep(max(1.0, float(os.getenv("SINK_MAX_LATENCY", "1.0")) * 2))
+        if tracker.rows == before:
+            break
+    client.loop_stop()
+    client.disconnect()
+    stop.set()
+    if follower is not None:
+        follower.join(timeout=2)
+    if sampler:
+        sampler.stop()
+    if proc is not None:
+        proc.terminate()
+        proc.wait(timeout=15)
+    return report(fleet, tracker, t0, send_time, sampler.peak_kb if sampler else None,
+                  {"out": str(out_csv) if out_csv else None})
+
+
+def report(fleet: SensorFleet, tracker: LatencyTracker, t0: float, send_time: float, rss_kb, extra: dict):
+    p50, p99, samples = tracker.percentiles()
+    span = (tracker.last_row_at - t0) if tracker.last_row_at else None
+    result = {
+        "sent": fleet.sent,
+        "duplicates_injected": fleet.duplicates,
+        "out_of_order_injected": fleet.out_of_order,
+        "send_msgs_per_s": round(fleet.sent / send_time, 1) if send_time else 0.0,
+        "rows_landed": tracker.rows,
+        "sustained_rows_per_s": round(tracker.rows / span, 1) if span else 0.0,
+        "latency_ms_p50": round(p50, 2) if p50 is not None else None,
+        "latency_ms_p99": round(p99, 2) if p99 is not None else None,
+        "latency_samples": samples,
+        "not_landed": tracker.pending(),
+        "bridge_rss_peak_mb": round(rss_kb / 1024, 1) if rss_kb else None,
+    }
+    result.update(extra)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gerador de carga / benchmark de ingestão do mqtt_bridge")
+    parser.add_argument("--mode", choices=["direct", "mqtt"], default="direct")
+    parser.add_argument("--sensors", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=5000, help="Mensagens/s agregadas")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de envio")
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--dup-rate", type=float, default=0.0, help="Fração de reenvios idênticos")
+    parser.add_argument("--ooo-rate", type=float, default=0.0, help="Fração de leituras fora de ordem")
+    parser.add_argument("--ooo-max", type=float, default=30.0, help="Atraso máximo (s) das fora de ordem")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--qos", type=int, default=0)
+    parser.add_argument("--spawn-bridge", action="store_true", help="Sobe o mqtt_bridge como subprocesso")
+    parser.add_argument("--bridge-out", default=None, help="CSV de saída de um bridge já em execução")
+    parser.add_argument("--bridge-pid", type=int, default=None, help="PID de um bridge já em execução (RSS)")
+    args = parser.parse_args()
+
+    if args.format == "binary" and args.rate > args.sensors:
+        print("Aviso: binário com mais de 1 msg/s por sensor; a deduplicação vai descartar leituras",
+              file=sys.stderr)
+    fleet = SensorFleet(args.sensors, args.format, args.dup_rate, args.ooo_rate, args.ooo_max, args.seed)
+    if args.mode == "direct":
+        result = run_direct(fleet, args.rate, args.duration, args.drain_timeout)
+    else:
+        result = run_mqtt(fleet, args.rate, args.duration, args.drain_timeout, args.broker, args.port,
+                          args.qos, args.spawn_bridge, args.bridge_out, args.bridge_pid)
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
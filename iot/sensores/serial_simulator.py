@@ -1,17 +1,45 @@
+import sys
 import time
 import random
 import json
+import argparse
+from pathlib import Path
 
-def simulate():
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from binary_format import encode_readings
+
+def simulate(fmt: str = "json", sensors: int = 1, interval: float = 5.0):
+    """
+    Emite leituras simuladas na saída padrão (uma linha por mensagem).
+    fmt="binary" usa o formato compacto v1 (iot/binary_format.py) em hexadecimal,
+    com todas as leituras do ciclo no mesmo lote.
+    """
+    ids = ["sim-01"] if sensors <= 1 else [f"sim-{i:02d}" for i in range(1, sensors + 1)]
     while True:
-        data = {
-            "sensor_id": "sim-01",
-            "umidade": round(random.uniform(30, 70), 2),
-            "nutriente": round(random.uniform(8, 15), 2),
-            "ts": time.strftime('%Y-%m-%dT%H:%M:%S')
-        }
-        print(json.dumps(data))
-        time.sleep(5)
+        if fmt == "binary":
+            now = int(time.time())
+            readings = [
+                {"sensor_id": sid, "umidade": round(random.uniform(30, 70), 2),
+                 "nutriente": round(random.uniform(8, 15), 2), "ts": now}
+                for sid in ids
+            ]
+            print(encode_readings(readings).hex(), flush=True)
+        else:
+            for sid in ids:
+                data = {
+                    "sensor_id": sid,
+                    "umidade": round(random.uniform(30, 70), 2),
+                    "nutriente": round(random.uniform(8, 15), 2),
+                    "ts": time.strftime('%Y-%m-%dT%H:%M:%S')
+                }
+                print(json.dumps(data), flush=True)
+        time.sleep(interval)
 
 if __name__ == '__main__':
-    simulate()
+    parser = argparse.ArgumentParser(description="Simulador serial de sensores FarmTech")
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--sensors", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=5.0)
+    args = parser.parse_args()
+    simulate(args.format, args.sensors, args.interval)
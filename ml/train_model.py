@@ -11,9 +11,33 @@ import joblib
 MODEL_PATH = os.getenv("MODEL_PATH", "ml/model.pkl")
 ROOT = Path(__file__).resolve().parents[2]
 
-def train_model(data_path="db/data_samples/sensors.csv"):
+def load_training_frame(data_path: str = "db", days: float = None) -> pd.DataFrame:
+    """
+    ``db``: db/query.py (PostgreSQL se configurado, senão store Parquet / CSV local), com o
+    filtro de dias e as colunas empurrados para a consulta; ou um CSV / diretório do store
+    Parquet (db/store.py) explícito.
+    Leituras em float32 e sensor_id category (db/frames.py): as árvores do sklearn já
+    treinam em float32, então não há perda e o frame ocupa metade.
+    """
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    cols = ["ts", "umidade", "nutriente"]
+    if data_path == "db":
+        from db.query import read_range
+        return read_range("sensors", start=pd.Timedelta(days=days) if days else None, columns=cols,
+                          cache=False).reset_index(drop=True)
+    if Path(data_path).is_dir():
+        from db.store import ParquetStore
+        store = ParquetStore(data_path)
+        df = store.read_recent(days, columns=cols, compact_types=True) if days \
+            else store.read_range(columns=cols, compact_types=True)
+        return df.sort_values("ts").reset_index(drop=True)
+    from db.frames import compact
+    return compact(pd.read_csv(data_path))
+
+def train_model(data_path="db", days: float = None):
     print(f"Loading data from {data_path}...")
-    df = pd.read_csv(data_path)
+    df = load_training_frame(data_path, days)
     
     if df.empty:
         print("No data available for training")
@@ -56,6 +80,9 @@ def train_from_csv(csv_path: str, target_col: str, model_out: str = "models/mode
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--phase", default="training", help="Phase name")
+    parser.add_argument("--data", default="db",
+                        help="db (PostgreSQL/store/CSV via db/query.py), CSV de leituras ou diretório do store Parquet")
+    parser.add_argument("--days", type=float, default=None, help="Só os últimos N dias (db ou store Parquet)")
     args = parser.parse_args()
     
-    train_model()
+    train_model(args.data, args.days)
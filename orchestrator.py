@@ -10,6 +10,9 @@ Orchestrator FarmTech (melhorado)
     python orchestrator.py --phase all
     python orchestrator.py --phase mqtt
     python orchestrator.py --phase train
+    python orchestrator.py --phase partitions  (partições futuras de sensors; o bridge postgres também roda)
+    python orchestrator.py --phase seed        (db/data_samples -> PostgreSQL; backfill: históricos do bridge)
+    python orchestrator.py --phase mqtt --workers 4   (N processos mqtt_bridge, um por core)
 """
 
 import argparse
@@ -30,6 +33,9 @@ PHASES = {
     "iot": ["python", str(PROJECT_ROOT / "iot" / "sensores" / "serial_simulator.py")],
     "mqtt": ["python", str(PROJECT_ROOT / "iot" / "mqtt_bridge.py")],
     "serial": ["python", str(PROJECT_ROOT / "data_pipeline" / "serial_reader.py")],
+    "partitions": ["python", str(PROJECT_ROOT / "db" / "partitions.py"), "maintain"],
+    "seed": ["python", str(PROJECT_ROOT / "db" / "seed.py"), "seed"],
+    "backfill": ["python", str(PROJECT_ROOT / "db" / "seed.py"), "backfill"],
     "train": ["python", str(PROJECT_ROOT / "ml" / "train_model.py")],
     "predict": ["python", str(PROJECT_ROOT / "ml" / "predict.py")],
     "yolo": ["python", str(PROJECT_ROOT / "ml" / "train_yolo.py")],
@@ -39,13 +45,15 @@ PHASES = {
 }
 
 LONG_RUNNING = {"iot", "mqtt", "streamlit", "irrigation"}
+# só com --phase explícito: backfill relê os históricos do bridge (pode ser grande)
+MANUAL_ONLY = {"backfill"}
 
 background_procs = {}
 
 def is_windows():
     return platform.system().lower().startswith("win")
 
-def start_background(phase, cmd):
+def start_background(phase, cmd, env=None):
     """
     Start a long-running command with Popen, redirecting stdout/stderr to logs.
     Returns the Popen object.
@@ -62,6 +70,7 @@ def start_background(phase, cmd):
             stdout=stdout_f,
             stderr=stderr_f,
             cwd=str(PROJECT_ROOT),
+            env=env,
             creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
         )
     else:
@@ -70,6 +79,7 @@ def start_background(phase, cmd):
             stdout=stdout_f,
             stderr=stderr_f,
             cwd=str(PROJECT_ROOT),
+            env=env,
             preexec_fn=os.setsid
         )
     proc._orch_stdout = stdout_f
@@ -130,13 +140,33 @@ def terminate_proc(proc):
                 except Exception:
                     pass
 
-def run_phase(phase):
+def start_mqtt_workers(workers, shard_mode="shared"):
+    """
+    Inicia N processos mqtt_bridge (mqtt.w0 .. mqtt.wN-1). Cada worker recebe
+    BRIDGE_WORKERS/BRIDGE_WORKER_INDEX e deriva client id, partição de saída e
+    contadores próprios. shard_mode: shared (MQTT v5 $share) ou hash (crc32 do sensor_id).
+    """
+    procs = []
+    for idx in range(workers):
+        env = dict(os.environ)
+        env["BRIDGE_WORKERS"] = str(workers)
+        env["BRIDGE_WORKER_INDEX"] = str(idx)
+        env["BRIDGE_SHARD_MODE"] = shard_mode
+        name = f"mqtt.w{idx}"
+        proc = start_background(name, PHASES["mqtt"], env=env)
+        background_procs[name] = proc
+        procs.append(proc)
+    return procs
+
+def run_phase(phase, workers=1, shard_mode="shared"):
     if phase not in PHASES:
         print(f"[ORCH] Fase desconhecida: {phase}")
         print(f"[ORCH] Fases disponíveis: {sorted(PHASES.keys())}")
         return
 
     cmd = PHASES[phase]
+    if phase == "mqtt" and workers > 1:
+        return start_mqtt_workers(workers, shard_mode)
     if phase in LONG_RUNNING:
         proc = start_background(phase, cmd)
         background_procs[phase] = proc
@@ -145,7 +175,7 @@ def run_phase(phase):
         return_code = run_blocking(phase, cmd)
         return return_code
 
-def run_all(sequential_short=True):
+def run_all(sequential_short=True, workers=1, shard_mode="shared"):
     """
     Strategy:
       - Start all LONG_RUNNING processes in background first.
@@ -157,12 +187,12 @@ def run_all(sequential_short=True):
     for phase in PHASES:
         if phase in LONG_RUNNING:
             try:
-                run_phase(phase)
+                run_phase(phase, workers=workers, shard_mode=shard_mode)
             except Exception as e:
                 print(f"[ORCH] Falha ao iniciar {phase}: {e}")
 
     for phase in PHASES:
-        if phase not in LONG_RUNNING:
+        if phase not in LONG_RUNNING and phase not in MANUAL_ONLY:
             try:
                 run_phase(phase)
             except Exception as e:
@@ -194,16 +224,20 @@ def _signal_handler(sig, frame):
 def main():
     parser = argparse.ArgumentParser(description="FarmTech Orchestrator (improved)")
     parser.add_argument("--phase", default="all", help="Phase to run (or 'all')")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BRIDGE_WORKERS", "1")),
+                        help="Número de processos mqtt_bridge (fase mqtt)")
+    parser.add_argument("--shard-mode", default=os.getenv("BRIDGE_SHARD_MODE", "shared"),
+                        choices=["shared", "hash"], help="Distribuição entre workers do mqtt_bridge")
     args = parser.parse_args()
 
     signal.signal(signal.SIGINT, _signal_handler)
     signal.signal(signal.SIGTERM, _signal_handler)
 
     if args.phase == "all":
-        run_all()
+        run_all(workers=args.workers, shard_mode=args.shard_mode)
         shutdown_all()
     else:
-        proc = run_phase(args.phase)
+        proc = run_phase(args.phase, workers=args.workers, shard_mode=args.shard_mode)
         if args.phase in LONG_RUNNING:
             print(f"[ORCH] {args.phase} iniciado em background. Ctrl+C para encerrar.")
             try:
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# módulos do bridge se importam pelo nome (from dedup import ...), como em iot/mqtt_bridge.py
+for p in (ROOT, ROOT / "iot"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
@@ -0,0 +1,49 @@
+import os
+
+from db.csvcache import IncrementalCSV
+
+HEADER = "sensor_id,umidade,nutriente,ts\n"
+
+
+def _line(i, umidade=40):
+    return f"esp32-{i % 3:02d},{umidade},10,2025-11-16T10:{i // 60:02d}:{i % 60:02d}\n"
+
+
+def _touch(path, bump):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))  # mtime muda mesmo no mesmo tick
+
+
+def test_anexo_le_so_o_fim(tmp_path):
+    path = tmp_path / "sensors.csv"
+    path.write_text(HEADER + "".join(_line(i) for i in range(5)))
+    csv = IncrementalCSV(path)
+    assert len(csv.read()) == 5
+    with open(path, "a") as f:
+        f.write(_line(5) + _line(6)[:10])  # última linha ainda incompleta
+    assert len(csv.read()) == 6
+    assert (csv.full_loads, csv.appends) == (1, 1)
+
+
+def test_truncado_recarrega_inteiro(tmp_path):
+    path = tmp_path / "sensors.csv"
+    path.write_text(HEADER + "".join(_line(i) for i in range(10)))
+    csv = IncrementalCSV(path)
+    assert len(csv.read()) == 10
+    path.write_text(HEADER + "".join(_line(i) for i in range(2)))
+    _touch(path, 1_000_000)
+    assert len(csv.read()) == 2
+    assert csv.full_loads == 2 and csv.appends == 0
+
+
+def test_reescrito_no_lugar_recarrega_inteiro(tmp_path):
+    path = tmp_path / "sensors.csv"
+    path.write_text(HEADER + "".join(_line(i) for i in range(5)))
+    csv = IncrementalCSV(path)
+    assert csv.read()["umidade"].tolist() == [40] * 5
+    # reescrito no lugar (mesmo inode) e depois crescido: o offset antigo não vale mais
+    path.write_text(HEADER + "".join(_line(i, umidade=41) for i in range(6)))
+    _touch(path, 1_000_000)
+    df = csv.read()
+    assert df["umidade"].tolist() == [41] * 6
+    assert csv.full_loads == 2 and csv.appends == 0
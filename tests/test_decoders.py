@@ -0,0 +1,44 @@
+import time
+
+from binary_format import encode_readings, format_epoch
+from decoders import decode_payload
+
+EPOCH = 1763287200  # 2025-11-16T10:00:00Z
+
+
+def test_json_e_binario_usam_a_mesma_convencao_de_ts():
+    expected = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(EPOCH))
+    js = decode_payload(b'{"sensor_id":"esp32-01","umidade":45.5,"ts":%d}' % EPOCH, "farmtech/sensors/soil")
+    bn = decode_payload(encode_readings([{"sensor_id": "esp32-01", "umidade": 45.5, "ts": EPOCH}]),
+                        "farmtech/sensors/soil/bin")
+    assert js[0]["ts"] == bn[0]["ts"] == format_epoch(EPOCH) == expected
+
+
+def test_ts_zero_e_sem_timestamp_nao_1970():
+    bn = encode_readings([{"sensor_id": "esp32-01", "umidade": 45.5, "ts": 0}])
+    js = b'{"sensor_id":"esp32-01","umidade":45.5,"ts":0}'
+    for payload in (bn, js):
+        assert decode_payload(payload, fill_ts=False)[0]["ts"] is None
+        ts = decode_payload(payload)[0]["ts"]
+        assert ts is not None and not ts.startswith("1970")
+    assert format_epoch(0) is None
+
+
+def test_fracao_de_segundo_preservada():
+    row = decode_payload(b'{"sensor_id":"esp32-01","umidade":45,"ts":%d.25}' % EPOCH)[0]
+    assert row["ts"] == format_epoch(EPOCH) + ".250000"
+
+
+def test_epoch_fora_da_faixa_vira_sem_ts():
+    for ts in (b"1e20", b"1e400", b"-5", b"3600", b"99999999999999999999999"):
+        row = decode_payload(b'{"sensor_id":"a","umidade":1,"ts":%s}' % ts, fill_ts=False)[0]
+        assert row["ts"] is None, ts
+    assert format_epoch(float("nan")) is None and format_epoch(float("inf")) is None
+    bn = encode_readings([{"sensor_id": "esp32-01", "umidade": 45.5, "ts": 3600}])
+    assert decode_payload(bn, fill_ts=False)[0]["ts"] is None  # RTC sem NTP
+
+
+def test_epoch_em_milissegundos():
+    row = decode_payload(b'{"sensor_id":"a","umidade":1,"ts":%d123}' % EPOCH)[0]
+    assert row["ts"] == format_epoch(EPOCH) + ".123000"
+    assert format_epoch(EPOCH * 1000) == format_epoch(EPOCH)
@@ -0,0 +1,52 @@
+import time
+
+from decoders import decode_payload
+from dedup import DedupIndex, filter_duplicates, is_redelivery
+
+
+def _ingest(index, payloads):
+    """Mesmo caminho do bridge: decode sem preencher ts, depois filtro por (sensor_id, ts)."""
+    out = []
+    for p in payloads:
+        out += filter_duplicates(index, decode_payload(p, "farmtech/sensors/x", fill_ts=False))
+    return out
+
+
+def test_payload_sem_ts_repetido_nao_e_descartado():
+    index = DedupIndex(capacity=100)
+    assert len(_ingest(index, [b"sim-01,45,10"] * 3)) == 3
+    assert len(_ingest(index, [b'{"sensor_id":"esp32-01","umidade":45.00}'] * 3)) == 3
+
+
+def test_mesmo_sensor_e_ts_e_duplicata():
+    index = DedupIndex(capacity=100)
+    p = b'{"sensor_id":"esp32-01","ts":"2025-11-16T10:00:00","umidade":45}'
+    q = b'{"sensor_id":"esp32-02","ts":"2025-11-16T10:00:00","umidade":45}'
+    rows = _ingest(index, [p, p, q])
+    assert [r["sensor_id"] for r in rows] == ["esp32-01", "esp32-02"]
+    assert index.stats()["hits"] == 1
+
+
+def test_reentrega_so_com_flag_dup():
+    index = DedupIndex(capacity=100, window=30)
+    p = b"sim-01,45,10"
+    assert not is_redelivery(index, p, dup=False)
+    assert not is_redelivery(index, p, dup=False)  # repetição legítima
+    assert is_redelivery(index, p, dup=True)
+    assert not is_redelivery(index, b"sim-01,46,10", dup=True)  # DUP de algo nunca visto
+
+
+def test_reentrega_fora_da_janela_passa():
+    index = DedupIndex(capacity=100, window=0.05)
+    is_redelivery(index, b"x", dup=False)
+    time.sleep(0.1)
+    assert not is_redelivery(index, b"x", dup=True)
+
+
+def test_capacidade_limita_memoria():
+    index = DedupIndex(capacity=10)
+    for i in range(100):
+        index.seen(("s", i))
+    stats = index.stats()
+    assert stats["size"] == 10 and stats["evictions"] == 90
+    assert not index.seen(("s", 0))  # despejada: volta a ser nova
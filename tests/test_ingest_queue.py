@@ -0,0 +1,84 @@
+import time
+
+import ingest_queue
+from ingest_queue import IngestQueue, SpillFile
+
+
+def _spill(path, n):
+    spill = SpillFile(str(path))
+    for i in range(n):
+        spill.append(time.time(), "farmtech/sensors/x", f"sim-{i:02d},45,10".encode(), tag=i)
+    spill.close()
+    return spill
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_replay_le_registro_a_registro_e_apaga_so_no_commit(tmp_path):
+    spill = _spill(tmp_path / "q.spill", 3)
+    assert spill.begin_replay() == spill.replay_path
+    it = spill.iter_replay()
+    assert next(it)[1:] == ("farmtech/sensors/x", b"sim-00,45,10", 0)  # gerador: não lê tudo de uma vez
+    assert len(list(it)) == 2
+    assert spill.replay_path.exists() and spill.pending == 3
+    spill.commit_replay()
+    assert not spill.replay_path.exists() and spill.pending == 0
+
+
+def test_replay_stale_e_recuperado_no_init(tmp_path):
+    path = tmp_path / "q.spill"
+    spill = _spill(path, 2)
+    spill.begin_replay()  # "crash" no meio do replay: .replay fica no disco
+    _spill(path, 1)  # spill novo depois do crash
+    recovered = SpillFile(str(path))
+    assert recovered.pending == 3
+    assert recovered.begin_replay() == recovered.replay_path
+    assert len(list(recovered.iter_replay())) == 2  # primeiro o .replay antigo
+    recovered.commit_replay()
+    assert recovered.pending == 1 and recovered.begin_replay() is not None
+
+
+def test_tags_de_execucao_anterior_nao_sao_reusadas(tmp_path):
+    path = tmp_path / "q.spill"
+    _spill(path, 2)  # tags 0 e 1: segmentos do journal da execução anterior
+    spill = SpillFile(str(path))
+    spill.append(time.time(), "farmtech/sensors/x", b"sim-09,45,10", tag=7)  # desta execução
+    spill.begin_replay()
+    assert [tag for *_, tag in spill.iter_replay()] == [None, None, 7]
+    spill.abort_replay(0)
+    spill.begin_replay()
+    assert [tag for *_, tag in spill.iter_replay()] == [None, None, 7]  # nova tentativa: idem
+    spill.commit_replay()
+    spill.append(time.time(), "farmtech/sensors/x", b"sim-10,45,10", tag=8)
+    spill.begin_replay()
+    assert [tag for *_, tag in spill.iter_replay()] == [8]
+    spill.commit_replay()
+
+
+def test_falha_no_commit_mantem_o_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_queue, "SPILL_RETRY_SECONDS", 0.2)
+    path = tmp_path / "q.spill"
+    _spill(path, 3)
+    seen, flushes = [], []
+
+    def flush():
+        flushes.append(len(seen))
+        if len(flushes) == 1:
+            raise RuntimeError("sink fora")
+
+    q = IngestQueue(lambda topic, payload, tag: seen.append(tag), policy="spill",
+                    spill_path=str(path), before_spill_commit=flush)
+    q.start()
+    try:
+        assert _wait(lambda: flushes)
+        assert q.spill.replay_path.exists()  # sink não confirmou: nada apagado
+        assert _wait(lambda: q.stats()["spill_pending"] == 0)
+    finally:
+        q.stop()
+    assert seen == [None] * 6  # at-least-once; tags da execução anterior descartadas
+    assert not q.spill.replay_path.exists()
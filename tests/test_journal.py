@@ -0,0 +1,45 @@
+from journal import Journal
+
+
+def _journal(path):
+    return Journal(str(path), segment_bytes=1, fsync="never")  # cada append fecha o segmento anterior
+
+
+def _receive(j, rows=1):
+    """Como o bridge: append, retain por linha e ack da mensagem ao entregar ao sink."""
+    seg = j.append("farmtech/sensors/soil", b'{"sensor_id":"esp32-01","umidade":40}')
+    j.retain(seg, rows)
+    j.ack(seg)
+    return seg
+
+
+def test_segmento_so_e_apagado_depois_do_ack_das_linhas(tmp_path):
+    j = _journal(tmp_path)
+    seg = _receive(j, rows=2)
+    _receive(j)  # fecha o segmento de seg
+    path = tmp_path / f"seg-{seg:010d}.wal"
+    assert path.exists() and j.stats()["pending"] == 3
+    j.ack(seg)
+    assert path.exists()  # ainda falta uma linha no sink
+    j.ack(seg)
+    assert not path.exists() and j.stats()["segments_deleted"] == 1
+    j.close()
+
+
+def test_segmento_com_linhas_pendentes_sobrevive_ao_restart(tmp_path):
+    j = _journal(tmp_path)
+    seg = _receive(j)
+    j.close()  # "crash": a linha nunca chegou ao sink
+    assert (tmp_path / f"seg-{seg:010d}.wal").exists()
+
+    j = _journal(tmp_path)
+    replayed = list(j.replay())
+    assert [s for s, _topic, _payload in replayed] == [seg]
+    assert (tmp_path / f"seg-{seg:010d}.wal").exists()  # reenviada, mas ainda não gravada
+    j.retain(seg, 1)
+    j.ack(seg)
+    assert (tmp_path / f"seg-{seg:010d}.wal").exists()
+    j.ack(seg)  # flush do sink
+    assert not (tmp_path / f"seg-{seg:010d}.wal").exists()
+    j.close()
+    assert j.stats()["segments"] == 0
@@ -0,0 +1,36 @@
+import json
+import os
+import time
+
+from db.latest import LatestReadings, source_id
+
+
+def _snapshot(directory, name, source):
+    latest = LatestReadings()
+    latest.update([{"sensor_id": "esp32-01", "umidade": 40, "nutriente": 10, "ts": "2025-11-16T10:00:00"}])
+    path = directory / name
+    latest.save(path, source=source)
+    return path
+
+
+def test_snapshot_so_da_mesma_origem(tmp_path):
+    mine, other = source_id("csv", tmp_path / "a.csv"), source_id("csv", tmp_path / "b.csv")
+    _snapshot(tmp_path, "w0.json", other)
+    assert LatestReadings.load(tmp_path, source=mine) is None
+    _snapshot(tmp_path, "w1.json", mine)
+    assert len(LatestReadings.load(tmp_path, source=mine)) == 1
+
+
+def test_snapshot_velho_e_ignorado(tmp_path):
+    src = source_id("parquet", tmp_path / "store")
+    path = _snapshot(tmp_path, "w0.json", src)
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    assert LatestReadings.load(tmp_path, source=src, max_age=300) is None
+    assert LatestReadings.load(tmp_path, source=src, max_age=7200) is not None
+
+
+def test_formato_antigo_sem_origem(tmp_path):
+    (tmp_path / "w0.json").write_text(json.dumps({"esp32-01": ["2025-11-16T10:00:00", 40, 10]}))
+    assert len(LatestReadings.load(tmp_path)) == 1
+    assert LatestReadings.load(tmp_path, source=source_id("csv", tmp_path / "a.csv")) is None
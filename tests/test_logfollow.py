@@ -0,0 +1,47 @@
+import sys
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "visualization" / "streamlit_app"))
+from component import logfollow  # noqa: E402
+from component.logfollow import LogFollower, rotate_log  # noqa: E402
+
+
+def _write(f, a, b):
+    for i in range(a, b):
+        f.write(f"linha {i}\n")
+    f.flush()
+
+
+def test_rename_le_o_antigo_ate_ficar_parado(tmp_path, monkeypatch):
+    path = tmp_path / "mqtt.log"
+    old = open(path, "a", encoding="utf-8")
+    _write(old, 0, 3)
+    follower = LogFollower(path)
+    assert follower.poll() == 3
+    rotate_log(path, max_bytes=0, backups=2)
+    new = open(path, "a", encoding="utf-8")
+    _write(new, 3, 5)
+    assert follower.poll() == 2
+    _write(old, 5, 7)  # processo antigo ainda escrevendo pelo descritor renomeado
+    assert follower.poll() == 2
+    monkeypatch.setattr(logfollow, "LOG_ROTATE_GRACE", 0)
+    follower.poll()
+    assert follower._old is None
+    assert sorted(follower.lines, key=lambda l: int(l.split()[1])) == [f"linha {i}" for i in range(7)]
+    for h in (old, new, follower):
+        h.close()
+
+
+def test_copytruncate_com_processo_escrevendo(tmp_path):
+    path = tmp_path / "mqtt.log"
+    f = open(path, "a", encoding="utf-8")
+    _write(f, 0, 50)
+    follower = logfollow.follow(path, max_bytes=100)
+    assert path.stat().st_size == 0
+    assert (tmp_path / "mqtt.log.1").read_text().count("\n") == 50
+    _write(f, 50, 52)  # O_APPEND: volta a escrever do início
+    assert follower.poll() == 2
+    assert list(follower.lines)[-3:] == ["linha 49", "linha 50", "linha 51"]
+    f.close()
+    follower.close()
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from db import query
+from db.store import ParquetStore
+
+T0 = pd.Timestamp("2025-11-16 10:00:00")
+
+
+def _frame():
+    # 2 sensores, a cada 15 min por 2 h; fora de ordem, como chega de vários workers
+    rows = [{"sensor_id": f"esp32-0{s}", "umidade": 40.0 + s * 10 + i, "nutriente": 10.0,
+             "ts": T0 + pd.Timedelta(minutes=15 * i)} for i in range(8) for s in (1, 2)]
+    return pd.DataFrame(rows[::-1])
+
+
+@pytest.fixture(params=["store", "csv"])
+def local(request, tmp_path, monkeypatch):
+    """read_range sem banco: store Parquet ou CSV do dashboard."""
+    monkeypatch.setattr(query, "get_engine", lambda database_url=None: None)
+    df = _frame()
+    if request.param == "store":
+        store = ParquetStore(str(tmp_path / "store"))
+        store.write(df)
+        monkeypatch.setattr(query, "get_store", lambda: store)
+    else:
+        path = tmp_path / "sensors.csv"
+        df.assign(ts=df["ts"].dt.strftime("%Y-%m-%dT%H:%M:%S")).to_csv(path, index=False)
+        monkeypatch.setattr(query, "get_store", lambda: None)
+        monkeypatch.setitem(query.CSV_CANDIDATES, "sensors", [path])
+    return lambda **kw: query.read_range("sensors", cache=False, **kw)
+
+
+def test_start_inclusivo_end_exclusivo_e_sensores(local):
+    df = local(start=T0 + pd.Timedelta(minutes=30), end=T0 + pd.Timedelta(hours=1), sensors=["esp32-01"])
+    assert df["ts"].tolist() == [T0 + pd.Timedelta(minutes=30), T0 + pd.Timedelta(minutes=45)]
+    assert set(df["sensor_id"].astype(str)) == {"esp32-01"}
+
+
+def test_sem_limit_em_ordem_crescente_de_ts(local):
+    df = local(columns=["ts", "umidade", "nutriente"])
+    assert len(df) == 16 and list(df.columns) == ["ts", "umidade", "nutriente"]
+    assert df["ts"].is_monotonic_increasing  # train_model usa shift(-1) como alvo
+
+
+def test_limit_traz_as_mais_recentes_em_ordem_decrescente(local):
+    df = local(columns=["ts", "sensor_id", "umidade"], limit=3)
+    assert df["ts"].tolist() == [T0 + pd.Timedelta(minutes=105)] * 2 + [T0 + pd.Timedelta(minutes=90)]
+
+
+def test_bucket_hora_com_media(local):
+    df = local(columns=["ts", "umidade"], bucket="1h", sensors=["esp32-01"])
+    assert df["ts"].tolist() == [T0, T0 + pd.Timedelta(hours=1)]
+    assert df["umidade"].tolist() == pytest.approx([51.5, 55.5])  # 50..53 e 54..57
+
+
+def test_agg_por_sensor_sem_bucket(local):
+    df = local(columns=["sensor_id", "umidade"], agg="max")
+    assert df["sensor_id"].astype(str).tolist() == ["esp32-01", "esp32-02"]  # como o ORDER BY do banco
+    assert df["umidade"].tolist() == [57.0, 67.0]
+    counts = local(columns=["sensor_id", "umidade"], agg="count", start=T0 + pd.Timedelta(hours=1))
+    assert counts["umidade"].tolist() == [4, 4]
+    last = local(columns=["sensor_id", "umidade"], agg="last")
+    assert last["umidade"].tolist() == [57.0, 67.0]
+
+
+def test_parametros_invalidos():
+    with pytest.raises(ValueError):
+        query.read_range("sensors", bucket="5m")
+    with pytest.raises(ValueError):
+        query.read_range("weather", sensors=["esp32-01"])
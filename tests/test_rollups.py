@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from db.rollups import RollupAccumulator, RollupMaintainer
+
+
+class _Backend:
+    def __init__(self):
+        self.down = False
+        self.upserts = 0
+
+    def upsert(self, bucket, df):
+        if self.down:
+            raise ConnectionError("backend fora")
+        self.upserts += 1
+
+    def compact(self):
+        pass
+
+
+def _rows(ts):
+    return [{"sensor_id": "esp32-01", "umidade": 40.0, "nutriente": 10.0, "ts": ts}]
+
+
+def test_ts_com_e_sem_fuso_no_mesmo_lote():
+    acc = RollupAccumulator()
+    acc.add_rows(_rows("2025-11-16T10:00:00") + _rows("2025-11-16T10:00:30Z")
+                 + _rows(datetime(2025, 11, 16, 10, 0, 45).astimezone()))
+    assert acc.rows == 3
+    delta = acc.drain()["1d"]
+    assert delta["n_umidade"].sum() == 3
+
+
+def test_done_so_depois_do_flush_e_com_retry():
+    backend = _Backend()
+    m = RollupMaintainer(backend, flush_interval=3600, max_retries=3)
+    acked = []
+    m.add(_rows("2025-11-16T10:00:00"), done=lambda: acked.append(1))
+    assert acked == []  # deltas ainda em memória: journal não pode liberar
+    backend.down = True
+    m.flush()
+    assert acked == [] and m.stats()["retry_batches"] == 1
+    backend.down = False
+    m.flush()
+    assert acked == [1] and m.stats()["waiting_ack"] == 0
+    m.close()
+
+
+def test_retry_limitado_e_falha_exposta():
+    backend = _Backend()
+    m = RollupMaintainer(backend, flush_interval=3600, max_retries=2)
+    acked = []
+    m.add(_rows("2025-11-16T10:00:00"), done=lambda: acked.append(1))
+    backend.down = True
+    for _ in range(3):
+        m.flush()
+    st = m.stats()
+    assert st["retry_batches"] == 0 and st["dropped_deltas"] == 1
+    assert "backend fora" in st["last_error"]
+    assert acked == [1]  # descartado: o journal não fica preso para sempre
+    backend.down = False
+    m.close()
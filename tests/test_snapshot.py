@@ -0,0 +1,32 @@
+import sys
+import time
+
+import pandas as pd
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "visualization" / "streamlit_app"))
+from component import snapshot  # noqa: E402
+from component.snapshot import Snapshot, SnapshotService  # noqa: E402
+
+
+def test_falha_devolve_o_anterior_na_hora_com_erro(monkeypatch):
+    calls = []
+
+    def build(database_url=None, version=0):
+        calls.append(version)
+        if len(calls) > 1:
+            raise ConnectionError("banco fora")
+        return Snapshot(version=version, built_at=pd.Timestamp.now() - pd.Timedelta(seconds=120),
+                        build_seconds=0.0)
+
+    monkeypatch.setattr(snapshot, "build_snapshot", build)
+    service = SnapshotService(interval=3600, idle=60)
+    service._build()
+    assert service.get(timeout=0).error is None
+    service._build()  # falhou: snapshot velho (120 s > idle) continua
+    t0 = time.monotonic()
+    snap = service.get(timeout=5)
+    assert time.monotonic() - t0 < 1  # não espera SNAPSHOT_WAIT
+    assert snap.version == 1 and snap.error == "banco fora"
+    assert service.stats()["last_error"] == "banco fora"
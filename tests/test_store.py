@@ -0,0 +1,68 @@
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from db.store import ParquetStore, _to_frame
+
+
+@pytest.fixture
+def sao_paulo(monkeypatch):
+    """Fuso local fora de UTC: ts com Z precisa mudar de relógio."""
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _rows(*ts):
+    return [{"sensor_id": "esp32-01", "umidade": 40.0 + i, "nutriente": 10.0, "ts": t} for i, t in enumerate(ts)]
+
+
+def test_to_frame_ts_ingenuo_fica_como_esta():
+    df = _to_frame(_rows("2025-11-16T10:00:00", "2025-11-16T10:00:00.250000"))
+    assert str(df["ts"].dtype) == "datetime64[us]"
+    assert df["ts"].tolist() == [pd.Timestamp("2025-11-16 10:00:00"), pd.Timestamp("2025-11-16 10:00:00.25")]
+
+
+def test_to_frame_ts_com_fuso_vira_hora_local(sao_paulo):
+    df = _to_frame(_rows("2025-11-16T13:00:00Z"))
+    assert df["ts"].tolist() == [pd.Timestamp("2025-11-16 10:00:00")]
+
+
+def test_to_frame_lote_misto_e_invalido_nao_levanta(sao_paulo):
+    df = _to_frame(_rows("2025-11-16T13:00:00Z", "2025-11-16T10:00:00", "2025-11-16T12:00:00+02:00", "ontem", None))
+    assert df["ts"].tolist()[:3] == [pd.Timestamp("2025-11-16 10:00:00"), pd.Timestamp("2025-11-16 10:00:00"),
+                                     pd.Timestamp("2025-11-16 07:00:00")]
+    assert df["ts"].isna().tolist()[3:] == [True, True]
+
+
+def test_to_frame_datetime_com_fuso(sao_paulo):
+    df = _to_frame(pd.DataFrame(_rows(pd.Timestamp("2025-11-16T13:00:00Z"))))
+    assert df["ts"].tolist() == [pd.Timestamp("2025-11-16 10:00:00")]
+
+
+@pytest.mark.parametrize("by_sensor", [False, True])
+def test_write_e_read_range(tmp_path, by_sensor):
+    store = ParquetStore(str(tmp_path / "store"), partition_by_sensor=by_sensor)
+    rows = _rows("2025-11-15T23:59:00", "2025-11-16T00:00:00", "2025-11-16T10:00:00", "ontem")
+    rows[1]["sensor_id"] = "esp32-02"
+    assert store.write(rows) == 3
+    assert store.stats()["rows_dropped"] == 1
+    df = store.read_range(start="2025-11-16", end=datetime(2025, 11, 16, 10))
+    assert df["ts"].tolist() == [pd.Timestamp("2025-11-16 00:00:00")]
+    df = store.read_range(sensors=["esp32-01"], columns=["ts", "umidade"])
+    assert list(df.columns) == ["ts", "umidade"]
+    assert sorted(df["umidade"].tolist()) == [40.0, 42.0]
+    assert len(store.read_range()) == 3
+
+
+def test_compact_mantem_as_linhas(tmp_path):
+    store = ParquetStore(str(tmp_path / "store"))
+    for i in range(4):
+        store.write(_rows(f"2025-11-16T10:00:0{i}"))
+    assert store.compact(min_files=4)["files_merged"] == 4
+    assert store.stats()["files"] == 1
+    assert store.read_range()["ts"].is_monotonic_increasing and len(store.read_range()) == 4
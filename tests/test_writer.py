@@ -0,0 +1,129 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from db.writer import _BatchedWriter, _to_ts
+
+
+class _FlakyWriter(_BatchedWriter):
+    name = "flaky"
+
+    def __init__(self, **kw):
+        self.down = False
+        self.written = []
+        super().__init__(max_latency=60, **kw)
+
+    def _write_batch(self, rows):
+        if self.down:
+            raise ConnectionError("destino fora")
+        if any(r.get("bad") for r in rows):
+            raise ValueError("valor fora da faixa")
+        self.written.extend(r["i"] for r in rows)
+
+
+def _rows(a, b):
+    return [{"i": i, "_wal": 1} for i in range(a, b)]
+
+
+def test_lote_com_falha_volta_ao_buffer_e_e_regravado_em_ordem():
+    acked = []
+    w = _FlakyWriter(max_rows=100, on_flush=lambda rows: acked.extend(r["i"] for r in rows))
+    w.write_many(_rows(0, 3))
+    w.down = True
+    assert w.flush(force=True) == 0
+    w.write_many(_rows(3, 5))
+    assert w.stats()["buffered"] == 5 and w.stats()["failed_flushes"] == 1
+    assert w.flush() == 0  # backoff ainda não venceu: nem tenta
+    assert w.stats()["failed_flushes"] == 1
+    w.down = False
+    assert w.flush(force=True) == 5
+    assert w.written == acked == [0, 1, 2, 3, 4]
+    assert w.stats()["consecutive_failures"] == 0
+    w.close()
+
+
+def test_buffer_cheio_vai_para_o_spill_e_volta_quando_o_destino_volta(tmp_path):
+    spill = tmp_path / "sink.jsonl"
+    w = _FlakyWriter(max_rows=2, max_buffer=4, spill_path=str(spill))
+    w.down = True
+    for row in _rows(0, 6):
+        w.write(row)
+        w.flush(force=True)
+    st = w.stats()
+    assert st["spill_pending"] + st["buffered"] == 6 and st["dropped_rows"] == 0
+    assert spill.exists()
+    w.down = False
+    w.flush(force=True)
+    assert w.written == list(range(6))
+    assert not spill.exists() and w.stats()["spill_pending"] == 0
+    w.close()
+
+
+def test_spill_de_execucao_anterior_e_regravado_sem_ack_do_journal(tmp_path):
+    spill = tmp_path / "sink.jsonl"
+    spill.write_text("".join(json.dumps(r) + "\n" for r in _rows(0, 3)), encoding="utf-8")
+    acked = []
+    w = _FlakyWriter(max_rows=2, spill_path=str(spill), on_flush=acked.extend)
+    assert w.stats()["spill_pending"] == 3
+    w.sync()
+    assert w.written == [0, 1, 2] and not spill.exists()
+    assert all("_wal" not in r for r in acked)  # segmentos de outro journal
+    w.close()
+
+
+def test_sync_levanta_se_linhas_ficaram_so_em_memoria():
+    w = _FlakyWriter(max_rows=100)
+    w.write_many(_rows(0, 2))
+    w.down = True
+    try:
+        w.sync()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("sync() deveria falhar com o destino fora")
+    w.down = False
+    w.sync()
+    w.close()
+
+
+def test_erro_permanente_isola_as_linhas_ruins(tmp_path):
+    acked, rejected = [], []
+    w = _FlakyWriter(max_rows=100, spill_path=str(tmp_path / "sink.jsonl"),
+                     on_flush=lambda rows: acked.extend(r["i"] for r in rows),
+                     on_reject=lambda rows: rejected.extend(r["i"] for r in rows))
+    rows = _rows(0, 10)
+    rows[3]["bad"] = rows[7]["bad"] = True
+    w.write_many(rows)
+    assert w.flush(force=True) == 10
+    assert w.written == acked == [0, 1, 2, 4, 5, 6, 8, 9]
+    assert rejected == [3, 7] and w.stats()["rejected_rows"] == 2
+    assert w.stats()["consecutive_failures"] == 0 and w.stats()["buffered"] == 0
+    lines = [json.loads(l) for l in (tmp_path / "sink.rejected.jsonl").read_text().splitlines()]
+    assert [r["i"] for r in lines] == [3, 7] and lines[0]["_error"] == "valor fora da faixa"
+    w.close()
+
+
+def test_erro_permanente_no_spill_nao_trava_o_resto(tmp_path):
+    spill = tmp_path / "sink.jsonl"
+    rows = _rows(0, 5)
+    rows[1]["bad"] = True
+    spill.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    w = _FlakyWriter(max_rows=2, spill_path=str(spill))
+    w.sync()
+    assert w.written == [0, 2, 3, 4] and w.stats()["rejected_rows"] == 1
+    assert not spill.exists()
+    w.close()
+
+
+def test_to_ts_com_fuso_vira_hora_local_sem_offset(monkeypatch):
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    try:
+        assert _to_ts("2025-11-16T13:00:00Z") == "2025-11-16T10:00:00"
+        assert _to_ts("2025-11-16T12:00:00+02:00") == "2025-11-16T07:00:00"
+        assert _to_ts(datetime(2025, 11, 16, 13, tzinfo=timezone.utc)) == "2025-11-16T10:00:00"
+        assert _to_ts("2025-11-16T10:00:00") == "2025-11-16T10:00:00"
+        assert _to_ts("ontem") is None and _to_ts(1e20) is None
+    finally:
+        monkeypatch.undo()
+        time.tzset()
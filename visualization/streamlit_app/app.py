@@ -6,14 +6,22 @@ import subprocess
 import platform
 import logging
 import json
+import re
 import uuid
 from pathlib import Path
 from datetime import datetime
 from component.visuals import render_visual_panels
+from component.snapshot import start_service
+from component.charts import figures
+from component.live import LIVE_REFRESH
+from component.profiling import profiler, render_profile_panel
+from component.logfollow import LOG_MAX_BYTES, copytruncate_log, follow, rotate_log
+from db.loader import fetch_metrics
+from db.engine import engine_stats
+from db.query import read_range
 
 import streamlit as st
 import pandas as pd
-import sqlalchemy
 from botocore.exceptions import ClientError
 import boto3
 
@@ -43,6 +51,8 @@ def start_background(name, cmd):
     """Inicia processo (background) e registra handles em st.session_state"""
     log_path = LOGS_DIR / f"{name}.log"
     err_path = LOGS_DIR / f"{name}.err.log"
+    for p in (log_path, err_path):  # acima de LOG_MAX_BYTES: vira .1 (component/logfollow.py)
+        rotate_log(p)
     stdout_f = open(log_path, "a", encoding="utf-8", buffering=1)
     stderr_f = open(err_path, "a", encoding="utf-8", buffering=1)
 
@@ -114,24 +124,6 @@ def stop_background(name):
                 pass
         st.session_state["farmtech_procs"].pop(name, None)
 
-def tail(path: str, n: int = 200):
-    try:
-        with open(path, "rb") as f:
-            f.seek(0, 2)
-            size = f.tell()
-            block = 4096
-            data = b""
-            while size > 0 and len(data) < n * 300:
-                size = max(0, size - block)
-                f.seek(size)
-                data = f.read(min(block, size)) + data
-            text = data.decode("utf-8", errors="replace")
-        return "\n".join(text.splitlines()[-n:])
-    except FileNotFoundError:
-        return "(log não encontrado)"
-    except Exception as e:
-        return f"(erro lendo log: {e})"
-
 # ----------------- SNS helper -----------------
 def publish_sns(message: str, subject: str = "Alerta FarmTech", message_group_id: str = None):
     """
@@ -150,123 +142,32 @@ def publish_sns(message: str, subject: str = "Alerta FarmTech", message_group_id
     resp = client.publish(**kwargs)
     return resp
 
-# ----------------- fetch_metrics -----------------
-@st.cache_data(ttl=5)
-def _get_engine(url: str):
-    try:
-        engine = sqlalchemy.create_engine(url)
-        with engine.connect() as conn:
-            conn.execute(sqlalchemy.text("SELECT 1"))
-        return engine
-    except Exception:
-        return None
-
-@st.cache_data(ttl=5)
-def fetch_metrics(database_url: str = None):
+# ----------------- snapshot compartilhado -----------------
+@st.cache_resource
+def snapshot_service(database_url: str = None):
     """
-    Retorna dicionário com:
-      - sensors_active (int)
-      - umidade_media (float)
-      - alerts_pending (int)
-      - latest_readings (DataFrame)
-    Usa DB se database_url válido; fallback CSV se não.
+    Uma thread por processo (component/snapshot.py) recalcula a cada SNAPSHOT_INTERVAL s:
+      - sensors_active, umidade_media, alerts_pending, latest_readings (db/loader.fetch_metrics:
+        ring buffer do bridge, DB numa consulta, store Parquet ou CSV)
+      - dados dos painéis (visuals.build_panel_data)
+    Todas as sessões leem o mesmo snapshot imutável.
     """
-    result = {
-        "sensors_active": 0,
-        "umidade_media": None,
-        "alerts_pending": 0,
-        "latest_readings": pd.DataFrame()
-    }
-
-    engine = None
-    if database_url:
-        engine = _get_engine(database_url)
-
-    if engine:
-        # DB queries (Postgres)
-        try:
-            q_active = """
-            SELECT sensor_id, MAX(ts) as last_ts
-            FROM sensors
-            GROUP BY sensor_id
-            HAVING MAX(ts) >= (now() - interval '15 minutes')
-            """
-            df_active = pd.read_sql_query(sqlalchemy.text(q_active), con=engine)
-            result["sensors_active"] = int(df_active.shape[0])
-        except Exception:
-            result["sensors_active"] = 0
-
-        try:
-            q_um = "SELECT umidade FROM sensors WHERE umidade IS NOT NULL ORDER BY ts DESC LIMIT 100"
-            df_um = pd.read_sql_query(sqlalchemy.text(q_um), con=engine)
-            if df_um is not None and not df_um.empty:
-                result["umidade_media"] = round(float(df_um['umidade'].mean()), 2)
-        except Exception:
-            result["umidade_media"] = None
-
-        try:
-            q_alerts = "SELECT COUNT(*) as pending FROM alerts WHERE resolved = false"
-            df_alerts = pd.read_sql_query(sqlalchemy.text(q_alerts), con=engine)
-            result["alerts_pending"] = int(df_alerts['pending'].iloc[0]) if not df_alerts.empty else 0
-        except Exception:
-            result["alerts_pending"] = 0
-
-        try:
-            q_latest = "SELECT sensor_id, umidade, nutriente, ts FROM sensors ORDER BY ts DESC LIMIT 20"
-            df_latest = pd.read_sql_query(sqlalchemy.text(q_latest), con=engine)
-            result["latest_readings"] = df_latest
-        except Exception:
-            result["latest_readings"] = pd.DataFrame()
-
-        return result
-
-    # ---------- CSV fallback ----------
-    csv_candidates = [
-        ROOT / "db" / "data_samples" / "sensors.csv",
-        ROOT / "db" / "sensors.csv",
-        ROOT / "db" / "sensors_data.csv",
-    ]
-    df = None
-    for p in csv_candidates:
-        try:
-            if p.exists():
-                df = pd.read_csv(p)
-                break
-        except Exception:
-            df = None
-
-    if df is None:
-        return result
-
-    # normalize timestamp
-    if 'ts' in df.columns:
-        df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
-
-    try:
-        now = pd.Timestamp.now()
-        last_per_sensor = df.sort_values('ts').groupby('sensor_id').last().reset_index()
-        recent = last_per_sensor[last_per_sensor['ts'] >= (now - pd.Timedelta(minutes=15))]
-        result['sensors_active'] = int(recent.shape[0])
-    except Exception:
-        result['sensors_active'] = int(df['sensor_id'].nunique()) if 'sensor_id' in df.columns else 0
-
-    if 'umidade' in df.columns:
-        try:
-            result['umidade_media'] = round(float(df['umidade'].dropna().astype(float).tail(100).mean()), 2)
-        except Exception:
-            result['umidade_media'] = None
-
-    try:
-        if 'ts' in df.columns:
-            result['latest_readings'] = df.sort_values('ts', ascending=False).head(20)
-        else:
-            result['latest_readings'] = df.head(20)
-    except Exception:
-        result['latest_readings'] = df.head(20)
-
-    return result
+    return start_service(database_url)
+
+def render_metrics(service, metrics):
+    """KPIs do topo; no modo ao vivo (fragmento) relê o snapshot atual a cada tick."""
+    with profiler.section("kpis"):
+        snap = service.get() if st.session_state.get("live_mode") else None
+        if snap is not None:
+            metrics = snap.metrics
+        umidade_media = metrics.get("umidade_media")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Sensores Ativos", metrics.get("sensors_active", 0))
+        col2.metric("Umidade Média", f"{umidade_media}%" if umidade_media is not None else "—")
+        col3.metric("Alertas Pendentes", metrics.get("alerts_pending", 0))
 
 # ----------------- Streamlit UI -----------------
+_rerun_t0 = profiler.clock()  # perfil por seção (component/profiling.py; painel na sidebar)
 st.set_page_config(page_title="FarmTech - Orquestrador", layout="wide")
 st.title("🌾 FarmTech - Orquestrador Integrado")
 
@@ -288,26 +189,37 @@ phase = st.sidebar.radio("Selecione uma fase:", [
 if phase == "Dashboard Principal":
     st.header("Dashboard Principal — Dados Reais + Cálculos Econômicos")
 
-    if st.button("🔄 Atualizar métricas"):
-        try:
-            st.cache_data.clear()
-        except Exception:
-            pass
-
-    with st.spinner("Consultando dados..."):
-        metrics = fetch_metrics(DATABASE_URL)
+    service = snapshot_service(DATABASE_URL)
+    b1, b2 = st.columns([1, 3])
+    refresh = b1.button("🔄 Atualizar métricas")
+    # ao vivo: só KPIs e série de umidade rodam de novo (st.fragment), o resto da página não
+    live_every = LIVE_REFRESH if b2.toggle(f"Ao vivo (a cada {LIVE_REFRESH:g} s)", key="live_mode") else None
+    with st.spinner("Consultando dados..."), profiler.section("snapshot.get"):
+        snap = service.refresh() if refresh else service.get()
+    if snap is None:  # serviço ainda sem nenhum snapshot: calcula nesta sessão
+        st.warning(f"Snapshot compartilhado indisponível ({service.stats()['last_error'] or 'calculando'}).")
+        with profiler.section("fetch_metrics"):
+            metrics, panels = fetch_metrics(DATABASE_URL), None
+    else:
+        if snap.error:
+            st.warning(f"Falha ao recalcular as métricas ({snap.error}); exibindo o snapshot de "
+                       f"{snap.age():.0f} s atrás.")
+        metrics, panels = snap.metrics, snap.panels
 
     # Mostrar métricas (reais)
     sensores_ativos = metrics.get("sensors_active", 0)
-    umidade_media = metrics.get("umidade_media")
-    alertas_pendentes = metrics.get("alerts_pending", 0)
-
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Sensores Ativos", sensores_ativos)
-    col2.metric("Umidade Média", f"{umidade_media}%" if umidade_media is not None else "—")
-    col3.metric("Alertas Pendentes", alertas_pendentes)
+    if live_every:
+        st.fragment(run_every=live_every)(render_metrics)(service, metrics)
+    else:
+        render_metrics(service, metrics)
+    with st.expander("Snapshot compartilhado / pool de conexões / cache de gráficos"):
+        st.json(service.stats())
+        st.json(figures.stats())
+        if DATABASE_URL:
+            st.json(engine_stats(DATABASE_URL))
 
     st.markdown("---")
+    t_calc = profiler.clock()
     st.subheader("Parâmetros agrícolas (insira valores para cálculos)")
 
     # Inputs
@@ -363,9 +275,13 @@ if phase == "Dashboard Principal":
     st.write(f"Custo por sensor: **{cost_per_sensor:,.2f}**" if cost_per_sensor is not None else "—")
     st.write(f"Produção por sensor: **{production_per_sensor:,.0f} {unit_name}**" if production_per_sensor is not None else "—")
 
-    render_visual_panels(database_url=DATABASE_URL)
+    profiler.record("calculadora", t_calc)
+
+    with profiler.section("visuals"):
+        render_visual_panels(database_url=DATABASE_URL, data=panels, live_every=live_every)
 
     # resumo em tabela
+    t_summary = profiler.clock()
     summary = {
         "Métrica": [
             "Área (ha)",
@@ -404,17 +320,19 @@ if phase == "Dashboard Principal":
     }
     df_summary = pd.DataFrame(summary)
     st.dataframe(df_summary, width='stretch')
+    profiler.record("resumo", t_summary)
 
     st.markdown("---")
     st.subheader("Últimas leituras (fonte)")
-    latest = metrics.get("latest_readings")
-    if latest is None or latest.empty:
-        st.info("Nenhuma leitura disponível.")
-    else:
-        if 'ts' in latest.columns:
-            latest = latest.copy()
-            latest['ts'] = pd.to_datetime(latest['ts']).astype(str)
-        st.dataframe(latest, width='stretch')
+    with profiler.section("latest_readings"):
+        latest = metrics.get("latest_readings")
+        if latest is None or latest.empty:
+            st.info("Nenhuma leitura disponível.")
+        else:
+            if 'ts' in latest.columns:
+                latest = latest.copy()
+                latest['ts'] = pd.to_datetime(latest['ts']).astype(str)
+            st.dataframe(latest, width='stretch')
 
     # export
     e1, e2 = st.columns(2)
@@ -462,7 +380,24 @@ elif phase == "IoT & Sensores":
     info = st.session_state["farmtech_procs"].get("mqtt")
     if info:
         st.subheader("Logs MQTT (últimas linhas)")
-        st.text_area("mqtt_log", value=tail(info["log"], 500), height=300)
+        with profiler.section("logs.tail"):
+            # follower do processo: lê só o que foi anexado desde o último rerun e segue rotação;
+            # o bridge continua rodando: acima de LOG_MAX_BYTES copia para .1 e trunca no lugar
+            follower = follow(info["log"], max_bytes=LOG_MAX_BYTES)
+            copytruncate_log(info["err"])
+            q1, q2 = st.columns([3, 1])
+            query = q1.text_input("Filtrar log (últimas linhas em memória)", key="mqtt_log_query")
+            use_regex = q2.checkbox("Regex", key="mqtt_log_regex")
+            if query:
+                try:
+                    hits = follower.search(query, limit=500, regex=use_regex)
+                except re.error as e:
+                    st.error(f"Regex inválida: {e}")
+                    hits = []
+                st.caption(f"{len(hits)} linha(s) entre as últimas {len(follower.lines)}")
+                st.text_area("mqtt_log", value="\n".join(hits), height=300)
+            else:
+                st.text_area("mqtt_log", value=follower.tail(500), height=300)
 
 # ---------------- Data Pipeline ----------------
 elif phase == "Data Pipeline":
@@ -476,22 +411,18 @@ elif phase == "Data Pipeline":
             ok = subprocess.run([PY, str(MQTT_SCRIPT)], cwd=str(ROOT))
             st.info(f"Exit code: {ok.returncode}")
 
-    # show weather CSV
-    cands = [ROOT / "db" / "data_samples" / "weather.csv", ROOT / "db" / "weather.csv"]
-    found = None
-    for p in cands:
-        if p.exists():
-            found = p
-            break
-    if found:
+    # clima: só as 200 leituras mais recentes (banco, senão CSV; db/query.py)
+    with profiler.section("clima.preview"):
         try:
-            dfw = pd.read_csv(found)
-            st.subheader("Dados Climáticos (preview)")
-            st.dataframe(dfw.head(200), width='stretch')
+            dfw = read_range("weather", limit=200, database_url=DATABASE_URL or "")
         except Exception as e:
-            st.error(f"Erro lendo CSV clima: {e}")
-    else:
-        st.info("CSV de clima não encontrado.")
+            dfw = None
+            st.error(f"Erro lendo dados de clima: {e}")
+        if dfw is not None and not dfw.empty:
+            st.subheader("Dados Climáticos (preview)")
+            st.dataframe(dfw, width='stretch')
+        elif dfw is not None:
+            st.info("Dados de clima não encontrados.")
 
 # ---------------- Machine Learning ----------------
 elif phase == "Machine Learning":
@@ -554,3 +485,6 @@ if st.sidebar.checkbox("Mostrar processos ativos"):
             if st.sidebar.button(f"Stop {name}"):
                 stop_background(name)
                 st.experimental_rerun()
+
+profiler.record("rerun", _rerun_t0)
+render_profile_panel()
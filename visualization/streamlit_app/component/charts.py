@@ -0,0 +1,232 @@
+"""
+charts.py
+Camada de renderização dos gráficos do dashboard (usada por visuals.py).
+
+- downsample(): LTTB (padrão) ou min/max por pixel até a largura do gráfico em pontos;
+  acima disso o matplotlib só gasta tempo desenhando pontos que caem no mesmo pixel
+- figuras com matplotlib.figure.Figure (fora do registro do pyplot): nada fica vivo depois
+  de render_png(), que desenha, serializa em PNG e fecha
+- FigureCache: PNG por (gráfico, versão dos dados); a versão vem do snapshot ou de um hash
+  da especificação já reduzida (pontos/barras), então um rerun sem dados novos só devolve bytes
+
+Benchmark (tempo por rerun e crescimento do RSS em N reruns, séries crescentes):
+    python visualization/streamlit_app/component/charts.py bench
+"""
+
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+CHART_DOWNSAMPLE = os.getenv("CHART_DOWNSAMPLE", "lttb")  # lttb | minmax | off
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", "32"))
+
+
+# ---------- downsampling ----------
+def _as_float(x: np.ndarray) -> np.ndarray:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[us]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Índices escolhidos pelo Largest-Triangle-Three-Buckets (mantém picos e formato)."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    xf, yf = _as_float(x), y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets internos
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = xf[nxt_lo:nxt_hi].mean(), yf[nxt_lo:nxt_hi].mean()
+        bx, by = xf[lo:hi], yf[lo:hi]
+        area = np.abs((xf[a] - cx) * (by - yf[a]) - (xf[a] - bx) * (cy - yf[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Índices do mínimo e do máximo de cada um dos ``n_out // 2`` blocos (envelope exato)."""
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    out = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        seg = y[lo:hi]
+        out += sorted((lo + int(np.argmin(seg)), lo + int(np.argmax(seg))))
+    return np.unique(np.asarray(out, dtype=np.int64))
+
+
+def downsample(series: pd.Series, width_px: int, method: str = None) -> pd.Series:
+    """``series`` (índice ordenado) reduzida a ~``width_px`` pontos; NaN descartados antes."""
+    method = method or CHART_DOWNSAMPLE
+    series = series.dropna()
+    if method == "off" or len(series) <= width_px:
+        return series
+    x, y = series.index.to_numpy(), series.to_numpy()
+    idx = minmax(y, width_px) if method == "minmax" else lttb(x, y, width_px)
+    return series.iloc[idx]
+
+
+# ---------- figuras ----------
+def new_figure(figsize) -> tuple:
+    """Figure fora do pyplot: sem registro global, liberada com a última referência."""
+    fig = Figure(figsize=figsize, dpi=CHART_DPI)
+    return fig, fig.subplots()
+
+
+def width_px(fig: Figure) -> int:
+    return int(fig.get_figwidth() * fig.dpi)
+
+
+def render_png(fig: Figure) -> bytes:
+    """Serializa e fecha: depois disso a figura não guarda mais buffers de desenho."""
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png")
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+def spec_version(*parts) -> str:
+    """Hash da especificação reduzida (séries/arrays pequenos, escalares)."""
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        if isinstance(p, (pd.Series, pd.Index)):
+            h.update(np.ascontiguousarray(p.to_numpy()).tobytes())
+            if isinstance(p, pd.Series):
+                h.update(np.ascontiguousarray(p.index.to_numpy().astype(str)).tobytes())
+        elif isinstance(p, np.ndarray):
+            h.update(np.ascontiguousarray(p).tobytes())
+        else:
+            h.update(repr(p).encode())
+    return h.hexdigest()
+
+
+class FigureCache:
+    """LRU (gráfico, versão) -> PNG; sessões que pedem a mesma chave ao mesmo tempo esperam um só desenho."""
+
+    def __init__(self, size: int = FIGURE_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, name: str, version, draw) -> bytes:
+        """PNG de ``draw()`` (que devolve a Figure) para a ``version``; desenha só no miss."""
+        key = (name, version)
+        while True:
+            with self._lock:
+                png = self._items.get(key)
+                if png is not None:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return png
+                waiting = self._pending.get(key)
+                if waiting is None:
+                    done = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            waiting.wait()
+            if key not in self._items:  # desenho falhou: tenta nesta sessão
+                with self._lock:
+                    if self._pending.get(key) is waiting:
+                        del self._pending[key]
+        try:
+            png = render_png(draw())
+            with self._lock:
+                self._items[key] = png
+                while len(self._items) > self.size:
+                    self._items.popitem(last=False)
+            return png
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": sum(len(v) for v in self._items.values()),
+                    "hits": self.hits, "misses": self.misses}
+
+
+figures = FigureCache()
+
+
+# ---------- benchmark ----------
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _bench(sizes, reruns: int):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rng = np.random.default_rng(0)
+
+    def legacy(series):
+        # antes: pyplot, todos os pontos, figura nunca fechada (st.pyplot só serializa)
+        fig, ax = plt.subplots(figsize=(9, 3.5))
+        ax.plot(series.index.to_pydatetime(), series.values)
+        fig.tight_layout()
+        fig.savefig(io.BytesIO(), format="png")
+
+    def layered(series, version):
+        def draw():
+            fig, ax = new_figure((9, 3.5))
+            s = downsample(series, width_px(fig))
+            ax.plot(s.index, s.values)
+            fig.tight_layout()
+            return fig
+        figures.get_or_render("bench", version, draw)
+
+    print(f"{'pontos':>10s} {'modo':28s} {'rerun p50':>12s} {'RSS +':>10s}")
+    for n in sizes:
+        idx = pd.date_range("2025-01-01", periods=n, freq="min")
+        series = pd.Series(40 + np.cumsum(rng.normal(0, 0.1, n)), index=idx)
+        for label, fn in (("pyplot, todos os pontos", lambda i: legacy(series)),
+                          ("downsample, dados novos", lambda i: layered(series, ("miss", n, i))),
+                          ("downsample, mesma versão", lambda i: layered(series, ("hit", n)))):
+            lat, rss0 = [], _rss_mb()
+            for i in range(reruns):
+                t0 = time.perf_counter()
+                fn(i)
+                lat.append(time.perf_counter() - t0)
+            lat.sort()
+            print(f"{n:10,d} {label:28s} {lat[len(lat) // 2] * 1000:9.1f} ms {_rss_mb() - rss0:7.0f} MB"
+                  f"{f'  (figuras abertas no pyplot: {len(plt.get_fignums())})' if label.startswith('pyplot') else ''}")
+        plt.close("all")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Renderização dos gráficos do dashboard")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="pyplot com todos os pontos x downsample + cache de PNG")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+    _bench(args.sizes, args.reruns)
@@ -17,7 +17,7 @@ import streamlit as st
 import pandas as pd
 import time
 from pathlib import Path
-from ml.train_model import fetch_metrics
+from db.loader import fetch_metrics
 
 
 @dataclass
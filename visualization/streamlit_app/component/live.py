@@ -0,0 +1,172 @@
+"""
+live.py
+Modo ao vivo do dashboard: a série horária de umidade de cada sessão cresce com as
+leituras novas em vez de ser recalculada por um rerun completo do app.py.
+
+- semente: série horária do snapshot (component/snapshot.py) até a hora da leitura mais
+  recente; a marca d'água começa no início dessa hora
+- a cada tick (st.fragment(run_every=LIVE_REFRESH) em visuals.py/app.py) busca só
+  ``ts >= marca`` (db/query.read_range: banco, store ou CSV incremental) e soma/conta por
+  hora; leituras na própria marca já vistas (mesmo sensor_id) são descartadas
+- snapshot novo num rerun completo: a série é semeada de novo (corrige leituras que
+  chegaram atrasadas, com ts anterior à marca)
+
+Benchmark (tick incremental x recálculo da série da janela inteira):
+    python visualization/streamlit_app/component/live.py bench
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+from db.query import read_range
+
+# intervalo (s) entre atualizações dos painéis ao vivo
+LIVE_REFRESH = float(os.getenv("LIVE_REFRESH", "5"))
+LIVE_DAYS = float(os.getenv("DASHBOARD_DAYS", "7"))
+
+
+class LiveHumidity:
+    """Série horária (média de umidade) de uma sessão, atualizada a partir da marca d'água."""
+
+    def __init__(self, seed: Optional[pd.Series] = None, last_ts=None, seed_key=None,
+                 days: float = LIVE_DAYS):
+        self.seed_key = seed_key
+        self.days = days
+        last_ts = pd.Timestamp(last_ts) if last_ts is not None and not pd.isna(last_ts) else pd.Timestamp.now()
+        self.mark = last_ts.floor("h")
+        # a hora da marca é refeita com as leituras brutas: a semente só tem a média
+        self._seed = seed[seed.index < self.mark] if seed is not None else pd.Series(dtype="float64")
+        self._sum = pd.Series(dtype="float64")
+        self._count = pd.Series(dtype="int64")
+        self._seen = set()  # sensor_id já contados com ts == marca
+        self.rows = 0
+        self.ticks = 0
+
+    def update(self, database_url: Optional[str] = None) -> int:
+        """Busca e acumula as leituras desde a marca; devolve quantas eram novas."""
+        df = read_range("sensors", start=self.mark, columns=["ts", "sensor_id", "umidade"],
+                        database_url=database_url or "")
+        self.ticks += 1
+        df = df.dropna(subset=["ts"])
+        if self._seen:
+            at_mark = (df["ts"] == self.mark) & df["sensor_id"].astype(str).isin(self._seen)
+            df = df[~at_mark]
+        if df.empty:
+            return 0
+        values = df.dropna(subset=["umidade"])
+        hours = values["ts"].dt.floor("h")
+        grouped = values["umidade"].astype("float64").groupby(hours)
+        self._sum = self._sum.add(grouped.sum(), fill_value=0)
+        self._count = self._count.add(grouped.count(), fill_value=0)
+        newest = df["ts"].max()
+        ids = set(df.loc[df["ts"] == newest, "sensor_id"].astype(str))
+        self._seen = (self._seen | ids) if newest == self.mark else ids
+        self.mark = newest
+        self.rows += len(df)
+        self._trim()
+        return len(df)
+
+    def _trim(self):
+        # janela relativa à marca, não ao relógio: dados antigos (CSVs de exemplo) continuam visíveis
+        cutoff = self.mark.floor("h") - pd.Timedelta(days=self.days)
+        if len(self._seed) and self._seed.index[0] < cutoff:
+            self._seed = self._seed[self._seed.index >= cutoff]
+        keep = self._sum.index >= cutoff
+        if not keep.all():
+            self._sum, self._count = self._sum[keep], self._count[keep]
+
+    def series(self) -> pd.Series:
+        live = (self._sum / self._count.where(self._count > 0)).dropna()
+        if self._seed.empty:
+            return live.sort_index()
+        seed = self._seed[self._seed.index < live.index.min()] if len(live) else self._seed
+        return pd.concat([seed, live]).sort_index()
+
+
+def live_humidity(state, data: dict, database_url: Optional[str] = None) -> LiveHumidity:
+    """LiveHumidity da sessão (``state``: st.session_state); semeia de novo quando o snapshot muda."""
+    seed_key = data.get("built_at")
+    live = state.get("live_humidity")
+    if live is None or live.seed_key != seed_key:
+        df_sensors = data.get("sensors")
+        last_ts = df_sensors["ts"].max() if df_sensors is not None and not df_sensors.empty else None
+        charts = data.get("charts") or {}
+        live = state["live_humidity"] = LiveHumidity(charts.get("humidity", data.get("hourly")),
+                                                     last_ts, seed_key)
+    live.update(database_url)
+    return live
+
+
+# ---------- benchmark ----------
+def _bench(database_url: str, ticks: int, batch: int):
+    """
+    Cada tick insere ``batch`` leituras novas e compara: recalcular a série da janela
+    (consulta 1h agregada, como num rerun completo sem snapshot) x LiveHumidity.update().
+    """
+    import sqlalchemy
+    from db.engine import get_engine
+    from db.query import clear_cache
+
+    engine = get_engine(database_url)
+    if engine is None:
+        raise SystemExit("bench precisa de DATABASE_URL (insere leituras de teste em sensors)")
+    window = pd.Timedelta(days=LIVE_DAYS)
+    seed = read_range("sensors", start=window, columns=["ts", "umidade"], bucket="1h",
+                      database_url=database_url, cache=False).set_index("ts")["umidade"]
+    last = read_range("sensors", columns=["ts"], limit=1, database_url=database_url, cache=False)["ts"].max()
+    live = LiveHumidity(seed, last)
+    live.update(database_url)
+    rng = np.random.default_rng(0)
+    full, inc = [], []
+    try:
+        for i in range(ticks):
+            now = pd.Timestamp.now()
+            rows = [{"sensor_id": f"live-{j % 50:02d}", "ts": (now + pd.Timedelta(microseconds=j)).to_pydatetime(),
+                     "umidade": float(rng.uniform(20, 60)), "nutriente": 0.0} for j in range(batch)]
+            with engine.begin() as conn:
+                conn.execute(sqlalchemy.text("INSERT INTO sensors (sensor_id, ts, umidade, nutriente) "
+                                             "VALUES (:sensor_id, :ts, :umidade, :nutriente)"), rows)
+            clear_cache()
+            t0 = time.perf_counter()
+            ref = read_range("sensors", start=window, columns=["ts", "umidade"], bucket="1h",
+                             database_url=database_url, cache=False).set_index("ts")["umidade"]
+            full.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            live.update(database_url)
+            got = live.series()
+            inc.append(time.perf_counter() - t0)
+            assert abs(float(got.iloc[-1]) - float(ref.iloc[-1])) < 1e-3, (got.iloc[-1], ref.iloc[-1])
+    finally:
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text("DELETE FROM sensors WHERE sensor_id LIKE 'live-%'"))
+    full.sort()
+    inc.sort()
+    print(f"{ticks} ticks, {batch} leituras novas por tick, janela {LIVE_DAYS:g} dias, {len(got)} horas")
+    print(f"  série da janela inteira (rerun):  p50={full[len(full) // 2] * 1000:8.1f} ms")
+    print(f"  incremental desde a marca:        p50={inc[len(inc) // 2] * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Série ao vivo do dashboard (marca d'água)")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Tick incremental x série recalculada da janela")
+    p.add_argument("--ticks", type=int, default=20)
+    p.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+    if args.database_url is None:
+        from data_pipeline.config import DATABASE_URL
+        args.database_url = DATABASE_URL
+    _bench(args.database_url, args.ticks, args.batch)
@@ -0,0 +1,355 @@
+"""
+logfollow.py
+Acompanhamento incremental dos logs dos processos (logs/*.log) mostrados no app.
+
+Cada LogFollower (um por arquivo no processo, compartilhado entre sessões) mantém o
+arquivo aberto, o offset lido e um deque com as últimas LOG_TAIL_LINES linhas:
+  - poll(): lê só os bytes anexados desde o último poll (nada mudou: só um fstat/stat)
+  - rotação por rename (logrotate, rotate_log()): o follower passa para o arquivo novo do
+    início e mantém o antigo aberto até ele ficar LOG_ROTATE_GRACE s sem crescer (quem ainda
+    escreve pelo descritor antigo não perde linhas)
+  - truncado (copytruncate, copytruncate_log()): volta ao início
+  - a primeira abertura lê só o fim do arquivo (~LOG_TAIL_LINES linhas), não o log inteiro
+  - linha final sem '\\n' (processo no meio da escrita) fica para o próximo poll
+  - search(): filtro (texto ou regex) sobre a janela em memória
+
+Limite de crescimento (acima de LOG_MAX_BYTES, cópias em .1 … .LOG_BACKUPS):
+  - rotate_log(): rename, antes de abrir o log para um processo novo
+  - copytruncate_log() / follow(max_bytes=...): copia e trunca no lugar, para o log de um
+    processo que continua rodando (aberto em modo 'a', O_APPEND, volta a escrever do início)
+
+Benchmark (rerun da aba IoT com log crescendo):
+    python visualization/streamlit_app/component/logfollow.py bench --size-mb 50
+"""
+
+import os
+import re
+import shutil
+import time
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List
+
+logger = logging.getLogger("farmtech.logfollow")
+
+LOG_TAIL_LINES = int(os.getenv("LOG_TAIL_LINES", "2000"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+LOG_ROTATE_GRACE = float(os.getenv("LOG_ROTATE_GRACE", "30"))
+_READ_CHUNK = 1 << 20
+_BACKFILL_BYTES_PER_LINE = 256  # primeira abertura: estimativa para achar o início das últimas linhas
+
+
+class LogFollower:
+    """Últimas ``maxlen`` linhas de ``path``, atualizadas só com os bytes novos."""
+
+    def __init__(self, path, maxlen: int = LOG_TAIL_LINES):
+        self.path = Path(path)
+        self.lines = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._f = None
+        self._ino = None
+        self._partial = b""
+        self._old = None  # [arquivo, parcial, último crescimento] do arquivo rotacionado por rename
+        self.version = 0  # muda quando entram linhas novas (chave de cache para a UI)
+        self.bytes_read = 0
+        self.rotations = 0
+
+    def poll(self) -> int:
+        """Lê o que foi anexado (e segue rotação/truncamento); devolve quantas linhas entraram."""
+        with self._lock:
+            try:
+                if self._f is None:
+                    return self._open(backfill=True)
+                added = self._drain() + self._drain_old()  # inclui o resto do arquivo já renomeado
+                try:
+                    st = os.stat(self.path)
+                except FileNotFoundError:
+                    return added  # rotacionado e ainda não recriado
+                if st.st_ino != self._ino:
+                    self.rotations += 1
+                    self._close_old()
+                    self._old = [self._f, self._partial, time.monotonic()]
+                    self._f = None
+                    return added + self._open(backfill=False)
+                if st.st_size < self._f.tell():  # copytruncate
+                    self.rotations += 1
+                    self._f.seek(0)
+                    self._partial = b""
+                return added + self._drain()
+            except FileNotFoundError:
+                return 0
+            except OSError:
+                logger.exception("Falha lendo %s", self.path)
+                self._close()
+                return 0
+
+    def _open(self, backfill: bool) -> int:
+        f = open(self.path, "rb")
+        st = os.fstat(f.fileno())
+        self._f, self._ino, self._partial = f, st.st_ino, b""
+        if backfill:
+            start = max(0, st.st_size - self.lines.maxlen * _BACKFILL_BYTES_PER_LINE)
+            f.seek(start)
+            if start:
+                f.readline()  # descarta a linha cortada
+        return self._drain()
+
+    def _close(self):
+        self._close_old()
+        if self._f is not None:
+            try:
+                self._f.close()
+            except OSError:
+                pass
+        self._f, self._ino, self._partial = None, None, b""
+
+    def _close_old(self):
+        if self._old is not None:
+            try:
+                self._old[0].close()
+            except OSError:
+                pass
+            self._old = None
+
+    def _drain(self) -> int:
+        added, self._partial = self._read(self._f, self._partial)
+        return added
+
+    def _drain_old(self) -> int:
+        """Lê o que ainda chegou no arquivo rotacionado; fecha depois de LOG_ROTATE_GRACE s parado."""
+        if self._old is None:
+            return 0
+        f, partial, active = self._old
+        added, self._old[1] = self._read(f, partial)
+        if added or self._old[1] != partial:
+            self._old[2] = time.monotonic()
+        elif time.monotonic() - active > LOG_ROTATE_GRACE:
+            if partial:  # o escritor antigo terminou sem '\n'
+                self.lines.append(partial.decode("utf-8", errors="replace").rstrip("\r"))
+                self.version += 1
+                added += 1
+            self._close_old()
+        return added
+
+    def _read(self, f, partial: bytes):
+        added = 0
+        while True:
+            data = f.read(_READ_CHUNK)
+            if not data:
+                break
+            self.bytes_read += len(data)
+            *complete, partial = (partial + data).split(b"\n")
+            self.lines.extend(l.decode("utf-8", errors="replace").rstrip("\r") for l in complete)
+            added += len(complete)
+        if added:
+            self.version += 1
+        return added, partial
+
+    def truncate(self, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS) -> bool:
+        """copytruncate_log() do arquivo seguido, lendo antes o que falta e voltando ao início."""
+        with self._lock:
+            if self._f is None:
+                return False
+            self._drain()
+            if not copytruncate_log(self.path, max_bytes, backups, before_truncate=self._drain):
+                return False
+            self.rotations += 1
+            self._f.seek(0)
+            self._partial = b""
+            return True
+
+    def tail(self, n: int = 200) -> str:
+        with self._lock:
+            k = min(n, len(self.lines))
+            return "\n".join([self.lines[i] for i in range(len(self.lines) - k, len(self.lines))])
+
+    def search(self, pattern: str, limit: int = 200, regex: bool = False, case: bool = False) -> List[str]:
+        """Linhas da janela que contêm ``pattern`` (ou casam a regex), as ``limit`` mais recentes."""
+        if regex:
+            rx = re.compile(pattern, 0 if case else re.IGNORECASE)
+            match = rx.search
+        elif case:
+            match = lambda line: pattern in line
+        else:
+            needle = pattern.lower()
+            match = lambda line: needle in line.lower()
+        with self._lock:
+            window = list(self.lines)
+        out = deque(maxlen=limit)
+        for line in window:
+            if match(line):
+                out.append(line)
+        return list(out)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+_followers = {}
+_followers_lock = threading.Lock()
+
+
+def follow(path, maxlen: int = LOG_TAIL_LINES, max_bytes: int = None) -> LogFollower:
+    """
+    Follower do processo para ``path`` (um por caminho), já atualizado com poll(). Com
+    ``max_bytes``, o log acima disso é copiado para .1 e truncado (processo continua escrevendo).
+    """
+    key = str(Path(path).resolve())
+    with _followers_lock:
+        follower = _followers.get(key)
+        if follower is None:
+            follower = _followers[key] = LogFollower(key, maxlen)
+    follower.poll()
+    if max_bytes is not None:
+        follower.truncate(max_bytes)
+    return follower
+
+
+def _shift_backups(path: Path, backups: int):
+    for i in range(backups - 1, 0, -1):
+        src = path.with_name(f"{path.name}.{i}")
+        if src.exists():
+            os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+
+
+def rotate_log(path, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS) -> bool:
+    """
+    ``path`` acima de ``max_bytes``: path.N-1 -> path.N, …, path -> path.1 (o mais antigo sai).
+    Chamar antes de abrir o log para um processo novo; quem ainda escreve no antigo
+    continua no arquivo renomeado.
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_size <= max_bytes:
+            return False
+    except FileNotFoundError:
+        return False
+    if backups <= 0:
+        path.unlink()
+        return True
+    _shift_backups(path, backups)
+    os.replace(path, path.with_name(f"{path.name}.1"))
+    return True
+
+
+def copytruncate_log(path, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS,
+                     before_truncate=None) -> bool:
+    """
+    ``path`` acima de ``max_bytes``: copia para path.1 (deslocando os backups) e trunca no lugar.
+    Para logs de processos ainda rodando: o descritor deles (modo 'a') segue válido. O que for
+    escrito entre a cópia e o truncamento se perde (janela de uma cópia, como no logrotate).
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_size <= max_bytes:
+            return False
+        if backups > 0:
+            _shift_backups(path, backups)
+            shutil.copyfile(path, path.with_name(f"{path.name}.1"))
+        if before_truncate is not None:
+            before_truncate()
+        os.truncate(path, 0)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+# ---------- benchmark ----------
+def _legacy_tail(path: str, n: int = 200):
+    # antes: app.tail(), blocos de 4 KB de trás para frente a cada rerun
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        block = 4096
+        data = b""
+        while size > 0 and len(data) < n * 300:
+            size = max(0, size - block)
+            f.seek(size)
+            data = f.read(min(block, size)) + data
+        text = data.decode("utf-8", errors="replace")
+    return "\n".join(text.splitlines()[-n:])
+
+
+def _bench(size_mb: float, reruns: int, append: int):
+    import tempfile
+
+    tmp = Path(tempfile.mkdtemp(prefix="logfollow_bench_"))
+    path = tmp / "mqtt.log"
+    line_no = 0
+
+    def write(n):
+        nonlocal line_no
+        with open(path, "a", encoding="utf-8") as f:
+            for _ in range(n):
+                f.write(f"2025-01-01 00:00:00 [INFO] mensagem {line_no} sensor=esp32-{line_no % 200:03d} "
+                        f"umidade={40 + line_no % 20}.0 nutriente={line_no % 15}.5\n")
+                line_no += 1
+
+    write(int(size_mb * 2**20 / 90))
+    print(f"log inicial {path.stat().st_size / 2**20:.0f} MB, {reruns} reruns com +{append} linhas, tail de 500")
+    try:
+        results = {}  # rótulo -> texto do último rerun
+        follower = LogFollower(path)
+        for label, fn in (("tail() (antes)", lambda: _legacy_tail(str(path), 500)),
+                          ("LogFollower", lambda: (follower.poll(), follower.tail(500))[1])):
+            lat = []
+            for i in range(reruns):
+                write(append)
+                t0 = time.perf_counter()
+                results[label] = fn()
+                lat.append(time.perf_counter() - t0)
+            lat.sort()
+            print(f"  {label:16s} p50={lat[len(lat) // 2] * 1000:7.2f} ms  max={lat[-1] * 1000:7.2f} ms")
+        assert _legacy_tail(str(path), 500) == results["LogFollower"]
+        print(f"  LogFollower leu {follower.bytes_read / 2**20:.2f} MB no total")
+
+        t0 = time.perf_counter()
+        hits = follower.search("sensor=esp32-007")
+        print(f"  search() em {len(follower.lines)} linhas: {len(hits)} resultados, "
+              f"{(time.perf_counter() - t0) * 1000:.2f} ms")
+
+        write(10)
+        rotate_log(path, max_bytes=0, backups=2)  # rename: 10 linhas ainda não lidas no antigo
+        write(5)
+        added = follower.poll()
+        assert added == 15 and follower.rotations == 1, (added, follower.rotations)
+        print(f"  rotação: {added} linhas novas (10 do arquivo antigo + 5 do novo), nenhuma perdida")
+    finally:
+        for p in tmp.iterdir():
+            p.unlink()
+        tmp.rmdir()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Acompanhamento incremental de logs")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="tail() por rerun x LogFollower")
+    p.add_argument("--size-mb", type=float, default=50)
+    p.add_argument("--reruns", type=int, default=50)
+    p.add_argument("--append", type=int, default=100)
+    p = sub.add_parser("tail", help="Segue um log (como tail -F)")
+    p.add_argument("path")
+    p.add_argument("--grep", default=None)
+    p.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+    if args.cmd == "bench":
+        _bench(args.size_mb, args.reruns, args.append)
+    else:
+        follower = LogFollower(args.path)
+        follower.poll()
+        print(follower.tail(20) if args.grep is None else "\n".join(follower.search(args.grep, 20)))
+        try:
+            while True:
+                time.sleep(args.interval)
+                added = min(follower.poll(), len(follower.lines))
+                for line in list(follower.lines)[len(follower.lines) - added:]:
+                    if args.grep is None or args.grep.lower() in line.lower():
+                        print(line)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,207 @@
+"""
+profiling.py
+Tempos por seção do dashboard (app.py, component/visuals.py, component/snapshot.py).
+
+- profiler.section("nome") (context manager) ou profiler.clock()/record() em trechos longos
+- janela móvel das últimas PROFILE_WINDOW medições por seção: p50/p95/máx entre reruns,
+  mostrados no painel da sidebar (render_profile_panel)
+- ligado por DASHBOARD_PROFILE=1 ou pelo switch da sidebar; o switch vale para o processo
+  (todas as sessões e a thread do snapshot). Desligado, section() só testa um bool
+- dump(): JSON com estatísticas e amostras (e o commit do git) em PROFILE_DIR, para
+  comparar versões offline:
+      python visualization/streamlit_app/component/profiling.py compare antes.json depois.json
+
+Benchmark (custo de section() ligado/desligado):
+    python visualization/streamlit_app/component/profiling.py bench
+"""
+
+import os
+import json
+import time
+import threading
+import subprocess
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[3]
+
+PROFILE_ENABLED = os.getenv("DASHBOARD_PROFILE", "0").lower() in ("1", "true", "yes", "on")
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "200"))
+PROFILE_DIR = ROOT / os.getenv("PROFILE_DIR", "reports/profiles")  # relativo à raiz do repo (absoluto também vale)
+
+STATS_COLUMNS = ["section", "n", "last_ms", "p50_ms", "p95_ms", "max_ms", "total_s"]
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+class Profiler:
+    """Janela móvel de tempos (segundos) por seção; thread-safe (sessões + thread do snapshot)."""
+
+    def __init__(self, window: int = PROFILE_WINDOW, enabled: bool = PROFILE_ENABLED):
+        self.window = window
+        self.enabled = enabled
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def section(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, t0)
+
+    def clock(self) -> Optional[float]:
+        """Início de um trecho medido com record(); None se desligado."""
+        return time.perf_counter() if self.enabled else None
+
+    def record(self, name: str, t0: Optional[float]):
+        if t0 is None:
+            return
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(elapsed)
+            self._totals[name] = self._totals.get(name, 0.0) + elapsed
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {k: list(v) for k, v in self._samples.items()}
+
+    def stats(self) -> pd.DataFrame:
+        """Uma linha por seção (ms), da maior p95 para a menor."""
+        with self._lock:
+            items = [(k, np.asarray(v, dtype=np.float64) * 1000, self._totals[k]) for k, v in self._samples.items()]
+        rows = [{"section": k, "n": len(ms), "last_ms": ms[-1], "p50_ms": np.percentile(ms, 50),
+                 "p95_ms": np.percentile(ms, 95), "max_ms": ms.max(), "total_s": total}
+                for k, ms, total in items if len(ms)]
+        df = pd.DataFrame(rows, columns=STATS_COLUMNS)
+        return df.sort_values("p95_ms", ascending=False, ignore_index=True).round(2)
+
+    def dump(self, path=None, label: str = "") -> Path:
+        """Grava estatísticas + amostras em JSON; sem ``path``, um arquivo novo em PROFILE_DIR."""
+        if path is None:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            suffix = f"_{label}" if label else ""
+            path = PROFILE_DIR / f"profile_{time.strftime('%Y%m%d_%H%M%S')}{suffix}.json"
+        path = Path(path)
+        doc = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "label": label,
+            "git": _git_rev(),
+            "window": self.window,
+            "stats": self.stats().to_dict(orient="records"),
+            "samples_ms": {k: [round(s * 1000, 3) for s in v] for k, v in self.samples().items()},
+        }
+        path.write_text(json.dumps(doc, indent=1), encoding="utf-8")
+        return path
+
+
+profiler = Profiler()
+
+
+def load_dump(path) -> pd.DataFrame:
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    return pd.DataFrame(doc["stats"], columns=STATS_COLUMNS).set_index("section")
+
+
+def compare(before, after) -> pd.DataFrame:
+    """p50/p95 de dois dumps lado a lado, com a variação (%), das seções com mais p95 primeiro."""
+    a, b = load_dump(before), load_dump(after)
+    df = pd.DataFrame({"p50_antes": a["p50_ms"], "p50_depois": b["p50_ms"],
+                       "p95_antes": a["p95_ms"], "p95_depois": b["p95_ms"]})
+    df["p50_%"] = (df["p50_depois"] / df["p50_antes"] - 1) * 100
+    df["p95_%"] = (df["p95_depois"] / df["p95_antes"] - 1) * 100
+    return df.sort_values("p95_depois", ascending=False, na_position="last").round(1)
+
+
+def render_profile_panel():
+    """Switch + tabela p50/p95 na sidebar; chamar no fim do app.py (inclui o rerun atual)."""
+    import streamlit as st
+
+    def _toggle():
+        profiler.enabled = st.session_state["profile_mode"]
+
+    # on_change: o switch de uma sessão não desliga o perfil ligado por outra a cada rerun
+    st.sidebar.toggle("⏱ Perfil de renderização (todas as sessões)", value=profiler.enabled,
+                      key="profile_mode", on_change=_toggle)
+    if not profiler.enabled:
+        return
+    st.sidebar.dataframe(profiler.stats()[["section", "n", "last_ms", "p50_ms", "p95_ms"]],
+                         hide_index=True, width='stretch')
+    c1, c2 = st.sidebar.columns(2)
+    if c1.button("💾 Salvar perfil"):
+        st.sidebar.success(f"Perfil salvo: {profiler.dump()}")
+    if c2.button("Zerar"):
+        profiler.reset()
+
+
+# ---------- benchmark ----------
+def _bench(n: int):
+    """Custo por chamada de section(): desligado, ligado e o corpo vazio como referência."""
+    prof = Profiler()
+
+    def run(label, body):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            body()
+        print(f"{label:24s} {(time.perf_counter() - t0) / n * 1e6:8.2f} µs/chamada")
+
+    def plain():
+        pass
+
+    def with_section():
+        with prof.section("bench"):
+            pass
+
+    run("sem medição", plain)
+    prof.enabled = False
+    run("section() desligado", with_section)
+    prof.enabled = True
+    run("section() ligado", with_section)
+    print(prof.stats().to_string(index=False))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Perfil por seção do dashboard")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("compare", help="Compara dois dumps (p50/p95 por seção)")
+    p.add_argument("before")
+    p.add_argument("after")
+    p = sub.add_parser("show", help="Estatísticas de um dump")
+    p.add_argument("path")
+    p = sub.add_parser("bench", help="Custo de section() ligado/desligado")
+    p.add_argument("-n", type=int, default=200_000)
+    args = parser.parse_args()
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        if args.cmd == "compare":
+            print(compare(args.before, args.after).to_string())
+        elif args.cmd == "show":
+            print(load_dump(args.path).to_string())
+        else:
+            _bench(args.n)
@@ -0,0 +1,258 @@
+"""
+snapshot.py
+Snapshot de métricas compartilhado entre todas as sessões do dashboard.
+
+Uma thread por processo do Streamlit (app.py a guarda com st.cache_resource) recalcula a
+cada SNAPSHOT_INTERVAL segundos os KPIs (db/loader.fetch_metrics) e os dados dos painéis
+(visuals.build_panel_data) e publica um Snapshot imutável; as sessões só leem a referência
+atual. Consultas ao banco e parse de CSV passam a ser por intervalo, não por sessão/rerun.
+
+- sem leitura por SNAPSHOT_IDLE segundos (nenhuma sessão aberta) a thread não recalcula;
+  a primeira leitura depois disso espera o snapshot novo (até SNAPSHOT_WAIT s)
+- falha no cálculo: mantém o snapshot anterior e registra o erro (stats()); enquanto a
+  última tentativa falhou, get() devolve na hora o anterior com ``error`` preenchido (sem
+  esperar SNAPSHOT_WAIT a cada rerun) e só pede um novo cálculo em segundo plano
+- os DataFrames do snapshot são compartilhados: não altere in-place
+
+Benchmark (sessões simultâneas com rerun periódico):
+    python visualization/streamlit_app/component/snapshot.py bench --sessions 20
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+
+from db.loader import fetch_metrics
+from db.query import clear_cache
+
+logger = logging.getLogger("dashboard.snapshot")
+
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "5"))
+SNAPSHOT_IDLE = float(os.getenv("SNAPSHOT_IDLE", "60"))
+SNAPSHOT_WAIT = float(os.getenv("SNAPSHOT_WAIT", "10"))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    built_at: pd.Timestamp
+    build_seconds: float
+    metrics: Mapping[str, Any] = field(default_factory=dict)
+    panels: Mapping[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None  # preenchido quando é o anterior a um cálculo que falhou
+
+    def age(self) -> float:
+        return (pd.Timestamp.now() - self.built_at).total_seconds()
+
+
+def build_snapshot(database_url: Optional[str] = None, version: int = 0) -> Snapshot:
+    """KPIs + dados dos painéis num Snapshot (sem Streamlit; roda na thread do serviço)."""
+    from component.profiling import profiler
+    from component.visuals import build_panel_data
+
+    t0 = time.perf_counter()
+    clear_cache()  # o cache de consultas não pode devolver o ciclo anterior
+    with profiler.section("snapshot.fetch_metrics"):
+        metrics = fetch_metrics(database_url)
+    with profiler.section("snapshot.build_panel_data"):
+        panels = build_panel_data(database_url)
+    built_at = pd.Timestamp.now()
+    panels["built_at"] = built_at.strftime("%Y-%m-%d %H:%M:%S")
+    return Snapshot(version=version, built_at=built_at, build_seconds=time.perf_counter() - t0,
+                    metrics=MappingProxyType(metrics), panels=MappingProxyType(panels))
+
+
+class SnapshotService(threading.Thread):
+    """Produtor único do Snapshot; ``get()`` é só a leitura de uma referência."""
+
+    def __init__(self, database_url: Optional[str] = None, interval: float = SNAPSHOT_INTERVAL,
+                 idle: float = SNAPSHOT_IDLE):
+        super().__init__(name="metrics-snapshot", daemon=True)
+        self.database_url = database_url
+        self.interval = float(interval)
+        self.idle = float(idle)
+        self._snapshot = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._halt = threading.Event()
+        self._last_read = time.monotonic()
+        self.builds = 0
+        self.failures = 0
+        self.last_error = None
+
+    def run(self):
+        while not self._halt.is_set():
+            if time.monotonic() - self._last_read <= self.idle:
+                self._build()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _build(self):
+        try:
+            snap = build_snapshot(self.database_url, version=self.builds + 1)
+        except Exception as e:
+            logger.exception("Snapshot: falha no cálculo (mantido o anterior)")
+            with self._cond:
+                self.failures += 1
+                self.last_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                self._cond.notify_all()  # quem espera não fica até o timeout por um cálculo que não vem
+            return
+        with self._cond:
+            self._snapshot = snap
+            self.builds += 1
+            self.last_error = None
+            self._cond.notify_all()
+
+    def _wait_newer(self, version: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            failures = self.failures
+            while (self._snapshot is None or self._snapshot.version <= version) and not self._halt.is_set():
+                if self.failures != failures:
+                    return self._stale(self._snapshot)
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            return self._snapshot
+
+    def _stale(self, snap: Optional[Snapshot]) -> Optional[Snapshot]:
+        error = self.last_error
+        return replace(snap, error=error) if snap is not None and error else snap
+
+    def get(self, timeout: float = SNAPSHOT_WAIT) -> Optional[Snapshot]:
+        """Snapshot atual; o primeiro (ou um parado por ociosidade) espera o cálculo até ``timeout`` s."""
+        self._last_read = time.monotonic()
+        snap = self._snapshot
+        if snap is not None and snap.age() <= self.idle:
+            return self._stale(snap)
+        self._wake.set()
+        if snap is not None and self.last_error:
+            return self._stale(snap)  # último cálculo falhou: não bloqueia o rerun esperando outro
+        return self._wait_newer(snap.version if snap is not None else 0, timeout)
+
+    def refresh(self, timeout: float = SNAPSHOT_WAIT) -> Optional[Snapshot]:
+        """Recalcula agora (botão "Atualizar") e devolve o snapshot novo."""
+        snap = self._snapshot
+        self._last_read = time.monotonic()
+        self._wake.set()
+        return self._wait_newer(snap.version if snap is not None else 0, timeout)
+
+    def stop(self):
+        self._halt.set()
+        self._wake.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.join(timeout=5)
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "version": snap.version if snap else 0,
+            "age_s": round(snap.age(), 1) if snap else None,
+            "build_ms": round(snap.build_seconds * 1000, 1) if snap else None,
+            "builds": self.builds,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "interval_s": self.interval,
+        }
+
+
+def start_service(database_url: Optional[str] = None, **kwargs) -> SnapshotService:
+    service = SnapshotService(database_url, **kwargs)
+    service.start()
+    return service
+
+
+# ---------- benchmark ----------
+def _bench(database_url: str, sessions: int, duration: float, rerun: float, ttl: float):
+    """
+    Sessões (threads) com rerun a cada ``rerun`` s: antes, cada sessão chama fetch_metrics
+    (st.cache_data: TTL por chave, sem single-flight, cópia pickle a cada leitura) e monta os
+    painéis (cache de consultas por TTL); depois, todas leem o snapshot.
+    """
+    import pickle
+    from component.visuals import build_panel_data
+    from db.engine import get_engine, engine_stats
+    from db import query
+
+    get_engine(database_url)
+    query._cache.ttl = ttl
+    metrics_cache = {}
+
+    def cached_metrics():
+        hit = metrics_cache.get(database_url)
+        if hit is None or time.monotonic() - hit[0] > ttl:
+            hit = metrics_cache[database_url] = (time.monotonic(), pickle.dumps(fetch_metrics(database_url)))
+        return pickle.loads(hit[1])
+
+    def legacy_rerun():
+        cached_metrics()
+        build_panel_data(database_url)
+
+    def run(label, rerun_fn):
+        before = next(iter(engine_stats(database_url).values()))["checkouts"]
+        cpu0 = time.process_time()
+        lat, lock = [], threading.Lock()
+        stop_at = time.monotonic() + duration
+
+        def session(i):
+            time.sleep(rerun * i / sessions)  # sessões defasadas, como reruns reais
+            while time.monotonic() < stop_at:
+                t0 = time.perf_counter()
+                rerun_fn()
+                with lock:
+                    lat.append(time.perf_counter() - t0)
+                time.sleep(rerun)
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cpu = time.process_time() - cpu0
+        queries = next(iter(engine_stats(database_url).values()))["checkouts"] - before
+        lat.sort()
+        print(f"{label:20s} reruns={len(lat):4d} consultas={queries:5d} ({queries / duration:6.1f}/s) "
+              f"CPU={cpu:6.1f}s ({cpu / duration * 100:5.1f}%) rerun p50={lat[len(lat) // 2] * 1000:8.2f} ms "
+              f"p95={lat[int(len(lat) * 0.95) - 1] * 1000:8.2f} ms")
+
+    query.clear_cache()
+    run("por sessão (antes)", legacy_rerun)
+    service = start_service(database_url, interval=ttl)
+    service.get()
+    run("snapshot", lambda: service.get())
+    service.stop()
+    print(f"snapshot: {service.stats()}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    sys.path.insert(0, str(ROOT / "visualization" / "streamlit_app"))
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Snapshot de métricas compartilhado do dashboard")
+    parser.add_argument("--database-url", default=None, help="Padrão: data_pipeline.config.DATABASE_URL")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="Consultas/CPU com N sessões: por sessão x snapshot")
+    p.add_argument("--sessions", type=int, default=20)
+    p.add_argument("--duration", type=float, default=30)
+    p.add_argument("--rerun", type=float, default=2.0, help="Intervalo entre reruns de cada sessão (s)")
+    p.add_argument("--ttl", type=float, default=SNAPSHOT_INTERVAL, help="TTL dos caches / intervalo do snapshot")
+    args = parser.parse_args()
+    if args.database_url is None:
+        from data_pipeline.config import DATABASE_URL
+        args.database_url = DATABASE_URL
+    _bench(args.database_url, args.sessions, args.duration, args.rerun, args.ttl)
@@ -1,151 +1,258 @@
 from pathlib import Path
 from typing import Optional, Tuple
+import os
+import sys
 import pandas as pd
 import streamlit as st
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import time
 
 ROOT = Path(__file__).resolve().parents[3]
-SENSORS_CANDIDATES = [
-    ROOT / "db" / "data_samples" / "sensors.csv",
-    ROOT / "db" / "sensors.csv",
-    ROOT / "db" / "sensors_data.csv",
-]
-WEATHER_CANDIDATES = [
-    ROOT / "db" / "data_samples" / "weather.csv",
-    ROOT / "db" / "weather.csv",
-]
-DETECTIONS_CANDIDATES = [
-    ROOT / "db" / "data_samples" / "detections.csv",
-    ROOT / "db" / "detections.csv",
-]
-
-def _read_first_existing(candidates):
-    for p in candidates:
-        if p.exists():
-            try:
-                df = pd.read_csv(p)
-                return df, p
-            except Exception:
-                continue
-    return None, None
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.query import read_range
+from component.charts import downsample, figures, new_figure, render_png, spec_version, width_px
+from db.ringbuffer import get_live_rings
+from component.live import live_humidity
+from component.profiling import profiler
+
+try:
+    from db.rollups import get_rollups
+except ImportError:  # pyarrow ausente: só CSV
+    get_rollups = None
+
+# janela dos painéis (dias); filtro e agregação vão para o banco/store (db/query.py)
+DASHBOARD_DAYS = float(os.getenv("DASHBOARD_DAYS", "7"))
+# linhas brutas trazidas (as mais recentes da janela) para histograma, KPIs e previews;
+# série horária e média por sensor são agregadas sobre a janela inteira
+DASHBOARD_MAX_ROWS = int(os.getenv("DASHBOARD_MAX_ROWS", "50000"))
+# janela do painel ao vivo lido do ring buffer do bridge (segundos)
+LIVE_WINDOW = float(os.getenv("LIVE_WINDOW", "600"))
+# largura mínima (px) por barra nos gráficos por sensor/categoria
+CHART_BAR_PX = int(os.getenv("CHART_BAR_PX", "20"))
+
+def _load_recent(table: str, database_url: Optional[str] = None) -> pd.DataFrame:
+    database_url = database_url or ""  # como em fetch_metrics: sem URL, só store/CSV
+    df = read_range(table, start=pd.Timedelta(days=DASHBOARD_DAYS), limit=DASHBOARD_MAX_ROWS,
+                    database_url=database_url)
+    if df.empty:  # nada na janela (ex.: só os CSVs de exemplo): as mais recentes
+        df = read_range(table, limit=DASHBOARD_MAX_ROWS, database_url=database_url)
+    return df
 
 def load_data(database_url: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
-    Carrega sensores, weather e detections. Usa CSV fallback.
-    Retorna (df_sensors, df_weather, df_detections). DataFrames podem ser None.
+    Carrega sensores, weather e detections (até DASHBOARD_MAX_ROWS linhas mais recentes dos
+    últimos DASHBOARD_DAYS dias) via db/query.py: PostgreSQL quando configurado, senão
+    store Parquet / CSVs (lidos incrementalmente).
+    Retorna (df_sensors, df_weather, df_detections); sem dados, DataFrames vazios.
+    Os frames vêm com tipos compactos (db/frames.py) e são compartilhados entre os
+    painéis e os reruns: as funções de plot não copiam nem alteram o frame.
     """
-    df_sensors, p1 = _read_first_existing(SENSORS_CANDIDATES)
-    df_weather, p2 = _read_first_existing(WEATHER_CANDIDATES)
-    df_detections, p3 = _read_first_existing(DETECTIONS_CANDIDATES)
+    return tuple(_load_recent(t, database_url) for t in ("sensors", "weather", "detections"))
 
-    if df_sensors is not None and 'ts' in df_sensors.columns:
-        try:
-            df_sensors['ts'] = pd.to_datetime(df_sensors['ts'], errors='coerce')
-        except Exception:
-            pass
+def _empty_figure(figsize, message: str) -> Figure:
+    fig, ax = new_figure(figsize)
+    ax.text(0.5, 0.5, message, ha="center", va="center")
+    ax.set_axis_off()
+    return fig
 
-    if df_weather is not None and 'ts' in df_weather.columns:
-        try:
-            df_weather['ts'] = pd.to_datetime(df_weather['ts'], errors='coerce')
-        except Exception:
-            pass
+# ---------- especificações dos gráficos (pequenas: o que de fato é desenhado) ----------
+def humidity_series(df_sensors: pd.DataFrame, series: Optional[pd.Series] = None) -> Optional[pd.Series]:
+    """Média de umidade por hora; ``series`` pronta (rollups/consulta 1h) evita o groupby nas linhas brutas."""
+    if series is None:
+        if df_sensors is None or df_sensors.empty:
+            return None
+        # agrupa direto sobre o frame compartilhado (mean ignora NaN; ts NaT fica fora do groupby)
+        series = df_sensors.groupby(df_sensors['ts'].dt.floor('h'))['umidade'].mean()
+    return series.dropna().sort_index()
 
-    if df_detections is not None and 'ts' in df_detections.columns:
-        try:
-            df_detections['ts'] = pd.to_datetime(df_detections['ts'], errors='coerce')
-        except Exception:
-            pass
+def sensor_means(df_sensors: pd.DataFrame, agg: Optional[pd.Series] = None) -> Optional[pd.Series]:
+    if agg is None:
+        if df_sensors is None or df_sensors.empty or 'sensor_id' not in df_sensors.columns:
+            return None
+        agg = df_sensors.groupby('sensor_id', observed=True)['umidade'].mean()
+    return agg.dropna().sort_values(ascending=False)
 
-    return df_sensors, df_weather, df_detections
+def nutrient_hist(df_sensors: pd.DataFrame, bins: int = 12):
+    """(contagens, bordas) do histograma: 12 barras, qualquer que seja o número de linhas."""
+    if df_sensors is None or df_sensors.empty or 'nutriente' not in df_sensors.columns:
+        return None
+    arr = pd.to_numeric(df_sensors['nutriente'], errors='coerce').dropna().to_numpy()
+    if arr.size == 0:
+        return None
+    return np.histogram(arr, bins=bins)
 
-def plot_humidity_timeseries(df_sensors: pd.DataFrame) -> plt.Figure:
-    """
-    Plota série temporal de umidade (média por hora).
-    """
-    fig, ax = plt.subplots(figsize=(9, 3.5))
-    if df_sensors is None or df_sensors.empty:
-        ax.text(0.5, 0.5, "No sensor data", ha="center", va="center")
-        ax.set_axis_off()
-        return fig
-
-    df = df_sensors.copy()
-    df = df.dropna(subset=['ts', 'umidade'])
-    df['hour'] = df['ts'].dt.floor('H')
-    series = df.groupby('hour')['umidade'].mean().sort_index()
-    ax.plot(series.index.to_pydatetime(), series.values)
+def detection_counts(df_detections: pd.DataFrame) -> Optional[pd.Series]:
+    if df_detections is None or df_detections.empty or 'categoria' not in df_detections.columns:
+        return None
+    return df_detections['categoria'].value_counts().sort_values(ascending=False)
+
+def chart_specs(df_sensors, df_detections, hourly=None, mean_per_sensor=None) -> dict:
+    return {
+        "humidity": humidity_series(df_sensors, hourly),
+        "per_sensor": sensor_means(df_sensors, mean_per_sensor),
+        "nutrients": nutrient_hist(df_sensors),
+        "detections": detection_counts(df_detections),
+    }
+
+# ---------- desenho (Figure fora do pyplot; component/charts.py) ----------
+def _bar_labels(ax, labels):
+    ax.set_xticks(range(len(labels)), labels, rotation=30, ha='right')
+
+def draw_humidity(series: Optional[pd.Series]) -> Figure:
+    if series is None or series.empty:
+        return _empty_figure((9, 3.5), "No sensor data")
+    fig, ax = new_figure((9, 3.5))
+    series = downsample(series, width_px(fig))  # ~1 ponto por pixel
+    ax.plot(series.index, series.values)
     ax.set_title("Umidade média por hora")
     ax.set_xlabel("Hora")
     ax.set_ylabel("Umidade")
     fig.tight_layout()
     return fig
 
-def plot_avg_humidity_per_sensor(df_sensors: pd.DataFrame) -> plt.Figure:
-    fig, ax = plt.subplots(figsize=(6, 3.5))
-    if df_sensors is None or df_sensors.empty or 'sensor_id' not in df_sensors.columns:
-        ax.text(0.5, 0.5, "No sensor data", ha="center", va="center")
-        ax.set_axis_off()
-        return fig
-    df = df_sensors.dropna(subset=['sensor_id', 'umidade'])
-    agg = df.groupby('sensor_id')['umidade'].mean().sort_values(ascending=False)
-    ax.bar(agg.index.astype(str), agg.values)
-    ax.set_title("Umidade média por sensor")
+def draw_sensor_means(agg: Optional[pd.Series]) -> Figure:
+    if agg is None or agg.empty:
+        return _empty_figure((6, 3.5), "No sensor data")
+    fig, ax = new_figure((6, 3.5))
+    title = "Umidade média por sensor"
+    limit = max(2, width_px(fig) // CHART_BAR_PX)
+    if len(agg) > limit:  # mais sensores que barras legíveis: os maiores e os menores
+        title += f" ({limit // 2} maiores e {limit - limit // 2} menores de {len(agg)})"
+        agg = pd.concat([agg.iloc[:limit // 2], agg.iloc[len(agg) - (limit - limit // 2):]])
+    ax.bar(range(len(agg)), agg.values)
+    _bar_labels(ax, agg.index.astype(str))
+    ax.set_title(title)
     ax.set_xlabel("Sensor")
     ax.set_ylabel("Umidade média")
-    plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
     fig.tight_layout()
     return fig
 
-def plot_nutrient_histogram(df_sensors: pd.DataFrame) -> plt.Figure:
-    fig, ax = plt.subplots(figsize=(6, 3.5))
-    if df_sensors is None or df_sensors.empty or 'nutriente' not in df_sensors.columns:
-        ax.text(0.5, 0.5, "No nutrient data", ha="center", va="center")
-        ax.set_axis_off()
-        return fig
-    arr = pd.to_numeric(df_sensors['nutriente'], errors='coerce').dropna()
-    if arr.empty:
-        ax.text(0.5, 0.5, "No nutrient data", ha="center", va="center")
-        ax.set_axis_off()
-        return fig
-    ax.hist(arr.values, bins=12)
+def draw_nutrients(hist) -> Figure:
+    if hist is None:
+        return _empty_figure((6, 3.5), "No nutrient data")
+    counts, edges = hist
+    fig, ax = new_figure((6, 3.5))
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
     ax.set_title("Distribuição de nutrientes")
     ax.set_xlabel("Nível nutriente")
     ax.set_ylabel("Frequência")
     fig.tight_layout()
     return fig
 
-def plot_detections_counts(df_detections: pd.DataFrame) -> plt.Figure:
-    fig, ax = plt.subplots(figsize=(6, 3.5))
-    if df_detections is None or df_detections.empty or 'categoria' not in df_detections.columns:
-        ax.text(0.5, 0.5, "No detections data", ha="center", va="center")
-        ax.set_axis_off()
-        return fig
-    cnt = df_detections['categoria'].value_counts().sort_values(ascending=False)
-    ax.bar(cnt.index.astype(str), cnt.values)
+def draw_detections(cnt: Optional[pd.Series]) -> Figure:
+    if cnt is None or cnt.empty:
+        return _empty_figure((6, 3.5), "No detections data")
+    fig, ax = new_figure((6, 3.5))
+    ax.bar(range(len(cnt)), cnt.values)
+    _bar_labels(ax, cnt.index.astype(str))
     ax.set_title("Contagem por categoria (detecções)")
     ax.set_xlabel("Categoria")
     ax.set_ylabel("Contagem")
-    plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
     fig.tight_layout()
     return fig
 
-def render_kpis(df_sensors: pd.DataFrame, df_detections: pd.DataFrame):
+DRAW = {"humidity": draw_humidity, "per_sensor": draw_sensor_means,
+        "nutrients": draw_nutrients, "detections": draw_detections}
+
+def plot_humidity_timeseries(df_sensors: pd.DataFrame, series: Optional[pd.Series] = None) -> Figure:
+    """
+    Plota série temporal de umidade (média por hora).
+    ``series`` pronta (rollups 1h) evita o groupby sobre as linhas brutas.
+    """
+    return draw_humidity(humidity_series(df_sensors, series))
+
+def plot_avg_humidity_per_sensor(df_sensors: pd.DataFrame, agg: Optional[pd.Series] = None) -> Figure:
+    return draw_sensor_means(sensor_means(df_sensors, agg))
+
+def plot_live_humidity(df_live: pd.DataFrame) -> Figure:
+    """Umidade média entre sensores em janelas de 10 s (leituras do ring buffer)."""
+    fig, ax = new_figure((9, 3))
+    series = df_live.set_index('ts')['umidade'].resample('10s').mean().dropna()
+    ax.plot(series.index, series.values)
+    ax.set_title(f"Umidade ao vivo (últimos {LIVE_WINDOW / 60:.0f} min)")
+    ax.set_xlabel("Hora")
+    ax.set_ylabel("Umidade")
+    fig.tight_layout()
+    return fig
+
+def plot_nutrient_histogram(df_sensors: pd.DataFrame) -> Figure:
+    return draw_nutrients(nutrient_hist(df_sensors))
+
+def plot_detections_counts(df_detections: pd.DataFrame) -> Figure:
+    return draw_detections(detection_counts(df_detections))
+
+def show_chart(name: str, spec, version=None):
+    """
+    PNG do gráfico ``name`` a partir do cache (component/charts.py): desenha só quando a
+    versão muda (versão do snapshot, ou hash da especificação já reduzida).
+    """
+    if version is None:
+        version = spec_version(*(spec if isinstance(spec, tuple) else (spec,)))
+    with profiler.section(f"chart.{name}"):
+        st.image(figures.get_or_render(name, version, lambda: DRAW[name](spec)), width='stretch')
+
+def load_rollup_views(days: float = DASHBOARD_DAYS):
+    """
+    Série horária e resumo por sensor da janela do dashboard a partir dos rollups
+    (db/rollups.py). None quando não há rollups; o custo depende da janela, não das linhas brutas.
+    """
+    rollups = get_rollups() if get_rollups is not None else None
+    if rollups is None:
+        return None
+    end = pd.Timestamp.now()
+    start = end - pd.Timedelta(days=days)
+    try:
+        per_sensor = rollups.summary(start, end, by_sensor=True)
+        if per_sensor.empty:
+            return None
+        return {"hourly": rollups.series(start, end, "umidade", bucket="1h"), "per_sensor": per_sensor}
+    except Exception:
+        return None
+
+def load_query_views(days: float = DASHBOARD_DAYS, database_url: Optional[str] = None):
+    """
+    Sem rollups: série horária e média por sensor agregadas no banco/store (db/query.py),
+    só os buckets vêm para o pandas. (None, None) sem leituras na janela.
+    """
+    window = pd.Timedelta(days=days)
+    database_url = database_url or ""
+    hourly = read_range("sensors", start=window, columns=["ts", "umidade"], bucket="1h", database_url=database_url)
+    if hourly.empty:
+        return None, None
+    per_sensor = read_range("sensors", start=window, columns=["sensor_id", "umidade"], agg="mean",
+                            database_url=database_url)
+    return hourly.set_index("ts")["umidade"], per_sensor.set_index("sensor_id")["umidade"]
+
+def render_kpis(df_sensors: pd.DataFrame, df_detections: pd.DataFrame, per_sensor: Optional[pd.DataFrame] = None,
+                sensors_count: Optional[int] = None):
     """
     Calcula e exibe KPIs simples: última umidade média, número de sensores, detecções recentes.
+    ``per_sensor`` (resumo dos rollups) substitui o cálculo sobre as linhas brutas;
+    ``sensors_count`` (da média por sensor agregada na janela inteira) substitui a contagem
+    sobre as linhas brutas, que são só as mais recentes.
     """
     last_umidade = None
+    known_count = sensors_count
     sensors_count = 0
     detections_count = 0
-    if df_sensors is not None and not df_sensors.empty:
+    if per_sensor is not None:
+        sensors_count = int(len(per_sensor))
+        last = per_sensor.dropna(subset=['last_umidade']).sort_values('last_ts')
+        last_umidade = last['last_umidade'].iloc[-1] if not last.empty else None
+    elif df_sensors is not None and not df_sensors.empty:
         if 'umidade' in df_sensors.columns:
             try:
-                last_row = df_sensors.sort_values('ts').iloc[-1]
+                last_row = df_sensors.loc[df_sensors['ts'].idxmax()]
                 last_umidade = last_row.get('umidade')
             except Exception:
                 last_umidade = None
         if 'sensor_id' in df_sensors.columns:
             sensors_count = int(df_sensors['sensor_id'].nunique())
+    if known_count is not None and per_sensor is None:
+        sensors_count = int(known_count)
     if df_detections is not None and not df_detections.empty:
         detections_count = int(len(df_detections))
     c1, c2, c3 = st.columns(3)
@@ -154,45 +261,106 @@ def render_kpis(df_sensors: pd.DataFrame, df_detections: pd.DataFrame):
     c3.metric("Detecções recentes", detections_count)
 
 
-def render_visual_panels(database_url: Optional[str] = None):
+def build_panel_data(database_url: Optional[str] = None) -> dict:
+    """
+    Tudo que os painéis leem (frames, agregados e previews), sem Streamlit: o snapshot
+    compartilhado (component/snapshot.py) calcula uma vez por intervalo para todas as sessões.
+    """
+    with profiler.section("panels.load_data"):
+        df_sensors, df_weather, df_detections = load_data(database_url=database_url)
+    with profiler.section("panels.views"):
+        views = load_rollup_views()
+        per_sensor = views["per_sensor"] if views else None
+        if views:
+            hourly, mean_per_sensor = views["hourly"], per_sensor["mean_umidade"]
+        else:
+            hourly, mean_per_sensor = load_query_views(database_url=database_url)
+    return {
+        "sensors": df_sensors,
+        "weather": df_weather,
+        "detections": df_detections,
+        "hourly": hourly,
+        "mean_per_sensor": mean_per_sensor,
+        "per_sensor": per_sensor,
+        "charts": chart_specs(df_sensors, df_detections, hourly, mean_per_sensor),
+        "sensors_preview": df_sensors.nlargest(200, 'ts') if not df_sensors.empty else df_sensors,
+        "detections_preview": df_detections.nlargest(200, 'ts') if not df_detections.empty else df_detections,
+    }
+
+
+def _ring_panel():
+    """Bridge ativo na mesma máquina: umidade ao vivo direto da memória compartilhada."""
+    rings = get_live_rings()
+    if rings is not None:
+        with profiler.section("live.ring"):
+            df_live = rings.frame(since=LIVE_WINDOW)
+            if not df_live.empty:
+                st.image(render_png(plot_live_humidity(df_live)), width='stretch')  # muda todo rerun: sem cache
+
+def _live_humidity_panel(database_url: Optional[str], data):
+    """Série horária da sessão crescendo a partir da marca d'água (component/live.py)."""
+    with profiler.section("live.update"):
+        live = live_humidity(st.session_state, data, database_url)
+    show_chart("humidity", live.series())
+    st.caption(f"Ao vivo: {live.rows} leituras novas desde o snapshot, marca {live.mark:%H:%M:%S}")
+
+def render_visual_panels(database_url: Optional[str] = None, data: Optional[dict] = None,
+                         live_every: Optional[float] = None):
     """
     Renderiza painéis de visualização no Streamlit.
     Use dentro do app.py, por exemplo na aba 'Dashboard Principal' ou em uma aba separada.
+    ``data``: resultado de build_panel_data já pronto (snapshot compartilhado); sem ele,
+    calcula nesta sessão.
+    ``live_every``: segundos entre atualizações do painel do ring buffer e da série de umidade
+    (st.fragment: só esses trechos rodam de novo, buscando as leituras novas); None = estático.
     """
     st.subheader("Visualizações — Painéis e Gráficos")
 
-    df_sensors, df_weather, df_detections = load_data(database_url=database_url)
+    if data is None:
+        with profiler.section("panels.build"):
+            data = build_panel_data(database_url)
+    df_sensors, df_detections = data["sensors"], data["detections"]
+    hourly, mean_per_sensor, per_sensor = data["hourly"], data["mean_per_sensor"], data["per_sensor"]
 
     # KPIs
-    render_kpis(df_sensors, df_detections)
+    with profiler.section("visuals.kpis"):
+        render_kpis(df_sensors, df_detections, per_sensor=per_sensor,
+                    sensors_count=len(mean_per_sensor) if mean_per_sensor is not None else None)
     st.markdown("---")
 
+    if live_every:
+        st.fragment(run_every=live_every)(_ring_panel)()
+    else:
+        _ring_panel()
+
+    # especificações já reduzidas (snapshot) e PNG em cache: sem dados novos, rerun só devolve bytes
+    specs = data.get("charts") or chart_specs(df_sensors, df_detections, hourly, mean_per_sensor)
     row1_col1, row1_col2 = st.columns([2, 1])
     with row1_col1:
-        fig1 = plot_humidity_timeseries(df_sensors)
-        st.pyplot(fig1)
+        if live_every:
+            st.fragment(run_every=live_every)(_live_humidity_panel)(database_url, data)
+        else:
+            show_chart("humidity", specs["humidity"])
     with row1_col2:
-        fig2 = plot_avg_humidity_per_sensor(df_sensors)
-        st.pyplot(fig2)
+        show_chart("per_sensor", specs["per_sensor"])
 
     row2_col1, row2_col2 = st.columns(2)
     with row2_col1:
-        fig3 = plot_nutrient_histogram(df_sensors)
-        st.pyplot(fig3)
+        show_chart("nutrients", specs["nutrients"])
     with row2_col2:
-        fig4 = plot_detections_counts(df_detections)
-        st.pyplot(fig4)
+        show_chart("detections", specs["detections"])
 
     st.markdown("---")
-    with st.expander("Mostrar dados brutos: sensores (preview)"):
-        if df_sensors is None:
-            st.info("Nenhum CSV de sensores encontrado.")
-        else:
-            st.dataframe(df_sensors.sort_values('ts', ascending=False).head(200), width='stretch')
-    with st.expander("Mostrar dados brutos: detecções (preview)"):
-        if df_detections is None:
-            st.info("Nenhum CSV de detecções encontrado.")
-        else:
-            st.dataframe(df_detections.sort_values('ts', ascending=False).head(200), width='stretch')
+    with profiler.section("visuals.previews"):
+        with st.expander("Mostrar dados brutos: sensores (preview)"):
+            if df_sensors.empty:
+                st.info("Nenhuma leitura de sensores encontrada.")
+            else:
+                st.dataframe(data["sensors_preview"], width='stretch')
+        with st.expander("Mostrar dados brutos: detecções (preview)"):
+            if df_detections.empty:
+                st.info("Nenhuma leitura de detecções encontrada.")
+            else:
+                st.dataframe(data["detections_preview"], width='stretch')
 
-    st.caption(f"Dados carregados: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    st.caption(f"Dados carregados: {data.get('built_at') or time.strftime('%Y-%m-%d %H:%M:%S')}")